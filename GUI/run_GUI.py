@@ -35,6 +35,8 @@ from GUI.py_files.ui_help_window import Ui_help_window
 from GUI.py_files.ui_json_window import Ui_JSON_window
 from GUI.py_files.ui_run_window import Ui_run_window
 
+from vipcals import daemon
+
 from io import StringIO
 from PySide6.QtGui import QTextCursor
 
@@ -99,6 +101,29 @@ class OutputRedirector(StringIO):
             return "lightblue"
         return "#cccccc"
         
+def run_in_daemon(worker, json_path):
+    """Submit the input file to the VIPCALs daemon, if there is one running, and
+    stream its output. Returns False if there is no daemon."""
+    if daemon.is_running() == False:
+        return False
+
+    try:
+        for event in daemon.submit(json_path):
+            if event['event'] == 'output':
+                worker.output_received.emit(event['text'])
+            elif event['event'] == 'queued':
+                worker.output_received.emit(f"Waiting for {event['ahead']} job(s) " \
+                                            + "submitted before.\n")
+            elif event['event'] == 'error':
+                worker.error_received.emit(f"\n[ERROR]: {event['text']}")
+            elif event['event'] == 'block' and event['status'] not in ['RUNNING', 'DONE']:
+                worker.error_received.emit(f"\n[ERROR]: Calibration block " \
+                                           + f"{event['block']}: {event['status']}")
+    except OSError as e:
+        worker.error_received.emit(f"\n[ERROR]: Connection with the daemon lost: {e}")
+
+    return True
+
 class PipelineWorker(QThread):
     output_received = Signal(str)  # Signal to send stdout
     error_received = Signal(str)   # Signal to send stderr
@@ -109,6 +134,11 @@ class PipelineWorker(QThread):
         CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
         MAIN_PATH = os.path.join(CURRENT_DIR, "..", "vipcals", "__main__.py")
 
+        # Use the persistent worker when it is running
+        if run_in_daemon(self, tmp_file) == True:
+            self.process_finished.emit()
+            return
+
         process = subprocess.Popen(
             ["ParselTongue", MAIN_PATH,
             tmp_file],
@@ -152,6 +182,12 @@ class JsonPipelineWorker(QThread):
         """Runs mock_pipeline.py in a subprocess and streams output."""
         CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
         MAIN_PATH = os.path.join(CURRENT_DIR, "..", "vipcals", "__main__.py")
+
+        # Use the persistent worker when it is running
+        if run_in_daemon(self, self.json_path) == True:
+            self.process_finished.emit()
+            return
+
         process = subprocess.Popen(
             ["ParselTongue", MAIN_PATH,
             self.json_path],
@@ -240,8 +276,8 @@ class MainWindow(qtw.QMainWindow, Ui_VIPCALs):
         for win in self.canvas_windows:
             if win is not None and win.isVisible():
                 win.close()
-        # Clean the tmp directory
-        os.system(f"rm -r {tmp_dir}/*")
+        # Clean the plots in the tmp directory, leaving the workspaces of other runs
+        os.system(f"find {tmp_dir} -maxdepth 1 -type f -delete")
         event.accept()
         
         
@@ -237,8 +237,8 @@ class MainWindow(qtw.QMainWindow, Ui_VIPCALs):
         for win in self.canvas_windows:
             if win is not None and win.isVisible():
                 win.close()
-        # Clean the tmp directory
-        os.system(f"rm -r {tmp_dir}/*")
+        # Clean the plots in the tmp directory, leaving the workspaces of other runs
+        os.system(f"find {tmp_dir} -maxdepth 1 -type f -delete")
         event.accept()
         
         
@@ -1,14 +1,21 @@
 import argparse
 import os
+import sys
 import json
+import time
 import string
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 from datetime import datetime
 
-from astropy.io import fits
 from astropy.coordinates import SkyCoord
 
 from pipeline import pipeline
+from vipcals.scripts import metadata as meta
+from vipcals.scripts import load_data as load
+import daemon
 
 import functools
 print = functools.partial(print, flush=True)
@@ -110,28 +117,26 @@ def create_default_dict():
     default_dict['flag_edge'] = 0
     # Plotting options
     default_dict['interactive'] = False
+    # Parallel options
+    default_dict['parallel_bands'] = False
+    # Scratch directory for auxiliary files
+    default_dict['scratch_dir'] = None
+    # Resume options
+    default_dict['resume'] = False
+    # Statistics options
+    default_dict['deferred_stats'] = False
+    default_dict['inplace_stats'] = False
 
     return default_dict
 
-parser = argparse.ArgumentParser(
-                    prog = 'VIPCALs',
-                    description = 'Automated VLBI data calibration pipeline using AIPS')
-
-# Arguments are read from a json file
-parser.add_argument('file', type=argparse.FileType('r'))
-args = parser.parse_args()
-entry_list = read_args(args.file)
-
-## Print ASCII art ##
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-ASCII_PATH = os.path.join(CURRENT_DIR, "..", "GUI" ,"ascii_logo_string.txt")
-ascii_logo = open(ASCII_PATH, 'r').read()
-print(ascii_logo)
-
-# Iterate over every entry on the input file
-print('A total of ' + str(len(entry_list)) + ' calibration blocks were read.\n')
-for i, entry in enumerate(entry_list):
-    print('Checking inputs of calibration block ' + str(i+1) + '.\n')
+def check_inputs(entry):
+    """Check the inputs of a calibration block and fill in the defaults.
+
+    :param entry: inputs of one calibration block as read from the json file
+    :type entry: dict
+    :return: complete input dictionary, or None if the inputs are not valid
+    :rtype: dict or None
+    """
     # Create default input dictionary
     input_dict = create_default_dict()
     # Unzip inputs
@@ -145,22 +150,22 @@ for i, entry in enumerate(entry_list):
         input_dict['userno'] = int(input_dict['userno'])
     except ValueError:
         print('User number has to be a number.\n')
-        exit()
+        return None
     try:
         input_dict['disk'] = int(input_dict['disk'])
     except ValueError:
         print('Disk number has to be a number.\n')
-        exit()
+        return None
     try:
         input_dict['time_aver'] = int(input_dict['time_aver'])
     except ValueError:
         print('Threshold for time averaging has to be an integer value in seconds.\n')
-        exit()
+        return None
     try:
         input_dict['freq_aver'] = int(input_dict['freq_aver'])
     except ValueError:
         print('Threshold for frequency averaging has to be an integer value in kHz.\n')
-        exit()
+        return None
 
     # Some inputs need to be floats
     if input_dict['flag_edge'] != None:
@@ -168,22 +173,22 @@ for i, entry in enumerate(entry_list):
             input_dict['flag_edge'] = float(input_dict['flag_edge'])
         except ValueError:
             print('Edge channels to be flagged needs to be a float number.\n')
-            exit()
+            return None
 
     # Some inputs need to be given as a list #
     if type(input_dict['paths']) != list:
         print('Filepaths have to be given as a list in the input file.\n')
-        exit()
+        return None
     if type(input_dict['targets']) != list:
         print('Target names have to be given as a list in the input file.\n')
-        exit()
+        return None
     if type(input_dict['shifts']) != list and input_dict['shifts'] != None:
         print('Coordinate shifts have to be given as a list in the input file.\n')
-        exit()
+        return None
     if type(input_dict['phase_ref']) != list and input_dict['phase_ref'] != None:
         print('Phase reference calibrators have to be given as a list in ' \
         + 'the input file.\n')
-        exit()
+        return None
 
     print(input_dict['paths'])
     print('\n')
@@ -191,25 +196,50 @@ for i, entry in enumerate(entry_list):
     # Load all has to be True/False
     if type(input_dict['load_all']) != bool:
         print('load_all option has to be True/False.\n')
-        exit()
+        return None
 
     # subarrays has to be True/False
     if type(input_dict['subarray']) != bool:
         print('subarray option has to be True/False.\n')
-        exit()
+        return None
+
+    # parallel_bands has to be True/False
+    if type(input_dict['parallel_bands']) != bool:
+        print('parallel_bands option has to be True/False.\n')
+        return None
+
+    # resume has to be True/False
+    if type(input_dict['resume']) != bool:
+        print('resume option has to be True/False.\n')
+        return None
+
+    # deferred_stats has to be True/False
+    if type(input_dict['deferred_stats']) != bool:
+        print('deferred_stats option has to be True/False.\n')
+        return None
+
+    # inplace_stats has to be True/False
+    if type(input_dict['inplace_stats']) != bool:
+        print('inplace_stats option has to be True/False.\n')
+        return None
+
+    # deferred_stats counts in place
+    if input_dict['deferred_stats'] == True and input_dict['inplace_stats'] == False:
+        print('deferred_stats option requires inplace_stats to be True.\n')
+        return None
 
     # Phase reference #
     if input_dict['phase_ref'] != None:
         if len(input_dict['targets']) != len(input_dict['phase_ref']):
             print('\nThe number of phase reference calibrators does not match ' \
             + 'the number of targets to calibrate.\n')
-            exit()
+            return None
     # Phase shift #
     if input_dict['shifts'] != None:
         if len(input_dict['targets']) != len(input_dict['shifts']):
             print('\nThe number of shifted coordinates does not match the number of ' \
                 + 'targets to calibrate.\n')
-            exit()
+            return None
 
 
         for i, coord in enumerate(input_dict['shifts']):
@@ -217,7 +247,7 @@ for i, entry in enumerate(entry_list):
                 parts = coord.split()
                 if len(parts) != 2:
                     print(f"\nInvalid coordinate format at index {i}: '{coord}'. Expected two values: RA and DEC.\n")
-                    exit()
+                    return None
 
                 ra_str, dec_str = parts
 
@@ -232,12 +262,13 @@ for i, entry in enumerate(entry_list):
                     print(f"\nError parsing coordinate at index {i}: '{coord}'")
                     print("Exception:", e)
 
+    # Read the headers of all files only once
+    metadata_list = meta.scan_files(input_dict['paths'])
+
     # Science targets have to be in the file/s
     all_sources = []
-    for i, path in enumerate(input_dict['paths'],1):
-            globals()[f"hdul_{i}"] = fits.open(path)
-            all_sources.extend(list(globals()[f"hdul_{i}"]['SOURCE'].data['SOURCE']))
-            globals()[f"hdul_{i}"].close()
+    for metadata in metadata_list:
+            all_sources.extend(list(metadata.sources['SOURCE']))
     all_sources = list(set(all_sources))    # Remove duplicates
     # Clean the list from non ASCII characters
     try:
@@ -251,7 +282,7 @@ for i, entry in enumerate(entry_list):
             if t not in all_sources_clean:
                 print(t + ' was not found in any of the files provided.\n')
         if any(x not in all_sources_clean for x in input_dict['targets']):
-            exit()
+            return None
 
     # Phase reference sources have to be in the file/s
     if input_dict['phase_ref'] != None:
@@ -261,24 +292,21 @@ for i, entry in enumerate(entry_list):
             if prs not in all_sources:
                 print(prs + ' was not found in any of the files provided.\n')
         if any(x not in all_sources for x in input_dict['phase_ref'] if x != None):
-            exit()
+            return None
 
     # Load multiple files together:
     if len(input_dict['paths']) > 1:
                 
     # Similar date (+-3 days)
         obs_dates = []
-        for j, path in enumerate(input_dict['paths'],1):
+        for metadata in metadata_list:
             for fmt in ("%d/%m/%y", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"):
                 try:
-                    globals()[f"hdul_{j}"] = fits.open(path)
-                    # print([h.name for h in globals()[f"hdul_{j}"]])
-                    dt = datetime.strptime(globals()[f"hdul_{j}"]['UV_DATA'].header['DATE-OBS'], fmt)
+                    dt = datetime.strptime(metadata.date_obs, fmt)
                     YYYY, MM, DD = dt.year, dt.month, dt.day
                     obs_dates.append(datetime(YYYY, MM, DD).toordinal())
                 except ValueError:
                     continue                
-            globals()[f"hdul_{j}"].close()
 
         if (max(obs_dates) - min(obs_dates)) > 2:
             print('\nWARNING! There are more than 2 days between observations.\n')
@@ -294,15 +322,14 @@ for i, entry in enumerate(entry_list):
         ref_freqs = []
         band_freqs = []
         obs_freqs = []
-        for j, path in enumerate(input_dict['paths'],1):
-            globals()[f"hdul_{j}"] = fits.open(path)
-            n_channels.append(globals()[f"hdul_{j}"]["FREQUENCY"].header['NO_CHAN'])
-            n_ifs.append(globals()[f"hdul_{j}"]["FREQUENCY"].header['NO_BAND'])
-            n_stokes.append(globals()[f"hdul_{j}"]["FREQUENCY"].header['NO_STKD'])
-            ref_channels.append(globals()[f"hdul_{j}"]["FREQUENCY"].header['REF_PIXL'])
-            ref_freqs.append(globals()[f"hdul_{j}"]["FREQUENCY"].header['REF_FREQ'])
-
-            band = np.atleast_1d(globals()[f"hdul_{j}"]['FREQUENCY'].data[:]['BANDFREQ'])  # Safe for both float and array
+        for metadata in metadata_list:
+            n_channels.append(metadata.no_chan)
+            n_ifs.append(metadata.no_band)
+            n_stokes.append(metadata.no_stkd)
+            ref_channels.append(metadata.ref_pixl)
+            ref_freqs.append(metadata.ref_freq)
+
+            band = np.atleast_1d(metadata.frequency[:]['BANDFREQ'])  # Safe for both float and array
             band_freqs.append(band)
                 
             freqs = band + ref_freqs[-1]
@@ -312,8 +339,6 @@ for i, entry in enumerate(entry_list):
                 obs_freqs.append(sorted(map(tuple, freqs)))
             else:
                 obs_freqs.append(sorted(freqs.tolist()))
-            
-            globals()[f"hdul_{j}"].close()
 
         for field in [n_channels, n_ifs, n_stokes, ref_channels, list(set(map(tuple, obs_freqs)))]:
             if len(set(field)) != 1:
@@ -328,30 +353,26 @@ for i, entry in enumerate(entry_list):
                     obs_freq_str = str(obs_freqs[j])
                     print(f"{filename:<35}{n_channels[j]:<10}{n_ifs[j]:<6}{n_stokes[j]:<8}{obs_freq_str:<80}{ref_channels[j]:<12}")
                             
-                exit()
+                return None
     
     # Reference antenna #
-    for filepath in input_dict['paths']:
+    for metadata in metadata_list:
         if input_dict['refant'] != None:
             antenna_names = []
-            hdul = fits.open(filepath)
-            non_ascii_antennas = list(hdul['ANTENNA'].data['ANNAME'])
-            hdul.close()
+            non_ascii_antennas = list(metadata.antennas)
             for ant in non_ascii_antennas:
                 ant = ant.encode()[:2].decode()
                 antenna_names.append(ant)
             if input_dict['refant'] not in antenna_names:
                 print('The selected reference antenna is not available in the FITS file.'\
                     + ' Please make sure that the input is correct.')
-                exit()
+                return None
 
     # Priority antenna list #
-    for filepath in input_dict['paths']:
+    for metadata in metadata_list:
         if input_dict['refant_list'] != None:
             antenna_names = []
-            hdul = fits.open(filepath)
-            non_ascii_antennas = list(hdul['ANTENNA'].data['ANNAME'])
-            hdul.close()
+            non_ascii_antennas = list(metadata.antennas)
             for ant in non_ascii_antennas:
                 ant = ant.encode()[:2].decode()
                 antenna_names.append(ant)
@@ -360,14 +381,14 @@ for i, entry in enumerate(entry_list):
                     print('One or more of the selected priority antennas are not available in the FITS file.'\
                         + ' Please make sure that the input is correct.\n')
                     print(f'Available antennas are {antenna_names}')
-                    exit()
+                    return None
 
     # Output directory
     if input_dict['output_directory'] != None:
         if os.path.isdir(input_dict['output_directory']) == False:
             print('\nThe selected output directory does not exist.' \
                 + ' The pipeline will stop now.\n')
-            exit()
+            return None
         if input_dict['output_directory'][-1] == '/':
             input_dict['output_directory'] = input_dict['output_directory'][:-1]
 
@@ -375,5 +396,257 @@ for i, entry in enumerate(entry_list):
     if input_dict['output_directory'] == None:
         input_dict['output_directory'] = os.getcwd()
 
-    # Everything is fine, start the pipeline
-    pipeline(input_dict)
\ No newline at end of file
+    # Scratch directory
+    if input_dict['scratch_dir'] != None:
+        if os.path.isdir(input_dict['scratch_dir']) == False:
+            print('\nThe selected scratch directory does not exist.' \
+                + ' The pipeline will stop now.\n')
+            return None
+
+    return input_dict
+
+def format_time(seconds):
+    """Format a time interval in seconds as hh:mm:ss.
+
+    :param seconds: time interval in seconds
+    :type seconds: float
+    :return: formatted time interval
+    :rtype: str
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}'
+
+def run_block(block_no, input_dict, slot_queue, userno_step = 1):
+    """Run the pipeline on one calibration block inside a worker process.
+
+    The worker takes a free slot from the queue and offsets the AIPS user number of
+    the block by the slot number times ``userno_step``, so that blocks running at the
+    same time never share an AIPS catalogue. The output of the pipeline is redirected
+    to a text file in the output directory of the block.
+
+    :param block_no: number of the calibration block in the input file
+    :type block_no: int
+    :param input_dict: checked input dictionary of the block
+    :type input_dict: dict
+    :param slot_queue: queue with the free worker slots
+    :type slot_queue: Queue
+    :param userno_step: AIPS user numbers reserved per worker, e.g. when the bands \
+        of each block are also calibrated in parallel; defaults to 1
+    :type userno_step: int, optional
+    :return: block number, AIPS user number, exit status, elapsed time and path of \
+        the output file
+    :rtype: tuple
+    """
+    slot = slot_queue.get()
+    t_i = time.time()
+    input_dict['userno'] = input_dict['userno'] + slot * userno_step
+    out_path = os.path.join(input_dict['output_directory'], 
+                            f'vipcals_block_{block_no}.out')
+
+    # Redirect at the file descriptor level to also catch the AIPS tasks output
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_stdout = os.dup(1)
+    saved_stderr = os.dup(2)
+    out_file = open(out_path, 'w')
+    os.dup2(out_file.fileno(), 1)
+    os.dup2(out_file.fileno(), 2)
+    try:
+        pipeline(input_dict)
+        status = 'DONE'
+    except (Exception, SystemExit) as e:
+        traceback.print_exc()
+        status = f'FAILED ({type(e).__name__})'
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved_stdout, 1)
+        os.dup2(saved_stderr, 2)
+        os.close(saved_stdout)
+        os.close(saved_stderr)
+        out_file.close()
+        slot_queue.put(slot)
+
+    return(block_no, input_dict['userno'], status, time.time() - t_i, out_path)
+
+def print_summary(entry_list, results):
+    """Print a table with the exit status of every calibration block.
+
+    :param entry_list: list of calibration blocks read from the input file
+    :type entry_list: list of dict
+    :param results: block number => (AIPS user number, status, elapsed time, output \
+        file)
+    :type results: dict
+    """
+    print('\nSummary of the calibration blocks:\n')
+    print(f"{'Block':<7}{'Files':<40}{'Userno':<8}{'Status':<25}{'Time':<10}{'Output':<40}")
+    for n, entry in enumerate(entry_list, 1):
+        paths = entry.get('paths')
+        if type(paths) == list:
+            files = ', '.join([str(x).split('/')[-1] for x in paths])
+        else:
+            files = str(paths)
+        if len(files) > 38:
+            files = files[:35] + '...'
+        userno, status, elapsed, out_path = results[n]
+        userno = '-' if userno == None else str(userno)
+        elapsed = '-' if elapsed == None else format_time(elapsed)
+        out_path = '-' if out_path == None else out_path
+        print(f"{n:<7}{files:<40}{userno:<8}{status:<25}{elapsed:<10}{out_path:<40}")
+    print('\n')
+
+def run_batch(entry_list, jobs, userno_step = 1):
+    """Run several calibration blocks at the same time in a pool of processes.
+
+    All blocks are checked before starting. Blocks with wrong inputs, or whose AIPS
+    user numbers overlap with the ones of another block, are reported and skipped, the
+    rest are distributed over ``jobs`` worker processes. The progress is printed every
+    time a block finishes, and a summary table is printed at the end.
+
+    :param entry_list: list of calibration blocks read from the input file
+    :type entry_list: list of dict
+    :param jobs: number of calibration blocks run at the same time
+    :type jobs: int
+    :param userno_step: AIPS user numbers reserved per worker, increased to the 
+        maximum number of bands of the blocks with parallel_bands; defaults to 1
+    :type userno_step: int, optional
+    :return: True if all blocks were calibrated succesfully
+    :rtype: bool
+    """
+    results = {}
+    valid_blocks = {}
+    for n, entry in enumerate(entry_list, 1):
+        print('Checking inputs of calibration block ' + str(n) + '.\n')
+        try:
+            input_dict = check_inputs(entry)
+        except Exception as e:
+            print(f'Error checking calibration block {n}: {e}\n')
+            input_dict = None
+        if input_dict == None:
+            results[n] = (None, 'INVALID INPUTS', None, None)
+        else:
+            valid_blocks[n] = input_dict
+
+    # Bands calibrated in parallel take consecutive user numbers inside each worker
+    bands = [load.count_bands(valid_blocks[n]['paths']) for n in valid_blocks \
+             if valid_blocks[n]['parallel_bands'] == True]
+    if bands != [] and max(bands) > userno_step:
+        userno_step = max(bands)
+        print(f'Bands are calibrated in parallel, each worker will use {userno_step} '
+              + 'AIPS user numbers.\n')
+
+    # Each block can use the user numbers [userno, userno + jobs * userno_step).
+    # Blocks with the same user number are kept apart by the worker slots, but blocks
+    # with different ones must not share any of them
+    ranges = {}
+    for n in list(valid_blocks):
+        base = valid_blocks[n]['userno']
+        clash = [b for b in ranges if b != base and b < base + jobs * userno_step \
+                 and base < b + jobs * userno_step]
+        if clash != []:
+            print(f'The AIPS user numbers of calibration block {n} '
+                  + f'({base}-{base + jobs * userno_step - 1}) overlap with the ones '
+                  + f'of calibration block {ranges[clash[0]]}. It will be skipped.\n')
+            results[n] = (None, 'USERNO CLASH', None, None)
+            del valid_blocks[n]
+        elif base not in ranges:
+            ranges[base] = n
+
+    print(f'Running {len(valid_blocks)} calibration blocks in {jobs} parallel '
+          + 'workers.\n')
+    
+    manager = multiprocessing.Manager()
+    slot_queue = manager.Queue()
+    for slot in range(jobs):
+        slot_queue.put(slot)
+
+    t_i = time.time()
+    with ProcessPoolExecutor(max_workers = jobs) as executor:
+        futures = {executor.submit(run_block, n, valid_blocks[n], slot_queue, 
+                                   userno_step): n \
+                   for n in valid_blocks}
+        for done, future in enumerate(as_completed(futures), 1):
+            n = futures[future]
+            try:
+                block_no, userno, status, elapsed, out_path = future.result()
+            except Exception as e:  # The worker process itself died
+                userno, status, elapsed, out_path = None, \
+                    f'FAILED ({type(e).__name__})', None, None
+            results[n] = (userno, status, elapsed, out_path)
+            elapsed_str = '-' if elapsed == None else format_time(elapsed)
+            print(f'[{done}/{len(valid_blocks)}] Calibration block {n} finished: '
+                  + f'{status} ({elapsed_str}). Total elapsed time: '
+                  + f'{format_time(time.time() - t_i)}')
+
+    manager.shutdown()
+    print_summary(entry_list, results)
+
+    return(all(results[n][1] == 'DONE' for n in results))
+
+def main():
+    parser = argparse.ArgumentParser(
+                        prog = 'VIPCALs',
+                        description = 'Automated VLBI data calibration pipeline using AIPS')
+
+    # Arguments are read from a json file
+    parser.add_argument('file', type=argparse.FileType('r'), nargs = '?')
+    parser.add_argument('-j', '--jobs', type = int, default = 1,
+                        help = 'number of calibration blocks run in parallel. Each ' \
+                        + 'worker k = 0, 1, ... uses the AIPS user number of the ' \
+                        + 'block + k * USERNO_STEP (default: 1)')
+    parser.add_argument('--userno-step', type = int, default = 1,
+                        help = 'AIPS user numbers reserved for each parallel worker. ' \
+                        + 'It is increased to the maximum number of bands when ' \
+                        + 'parallel_bands is enabled (default: 1)')
+    parser.add_argument('--daemon', action = 'store_true',
+                        help = 'start a persistent worker that keeps the pipeline ' \
+                        + 'loaded and calibrates the files submitted with daemon.py')
+    parser.add_argument('--socket', default = daemon.socket_path,
+                        help = 'path of the Unix socket of the daemon ' \
+                        + f'(default: {daemon.socket_path})')
+    args = parser.parse_args()
+
+    # Persistent worker, input files are submitted through the socket
+    if args.daemon == True:
+        daemon.serve(read_args, check_inputs, pipeline, args.socket)
+        return
+
+    if args.file == None:
+        parser.error('the input file is required')
+    entry_list = read_args(args.file)
+
+    if args.jobs < 1:
+        print('The number of parallel jobs has to be at least 1.\n')
+        exit()
+    if args.userno_step < 1:
+        print('The AIPS user number step has to be at least 1.\n')
+        exit()
+
+    ## Print ASCII art ##
+    CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+    ASCII_PATH = os.path.join(CURRENT_DIR, "..", "GUI" ,"ascii_logo_string.txt")
+    ascii_logo = open(ASCII_PATH, 'r').read()
+    print(ascii_logo)
+
+    print('A total of ' + str(len(entry_list)) + ' calibration blocks were read.\n')
+
+    # Batch mode, several blocks at the same time
+    if args.jobs > 1 and len(entry_list) > 1:
+        if run_batch(entry_list, min(args.jobs, len(entry_list)), 
+                     args.userno_step) == False:
+            sys.exit(1)
+        return
+
+    # Iterate over every entry on the input file
+    for i, entry in enumerate(entry_list):
+        print('Checking inputs of calibration block ' + str(i+1) + '.\n')
+        input_dict = check_inputs(entry)
+        if input_dict == None:
+            exit()
+
+        # Everything is fine, start the pipeline
+        pipeline(input_dict)
+
+if __name__ == '__main__':
+    main()
@@ -111,6 +111,15 @@ def create_default_dict():
     default_dict['flag_edge'] = 0
     # Plotting options
     default_dict['interactive'] = True
+    # Parallel options
+    default_dict['parallel_bands'] = False
+    # Scratch directory for auxiliary files
+    default_dict['scratch_dir'] = None
+    # Resume options
+    default_dict['resume'] = False
+    # Statistics options
+    default_dict['deferred_stats'] = False
+    default_dict['inplace_stats'] = False
 
     return default_dict
 
@@ -200,6 +209,31 @@ for i, entry in enumerate(entry_list):
         print('subarray option has to be True/False.\n')
         exit()
 
+    # parallel_bands has to be True/False
+    if type(input_dict['parallel_bands']) != bool:
+        print('parallel_bands option has to be True/False.\n')
+        exit()
+
+    # resume has to be True/False
+    if type(input_dict['resume']) != bool:
+        print('resume option has to be True/False.\n')
+        exit()
+
+    # deferred_stats has to be True/False
+    if type(input_dict['deferred_stats']) != bool:
+        print('deferred_stats option has to be True/False.\n')
+        exit()
+
+    # inplace_stats has to be True/False
+    if type(input_dict['inplace_stats']) != bool:
+        print('inplace_stats option has to be True/False.\n')
+        exit()
+
+    # deferred_stats counts in place
+    if input_dict['deferred_stats'] == True and input_dict['inplace_stats'] == False:
+        print('deferred_stats option requires inplace_stats to be True.\n')
+        exit()
+
     # Phase reference #
     if input_dict['phase_ref'] != None:
         if len(input_dict['targets']) != len(input_dict['phase_ref']):
@@ -378,6 +412,13 @@ for i, entry in enumerate(entry_list):
     if input_dict['output_directory'] == None:
         input_dict['output_directory'] = os.getcwd()
 
+    # Scratch directory
+    if input_dict['scratch_dir'] != None:
+        if os.path.isdir(input_dict['scratch_dir']) == False:
+            print('\nThe selected scratch directory does not exist.' \
+                + ' The pipeline will stop now.\n')
+            exit()
+
     # Everything is fine, start the pipeline
 
     try:
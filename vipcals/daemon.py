@@ -0,0 +1,355 @@
+import argparse
+import os
+import sys
+import json
+import queue
+import socket
+import threading
+import traceback
+import multiprocessing
+import socketserver
+
+import functools
+print = functools.partial(print, flush=True)
+
+socket_path = os.path.expanduser("~/.vipcals/vipcals.sock")
+
+# Check if /home/vipcals exists
+if os.path.isdir("/home/vipcals"):
+    socket_path = "/home/vipcals/.vipcals/vipcals.sock"
+
+################################################
+####                 Server                 ####
+################################################
+
+def run_job(entry_list, output_fd, events, check_inputs, pipeline):
+    """Calibrate the blocks of a job inside a process forked from the daemon.
+
+    The process inherits the modules and catalogues already loaded by the daemon. Its
+    output is redirected to a pipe read by the daemon, and the progress of each block
+    is sent as structured events.
+
+    :param entry_list: list of calibration blocks read from the input file
+    :type entry_list: list of dict
+    :param output_fd: file descriptor where the output is written
+    :type output_fd: int
+    :param events: connection where the progress events are sent
+    :type events: multiprocessing.connection.Connection
+    :param check_inputs: function that checks the inputs of a block
+    :type check_inputs: function
+    :param pipeline: function that calibrates a block
+    :type pipeline: function
+    """
+    # Redirect at the file descriptor level to also catch the AIPS tasks output
+    os.dup2(output_fd, 1)
+    os.dup2(output_fd, 2)
+    os.close(output_fd)
+    sys.stdout.reconfigure(line_buffering = True)
+    sys.stderr.reconfigure(line_buffering = True)
+
+    status = 'DONE'
+    for n, entry in enumerate(entry_list, 1):
+        events.send({'event': 'block', 'block': n, 'status': 'RUNNING'})
+        print('Checking inputs of calibration block ' + str(n) + '.\n')
+        try:
+            input_dict = check_inputs(entry)
+            if input_dict == None:
+                block_status = 'INVALID INPUTS'
+            else:
+                pipeline(input_dict)
+                block_status = 'DONE'
+        except (Exception, SystemExit) as e:
+            traceback.print_exc()
+            block_status = f'FAILED ({type(e).__name__})'
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        events.send({'event': 'block', 'block': n, 'status': block_status})
+
+        # Same as in the command line, the job stops at the first wrong block
+        if block_status != 'DONE':
+            status = 'FAILED'
+            break
+
+    events.send({'event': 'done', 'status': status})
+    events.close()
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """Handle one request sent to the daemon.
+
+    Each request is a single JSON line with an ``action``: ``ping``, ``run`` (with the
+    ``file`` to calibrate) or ``shutdown``. The answer is a stream of JSON lines.
+    """
+    def send(self, message):
+        """
+        Send a message to the client, the job keeps running if it disconnects.
+        """
+        if self.connected == False:
+            return
+        try:
+            with self.lock:
+                self.wfile.write((json.dumps(message) + '\n').encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.connected = False
+
+    def handle(self):
+        """
+        Read the request and answer it.
+        """
+        self.lock = threading.Lock()
+        self.connected = True
+        try:
+            request = json.loads(self.rfile.readline().decode())
+        except ValueError:
+            self.send({'event': 'error', 'text': 'The request is not valid JSON.'})
+            return
+
+        if request.get('action') == 'ping':
+            self.send({'event': 'pong', 'pid': os.getpid(),
+                       'jobs': self.server.running_jobs,
+                       'queued': self.server.jobs.qsize()})
+
+        elif request.get('action') == 'shutdown':
+            self.send({'event': 'done', 'status': 'DONE'})
+            threading.Thread(target = self.server.shutdown).start()
+
+        elif request.get('action') == 'run':
+            self.run_job(request)
+
+        else:
+            self.send({'event': 'error', 'text': 'Unknown action.'})
+
+    def run_job(self, request):
+        """
+        Queue the job and wait until it has been calibrated.
+        """
+        try:
+            with open(request['file'], 'r') as f:
+                entry_list = self.server.read_args(f)
+        except (KeyError, OSError, ValueError) as e:
+            self.send({'event': 'error', 'text': f'The input file could not be read: {e}'})
+            self.send({'event': 'done', 'status': 'FAILED'})
+            return
+
+        self.send({'event': 'accepted', 'blocks': len(entry_list)})
+
+        # Jobs share the AIPS user numbers of their inputs, so they run one at a time
+        ahead = self.server.jobs.qsize() + self.server.running_jobs
+        if ahead > 0:
+            self.send({'event': 'queued', 'ahead': ahead})
+        finished = threading.Event()
+        self.server.jobs.put((self, entry_list, finished))
+        finished.wait()
+
+    def execute(self, entry_list):
+        """
+        Fork a process for the job and stream its output and progress.
+        """
+        ctx = multiprocessing.get_context('fork')
+        read_fd, write_fd = os.pipe()
+        events_r, events_w = ctx.Pipe(duplex = False)
+
+        p = ctx.Process(target = run_job,
+                        args = (entry_list, write_fd, events_w,
+                                self.server.check_inputs, self.server.pipeline))
+        p.start()
+        os.close(write_fd)
+        events_w.close()
+
+        def forward_output():
+            with os.fdopen(read_fd, 'r', errors = 'replace') as output:
+                for line in output:
+                    self.send({'event': 'output', 'text': line})
+
+        output_thread = threading.Thread(target = forward_output)
+        output_thread.start()
+
+        status = 'FAILED'
+        while True:
+            try:
+                event = events_r.recv()
+            except EOFError:  # The job process has ended
+                break
+            if event['event'] == 'done':
+                status = event['status']
+            else:
+                self.send(event)
+
+        p.join()
+        output_thread.join()
+        events_r.close()
+
+        if p.exitcode != 0:
+            status = 'FAILED'
+        self.send({'event': 'done', 'status': status})
+
+def run_queue(server):
+    """Calibrate the queued jobs one after the other.
+
+    Jobs are only forked from this thread, and only once the previous job and the 
+    thread forwarding its output have finished.
+
+    :param server: daemon server
+    :type server: :class:`DaemonServer`
+    """
+    while True:
+        handler, entry_list, finished = server.jobs.get()
+        server.running_jobs = 1
+        try:
+            handler.execute(entry_list)
+        except Exception:
+            traceback.print_exc()
+            handler.send({'event': 'done', 'status': 'FAILED'})
+        finally:
+            server.running_jobs = 0
+            finished.set()
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server of the pipeline daemon."""
+    daemon_threads = True
+
+def serve(read_args, check_inputs, pipeline, path = socket_path):
+    """Start the pipeline daemon.
+
+    The daemon keeps the modules of the pipeline and the calibrator catalogue in memory,
+    and calibrates every job it receives in a forked process, so that jobs do not pay
+    the start-up time of the interpreter and the imports. Jobs are calibrated one at a
+    time, in the order they are received, so that they never share an AIPS catalogue.
+
+    :param read_args: function that reads the calibration blocks of an input file
+    :type read_args: function
+    :param check_inputs: function that checks the inputs of a block
+    :type check_inputs: function
+    :param pipeline: function that calibrates a block
+    :type pipeline: function
+    :param path: path of the Unix socket; defaults to ~/.vipcals/vipcals.sock
+    :type path: str, optional
+    """
+    from vipcals.scripts import load_data as load
+
+    if is_running(path) == True:
+        print(f'A VIPCALs daemon is already listening on {path}.\n')
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    if os.path.exists(path):
+        os.remove(path)  # Left by a daemon that was killed
+
+    # Keep the calibrator catalogue in memory
+    load.read_calibrator_catalogue()
+
+    server = DaemonServer(path, JobHandler)
+    os.chmod(path, 0o600)
+    server.read_args = read_args
+    server.check_inputs = check_inputs
+    server.pipeline = pipeline
+    server.running_jobs = 0
+    server.jobs = queue.Queue()
+    threading.Thread(target = run_queue, args = (server,), daemon = True).start()
+
+    print(f'VIPCALs daemon listening on {path} (PID {os.getpid()}).\n')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+
+################################################
+####                 Client                 ####
+################################################
+
+def request(message, path = socket_path, timeout = None):
+    """Send a request to the daemon and yield its answer.
+
+    :param message: request
+    :type message: dict
+    :param path: path of the Unix socket; defaults to ~/.vipcals/vipcals.sock
+    :type path: str, optional
+    :param timeout: timeout of the connection in seconds; defaults to None
+    :type timeout: float, optional
+    :return: events sent by the daemon
+    :rtype: generator of dict
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path)
+        client.sendall((json.dumps(message) + '\n').encode())
+        with client.makefile('r', errors = 'replace') as answer:
+            for line in answer:
+                yield json.loads(line)
+
+def is_running(path = socket_path):
+    """Check if a daemon is listening on the socket.
+
+    :param path: path of the Unix socket; defaults to ~/.vipcals/vipcals.sock
+    :type path: str, optional
+    :return: whether the daemon answered
+    :rtype: bool
+    """
+    if os.path.exists(path) == False:
+        return False
+    try:
+        for event in request({'action': 'ping'}, path, timeout = 2):
+            return event['event'] == 'pong'
+    except (OSError, ValueError):
+        return False
+    return False
+
+def submit(json_path, path = socket_path):
+    """Submit an input file to the daemon.
+
+    :param json_path: path of the JSON input file
+    :type json_path: str
+    :param path: path of the Unix socket; defaults to ~/.vipcals/vipcals.sock
+    :type path: str, optional
+    :return: events sent by the daemon: ``accepted``, ``queued`` (jobs ahead in the
+        queue), ``output`` (one per line of output), ``block`` (status of each
+        calibration block), ``error`` and ``done``
+    :rtype: generator of dict
+    """
+    return request({'action': 'run', 'file': os.path.abspath(json_path)}, path)
+
+def main():
+    parser = argparse.ArgumentParser(
+                        prog = 'VIPCALs daemon client',
+                        description = 'Submit a JSON input file to a running VIPCALs ' \
+                        + 'daemon, started with: ParselTongue __main__.py --daemon')
+    parser.add_argument('file', nargs = '?')
+    parser.add_argument('--socket', default = socket_path,
+                        help = f'path of the Unix socket (default: {socket_path})')
+    parser.add_argument('--shutdown', action = 'store_true',
+                        help = 'stop the daemon')
+    args = parser.parse_args()
+
+    if is_running(args.socket) == False:
+        print(f'No VIPCALs daemon is listening on {args.socket}.\n')
+        sys.exit(1)
+
+    if args.shutdown == True:
+        for event in request({'action': 'shutdown'}, args.socket):
+            pass
+        return
+
+    if args.file == None:
+        parser.error('the input file is required')
+
+    status = 'FAILED'
+    for event in submit(args.file, args.socket):
+        if event['event'] == 'output':
+            print(event['text'], end = '')
+        elif event['event'] == 'queued':
+            print(f"Waiting for {event['ahead']} job(s) submitted before.\n")
+        elif event['event'] == 'error':
+            print(event['text'] + '\n')
+        elif event['event'] == 'block' and event['status'] != 'RUNNING':
+            print(f"Calibration block {event['block']} finished: {event['status']}\n")
+        elif event['event'] == 'done':
+            status = event['status']
+
+    if status != 'DONE':
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+import argparse
+import os
+import sys
+import csv
+import json
+import string
+import numpy as np
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from vipcals.scripts.metadata import read_metadata
+
+import functools
+print = functools.partial(print, flush=True)
+
+# Extensions of the files included in the inventory. Only IDI-FITS files are
+# supported, random group uvfits files do not have the tables read by the pipeline
+FITS_EXTENSIONS = ('.idifits', '.fits', '.fit')
+
+def is_fits_file(filename):
+    """Check if a file looks like an IDI-FITS file.
+
+    Besides the usual extensions, EVN files ending in .IDI, .IDI1, .IDI2, ... are
+    also included.
+
+    :param filename: name of the file
+    :type filename: str
+    :return: whether the file has to be included in the inventory
+    :rtype: bool
+    """
+    name = filename.lower()
+    if name.endswith(FITS_EXTENSIONS):
+        return True
+    return name.split('.')[-1].rstrip(string.digits) == 'idi'
+
+def find_files(root_list):
+    """Look for IDI-FITS files in a list of directories.
+
+    :param root_list: directories to walk through; files are also accepted
+    :type root_list: list of str
+    :return: sorted absolute paths of the files found
+    :rtype: list of str
+    """
+    file_list = []
+    for root in root_list:
+        if os.path.isfile(root):
+            file_list.append(os.path.abspath(root))
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            for f in filenames:
+                if is_fits_file(f) == True:
+                    file_list.append(os.path.abspath(os.path.join(dirpath, f)))
+    return(sorted(set(file_list)))
+
+def band_name(freq):
+    """Band name of a frequency, same as :meth:`~vipcals.scripts.helper.Source.set_band`.
+
+    :param freq: frequency in Hz
+    :type freq: float
+    :return: band name
+    :rtype: str
+    """
+    for limit, band in [(1e9, 'P'), (2e9, 'L'), (3e9, 'S'), (7e9, 'C'), (1e10, 'X'),
+                        (1.8e10, 'U'), (2.6e10, 'K'), (5e10, 'Ka')]:
+        if freq < limit:
+            return band
+    return 'W'
+
+def date_ordinal(date_obs):
+    """Convert the DATE-OBS keyword into an ordinal day.
+
+    :param date_obs: DATE-OBS keyword of the UV_DATA table
+    :type date_obs: str
+    :return: day of the observation as returned by datetime.toordinal, or None if \
+        the format is not known
+    :rtype: int
+    """
+    for fmt in ("%d/%m/%y", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(date_obs, fmt).toordinal()
+        except ValueError:
+            continue
+    return None
+
+def describe_file(path):
+    """Extract the information of a file needed to plan the calibration.
+
+    The FREQUENCY header is summarized in the same way as in the input checks of
+    ``__main__.py``, so that files are only concatenated if the pipeline accepts them.
+
+    :param path: path of the IDI-FITS file
+    :type path: str
+    :return: description of the file with its path, project code, date, sources, \
+        bands and concatenation signature; or its path and the error if it could not \
+        be read
+    :rtype: dict
+    """
+    try:
+        metadata = read_metadata(path)
+    except KeyError as e:  # Missing UV_DATA, SOURCE, FREQUENCY or ANTENNA table
+        return {'path': path, 'error': f'not an IDI-FITS file ({e})'}
+    except (OSError, IndexError, ValueError, TypeError) as e:
+        return {'path': path, 'error': f'{type(e).__name__}: {e}'}
+
+    # Clean the source names from non ASCII characters
+    sources = []
+    for item in metadata.sources['SOURCE']:
+        if type(item) != str:
+            item = item.decode('ascii', 'ignore')
+        sources.append(''.join(c for c in item.split('\x00', 1)[0] \
+                               if c in string.printable).strip())
+
+    band = np.atleast_1d(metadata.frequency[:]['BANDFREQ'])  # Safe for both float and array
+    freqs = band + metadata.ref_freq
+    # If more than 1 IF
+    if freqs.ndim > 1:
+        obs_freqs = tuple(sorted(map(tuple, freqs.tolist())))
+    else:
+        obs_freqs = tuple(sorted(freqs.tolist()))
+
+    return {'path': path,
+            'obscode': metadata.obscode.strip(),
+            'date': date_ordinal(metadata.date_obs),
+            'sources': sorted(set(sources)),
+            'bands': sorted(set(band_name(x) for x in np.ravel(freqs))),
+            'signature': (int(metadata.no_chan), int(metadata.no_band),
+                          int(metadata.no_stkd), float(metadata.ref_pixl), obs_freqs)}
+
+def group_files(file_info, max_days = 2):
+    """Group the files that can be concatenated in a single calibration block.
+
+    Files are grouped if they belong to the same project, have the same frequency
+    setup and were observed at most ``max_days`` apart.
+
+    :param file_info: descriptions of the files from :func:`describe_file`
+    :type file_info: list of dict
+    :param max_days: maximum number of days between consecutive files of a group; \
+        defaults to 2
+    :type max_days: int, optional
+    :return: groups of file descriptions
+    :rtype: list of list of dict
+    """
+    setups = {}
+    for info in file_info:
+        setups.setdefault((info['obscode'], info['signature']), []).append(info)
+
+    groups = []
+    for key in sorted(setups, key = lambda x: x[0]):
+        setup = sorted(setups[key], key = lambda x: (x['date'] or 0, x['path']))
+        current = [setup[0]]
+        for info in setup[1:]:
+            if info['date'] == None or current[-1]['date'] == None \
+               or info['date'] - current[-1]['date'] > max_days:
+                groups.append(current)
+                current = [info]
+            else:
+                current.append(info)
+        groups.append(current)
+    return(groups)
+
+def make_blocks(groups, userno, disk, output_directory, targets = None):
+    """Write a calibration block for each group of files.
+
+    :param groups: groups of file descriptions from :func:`group_files`
+    :type groups: list of list of dict
+    :param userno: AIPS user number
+    :type userno: int
+    :param disk: AIPS disk number
+    :type disk: int
+    :param output_directory: output directory of the blocks
+    :type output_directory: str
+    :param targets: science targets of the campaign; if None, all sources in the \
+        files are written as targets; defaults to None
+    :type targets: list of str, optional
+    :return: calibration blocks
+    :rtype: list of dict
+    """
+    blocks = []
+    for group in groups:
+        sources = sorted(set(s for info in group for s in info['sources']))
+        if targets == None:
+            block_targets = sources
+        else:
+            block_targets = [t for t in targets if t in sources]
+        if len(block_targets) == 0:
+            continue
+        blocks.append({'userno': userno,
+                       'disk': disk,
+                       'paths': [info['path'] for info in group],
+                       'targets': block_targets,
+                       'output_directory': output_directory})
+    return(blocks)
+
+def write_blocks(blocks, file):
+    """Write calibration blocks in the input format of VIPCALs.
+
+    :param blocks: calibration blocks
+    :type blocks: list of dict
+    :param file: open file where to write the blocks
+    :type file: file object
+    """
+    file.write('\n\n'.join([json.dumps(b, indent = 2) for b in blocks]) + '\n')
+
+def write_summary(file_info, blocks, file):
+    """Write a CSV table with the information of every file.
+
+    :param file_info: descriptions of the files from :func:`describe_file`
+    :type file_info: list of dict
+    :param blocks: calibration blocks
+    :type blocks: list of dict
+    :param file: open file where to write the table
+    :type file: file object
+    """
+    block_no = {}
+    for n, block in enumerate(blocks, 1):
+        for path in block['paths']:
+            block_no[path] = n
+
+    writer = csv.writer(file)
+    writer.writerow(['path', 'obscode', 'date', 'bands', 'sources', 'block', 'error'])
+    for info in file_info:
+        if 'error' in info:
+            writer.writerow([info['path'], '', '', '', '', '', info['error']])
+            continue
+        if info['date'] != None:
+            date = datetime.fromordinal(info['date']).strftime('%Y-%m-%d')
+        else:
+            date = ''
+        writer.writerow([info['path'], info['obscode'], date, ' '.join(info['bands']),
+                         ' '.join(info['sources']), block_no.get(info['path'], ''), ''])
+
+def main():
+    parser = argparse.ArgumentParser(
+                        prog = 'vipcals-inventory',
+                        description = 'Scan directories of IDI-FITS files and ' \
+                        + 'write the calibration blocks of VIPCALs, concatenating ' \
+                        + 'compatible files of the same observation')
+    parser.add_argument('directories', nargs = '+',
+                        help = 'directories (or files) to scan')
+    parser.add_argument('-o', '--output', type = argparse.FileType('w'),
+                        default = sys.stdout,
+                        help = 'JSON file where the blocks are written (default: stdout)')
+    parser.add_argument('--userno', type = int, required = True,
+                        help = 'AIPS user number of the blocks')
+    parser.add_argument('--disk', type = int, required = True,
+                        help = 'AIPS disk number of the blocks')
+    parser.add_argument('--output-directory', required = True,
+                        help = 'output directory of the blocks')
+    parser.add_argument('--targets', nargs = '+', default = None,
+                        help = 'science targets; only blocks with at least one of ' \
+                        + 'them are written (default: all sources are targets)')
+    parser.add_argument('-j', '--jobs', type = int, default = os.cpu_count(),
+                        help = 'number of files read in parallel (default: all CPUs)')
+    parser.add_argument('--max-days', type = int, default = 2,
+                        help = 'maximum days between files concatenated in the same ' \
+                        + 'block (default: 2)')
+    parser.add_argument('--summary', type = argparse.FileType('w'), default = None,
+                        help = 'CSV file with the project, date, bands, sources and ' \
+                        + 'block of every file')
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        parser.error('the number of parallel jobs has to be at least 1')
+
+    file_list = find_files(args.directories)
+    print(f'{len(file_list)} files found.', file = sys.stderr)
+    if len(file_list) == 0:
+        sys.exit(1)
+
+    with ProcessPoolExecutor(max_workers = args.jobs) as pool:
+        file_info = list(pool.map(describe_file, file_list, chunksize = 16))
+
+    skipped = [x for x in file_info if 'error' in x]
+    valid = [x for x in file_info if 'error' not in x]
+    for info in skipped:
+        print(f"Skipped {info['path']}: {info['error']}", file = sys.stderr)
+
+    groups = group_files(valid, args.max_days)
+    blocks = make_blocks(groups, args.userno, args.disk, args.output_directory,
+                         args.targets)
+    write_blocks(blocks, args.output)
+    if args.summary != None:
+        write_summary(file_info, blocks, args.summary)
+
+    print(f'{len(valid)} files read, {len(skipped)} skipped. ' \
+          + f'{len(blocks)} calibration blocks written.', file = sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,20 @@
 import os
 import time 
+import multiprocessing
 import json
 import pickle
 import numpy as np
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
+from typing import NamedTuple
 
 from AIPS import AIPS
 
 from astropy.coordinates import SkyCoord
-from astropy.io import fits
 
 from vipcals.scripts import load_data as load
+from vipcals.scripts import metadata as meta
 from vipcals.scripts import display as disp
 from vipcals.scripts import load_tables as tabl
 from vipcals.scripts import ty_smooth as tysm
@@ -31,6 +33,9 @@ from vipcals.scripts import fringe_fit as frng
 from vipcals.scripts import optimize_solint as opti
 from vipcals.scripts import export_data as expo
 from vipcals.scripts import phase_shift as shft
+from vipcals.scripts import journal as jrnl
+from vipcals.scripts import stages as stg
+from vipcals.scripts import table_cache as tcache
 
 
 from AIPSData import AIPSUVData, AIPSCat
@@ -45,13 +50,109 @@ tmp_dir = os.path.expanduser("~/.vipcals/tmp")
 if os.path.isdir("/home/vipcals"):
     tmp_dir = "/home/vipcals/.vipcals/tmp"
 
+class VisStats():
+    """Count the visibilities of the science targets after each calibration step.
+
+    By default, the targets are splitted applying the calibration and the visibilities
+    of the splitted entries are counted, with
+    :func:`~vipcals.scripts.export_data.count_visibilities`. With inplace, the
+    visibilities are counted directly on the multi-source dataset, updating a
+    :class:`~vipcals.scripts.export_data.VisCube` so that each count only counts again
+    the scans and antennas affected by the new tables. In deferred mode, which also
+    requires inplace, the requests are kept in the stage journal and all of them are
+    counted in place at the end of the calibration with a single pass over the data,
+    using :func:`~vipcals.scripts.export_data.vis_count_multi`. The counts in place are
+    an estimate of the ones of the splitted entries.
+    """
+    def __init__(self, target_list, stats_df, log_list, journal, deferred = False,
+                 inplace = False):
+        """
+        Initialize the counter with the targets, statistics, logs and stage journal of
+        the calibration.
+        """
+        self.target_list = target_list
+        self.stats_df = stats_df
+        self.log_list = log_list
+        self.deferred = deferred
+        self.inplace = inplace
+        self.cube = None
+        # Requests of completed stages are recovered when resuming
+        self.requests = journal['state'].setdefault('deferred_counts', [])
+
+    def count(self, uvdata, targets, columns, text, cl_table, flagver, bpass = False,
+              split = False, keep = False):
+        """
+        Count the visibilities of some targets, or register the request in deferred
+        mode. The total and per antenna counts are written in the two columns given,
+        and the text is printed with the name of each target and its count. When
+        counting in place, the splitted entries are only created if split is True,
+        e.g. for the interactive plots.
+        """
+        request = {'targets': list(targets), 'cl_table': cl_table, 'flagver': flagver,
+                   'bpass': bpass, 'columns': columns, 'text': text}
+        if self.inplace == False:
+            vis_counts = expo.count_visibilities(uvdata, targets, cl_table = cl_table,
+                                                 bpass = bpass, flagver = flagver,
+                                                 keep = keep)
+            self.write(request, vis_counts)
+            return
+
+        # The splitted entries are only needed for the plots
+        if split == True:
+            expo.data_split(uvdata, targets, cl_table, bpass, flagver, keep)
+
+        if self.deferred == False:
+            # Only the scans and antennas changed since the last count are counted
+            if self.cube == None or self.cube.matches(uvdata) == False:
+                self.cube = expo.VisCube(uvdata, self.target_list)
+            vis_counts = self.cube.count(uvdata, cl_table = cl_table, bpass = bpass,
+                                         flagver = flagver, target_list = targets)
+            self.write(request, vis_counts)
+            return
+
+        if bpass == True:
+            request['bpver'] = uvdata.table_highver('BP')
+        self.requests.append(request)
+
+        # Create the columns now, to keep their order in the statistics
+        if columns[0] not in self.stats_df:
+            self.stats_df[columns[0]] = np.nan
+            self.stats_df[columns[1]] = None
+
+    def write(self, request, vis_counts):
+        """
+        Write the counts of a request in the statistics and the logs.
+        """
+        for target in request['targets']:
+            i = self.target_list.index(target)
+            vis, vis_ant = vis_counts[target]
+            self.stats_df.at[i, request['columns'][0]] = int(vis)
+            self.stats_df.at[i, request['columns'][1]] = json.dumps(vis_ant)
+            print(request['text'].format(target) + f': {vis}\n')
+            self.log_list[i].write('\n' + request['text'].format(target) + f': {vis}\n')
+
+    def flush(self, uvdata):
+        """
+        Count all deferred requests reading the data once.
+        """
+        if len(self.requests) == 0:
+            return
+        print('Counting the visibilities of ' + str(len(self.requests)) \
+              + ' calibration steps...\n')
+        counts_list = expo.vis_count_multi(uvdata, self.requests)
+        for request, vis_counts in zip(self.requests, counts_list):
+            self.write(request, vis_counts)
+        del self.requests[:]
+
+@tcache.tracked
 def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list, 
               sources, load_all, full_source_list, disk_number, aips_name, klass, 
               multi_id, selfreq, bif, eif, default_refant, default_refant_list, 
               search_central, max_scan_refant_search, time_aver, freq_aver, 
               fringefit_snr, default_solint, min_solint, 
               max_solint, phase_ref, input_calibrator, subarray, shift_coords, 
-              load_antab, channel_out, flag_edge, interactive, stats_df):
+              load_antab, channel_out, flag_edge, interactive, resume, deferred_stats, 
+              inplace_stats, stats_df, workspace):
 
     """Main workflow of the pipeline 
 
@@ -128,1187 +229,1252 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
     :type flag_edge: float
     :param interactive: produce interactive plots in the GUI
     :type interactive: bool
+    :param resume: restart the calibration after the last stage completed by a previous 
+        run, as written in the stage journal
+    :type resume: bool
+    :param deferred_stats: count the visibilities of all calibration steps in place in 
+        a single pass over the data at the end of the calibration, requires 
+        inplace_stats
+    :type deferred_stats: bool
+    :param inplace_stats: count the visibilities on the multi-source dataset instead of 
+        on the splitted targets
+    :type inplace_stats: bool
     :param stats_df: Pandas DataFrame where to keep track of the different statistics
     :type stats_df: pandas.DataFrame object
+    :param workspace: scratch workspace of the run
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`
     """    
     ## PIPELINE STARTS
     t_i = time.time()
 
     # AIPS log is registered simultaneously for all science targets
-    help.open_log(outpath_list, filename_list)
-
-    # By default, sequence will start in 1
-    seq = 1
+    if resume == True:
+        help.open_log(outpath_list, filename_list, mode = 'a')
+    else:
+        help.open_log(outpath_list, filename_list)
+
+    ## Read the stage journal of a previous run ##
+    journal = jrnl.new_journal(outpath_list, filename_list, target_list)
+    if resume == True:
+        old_journal = jrnl.read_journal(outpath_list, filename_list, target_list)
+        if old_journal != None:
+            uvdata = jrnl.check_entry(old_journal)
+        if old_journal != None and uvdata != None:
+            journal = old_journal
+            stats_df = jrnl.restore_stats(journal)
+            disp.write_box(log_list, 'Resuming the calibration')
+            disp.print_box('Resuming the calibration')
+            for pipeline_log in log_list:
+                pipeline_log.write('\nThe calibration of ' + uvdata.name + '.' \
+                                   + uvdata.klass + ' will resume after the stage: ' \
+                                   + journal['stage'] + '\n')
+            print('\nThe calibration of ' + uvdata.name + '.' + uvdata.klass \
+                  + ' will resume after the stage: ' + journal['stage'] + '\n')
+        else:
+            for pipeline_log in log_list:
+                pipeline_log.write('\nNo completed stages were found for this dataset, '\
+                                   + 'the calibration will start from the beginning.\n')
+            print('\nNo completed stages were found for this dataset, the calibration '\
+                  + 'will start from the beginning.\n')
+
+    # Stages completed in a previous run are skipped
+    engine = stg.StageEngine(journal, log_list)
+    vis_stats = VisStats(target_list, stats_df, log_list, journal, deferred_stats,
+                         inplace_stats)
+
+    if engine.pending('load') == True:
+        # By default, sequence will start in 1
+        seq = 1
         
-    ## Check if the test file already exists and delete it ##
-    uvdata = AIPSUVData(aips_name, klass, disk_number, seq)
+        ## Check if the test file already exists and delete it ##
+        uvdata = AIPSUVData(aips_name, klass, disk_number, seq)
     
-    if uvdata.exists() == True:
-        uvdata.zap()
-
-    ## 1.- LOAD DATA ##
-    disp.write_box(log_list, 'Loading data') 
-    disp.print_box('Loading data')  
-    #else:
-
-    ## Load the dataset ##
-    t0 = time.time()
-    load.load_data(filepath_list, aips_name, sources, disk_number, multi_id,\
-    selfreq, klass = klass, bif = bif, eif = eif, l_a = load_all, symlink_path = tmp_dir)
-    ## Modify the AN table in case there are non ASCII characters   
-    try:
-        uvdata.antennas
-    except SystemError:
-        tabl.remove_ascii_antname(uvdata, filepath_list[0])
-        tabl.remove_ascii_poltype(uvdata, filepath_list[0])
-        print('\nAN Table was modified to correct for padding in entries.\n')
+        if uvdata.exists() == True:
+            uvdata.zap()
+
+        ## 1.- LOAD DATA ##
+        disp.write_box(log_list, 'Loading data') 
+        disp.print_box('Loading data')  
+        #else:
+
+        ## Load the dataset ##
+        t0 = time.time()
+        load.load_data(filepath_list, aips_name, sources, disk_number, multi_id,\
+        selfreq, klass = klass, bif = bif, eif = eif, l_a = load_all, symlink_path = workspace.path)
+        ## Modify the AN table in case there are non ASCII characters   
+        try:
+            uvdata.antennas
+        except SystemError:
+            tabl.repair_an_table(uvdata, filepath_list[0])
+            print('\nAN Table was modified to correct for padding in entries.\n')
     
-    # Print some general information
-    disp.write_info(uvdata, filepath_list, log_list, sources, stats_df=stats_df)
-    disp.print_info(uvdata, filepath_list, sources)
-    t1 = time.time() 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t1-t0))
-    print('Execution time: {:.2f} s. \n'.format(t1-t0))
-    stats_df['time_1'] = t1-t0
+        # Print some general information
+        disp.write_info(uvdata, filepath_list, log_list, sources, stats_df=stats_df)
+        disp.print_info(uvdata, filepath_list, sources)
+        t1 = time.time() 
+        for pipeline_log in log_list:
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t1-t0))
+        print('Execution time: {:.2f} s. \n'.format(t1-t0))
+        stats_df['time_1'] = t1-t0
 
-    ## Check data integrity
-    print('\nChecking data integrity...\n')
+        ## Check data integrity
+        print('\nChecking data integrity...\n')
 
-    ## Check for order
-    if uvdata.header['sortord'] != 'TB':
-        load.tborder(uvdata, pipeline_log)
-        for pipeline_log in log_list:
-            pipeline_log.write('\nData was not in TB order. It has been reordered using '\
-                               + 'the UVSRT task\n')
-        print('\nData was not in TB order. It has been reordered using ' \
-              + 'the UVSRT task\n')
+        ## Check for order
+        if uvdata.header['sortord'] != 'TB':
+            load.tborder(uvdata, pipeline_log)
+            for pipeline_log in log_list:
+                pipeline_log.write('\nData was not in TB order. It has been reordered using '\
+                                   + 'the UVSRT task\n')
+            print('\nData was not in TB order. It has been reordered using ' \
+                  + 'the UVSRT task\n')
         
-        stats_df['need_uvsrt'] = True
-    else:
-        stats_df['need_uvsrt'] = False
+            stats_df['need_uvsrt'] = True
+        else:
+            stats_df['need_uvsrt'] = False
     
-    ## Check for CL/NX tables
-    if [1, 'AIPS CL'] not in uvdata.tables or [1, 'AIPS NX'] not in \
-        uvdata.tables:
-        load.run_indxr(uvdata)
-        print('\nINDXR was run, NX#1 and CL#1 were created.\n')
+        ## Check for CL/NX tables
+        if [1, 'AIPS CL'] not in uvdata.tables or [1, 'AIPS NX'] not in \
+            uvdata.tables:
+            load.run_indxr(uvdata)
+            print('\nINDXR was run, NX#1 and CL#1 were created.\n')
             
-        stats_df['need_indxr'] = True
-    else:
-        stats_df['need_indxr'] = False
-
-    ## Check for TY/GC/FG tables
-    missing_tables = False
-    stats_df['need_ty'] = False
-    stats_df['need_fg'] = False
-    stats_df['need_gc'] = False
-    stats_df['vlbacal_files'] = False
-    stats_df['evncal_files'] = False
-
-    if load_antab != None:
-        disp.write_box(log_list, 'Loading external table information')
-        disp.print_box('Loading external table information')
-        missing_tables = True
-        t_i_table = time.time()
+            stats_df['need_indxr'] = True
+        else:
+            stats_df['need_indxr'] = False
+
+        ## Check for TY/GC/FG tables
+        missing_tables = False
         stats_df['need_ty'] = False
+        stats_df['need_fg'] = False
         stats_df['need_gc'] = False
-        stats_df['vlbacal_files'] = load_antab
-        stats_df['evncal_files'] = load_antab
-        tabl.load_external_antab(uvdata, load_antab)
-
-        print(f'\nAmplitude calibration information has been loaded from {load_antab}\n')
-        print('\nTY#1 and GC#1 created.\n')
+        stats_df['vlbacal_files'] = False
+        stats_df['evncal_files'] = False
+        # vlba.cal files, retrieved once for the TY and FG tables
+        cal_bundle = None
 
-        for pipeline_log in log_list:
-                pipeline_log.write('\nAmplitude calibration information has been'\
-                                   + f'loaded from {load_antab}'\
-                                   + '\n\nTY#1 and GC#1 created.\n\n')
-
-    else:
-        if uvdata.header.telescop == 'EVN':
+        if load_antab != None:
             disp.write_box(log_list, 'Loading external table information')
             disp.print_box('Loading external table information')
             missing_tables = True
             t_i_table = time.time()
-            retrieved_urls = tabl.load_evn_tables(uvdata)
-            stats_df['evncal_files'] = retrieved_urls
+            stats_df['need_ty'] = False
+            stats_df['need_gc'] = False
+            stats_df['vlbacal_files'] = load_antab
+            stats_df['evncal_files'] = load_antab
+            tabl.load_external_antab(uvdata, load_antab)
 
-            print("System temperatures and gain curves were retrieved from "\
-                  + f"{retrieved_urls}")
-            print(f"\nTY#1 and GC#1 created.\n")
+            print(f'\nAmplitude calibration information has been loaded from {load_antab}\n')
+            print('\nTY#1 and GC#1 created.\n')
 
             for pipeline_log in log_list:
                     pipeline_log.write('\nAmplitude calibration information has been'\
-                                    + f'loaded from {retrieved_urls}'\
-                                    + '\n\nTY#1 and GC#1 created.\n\n')
+                                       + f'loaded from {load_antab}'\
+                                       + '\n\nTY#1 and GC#1 created.\n\n')
 
-        if ([1, 'AIPS TY'] not in uvdata.tables or [1, 'AIPS GC'] \
-        not in uvdata.tables or [1, 'AIPS FG'] not in uvdata.tables) \
-            and uvdata.header.telescop != 'EVN':
-
-            disp.write_box(log_list, 'Loading external table information')
-            disp.print_box('Loading external table information')
-            missing_tables = True
-            t_i_table = time.time()
+        else:
+            if uvdata.header.telescop == 'EVN':
+                disp.write_box(log_list, 'Loading external table information')
+                disp.print_box('Loading external table information')
+                missing_tables = True
+                t_i_table = time.time()
+                retrieved_urls = tabl.load_evn_tables(uvdata, workspace = workspace)
+                stats_df['evncal_files'] = retrieved_urls
+
+                print("System temperatures and gain curves were retrieved from "\
+                      + f"{retrieved_urls}")
+                print(f"\nTY#1 and GC#1 created.\n")
 
-        if [1, 'AIPS TY'] not in uvdata.tables:
-            try:
-                retrieved_urls = tabl.load_ty_tables(uvdata, bif, eif)
-            except help.NoTablesError:
-                # If the pipeline finds no tables, stops here
-                print("No vlba.cal tables were found online. The pipeline will stop here.\n")
                 for pipeline_log in log_list:
-                    pipeline_log.write("\nNo vlba.cal tables were found online. The pipeline will stop here.\n")     
+                        pipeline_log.write('\nAmplitude calibration information has been'\
+                                        + f'loaded from {retrieved_urls}'\
+                                        + '\n\nTY#1 and GC#1 created.\n\n')
+
+            if ([1, 'AIPS TY'] not in uvdata.tables or [1, 'AIPS GC'] \
+            not in uvdata.tables or [1, 'AIPS FG'] not in uvdata.tables) \
+                and uvdata.header.telescop != 'EVN':
+
+                disp.write_box(log_list, 'Loading external table information')
+                disp.print_box('Loading external table information')
+                missing_tables = True
+                t_i_table = time.time()
+
+            if [1, 'AIPS TY'] not in uvdata.tables:
+                try:
+                    cal_bundle = tabl.CalVlbaBundle(uvdata, workspace = workspace)
+                    retrieved_urls = tabl.load_ty_tables(uvdata, bif, eif, 
+                                                         workspace = workspace, 
+                                                         bundle = cal_bundle)
+                except help.NoTablesError:
+                    # If the pipeline finds no tables, stops here
+                    print("No vlba.cal tables were found online. The pipeline will stop here.\n")
+                    for pipeline_log in log_list:
+                        pipeline_log.write("\nNo vlba.cal tables were found online. The pipeline will stop here.\n")     
                 
-                return(1)
+                    return(1)
 
-            for pipeline_log in log_list:
-                for good_url in retrieved_urls:
-                    pipeline_log.write('\nSystem temperatures were not available in the ' \
-                                    + 'file, they have been retrieved from ' \
-                                    + good_url)
-                pipeline_log.write('\nTY#1 created.\n')
-
-            # Move the temperature file to the target folders
-            for path in outpath_list:
-                os.system(f'cp {tmp_dir}/tsys.vlba {path}/TABLES/tsys.vlba')
-
-            # Clean the tmp directory
-            os.system(f'rm {tmp_dir}/*.vlba')
+                for pipeline_log in log_list:
+                    for good_url in retrieved_urls:
+                        pipeline_log.write('\nSystem temperatures were not available in the ' \
+                                        + 'file, they have been retrieved from ' \
+                                        + good_url)
+                    pipeline_log.write('\nTY#1 created.\n')
+
+                # Move the temperature file to the target folders
+                for path in outpath_list:
+                    os.system(f'cp {workspace.path}/tsys.vlba {path}/TABLES/tsys.vlba')
+
+                # Clean the tmp directory
+                os.system(f'rm {workspace.path}/*.vlba')
     
-            print('\nSystem temperatures were not available in the ' \
-                                    + 'file, they have been retrieved from \n' \
-                                    + good_url)
-            print('\nTY#1 created.\n')
-            stats_df['need_ty'] = True
-            stats_df['vlbacal_files'] = str(retrieved_urls)
+                print('\nSystem temperatures were not available in the ' \
+                                        + 'file, they have been retrieved from \n' \
+                                        + good_url)
+                print('\nTY#1 created.\n')
+                stats_df['need_ty'] = True
+                stats_df['vlbacal_files'] = str(retrieved_urls)
             
-        if [1, 'AIPS GC'] not in uvdata.tables:
-            good_url = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/vlba_gains.key'
-            try:
-                tabl.load_gc_tables(uvdata)
-            except help.NoTablesError:
-                for pipeline_log in log_list:
-                    pipeline_log.write('WARNING: No gain curves were found at the '\
-                                        + 'observed date. No GC table will be created.\n') 
-                print('WARNING: No gain curves were found at the observed date. No ' \
-                + 'GC table will be created.\nThe pipeline will stop here.\n')
+            if [1, 'AIPS GC'] not in uvdata.tables:
+                good_url = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/vlba_gains.key'
+                try:
+                    tabl.load_gc_tables(uvdata, workspace = workspace)
+                except help.NoTablesError:
+                    for pipeline_log in log_list:
+                        pipeline_log.write('WARNING: No gain curves were found at the '\
+                                            + 'observed date. No GC table will be created.\n') 
+                    print('WARNING: No gain curves were found at the observed date. No ' \
+                    + 'GC table will be created.\nThe pipeline will stop here.\n')
                 
-                return  # END THE PIPELINE!
+                    return  # END THE PIPELINE!
             
-            for pipeline_log in log_list:
-                pipeline_log.write('\nGain curve information was not available in the '\
-                                + 'file, it has been retrieved from\n' + good_url \
-                                + '\n\nGC#1 created.\n\n')
+                for pipeline_log in log_list:
+                    pipeline_log.write('\nGain curve information was not available in the '\
+                                    + 'file, it has been retrieved from\n' + good_url \
+                                    + '\n\nGC#1 created.\n\n')
                 
-            # Move the gain curve file to the target folders
-            for path in outpath_list:
-                os.system(f'cp {tmp_dir}/gaincurves.vlba {path}/TABLES/gaincurves.vlba')
+                # Move the gain curve file to the target folders
+                for path in outpath_list:
+                    os.system(f'cp {workspace.path}/gaincurves.vlba {path}/TABLES/gaincurves.vlba')
         
-            # Clean the tmp directory
-            os.system(f'rm {tmp_dir}/*.vlba')        
+                # Clean the tmp directory
+                os.system(f'rm {workspace.path}/*.vlba')        
             
-            print('\nGain curve information was not available in the file, it has '\
-            + 'been retrieved from\n' + good_url + '\n\nGC#1 created.\n')
-            stats_df['need_gc'] = True
+                print('\nGain curve information was not available in the file, it has '\
+                + 'been retrieved from\n' + good_url + '\n\nGC#1 created.\n')
+                stats_df['need_gc'] = True
         
    
-    if [1, 'AIPS FG'] not in uvdata.tables and uvdata.header.telescop != 'EVN':
-        try:
-            retrieved_urls = tabl.load_fg_tables(uvdata)
-            for pipeline_log in log_list:
-                for good_url in retrieved_urls:
-                    pipeline_log.write('Flag information was not available in the file, ' \
-                                        + 'it has been retrieved from ' + good_url + '\n')
-                pipeline_log.write('FG#1 created.\n')
+        if [1, 'AIPS FG'] not in uvdata.tables and uvdata.header.telescop != 'EVN':
+            try:
+                if cal_bundle == None:
+                    cal_bundle = tabl.CalVlbaBundle(uvdata, workspace = workspace)
+                retrieved_urls = tabl.load_fg_tables(uvdata, workspace = workspace, 
+                                                     bundle = cal_bundle)
+                for pipeline_log in log_list:
+                    for good_url in retrieved_urls:
+                        pipeline_log.write('Flag information was not available in the file, ' \
+                                            + 'it has been retrieved from ' + good_url + '\n')
+                    pipeline_log.write('FG#1 created.\n')
 
-            # Move the flag file to the target folders
-            for path in outpath_list:
-                os.system(f'cp {tmp_dir}/flags.vlba {path}/TABLES/flags.vlba')
+                # Move the flag file to the target folders
+                for path in outpath_list:
+                    os.system(f'cp {workspace.path}/flags.vlba {path}/TABLES/flags.vlba')
 
-            # Clean the tmp directory
-            os.system(f'rm {tmp_dir}/*.vlba')
+                # Clean the tmp directory
+                os.system(f'rm {workspace.path}/*.vlba')
             
-            print('Flag information was not available in the file, ' \
-                            + 'it has been retrieved from\n' + good_url + '\n')
-            print('FG#1 created.\n')
-            stats_df['need_fg'] = True
-            stats_df['vlbacal_files'] = str(retrieved_urls)
-
-        except help.NoTablesError:
-            # If the pipeline finds no tables, gives a wrning but continues
-            print("No vlba.cal tables were found online. No initial flags will be applied.\n")
-            for pipeline_log in log_list:
-                pipeline_log.write("\nNo vlba.cal tables were found online. No initial flags will be applied.\n")
-            stats_df['need_fg'] = True
-            stats_df['vlbacal_files'] = None
+                print('Flag information was not available in the file, ' \
+                                + 'it has been retrieved from\n' + good_url + '\n')
+                print('FG#1 created.\n')
+                stats_df['need_fg'] = True
+                stats_df['vlbacal_files'] = str(retrieved_urls)
 
-    if missing_tables == True:
-        t1 = time.time()
-        for pipeline_log in log_list:
-            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t1-t_i_table))
-
-    stats_df['time_2'] = time.time()-t1
-
-    ## If multi-id, check if the source is in this id
-    if multi_id == True:
-        obs_source_ids = [x.source_id for x in uvdata.table('NX', 1)]
-        obs_source_names = set([y.source.strip() for y in uvdata.table('SU', 1) 
-                            if y.id__no in obs_source_ids])
-        if len(set(target_list).intersection(obs_source_names)) != len(set(target_list)): 
-            miss_sources = [x for x in target_list if x not in obs_source_names]
-            print("\nNot all targets were observed at this frequency, the pipeline will stop here.\n")
-            print(f"\nMissing sources: {miss_sources}\n")
+            except help.NoTablesError:
+                # If the pipeline finds no tables, gives a wrning but continues
+                print("No vlba.cal tables were found online. No initial flags will be applied.\n")
+                for pipeline_log in log_list:
+                    pipeline_log.write("\nNo vlba.cal tables were found online. No initial flags will be applied.\n")
+                stats_df['need_fg'] = True
+                stats_df['vlbacal_files'] = None
+
+        if missing_tables == True:
+            t1 = time.time()
             for pipeline_log in log_list:
-                pipeline_log.write("\nNot all targets were observed at this frequency, the pipeline will stop here.\n")
-                pipeline_log.write(f"\nMissing sources: {miss_sources}\n")
-            return()
+                pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t1-t_i_table))
+
+        stats_df['time_2'] = time.time()-t1
+
+        ## If multi-id, check if the source is in this id
+        if multi_id == True:
+            obs_source_ids = [x.source_id for x in tcache.table(uvdata, 'NX', 1)]
+            obs_source_names = set([y.source.strip() for y in tcache.table(uvdata, 'SU', 1) 
+                                if y.id__no in obs_source_ids])
+            if len(set(target_list).intersection(obs_source_names)) != len(set(target_list)): 
+                miss_sources = [x for x in target_list if x not in obs_source_names]
+                print("\nNot all targets were observed at this frequency, the pipeline will stop here.\n")
+                print(f"\nMissing sources: {miss_sources}\n")
+                for pipeline_log in log_list:
+                    pipeline_log.write("\nNot all targets were observed at this frequency, the pipeline will stop here.\n")
+                    pipeline_log.write(f"\nMissing sources: {miss_sources}\n")
+                return()
 
 
-    ## Shift phase center if necessary ##
+        ## Shift phase center if necessary ##
     
-    if shift_coords != None:
-        t_shift = time.time()
-        disp.write_box(log_list, 'Shifting phase center')
-        disp.print_box('Shifting phase center')
-        for i, target in enumerate(target_list):
-            if shift_coords[i] == None:
-                stats_df.at[i, 'uvshift'] = False
-                stats_df.at[i, 'time_3'] = 0
-                old_coord = shft.get_coord(uvdata, target)
-                stats_df.at[i, 'old_coords'] = old_coord.to_string(style = 'hmsdms')
-                stats_df.at[i, 'new_coords'] = old_coord.to_string(style = 'hmsdms')
-                continue
+        if shift_coords != None:
+            t_shift = time.time()
+            disp.write_box(log_list, 'Shifting phase center')
+            disp.print_box('Shifting phase center')
+            for i, target in enumerate(target_list):
+                if shift_coords[i] == None:
+                    stats_df.at[i, 'uvshift'] = False
+                    stats_df.at[i, 'time_3'] = 0
+                    old_coord = shft.get_coord(uvdata, target)
+                    stats_df.at[i, 'old_coords'] = old_coord.to_string(style = 'hmsdms')
+                    stats_df.at[i, 'new_coords'] = old_coord.to_string(style = 'hmsdms')
+                    continue
                 
-            stats_df.at[i, 'uvshift'] = True
-            old_seq = uvdata.seq    
-            # Delete the data if it already existed
-            if AIPSUVData(uvdata.name, uvdata.klass, \
-                          uvdata.disk, uvdata.seq + 1).exists(): 
-                AIPSUVData(uvdata.name, uvdata.klass, \
-                          uvdata.disk, uvdata.seq + 1).zap()
-            # Shift
-            old_coord, new_coord = shft.uv_shift(uvdata, target, shift_coords[i])
+                stats_df.at[i, 'uvshift'] = True
+                old_seq = uvdata.seq    
+                # Delete the data if it already existed
+                if AIPSUVData(uvdata.name, uvdata.klass, \
+                              uvdata.disk, uvdata.seq + 1).exists(): 
+                    AIPSUVData(uvdata.name, uvdata.klass, \
+                              uvdata.disk, uvdata.seq + 1).zap()
+                # Shift
+                old_coord, new_coord = shft.uv_shift(uvdata, target, shift_coords[i])
          
-            uvdata = AIPSUVData(uvdata.name, uvdata.klass, \
-                                uvdata.disk, old_seq + 1)
+                uvdata = AIPSUVData(uvdata.name, uvdata.klass, \
+                                    uvdata.disk, old_seq + 1)
 
-            # Remove previous dataset
-            AIPSUVData(uvdata.name, uvdata.klass, \
-                                uvdata.disk, uvdata.seq - 1).zap()
+                # Remove previous dataset
+                AIPSUVData(uvdata.name, uvdata.klass, \
+                                    uvdata.disk, uvdata.seq - 1).zap()
             
-            log_list[i].write('\nThe new coordinates for the phase center of ' + target \
-                              + ' are: ' + shift_coords[i].to_string(style = 'hmsdms') \
-                              + '\n')
-            print('\nThe new coordinates for the phase center of ' + target \
-                              + ' are: ' + shift_coords[i].to_string(style = 'hmsdms') \
-                              + '\n')
+                log_list[i].write('\nThe new coordinates for the phase center of ' + target \
+                                  + ' are: ' + shift_coords[i].to_string(style = 'hmsdms') \
+                                  + '\n')
+                print('\nThe new coordinates for the phase center of ' + target \
+                                  + ' are: ' + shift_coords[i].to_string(style = 'hmsdms') \
+                                  + '\n')
             
-            stats_df.at[i, 'old_coords'] = old_coord.to_string(style = 'hmsdms')
-            stats_df.at[i, 'new_coords'] = new_coord.to_string(style = 'hmsdms')
-            stats_df.at[i, 'time_3'] = time.time() - t_shift
+                stats_df.at[i, 'old_coords'] = old_coord.to_string(style = 'hmsdms')
+                stats_df.at[i, 'new_coords'] = new_coord.to_string(style = 'hmsdms')
+                stats_df.at[i, 'time_3'] = time.time() - t_shift
 
-    else:
-        stats_df['time_3'] = 0
-        stats_df['uvshift'] = False
-        for i, target in enumerate(target_list):
-            old_coord = shft.get_coord(uvdata, target)
-            stats_df.at[i, 'old_coords'] = old_coord.to_string(style = 'hmsdms')
-            stats_df.at[i, 'new_coords'] = old_coord.to_string(style = 'hmsdms')
+        else:
+            stats_df['time_3'] = 0
+            stats_df['uvshift'] = False
+            for i, target in enumerate(target_list):
+                old_coord = shft.get_coord(uvdata, target)
+                stats_df.at[i, 'old_coords'] = old_coord.to_string(style = 'hmsdms')
+                stats_df.at[i, 'new_coords'] = old_coord.to_string(style = 'hmsdms')
 
-    # Update the sequence
-    seq = uvdata.seq
+        # Update the sequence
+        seq = uvdata.seq
     
-    t_avg = time.time()
-    ## If the time resolution is < 2s, average the dataset in time 
-    ## (unless other value is given)
-    if [1, 'AIPS CQ'] in uvdata.tables:
-        try:
-            time_resol = float(uvdata.table('CQ', 1)[0]['time_avg'][0])
-        except TypeError: # Single IF datasets
-            time_resol = float(uvdata.table('CQ', 1)[0]['time_avg'])
-    else:
-        wuvdata = wizard.AIPSUVData(uvdata.name, uvdata.klass, uvdata.disk, uvdata.seq)
-        time_resol = float(round(min([x.inttim for x  in wuvdata]), 2))
+        t_avg = time.time()
+        ## If the time resolution is < 2s, average the dataset in time 
+        ## (unless other value is given)
+        if [1, 'AIPS CQ'] in uvdata.tables:
+            try:
+                time_resol = float(tcache.table(uvdata, 'CQ', 1)[0]['time_avg'][0])
+            except TypeError: # Single IF datasets
+                time_resol = float(tcache.table(uvdata, 'CQ', 1)[0]['time_avg'])
+        else:
+            wuvdata = wizard.AIPSUVData(uvdata.name, uvdata.klass, uvdata.disk, uvdata.seq)
+            time_resol = float(round(min([x.inttim for x  in wuvdata]), 2))
         
-    if time_resol <= (time_aver/1.99):
-        avgdata = AIPSUVData(aips_name[:9] + '_AT', uvdata.klass, disk_number, seq)
-        if avgdata.exists() == True:
-            avgdata.zap()
-        load.time_aver(uvdata, time_resol, time_aver)
-        uvdata = AIPSUVData(aips_name[:9] + '_AT', uvdata.klass, disk_number, seq)
-
-        # Index the data again
-        uvdata.zap_table('CL', 1)
-        load.run_indxr(uvdata)
-
-        disp.write_box(log_list, 'Data averaging')
-        disp.print_box('Data averaging')
-        for pipeline_log in log_list:
-            pipeline_log.write('\nThe time resolution was ' \
-                            + '{:.2f}'.format(time_resol) \
-                            + f's. It has been averaged to {time_aver}s.\n')
-        print('\nThe time resolution was {:.2f}'.format(time_resol) \
-            + f's. It has been averaged to {time_aver}s.')
-        is_data_avg = True
-        stats_df['time_avg'] = True
-        stats_df['old_timesamp'] = time_resol
-        stats_df['new_timesamp'] = time_aver
-    else:
-        is_data_avg = False
-        stats_df['time_avg'] = False
-        stats_df['old_timesamp'] = time_resol
-        stats_df['new_timesamp'] = time_resol
+        if time_resol <= (time_aver/1.99):
+            avgdata = AIPSUVData(aips_name[:9] + '_AT', uvdata.klass, disk_number, seq)
+            if avgdata.exists() == True:
+                avgdata.zap()
+            load.time_aver(uvdata, time_resol, time_aver)
+            uvdata = AIPSUVData(aips_name[:9] + '_AT', uvdata.klass, disk_number, seq)
+
+            # Index the data again
+            uvdata.zap_table('CL', 1)
+            load.run_indxr(uvdata)
+
+            disp.write_box(log_list, 'Data averaging')
+            disp.print_box('Data averaging')
+            for pipeline_log in log_list:
+                pipeline_log.write('\nThe time resolution was ' \
+                                + '{:.2f}'.format(time_resol) \
+                                + f's. It has been averaged to {time_aver}s.\n')
+            print('\nThe time resolution was {:.2f}'.format(time_resol) \
+                + f's. It has been averaged to {time_aver}s.')
+            is_data_avg = True
+            stats_df['time_avg'] = True
+            stats_df['old_timesamp'] = time_resol
+            stats_df['new_timesamp'] = time_aver
+        else:
+            is_data_avg = False
+            stats_df['time_avg'] = False
+            stats_df['old_timesamp'] = time_resol
+            stats_df['new_timesamp'] = time_resol
         
             
-    ## If the channel bandwidth is smaller than 0.5 MHz, average the dataset 
-    ## in frequency up to 0.5 MHz per channel (unless other value is given)
-    if [1, 'AIPS CQ'] in uvdata.tables:
-        try:
-            ch_width = float(uvdata.table('CQ', 1)[0]['chan_bw'][0])
-            no_chan = int(uvdata.table('CQ', 1)[0]['no_chan'][0])
-        except TypeError: # Single IF datasets
-            ch_width = float(uvdata.table('CQ', 1)[0]['chan_bw'])
-            no_chan = int(uvdata.table('CQ', 1)[0]['no_chan'])
+        ## If the channel bandwidth is smaller than 0.5 MHz, average the dataset 
+        ## in frequency up to 0.5 MHz per channel (unless other value is given)
+        if [1, 'AIPS CQ'] in uvdata.tables:
+            try:
+                ch_width = float(tcache.table(uvdata, 'CQ', 1)[0]['chan_bw'][0])
+                no_chan = int(tcache.table(uvdata, 'CQ', 1)[0]['no_chan'][0])
+            except TypeError: # Single IF datasets
+                ch_width = float(tcache.table(uvdata, 'CQ', 1)[0]['chan_bw'])
+                no_chan = int(tcache.table(uvdata, 'CQ', 1)[0]['no_chan'])
         
-    else:
-        try:
-            ch_width = float(uvdata.table('FQ', 1)[0]['ch_width'][0])
-            total_width = float(uvdata.table('FQ', 1)[0]['total_bandwidth'][0])
-            no_chan = int(total_width/ch_width)
-        except TypeError: # Single IF datasets
-            ch_width = float(uvdata.table('FQ', 1)[0]['ch_width'])
-            total_width = float(uvdata.table('FQ', 1)[0]['total_bandwidth'])
-            no_chan = int(total_width/ch_width)
-
-    if ch_width < freq_aver*1000:
-        if is_data_avg == False:
-            avgdata = AIPSUVData(aips_name[:9] + '_AF', uvdata.klass, \
-                                 disk_number, seq)
-            if avgdata.exists() == True:
-                avgdata.zap()
-            f_ratio = freq_aver*1000/ch_width    # NEED TO ADD A CHECK IN CASE THIS FAILS
+        else:
+            try:
+                ch_width = float(tcache.table(uvdata, 'FQ', 1)[0]['ch_width'][0])
+                total_width = float(tcache.table(uvdata, 'FQ', 1)[0]['total_bandwidth'][0])
+                no_chan = int(total_width/ch_width)
+            except TypeError: # Single IF datasets
+                ch_width = float(tcache.table(uvdata, 'FQ', 1)[0]['ch_width'])
+                total_width = float(tcache.table(uvdata, 'FQ', 1)[0]['total_bandwidth'])
+                no_chan = int(total_width/ch_width)
+
+        if ch_width < freq_aver*1000:
+            if is_data_avg == False:
+                avgdata = AIPSUVData(aips_name[:9] + '_AF', uvdata.klass, \
+                                     disk_number, seq)
+                if avgdata.exists() == True:
+                    avgdata.zap()
+                f_ratio = freq_aver*1000/ch_width    # NEED TO ADD A CHECK IN CASE THIS FAILS
             
-            if time_resol >= 0.33: # => If it was not written before
-                disp.write_box(log_list, 'Data averaging')
-                disp.print_box('Data averaging')
+                if time_resol >= 0.33: # => If it was not written before
+                    disp.write_box(log_list, 'Data averaging')
+                    disp.print_box('Data averaging')
             
-            load.freq_aver(uvdata,f_ratio)
-            uvdata = AIPSUVData(aips_name[:9] + '_AF', uvdata.klass, \
-                                 disk_number, seq)
-
-        if is_data_avg == True:
-            avgdata = AIPSUVData(aips_name[:9] + '_ATF', uvdata.klass, \
-                                 disk_number, seq)
-            if avgdata.exists() == True:
-                avgdata.zap()
-            f_ratio = freq_aver*1000/ch_width    # NEED TO ADD A CHECK IN CASE THIS FAILS
+                load.freq_aver(uvdata,f_ratio)
+                uvdata = AIPSUVData(aips_name[:9] + '_AF', uvdata.klass, \
+                                     disk_number, seq)
+
+            if is_data_avg == True:
+                avgdata = AIPSUVData(aips_name[:9] + '_ATF', uvdata.klass, \
+                                     disk_number, seq)
+                if avgdata.exists() == True:
+                    avgdata.zap()
+                f_ratio = freq_aver*1000/ch_width    # NEED TO ADD A CHECK IN CASE THIS FAILS
             
-            load.freq_aver(uvdata,f_ratio)
-            uvdata = AIPSUVData(aips_name[:9] + '_ATF', uvdata.klass, \
-                                 disk_number, seq)
+                load.freq_aver(uvdata,f_ratio)
+                uvdata = AIPSUVData(aips_name[:9] + '_ATF', uvdata.klass, \
+                                     disk_number, seq)
 
-        # Index the data again
-        uvdata.zap_table('CL', 1)
-        load.run_indxr(uvdata)
+            # Index the data again
+            uvdata.zap_table('CL', 1)
+            load.run_indxr(uvdata)
 
-        try:
-            no_chan_new = int(uvdata.table('FQ', 1)[0]['total_bandwidth'][0]/ \
-                              uvdata.table('FQ', 1)[0]['ch_width'][0])
-        except TypeError: # Single IF datasets
-            no_chan_new = int(uvdata.table('FQ', 1)[0]['total_bandwidth']/ \
-                              uvdata.table('FQ', 1)[0]['ch_width'])
+            try:
+                no_chan_new = int(tcache.table(uvdata, 'FQ', 1)[0]['total_bandwidth'][0]/ \
+                                  tcache.table(uvdata, 'FQ', 1)[0]['ch_width'][0])
+            except TypeError: # Single IF datasets
+                no_chan_new = int(tcache.table(uvdata, 'FQ', 1)[0]['total_bandwidth']/ \
+                                  tcache.table(uvdata, 'FQ', 1)[0]['ch_width'])
 
 
-        for pipeline_log in log_list:
-            pipeline_log.write('\nThere were ' + str(no_chan) + ' channels of ' \
-                            + str(ch_width/1e3) + ' kHz per IF. The dataset has ' \
-                            + 'been averaged to ' + str(no_chan_new) + ' channels of ' \
-                            + '500 kHz.\n')
-
-        print('\nThere were ' + str(no_chan) + ' channels of ' \
-              + str(ch_width/1e3) + ' kHz per IF. The dataset has ' \
-              + 'been averaged to ' + str(no_chan_new) + ' channels of ' \
-              + f'{freq_aver} kHz.\n')
+            for pipeline_log in log_list:
+                pipeline_log.write('\nThere were ' + str(no_chan) + ' channels of ' \
+                                + str(ch_width/1e3) + ' kHz per IF. The dataset has ' \
+                                + 'been averaged to ' + str(no_chan_new) + ' channels of ' \
+                                + '500 kHz.\n')
+
+            print('\nThere were ' + str(no_chan) + ' channels of ' \
+                  + str(ch_width/1e3) + ' kHz per IF. The dataset has ' \
+                  + 'been averaged to ' + str(no_chan_new) + ' channels of ' \
+                  + f'{freq_aver} kHz.\n')
         
-        stats_df['freq_avg'] = True
-        stats_df['old_ch_width'] = ch_width
-        stats_df['old_ch_no'] = no_chan
-        stats_df['new_ch_width'] = freq_aver*1000
-        stats_df['new_ch_no'] = no_chan_new
+            stats_df['freq_avg'] = True
+            stats_df['old_ch_width'] = ch_width
+            stats_df['old_ch_no'] = no_chan
+            stats_df['new_ch_width'] = freq_aver*1000
+            stats_df['new_ch_no'] = no_chan_new
         
-    else:
-        stats_df['freq_avg'] = False
-        stats_df['old_ch_width'] = ch_width
-        stats_df['old_ch_no'] = no_chan
-        stats_df['new_ch_width'] = ch_width
-        stats_df['new_ch_no'] = no_chan
+        else:
+            stats_df['freq_avg'] = False
+            stats_df['old_ch_width'] = ch_width
+            stats_df['old_ch_no'] = no_chan
+            stats_df['new_ch_width'] = ch_width
+            stats_df['new_ch_no'] = no_chan
         
-    stats_df['time_4'] = time.time() - t_avg
-
-    ## Print scan information ##    
-    load.print_listr(uvdata, outpath_list, filename_list)
-    for i, pipeline_log in enumerate(log_list):
-        pipeline_log.write('\nScan information printed in '  \
-                            + filename_list[i] + '_scansum.txt \n')
+        stats_df['time_4'] = time.time() - t_avg
+
+        ## Print scan information ##    
+        load.print_listr(uvdata, outpath_list, filename_list, 
+                         workspace = workspace)
+        for i, pipeline_log in enumerate(log_list):
+            pipeline_log.write('\nScan information printed in '  \
+                                + filename_list[i] + '_scansum.txt \n')
         
-    # Counting scans and scan length
-    nx_table = uvdata.table('NX', 1)
-    for i, target in enumerate(target_list):
-        s_count = 0
-        s_lengths = []
-        target_id = [x.id for x in full_source_list if x.name == target][0]
-        for scan in nx_table:
-            if scan.source_id == target_id:
-                s_count += 1
-                s_lengths.append(round(scan.time_interval * 24 * 3600,1))
-        stats_df.at[i, 'n_scans'] = s_count
-        stats_df.at[i, 'scan_lengths'] = str(s_lengths)
-
-    # Counting visibilities
-    expo.data_split(uvdata, target_list, cl_table=1, flagver=1)
-    for i, target in enumerate(target_list):
-        cl1 = AIPSUVData(target, 'PLOT', uvdata.disk, 1)
-        vis_cl1, vis_ant_cl1 = expo.vis_count_v2(cl1)
-        stats_df.at[i, 'CL1_vis'] = int(vis_cl1)
-        stats_df.at[i, 'CL1_ant_vis'] = json.dumps(vis_ant_cl1)
-        print(f"CL1 visibilities of {target}: {vis_cl1}\n")
-        log_list[i].write(f"\nCL1 visibilities of {target}: {vis_cl1}\n")
+        # Counting scans and scan length
+        nx_table = tcache.table(uvdata, 'NX', 1)
+        for i, target in enumerate(target_list):
+            s_count = 0
+            s_lengths = []
+            target_id = [x.id for x in full_source_list if x.name == target][0]
+            for scan in nx_table:
+                if scan.source_id == target_id:
+                    s_count += 1
+                    s_lengths.append(round(scan.time_interval * 24 * 3600,1))
+            stats_df.at[i, 'n_scans'] = s_count
+            stats_df.at[i, 'scan_lengths'] = str(s_lengths)
+
+        # Counting visibilities
+        vis_stats.count(uvdata, target_list, ['CL1_vis', 'CL1_ant_vis'],
+                        'CL1 visibilities of {}',
+                        cl_table = 1, flagver = 1, split = False)
+
+        engine.complete('load', uvdata, stats_df)
+    else:
+        t1 = time.time()
     
-    ## Smooth the TY table ##  
-    ## Flag antennas with no TY or GC table entries ##  
+    ## Download the remote files of later stages in the background ##
+    YYYY = int(uvdata.header.date_obs[:4])
+    MM = int(uvdata.header.date_obs[5:7])
+    DD = int(uvdata.header.date_obs[8:])
+    date_obs = datetime(YYYY, MM, DD)
+    if engine.is_done('ionos') == False and date_obs > datetime(1998,6,1):
+        ionex_files, _ = iono.ionex_list(uvdata)
+        engine.submit('ionex', iono.download_ionex, ionex_files, workspace = workspace)
+    if engine.is_done('eop') == False:
+        engine.submit('eop', eopc.download_eop, workspace = workspace)
+
+    if engine.pending('tsys', uvdata) == True:
+        ## Smooth the TY table ##  
+        ## Flag antennas with no TY or GC table entries ##  
     
-    t_tsys = time.time()
-    disp.write_box(log_list, 'Flagging system temperatures')
-    disp.print_box('Flagging system temperatures')
+        t_tsys = time.time()
+        disp.write_box(log_list, 'Flagging system temperatures')
+        disp.print_box('Flagging system temperatures')
     
-    no_tsys_ant, no_gc_ant = tysm.ty_smooth(uvdata)
-
-    if len(no_tsys_ant) > 0:
-        for n in no_tsys_ant:
-            n_name = [x['anname'] for x in uvdata.table('AN', 1) if x['nosta'] == n] 
-            n_name[0] = n_name[0].replace(' ','') 
-            print('\n' + str(n) + '-' + n_name[0] + ' has no TSys available, ' \
-                  + 'it will be flagged.\n')
-                
-        for pipeline_log in log_list:
+        no_tsys_ant, no_gc_ant = tysm.ty_smooth(uvdata)
+        an_names = tcache.antenna_names(uvdata)
+
+        if len(no_tsys_ant) > 0:
             for n in no_tsys_ant:
-                n_name = [x['anname'] for x in uvdata.table('AN', 1) if x['nosta'] == n]
-                n_name[0] = n_name[0].replace(' ','') 
-                pipeline_log.write('\n' + str(n) + '-' + n_name[0] + ' has no Tsys ' \
-                                   + 'available, it will be flagged.\n') 
-
-    if len(no_gc_ant) > 0:
-        for n in [x for x in no_gc_ant if x not in no_tsys_ant]:
-            n_name = [x['anname'] for x in uvdata.table('AN', 1) if x['nosta'] == n] 
-            n_name[0] = n_name[0].replace(' ','') 
-            print('\n' + str(n) + '-' + n_name[0] + ' has no gain curve available, ' \
-                  + 'it will be flagged.\n')
-            
-        for pipeline_log in log_list:
+                n_name = an_names[n].replace(' ','')
+                print('\n' + str(n) + '-' + n_name + ' has no TSys available, ' \
+                      + 'it will be flagged.\n')
+                
+            for pipeline_log in log_list:
+                for n in no_tsys_ant:
+                    n_name = an_names[n].replace(' ','')
+                    pipeline_log.write('\n' + str(n) + '-' + n_name + ' has no Tsys ' \
+                                       + 'available, it will be flagged.\n') 
+
+        if len(no_gc_ant) > 0:
             for n in [x for x in no_gc_ant if x not in no_tsys_ant]:
-                n_name = [x['anname'] for x in uvdata.table('AN', 1) if x['nosta'] == n]
-                n_name[0] = n_name[0].replace(' ','') 
-                pipeline_log.write('\n' + str(n) + '-' + n_name[0] + ' has no gain ' \
-                                   + 'curve available, it will be flagged.\n') 
+                n_name = an_names[n].replace(' ','')
+                print('\n' + str(n) + '-' + n_name + ' has no gain curve available, ' \
+                      + 'it will be flagged.\n')
+            
+            for pipeline_log in log_list:
+                for n in [x for x in no_gc_ant if x not in no_tsys_ant]:
+                    n_name = an_names[n].replace(' ','')
+                    pipeline_log.write('\n' + str(n) + '-' + n_name + ' has no gain ' \
+                                       + 'curve available, it will be flagged.\n') 
     
-    original_tsys, flagged_tsys, tsys_dict, smo_antennas = tysm.ty_assess(uvdata)
+        original_tsys, flagged_tsys, tsys_dict, smo_antennas, \
+            tsys_flag_fractions = tysm.ty_assess(uvdata)
     
-    tsys_flag_percent = np.round(flagged_tsys/original_tsys*100, 2)
+        tsys_flag_percent = np.round(flagged_tsys/original_tsys*100, 2)
 
-    for pipeline_log in log_list:
-        pipeline_log.write("\nAntenna |  TY1  |  TY2 \n")
-        pipeline_log.write("--------|-------|-------\n")
+        for pipeline_log in log_list:
+            pipeline_log.write("\nAntenna |  TY1  |  TY2 \n")
+            pipeline_log.write("--------|-------|-------\n")
+            for _, (ant, ty2, ty1) in tsys_dict.items():
+                if ty1 != 0:
+                    pipeline_log.write(f"{ant.strip():<8}|  {ty1:<4} |  {ty2} \n")
+
+            if len(smo_antennas) > 0:
+                pipeline_log.write(f"\nSystem temperatures of {smo_antennas} were fully flagged."\
+                    + " The antennas will be included in FG#2.\n")
+
+            pipeline_log.write('\nSystem temperatures clipped: ' + str(tsys_flag_percent) \
+                               + '% of the Tsys values have been flagged ('  \
+                               + str(flagged_tsys) + '/' + str(original_tsys) + ')\n' \
+                               + 'TY#2 created.\n')
+        
+        print("\nAntenna |  TY1  |  TY2 \n")
+        print("--------|-------|-------\n")
         for _, (ant, ty2, ty1) in tsys_dict.items():
             if ty1 != 0:
-                pipeline_log.write(f"{ant.strip():<8}|  {ty1:<4} |  {ty2} \n")
+                print(f"{ant.strip():<8}|  {ty1:<4} |  {ty2} \n")
 
         if len(smo_antennas) > 0:
-            pipeline_log.write(f"\nSystem temperatures of {smo_antennas} were fully flagged."\
-                + " The antennas will be included in FG#2.\n")
-
-        pipeline_log.write('\nSystem temperatures clipped: ' + str(tsys_flag_percent) \
-                           + '% of the Tsys values have been flagged ('  \
-                           + str(flagged_tsys) + '/' + str(original_tsys) + ')\n' \
-                           + 'TY#2 created.\n')
-        
-    print("\nAntenna |  TY1  |  TY2 \n")
-    print("--------|-------|-------\n")
-    for _, (ant, ty2, ty1) in tsys_dict.items():
-        if ty1 != 0:
-            print(f"{ant.strip():<8}|  {ty1:<4} |  {ty2} \n")
-
-    if len(smo_antennas) > 0:
-        print(f"\nSystem temperatures of {smo_antennas} were fully flagged."\
-              + " The antennas will be included in FG#2.\n")
+            print(f"\nSystem temperatures of {smo_antennas} were fully flagged."\
+                  + " The antennas will be included in FG#2.\n")
      
-    print('\nSystem temperatures clipped: ' + str(tsys_flag_percent) \
-            + '% of the Tsys values have been flagged ('  \
-            + str(flagged_tsys) + '/' + str(original_tsys) + ')\n' \
-            + 'TY#2 created.\n') 
+        print('\nSystem temperatures clipped: ' + str(tsys_flag_percent) \
+                + '% of the Tsys values have been flagged ('  \
+                + str(flagged_tsys) + '/' + str(original_tsys) + ')\n' \
+                + 'TY#2 created.\n') 
     
-    # Print the TY tables
-    try:
-        for i, target in enumerate(target_list):
-            plot.tsys_plotter(outpath_list[i], uvdata, tyver = 1)
-            print('\nOriginal system temperatures plotted in '
-                    + outpath_list[i] + '/PLOTS/'  \
-                    + filename_list[i] + '_TSYS_TY1.ps\n')
-            log_list[i].write('\nOriginal system temperatures plotted in '
-                            + outpath_list[i] + '/PLOTS/'  \
-                            + filename_list[i] + '_TSYS_TY1.ps\n')           
-    except RuntimeError:
-        for i, target in enumerate(target_list):
-            log_list[i].write('\nOriginal system temperatures could not be plotted.\n')
-        print('\nOriginal system temperatures could not be plotted.\n')
+        # Print the TY tables
+        try:
+            for i, target in enumerate(target_list):
+                plot.tsys_plotter(outpath_list[i], uvdata, tyver = 1, 
+                                  workspace = workspace)
+                print('\nOriginal system temperatures plotted in '
+                        + outpath_list[i] + '/PLOTS/'  \
+                        + filename_list[i] + '_TSYS_TY1.ps\n')
+                log_list[i].write('\nOriginal system temperatures plotted in '
+                                + outpath_list[i] + '/PLOTS/'  \
+                                + filename_list[i] + '_TSYS_TY1.ps\n')           
+        except RuntimeError:
+            for i, target in enumerate(target_list):
+                log_list[i].write('\nOriginal system temperatures could not be plotted.\n')
+            print('\nOriginal system temperatures could not be plotted.\n')
 
-    try:
-        for i, target in enumerate(target_list):
-            plot.tsys_plotter(outpath_list[i], uvdata, tyver = 2)
-            print('\nSmoothed system temperatures plotted in '
-                    + outpath_list[i] + '/PLOTS/'  \
-                    + filename_list[i] + '_TSYS_TY2.ps\n')
-            log_list[i].write('\nSmoothed system temperatures plotted in '
-                            + outpath_list[i] + '/PLOTS/'  \
-                            + filename_list[i] + '_TSYS_TY2.ps\n')           
-    except RuntimeError:
-        for i, target in enumerate(target_list):
-            log_list[i].write('\nSmoothed system temperatures could not be plotted.\n')
-        print('\nSmoothed system temperatures could not be plotted.\n')
+        try:
+            for i, target in enumerate(target_list):
+                plot.tsys_plotter(outpath_list[i], uvdata, tyver = 2, 
+                                  workspace = workspace)
+                print('\nSmoothed system temperatures plotted in '
+                        + outpath_list[i] + '/PLOTS/'  \
+                        + filename_list[i] + '_TSYS_TY2.ps\n')
+                log_list[i].write('\nSmoothed system temperatures plotted in '
+                                + outpath_list[i] + '/PLOTS/'  \
+                                + filename_list[i] + '_TSYS_TY2.ps\n')           
+        except RuntimeError:
+            for i, target in enumerate(target_list):
+                log_list[i].write('\nSmoothed system temperatures could not be plotted.\n')
+            print('\nSmoothed system temperatures could not be plotted.\n')
 
     
-    stats_df['ty1_points'] = original_tsys
-    stats_df['ty2_points'] = original_tsys - flagged_tsys
-    stats_df['tsys_dict'] = json.dumps(tsys_dict)
+        stats_df['ty1_points'] = original_tsys
+        stats_df['ty2_points'] = original_tsys - flagged_tsys
+        stats_df['tsys_dict'] = json.dumps(tsys_dict)
+        stats_df['tsys_if_flagged'] = json.dumps(tsys_flag_fractions['ifs'])
+        stats_df['tsys_source_flagged'] = json.dumps(tsys_flag_fractions['sources'])
 
-    # Remove unflagged splitted entries
-    for i, target in enumerate(target_list):
-        AIPSUVData(target, 'PLOT', uvdata.disk, 1).zap()
+        # Remove unflagged splitted entries
+        for i, target in enumerate(target_list):
+            if AIPSUVData(target, 'PLOT', uvdata.disk, 1).exists() == True:
+                AIPSUVData(target, 'PLOT', uvdata.disk, 1).zap()
 
-    # Counting again the visibilities with the flags
-    expo.data_split(uvdata, target_list, cl_table=1, flagver=2)
-    for i, target in enumerate(target_list):
-        cl1_fg2 = AIPSUVData(target, 'PLOT', uvdata.disk, 1)
-        vis_cl1_fg2, vis_ant_cl1_fg2 = expo.vis_count_v2(cl1_fg2)
-        stats_df.at[i, 'CL1_vis_FG2'] = int(vis_cl1_fg2)
-        stats_df.at[i, 'CL1_FG2_ant_vis'] = json.dumps(vis_ant_cl1_fg2)
-        print(f"CL1 visibilities of {target} after flagging: {vis_cl1_fg2}\n")
-        log_list[i].write(f"\nCL1 visibilities of {target} after flagging: {vis_cl1_fg2}\n")
+        # Counting again the visibilities with the flags
+        vis_stats.count(uvdata, target_list, ['CL1_vis_FG2', 'CL1_FG2_ant_vis'],
+                        'CL1 visibilities of {} after flagging',
+                        cl_table = 1, flagver = 2, split = interactive)
 
-    t2 = time.time()
+        t2 = time.time()
 
-    stats_df['time_5'] = t2 - t_tsys
+        stats_df['time_5'] = t2 - t_tsys
     
-    for pipeline_log in log_list:
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t2-t1))
-    print('Execution time: {:.2f} s. \n'.format(t2-t1))
+        for pipeline_log in log_list:
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t2-t1))
+        print('Execution time: {:.2f} s. \n'.format(t2-t1))
+
+        engine.complete('tsys', uvdata, stats_df)
+    else:
+        t2 = time.time()
 
     # full_source_list needs to be re-written after loading, to avoid issues when 
     # concatenating files
     full_source_list = load.redo_source_list(uvdata)
 
-    ## Choose refant ##
-    disp.write_box(log_list, 'Reference antenna search')
-    disp.print_box('Reference antenna search')
-    print('\nSearch for reference antenna starts...\n')
+    if engine.pending('refant', uvdata) == True:
+        ## Choose refant ##
+        disp.write_box(log_list, 'Reference antenna search')
+        disp.print_box('Reference antenna search')
+        print('\nSearch for reference antenna starts...\n')
 
-    # Disable search central antennas if the telescope is not the VLBA
-    if uvdata.header.telescop != 'VLBA':
-        search_central = False
+        # Disable search central antennas if the telescope is not the VLBA
+        if uvdata.header.telescop != 'VLBA':
+            search_central = False
     
-    if default_refant == None:
-        for pipeline_log in log_list:
-            pipeline_log.write('\nChoosing reference antenna with all sources.\n')
+        if default_refant == None:
+            for pipeline_log in log_list:
+                pipeline_log.write('\nChoosing reference antenna with all sources.\n')
 
-        try:
-            refant, ant_dict = rant.refant_choose_snr(uvdata, sources, target_list, 
-                            full_source_list, log_list, search_central=search_central, 
-                            max_scans = max_scan_refant_search)
-        except ValueError:
-            print('\n\nNO ANTENNAS!\n\n')
-            return()
+            try:
+                refant, ant_dict = rant.refant_choose_snr(uvdata, sources, target_list, 
+                                full_source_list, log_list, search_central=search_central, 
+                                max_scans = max_scan_refant_search)
+            except ValueError:
+                print('\n\nNO ANTENNAS!\n\n')
+                return()
 
 
-        refant_summary = (
-            f"\n{ant_dict[refant].codename} has been selected as the reference antenna "
-            f"with an SNR of {round(ant_dict[refant].median_SNR, 2)}. It is available in "
-            f"{len(ant_dict[refant].scans_obs)} out of {ant_dict[refant].max_scans} scans.\n"
-        )
+            refant_summary = (
+                f"\n{ant_dict[refant].codename} has been selected as the reference antenna "
+                f"with an SNR of {round(ant_dict[refant].median_SNR, 2)}. It is available in "
+                f"{len(ant_dict[refant].scans_obs)} out of {ant_dict[refant].max_scans} scans.\n"
+            )
 
-        for pipeline_log in log_list:
-            pipeline_log.write(refant_summary)
-            pipeline_log.write("Antenna  |   SNR   | Obs Scans | Tot Scans\n")
-            pipeline_log.write("---------|---------|-----------|-----------\n")
+            for pipeline_log in log_list:
+                pipeline_log.write(refant_summary)
+                pipeline_log.write("Antenna  |   SNR   | Obs Scans | Tot Scans\n")
+                pipeline_log.write("---------|---------|-----------|-----------\n")
+                for ant in ant_dict.values():
+                    pipeline_log.write(
+                        f"{ant.codename:<8} | {round(ant.median_SNR,2):>6} |"
+                        f" {len(ant.scans_obs):>9} | {ant.max_scans:>9}\n"
+                    )
+
+            # Console output
+            print(refant_summary)
+            print("Antenna  |   SNR   | Obs Scans | Tot Scans")
+            print("---------|---------|-----------|-----------")
             for ant in ant_dict.values():
-                pipeline_log.write(
+                print(
                     f"{ant.codename:<8} | {round(ant.median_SNR,2):>6} |"
-                    f" {len(ant.scans_obs):>9} | {ant.max_scans:>9}\n"
+                    f" {len(ant.scans_obs):>9} | {ant.max_scans:>9}"
                 )
 
-        # Console output
-        print(refant_summary)
-        print("Antenna  |   SNR   | Obs Scans | Tot Scans")
-        print("---------|---------|-----------|-----------")
-        for ant in ant_dict.values():
-            print(
-                f"{ant.codename:<8} | {round(ant.median_SNR,2):>6} |"
-                f" {len(ant.scans_obs):>9} | {ant.max_scans:>9}"
-            )
-
-        stats_df['refant_no'] = refant
-        stats_df['refant_name'] = ant_dict[refant].name
-        refant_rank = dict(zip([x.name for x in ant_dict.values()], 
-                               [x.median_SNR for x in ant_dict.values()]))
-        stats_df['refant_rank'] = json.dumps(refant_rank)
+            stats_df['refant_no'] = refant
+            stats_df['refant_name'] = ant_dict[refant].name
+            refant_rank = dict(zip([x.name for x in ant_dict.values()], 
+                                   [x.median_SNR for x in ant_dict.values()]))
+            stats_df['refant_rank'] = json.dumps(refant_rank)
 
-    else:
-        refant = [x['nosta'] for x in uvdata.table('AN',1) \
-                  if default_refant in x['anname']][0]
-        for pipeline_log in log_list:
-            pipeline_log.write('\n' + default_refant + ' has been manually selected as the ' \
-                               + 'reference antenna.\n')
-        print(default_refant + ' has been manually selected as the reference antenna.\n')
-
-        stats_df['refant_no'] = refant
-        stats_df['refant_name'] = default_refant
-        stats_df['refant_rank'] = json.dumps({default_refant: 'MANUAL'})
-
-
-    if default_refant == None and default_refant_list == None:
-        priority_refant_names = [x.name for x in ant_dict.values()][1:]
-        priority_refants = []
-        for name in priority_refant_names:
-            priority_refants.append([x['nosta'] for x in uvdata.table('AN', 1)\
-                                     if name in x['anname']][0])
-
-    elif default_refant_list != None:
-        priority_refants = []
-        for name in default_refant_list:
-            priority_refants.append([x['nosta'] for x in uvdata.table('AN', 1)\
-                                     if name in x['anname']][0])
+        else:
+            refant = [x['nosta'] for x in tcache.table(uvdata, 'AN',1) \
+                      if default_refant in x['anname']][0]
+            for pipeline_log in log_list:
+                pipeline_log.write('\n' + default_refant + ' has been manually selected as the ' \
+                                   + 'reference antenna.\n')
+            print(default_refant + ' has been manually selected as the reference antenna.\n')
+
+            stats_df['refant_no'] = refant
+            stats_df['refant_name'] = default_refant
+            stats_df['refant_rank'] = json.dumps({default_refant: 'MANUAL'})
+
+
+        if default_refant == None and default_refant_list == None:
+            priority_refant_names = [x.name for x in ant_dict.values()][1:]
+            priority_refants = []
+            for name in priority_refant_names:
+                priority_refants.append([x['nosta'] for x in tcache.table(uvdata, 'AN', 1)\
+                                         if name in x['anname']][0])
+
+        elif default_refant_list != None:
+            priority_refants = []
+            for name in default_refant_list:
+                priority_refants.append([x['nosta'] for x in tcache.table(uvdata, 'AN', 1)\
+                                         if name in x['anname']][0])
             
-    elif default_refant != None and default_refant_list == None:
-        priority_refants = []
+        elif default_refant != None and default_refant_list == None:
+            priority_refants = []
 
-    t3=time.time()
-    stats_df['time_6'] = t3-t2
-    for pipeline_log in log_list:
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t3-t2))
-    print('Execution time: {:.2f} s. \n'.format(t3-t2))
+        t3=time.time()
+        stats_df['time_6'] = t3-t2
+        for pipeline_log in log_list:
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t3-t2))
+        print('Execution time: {:.2f} s. \n'.format(t3-t2))
 
-    ## Ionospheric correction ##
-    disp.write_box(log_list, 'Ionospheric corrections')
-    disp.print_box('Ionospheric corrections')
+        engine.complete('refant', uvdata, stats_df, refant = refant,
+                        priority_refants = priority_refants)
+    else:
+        refant = journal['state']['refant']
+        priority_refants = journal['state']['priority_refants']
+        t3 = time.time()
+
+    if engine.pending('ionos', uvdata) == True:
+        ## Ionospheric correction ##
+        disp.write_box(log_list, 'Ionospheric corrections')
+        disp.print_box('Ionospheric corrections')
     
-    YYYY = int(uvdata.header.date_obs[:4])
-    MM = int(uvdata.header.date_obs[5:7])
-    DD = int(uvdata.header.date_obs[8:])
-    date_obs = datetime(YYYY, MM, DD)
-    if date_obs > datetime(1998,6,1):
+        if date_obs > datetime(1998,6,1):
         
-        files = iono.ionos_correct(uvdata)
+            files = iono.ionos_correct(uvdata, workspace = workspace, 
+                                       files = engine.result('ionex'))
 
-        for pipeline_log in log_list:
-            pipeline_log.write('\nIonospheric corrections applied!\nCL#2 created.'\
-                            + '\n')
-        print('\nIonospheric corrections applied!\nCL#2 created.\n')
+            for pipeline_log in log_list:
+                pipeline_log.write('\nIonospheric corrections applied!\nCL#2 created.'\
+                                + '\n')
+            print('\nIonospheric corrections applied!\nCL#2 created.\n')
 
-        # Counting visibilities
-        expo.data_split(uvdata, target_list, cl_table=2, flagver=2)
-        for i, target in enumerate(target_list):
-            cl2 = AIPSUVData(target, 'PLOT', uvdata.disk, 2)
-            vis_cl2, vis_ant_cl2 = expo.vis_count_v2(cl2)
-            stats_df.at[i, 'CL2_vis'] = int(vis_cl2)
-            stats_df.at[i, 'CL2_ant_vis'] = json.dumps(vis_ant_cl2) 
-            print(f"CL2 visibilities of {target}: {vis_cl2}\n")
-            log_list[i].write(f"\nCL2 visibilities of {target}: {vis_cl2}\n")
+            # Counting visibilities
+            vis_stats.count(uvdata, target_list, ['CL2_vis', 'CL2_ant_vis'],
+                            'CL2 visibilities of {}',
+                            cl_table = 2, flagver = 2, split = interactive)
 
-        t4 = time.time()
+            t4 = time.time()
 
-        os.system(f'rm -rf {tmp_dir}/jplg*')
-        os.system(f'rm -rf {tmp_dir}/codg*')
+            os.system(f'rm -rf {workspace.path}/jplg*')
+            os.system(f'rm -rf {workspace.path}/codg*')
 
-        stats_df['iono_files'] = str(files)
-        stats_df['time_7'] = t4 - t3
+            stats_df['iono_files'] = str(files)
+            stats_df['time_7'] = t4 - t3
         
 
-    else:
+        else:
 
-        help.tacop(uvdata, 'CL', 1, 2)
-        for pipeline_log in log_list:
-            pipeline_log.write('\nIonospheric corrections not applied! IONEX '\
-                            + 'files are not available for observations '\
-                            + 'older than June 1998.\nCL#2 will be copied '\
-                            + 'from CL#1.\n')
-        print('\nIonospheric corrections not applied! IONEX files are not '\
-              + 'available for observations older than June 1998.\nCL#2 '\
-              + 'will be copied from CL#1.\n')
+            help.tacop(uvdata, 'CL', 1, 2)
+            for pipeline_log in log_list:
+                pipeline_log.write('\nIonospheric corrections not applied! IONEX '\
+                                + 'files are not available for observations '\
+                                + 'older than June 1998.\nCL#2 will be copied '\
+                                + 'from CL#1.\n')
+            print('\nIonospheric corrections not applied! IONEX files are not '\
+                  + 'available for observations older than June 1998.\nCL#2 '\
+                  + 'will be copied from CL#1.\n')
         
-        # Counting visibilities
-        expo.data_split(uvdata, target_list, cl_table=2, flagver=2)
-        for i, target in enumerate(target_list):
-            cl2 = AIPSUVData(target, 'PLOT', uvdata.disk, 2)
-            vis_cl2, vis_ant_cl2 = expo.vis_count_v2(cl2)
-            stats_df.at[i, 'CL2_vis'] = int(vis_cl2)
-            stats_df.at[i, 'CL2_ant_vis'] = json.dumps(vis_ant_cl2)
-            print(f"CL2 visibilities of {target}: {vis_cl2}\n")
-            log_list[i].write(f"\nCL2 visibilities of {target}: {vis_cl2}\n")
+            # Counting visibilities
+            vis_stats.count(uvdata, target_list, ['CL2_vis', 'CL2_ant_vis'],
+                            'CL2 visibilities of {}',
+                            cl_table = 2, flagver = 2, split = interactive)
 
-        t4 = time.time()
+            t4 = time.time()
 
-        stats_df['iono_files'] = 'OLD'
-        stats_df['time_7'] = t4 - t3
+            stats_df['iono_files'] = 'OLD'
+            stats_df['time_7'] = t4 - t3
 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t4-t3))
-    print('Execution time: {:.2f} s. \n'.format(t4-t3)) 
+        for pipeline_log in log_list:
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t4-t3))
+        print('Execution time: {:.2f} s. \n'.format(t4-t3)) 
 
-    ## Earth orientation parameters correction ##
-    disp.write_box(log_list, 'Earth orientation parameters corrections')
-    disp.print_box('Earth orientation parameters corrections')
+        engine.complete('ionos', uvdata, stats_df)
+    else:
+        t4 = time.time()
 
-    with fits.open(filepath_list[0]) as hdul:
-        try:
-            if hdul[0].header['CORRELAT'].strip() == 'SFXC':
-                for pipeline_log in log_list:
-                    pipeline_log.write('\nEarth orientation parameter corrections cannot '\
-                                    + 'be applied for non-DiFX correlators.\n'\
-                                    + 'CL#3 will be copied from CL#2.\n')
-                    print('\nEarth orientation parameter corrections cannot be ' \
-                                    + 'applied for non-DiFX correlators.\n'\
-                                    + 'CL#3 will be copied from CL#2.\n')
-                    help.tacop(uvdata, 'CL', 2, 3)
-            else:
-                eopc.eop_correct(uvdata)
+    if engine.pending('eop', uvdata) == True:
+        ## Earth orientation parameters correction ##
+        disp.write_box(log_list, 'Earth orientation parameters corrections')
+        disp.print_box('Earth orientation parameters corrections')
 
-                for pipeline_log in log_list:
-                    pipeline_log.write('\nEarth orientation parameter corrections applied!\n'\
-                                    + 'CL#3 created.\n')
-                print('\nEarth orientation parameter corrections applied!\nCL#3 created.\n')
-                os.system(f'rm -rf {tmp_dir}/usno*')
+        # The file is None if it was not downloaded in the background
+        eop_file = engine.result('eop')
 
-        except KeyError:
-            eopc.eop_correct(uvdata)
+        # Files without correlator information are assumed to come from DiFX
+        if meta.read_metadata(filepath_list[0]).correlator == 'SFXC':
+            for pipeline_log in log_list:
+                pipeline_log.write('\nEarth orientation parameter corrections cannot '\
+                                + 'be applied for non-DiFX correlators.\n'\
+                                + 'CL#3 will be copied from CL#2.\n')
+                print('\nEarth orientation parameter corrections cannot be ' \
+                                + 'applied for non-DiFX correlators.\n'\
+                                + 'CL#3 will be copied from CL#2.\n')
+                help.tacop(uvdata, 'CL', 2, 3)
+        else:
+            eopc.eop_correct(uvdata, workspace = workspace, 
+                             download = eop_file == None)
 
             for pipeline_log in log_list:
                 pipeline_log.write('\nEarth orientation parameter corrections applied!\n'\
                                 + 'CL#3 created.\n')
             print('\nEarth orientation parameter corrections applied!\nCL#3 created.\n')
-            os.system(f'rm -rf {tmp_dir}/usno*')
+            os.system(f'rm -rf {workspace.path}/usno*')
 
 
 
-    # Counting visibilities
-    expo.data_split(uvdata, target_list, cl_table=3, flagver=2)
-    for i, target in enumerate(target_list):
-        cl3 = AIPSUVData(target, 'PLOT', uvdata.disk, 3)
-        vis_cl3, vis_ant_cl3 = expo.vis_count_v2(cl3)
-        stats_df.at[i, 'CL3_vis'] = int(vis_cl3)
-        stats_df.at[i, 'CL3_ant_vis'] = json.dumps(vis_ant_cl3)
-        print(f"CL3 visibilities of {target}: {vis_cl3}\n")
-        log_list[i].write(f"\nCL3 visibilities of {target}: {vis_cl3}\n")
+        # Counting visibilities
+        vis_stats.count(uvdata, target_list, ['CL3_vis', 'CL3_ant_vis'],
+                        'CL3 visibilities of {}',
+                        cl_table = 3, flagver = 2, split = interactive)
 
-    t5 = time.time()
+        t5 = time.time()
 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t5-t4))
-    print('Execution time: {:.2f} s. \n'.format(t5-t4))
+        for pipeline_log in log_list:
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t5-t4))
+        print('Execution time: {:.2f} s. \n'.format(t5-t4))
+
+        stats_df['time_8'] = t5 - t4
 
-    stats_df['time_8'] = t5 - t4
+        engine.complete('eop', uvdata, stats_df)
+    else:
+        t5 = time.time()
 
-    ## Parallatic angle correction ##
-    disp.write_box(log_list, 'Parallactic angle corrections')
-    disp.print_box('Parallactic angle corrections')
+    if engine.pending('pang', uvdata) == True:
+        ## Parallatic angle correction ##
+        disp.write_box(log_list, 'Parallactic angle corrections')
+        disp.print_box('Parallactic angle corrections')
     
-    pang.pang_corr(uvdata)
+        pang.pang_corr(uvdata)
 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nParallactic angle corrections applied!\nCL#4'\
-                        + ' created.\n')
-    print('\nParallactic angle corrections applied!\nCL#4 created.\n')
+        for pipeline_log in log_list:
+            pipeline_log.write('\nParallactic angle corrections applied!\nCL#4'\
+                            + ' created.\n')
+        print('\nParallactic angle corrections applied!\nCL#4 created.\n')
 
-    # Counting visibilities
-    expo.data_split(uvdata, target_list, cl_table=4, flagver=2)
-    for i, target in enumerate(target_list):
-        cl4 = AIPSUVData(target, 'PLOT', uvdata.disk, 4)
-        vis_cl4, vis_ant_cl4 = expo.vis_count_v2(cl4)
-        stats_df.at[i, 'CL4_vis'] = int(vis_cl4)
-        stats_df.at[i, 'CL4_ant_vis'] = json.dumps(vis_ant_cl4)
-        print(f"CL4 visibilities of {target}: {vis_cl4}\n")
-        log_list[i].write(f"\nCL4 visibilities of {target}: {vis_cl4}\n")
+        # Counting visibilities
+        vis_stats.count(uvdata, target_list, ['CL4_vis', 'CL4_ant_vis'],
+                        'CL4 visibilities of {}',
+                        cl_table = 4, flagver = 2, split = False)
 
-    t6 = time.time()
+        t6 = time.time()
 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t6-t5))
-    print('Execution time: {:.2f} s. \n'.format(t6-t5))
-
-    stats_df['time_9'] = t6 - t5
-
-    ## Selecting calibrator scan ##
-    # If there is no input calibrator
-    if input_calibrator ==  None:
-        ## Look for calibrator ##
-        ## SNR fringe search ##
-        disp.write_box(log_list, 'Calibrator search')
-        disp.print_box('Calibrator search')
+        for pipeline_log in log_list:
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t6-t5))
+        print('Execution time: {:.2f} s. \n'.format(t6-t5))
+
+        stats_df['time_9'] = t6 - t5
+
+        engine.complete('pang', uvdata, stats_df)
+    else:
+        t6 = time.time()
+
+    if engine.pending('calibrator', uvdata) == True:
+        ## Selecting calibrator scan ##
+        # If there is no input calibrator
+        if input_calibrator ==  None:
+            ## Look for calibrator ##
+            ## SNR fringe search ##
+            disp.write_box(log_list, 'Calibrator search')
+            disp.print_box('Calibrator search')
         
-        #snr_fring(uvdata, refant)
-        cali.snr_fring(uvdata, refant, priority_refants)
+            #snr_fring(uvdata, refant)
+            cali.snr_fring(uvdata, refant, priority_refants)
         
-        ## Get a list of scans ordered by SNR ##
-        try:
-            scan_list = cali.snr_scan_list_v2(uvdata)
-        except help.NoScansError:
-            for pipeline_log in log_list:
-                pipeline_log.write('\nNone of the scans reached a minimum SNR of ' \
-                                + '5 and the dataset could not be automatically ' \
-                                + 'calibrated.\nThe pipeline will stop now.\n')
+            ## Get a list of scans ordered by SNR ##
+            try:
+                scan_list = cali.snr_scan_list_v2(uvdata)
+            except help.NoScansError:
+                for pipeline_log in log_list:
+                    pipeline_log.write('\nNone of the scans reached a minimum SNR of ' \
+                                    + '5 and the dataset could not be automatically ' \
+                                    + 'calibrated.\nThe pipeline will stop now.\n')
                 
-            print('\nNone of the scans reached a minimum SNR of ' \
-                + '5 and the dataset could not be automatically ' \
-                + 'calibrated.\nThe pipeline will stop now.\n')
+                print('\nNone of the scans reached a minimum SNR of ' \
+                    + '5 and the dataset could not be automatically ' \
+                    + 'calibrated.\nThe pipeline will stop now.\n')
                 
-            return()
+                return()
         
-        ## Get the calibrator scans
-        calibrator_scans, no_calib_antennas = cali.get_calib_scans(uvdata, scan_list, refant)
+            ## Get the calibrator scans
+            calibrator_scans, no_calib_antennas = cali.get_calib_scans(uvdata, scan_list, refant)
 
-        t7 = time.time()
+            t7 = time.time()
+
+            # This needs to be managed better
+            if len(calibrator_scans) == 0:
+                print("\n\nNo suitable calibrators were found, the pipeline will end now\n\n")
+                for pipeline_log in log_list:
+                    pipeline_log.write("\n\nNo suitable calibrators were found, the pipeline will end now\n\n")
+                    return()
 
-        # This needs to be managed better
-        if len(calibrator_scans) == 0:
-            print("\n\nNo suitable calibrators were found, the pipeline will end now\n\n")
             for pipeline_log in log_list:
-                pipeline_log.write("\n\nNo suitable calibrators were found, the pipeline will end now\n\n")
-                return()
+                if len(calibrator_scans) == 1:
+                    scan_i = help.ddhhmmss(calibrator_scans[0].time - calibrator_scans[0].time_interval / 2)
+                    scan_f = help.ddhhmmss(calibrator_scans[0].time + calibrator_scans[0].time_interval / 2)
+                    init_str = f"{scan_i[0]:02}/{scan_i[1]:02}:{scan_i[2]:02}:{scan_i[3]:02}"
+                    fin_str  = f"{scan_f[0]:02}/{scan_f[1]:02}:{scan_f[2]:02}:{scan_f[3]:02}"
 
-        for pipeline_log in log_list:
-            if len(calibrator_scans) == 1:
+                    antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in tcache.table(uvdata, 'AN', 1) 
+                                if a['nosta'] in calibrator_scans[0].calib_antennas[:-1]]
+                    flagged_antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in tcache.table(uvdata, 'AN', 1) 
+                                if a['nosta'] in no_calib_antennas]
+                
+                    pipeline_log.write(f"\n{'Source:':<12} {calibrator_scans[0].source_name}\t\t")
+                    pipeline_log.write(f"\n{'Time:':<12} {init_str} - {fin_str}")
+                    pipeline_log.write(f"\n{'Antennas:':<12} {antennas}\t\t")
+                    pipeline_log.write(f"\n{'Mean SNR:':<12} {calibrator_scans[0].calib_snr}\n")
+                    if len(no_calib_antennas) > 0:
+                        pipeline_log.write(f"\nThere were no fringes with SNR > 5 to antennas: {flagged_antennas},\n")
+                        pipeline_log.write(f"They will be flagged.\n\n")
+                        pipeline_log.write('FG#3 created.\n')
+                    pipeline_log.write('\nSN#1 created.\n')
+
+
+
+                else:
+                    pipeline_log.write('\nThe chosen scans for calibration are:\n')
+                    for scn in calibrator_scans:   
+                        scan_i = help.ddhhmmss(scn.time - scn.time_interval / 2)
+                        scan_f = help.ddhhmmss(scn.time + scn.time_interval / 2)
+                        init_str = f"{scan_i[0]:02}/{scan_i[1]:02}:{scan_i[2]:02}:{scan_i[3]:02}"
+                        fin_str  = f"{scan_f[0]:02}/{scan_f[1]:02}:{scan_f[2]:02}:{scan_f[3]:02}"
+
+                        antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in tcache.table(uvdata, 'AN', 1) 
+                                    if a['nosta'] in scn.calib_antennas[:-1]]
+                        flagged_antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in tcache.table(uvdata, 'AN', 1) 
+                                    if a['nosta'] in no_calib_antennas]
+                    
+                        pipeline_log.write(f"\n{'Source:':<12} {scn.source_name}\t\t")
+                        pipeline_log.write(f"\n{'Time:':<12} {init_str} - {fin_str}")
+                        pipeline_log.write(f"\n{'Antennas:':<12} {antennas}\t\t")
+                        pipeline_log.write(f"\n{'Mean SNR:':<12} {scn.calib_snr}\n")
+                    if len(no_calib_antennas) > 0:
+                        pipeline_log.write(f"\nThere were no fringes with SNR > 5 to antennas: {flagged_antennas},\n")
+                        pipeline_log.write(f"They will be flagged.\n\n")
+                        pipeline_log.write('FG#3 created.\n')
+                    pipeline_log.write('\nSN#1 created.\n')
+
+                pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t7-t6))
+
+   
+            if len(calibrator_scans) == 1:          
+                print('\nThe chosen scan for calibration is:\n')
                 scan_i = help.ddhhmmss(calibrator_scans[0].time - calibrator_scans[0].time_interval / 2)
                 scan_f = help.ddhhmmss(calibrator_scans[0].time + calibrator_scans[0].time_interval / 2)
                 init_str = f"{scan_i[0]:02}/{scan_i[1]:02}:{scan_i[2]:02}:{scan_i[3]:02}"
                 fin_str  = f"{scan_f[0]:02}/{scan_f[1]:02}:{scan_f[2]:02}:{scan_f[3]:02}"
 
-                antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in uvdata.table('AN', 1) 
+                antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in tcache.table(uvdata, 'AN', 1) 
                             if a['nosta'] in calibrator_scans[0].calib_antennas[:-1]]
-                flagged_antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in uvdata.table('AN', 1) 
+                flagged_antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in tcache.table(uvdata, 'AN', 1) 
                             if a['nosta'] in no_calib_antennas]
-                
-                pipeline_log.write(f"\n{'Source:':<12} {calibrator_scans[0].source_name}\t\t")
-                pipeline_log.write(f"\n{'Time:':<12} {init_str} - {fin_str}")
-                pipeline_log.write(f"\n{'Antennas:':<12} {antennas}\t\t")
-                pipeline_log.write(f"\n{'Mean SNR:':<12} {calibrator_scans[0].calib_snr}\n")
+            
+                print(f"\n{'Source:':<12} {calibrator_scans[0].source_name}")
+                print(f"\n{'Time:':<12} {init_str} - {fin_str}")
+                print(f"\n{'Antennas:':<12} {antennas}")
+                print(f"\n{'Mean SNR:':<12} {calibrator_scans[0].calib_snr}\n")
                 if len(no_calib_antennas) > 0:
-                    pipeline_log.write(f"\nThere were no fringes with SNR > 5 to antennas: {flagged_antennas},\n")
-                    pipeline_log.write(f"They will be flagged.\n\n")
-                    pipeline_log.write('FG#3 created.\n')
-                pipeline_log.write('\nSN#1 created.\n')
-
-
+                    print(f"\nThere were no fringes with SNR > 5 to antennas: {flagged_antennas},\n")
+                    print(f"They will be flagged.\n\n")
+                    print('FG#3 created.\n')
+                print('\nSN#1 created.\n')
 
             else:
-                pipeline_log.write('\nThe chosen scans for calibration are:\n')
-                for scn in calibrator_scans:   
+                print('\nThe chosen scans for calibration are:\n')
+                for scn in calibrator_scans:
                     scan_i = help.ddhhmmss(scn.time - scn.time_interval / 2)
                     scan_f = help.ddhhmmss(scn.time + scn.time_interval / 2)
                     init_str = f"{scan_i[0]:02}/{scan_i[1]:02}:{scan_i[2]:02}:{scan_i[3]:02}"
                     fin_str  = f"{scan_f[0]:02}/{scan_f[1]:02}:{scan_f[2]:02}:{scan_f[3]:02}"
 
-                    antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in uvdata.table('AN', 1) 
+                    antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in tcache.table(uvdata, 'AN', 1) 
                                 if a['nosta'] in scn.calib_antennas[:-1]]
-                    flagged_antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in uvdata.table('AN', 1) 
+                    flagged_antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in tcache.table(uvdata, 'AN', 1) 
                                 if a['nosta'] in no_calib_antennas]
-                    
-                    pipeline_log.write(f"\n{'Source:':<12} {scn.source_name}\t\t")
-                    pipeline_log.write(f"\n{'Time:':<12} {init_str} - {fin_str}")
-                    pipeline_log.write(f"\n{'Antennas:':<12} {antennas}\t\t")
-                    pipeline_log.write(f"\n{'Mean SNR:':<12} {scn.calib_snr}\n")
-                if len(no_calib_antennas) > 0:
-                    pipeline_log.write(f"\nThere were no fringes with SNR > 5 to antennas: {flagged_antennas},\n")
-                    pipeline_log.write(f"They will be flagged.\n\n")
-                    pipeline_log.write('FG#3 created.\n')
-                pipeline_log.write('\nSN#1 created.\n')
+                
+                    print(f"\n{'Source:':<12} {scn.source_name}")
+                    print(f"\n{'Time:':<12} {init_str} - {fin_str}")
+                    print(f"\n{'Antennas:':<12} {antennas}")
+                    print(f"\n{'Mean SNR:':<12} {scn.calib_snr}\n")
 
-            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t7-t6))
+                if len(no_calib_antennas) > 0:
+                    print(f"\nThere were no fringes with SNR > 5 to antennas: {flagged_antennas},\n")
+                    print(f"They will be flagged.\n\n")
+                    print('FG#3 created.\n')
+                print('\nSN#1 created.\n')
 
-   
-        if len(calibrator_scans) == 1:          
-            print('\nThe chosen scan for calibration is:\n')
-            scan_i = help.ddhhmmss(calibrator_scans[0].time - calibrator_scans[0].time_interval / 2)
-            scan_f = help.ddhhmmss(calibrator_scans[0].time + calibrator_scans[0].time_interval / 2)
-            init_str = f"{scan_i[0]:02}/{scan_i[1]:02}:{scan_i[2]:02}:{scan_i[3]:02}"
-            fin_str  = f"{scan_f[0]:02}/{scan_f[1]:02}:{scan_f[2]:02}:{scan_f[3]:02}"
-
-            antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in uvdata.table('AN', 1) 
-                        if a['nosta'] in calibrator_scans[0].calib_antennas[:-1]]
-            flagged_antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in uvdata.table('AN', 1) 
-                        if a['nosta'] in no_calib_antennas]
-            
-            print(f"\n{'Source:':<12} {calibrator_scans[0].source_name}")
-            print(f"\n{'Time:':<12} {init_str} - {fin_str}")
-            print(f"\n{'Antennas:':<12} {antennas}")
-            print(f"\n{'Mean SNR:':<12} {calibrator_scans[0].calib_snr}\n")
+            print('Execution time: {:.2f} s. \n'.format(t7-t6))
+            try:
+                scan_dict = \
+                    {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), [sum(inner) / len(inner) for inner in scan.snr], scan.antennas) for scan in scan_list}
+                calibscans_dict = \
+                    {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), [sum(inner) / len(inner) for inner in scan.snr], scan.calib_antennas) for scan in calibrator_scans}
+            except TypeError: # Single IF
+                scan_dict = \
+                    {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), scan.snr, scan.antennas) for scan in scan_list}
+                calibscans_dict = \
+                    {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), scan.snr, scan.calib_antennas) for scan in calibrator_scans}
+
+            stats_df['SNR_scan_list'] = json.dumps(scan_dict)
+            stats_df['selected_scans'] = json.dumps(calibscans_dict)
             if len(no_calib_antennas) > 0:
-                print(f"\nThere were no fringes with SNR > 5 to antennas: {flagged_antennas},\n")
-                print(f"They will be flagged.\n\n")
-                print('FG#3 created.\n')
-            print('\nSN#1 created.\n')
-
-        else:
-            print('\nThe chosen scans for calibration are:\n')
-            for scn in calibrator_scans:
-                scan_i = help.ddhhmmss(scn.time - scn.time_interval / 2)
-                scan_f = help.ddhhmmss(scn.time + scn.time_interval / 2)
-                init_str = f"{scan_i[0]:02}/{scan_i[1]:02}:{scan_i[2]:02}:{scan_i[3]:02}"
-                fin_str  = f"{scan_f[0]:02}/{scan_f[1]:02}:{scan_f[2]:02}:{scan_f[3]:02}"
+                stats_df['antennas_no_calib'] = str(no_calib_antennas)
+            else:
+                stats_df['antennas_no_calib'] = False
+            stats_df['calibrator_search'] = 'AUTO'
+            stats_df['time_10'] = t7 - t6
+        
+        # If there is an input calibrator
+        if input_calibrator != None:
+            ## Look for calibrator ##
+            ## SNR fringe search ##
+            disp.write_box(log_list, 'Calibrator search')
+            disp.print_box('Calibrator search')
+        
+            #snr_fring(uvdata, refant)
+            cali.snr_fring(uvdata, refant, priority_refants)
+        
+            ## Get a list of scans ordered by SNR ##
+        
+            scan_list = cali.snr_scan_list_v2(uvdata)
+        
+            ## Get the scans for the input calibrator ## 
+            calibrator_scans = [x for x in scan_list if x.source_name == input_calibrator]
+            ## Order by SNR
+            calibrator_scans.sort(key=lambda x: np.nanmedian(x.snr),\
+                       reverse=True)
+        
+            calibrator_scans = [calibrator_scans[0]]
+            t7 = time.time()
 
-                antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in uvdata.table('AN', 1) 
-                            if a['nosta'] in scn.calib_antennas[:-1]]
-                flagged_antennas = [str(a['nosta']) +  '-' + a['anname'].strip() for a in uvdata.table('AN', 1) 
-                            if a['nosta'] in no_calib_antennas]
-                
-                print(f"\n{'Source:':<12} {scn.source_name}")
-                print(f"\n{'Time:':<12} {init_str} - {fin_str}")
-                print(f"\n{'Antennas:':<12} {antennas}")
-                print(f"\n{'Mean SNR:':<12} {scn.calib_snr}\n")
+            for pipeline_log in log_list:
+                pipeline_log.write('\nThe chosen scan for calibration is:\n')
+                pipeline_log.write(str(calibrator_scans[0].source_name) + '\t\tSNR: ' \
+                                    + '{:.2f}.'.format(np.nanmedian(calibrator_scans[0].snr)))
+                pipeline_log.write('\nSN#1 created.\n')
+                pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t7-t6))
 
-            if len(no_calib_antennas) > 0:
-                print(f"\nThere were no fringes with SNR > 5 to antennas: {flagged_antennas},\n")
-                print(f"They will be flagged.\n\n")
-                print('FG#3 created.\n')
+            print('\nThe chosen scan for calibration is:\n')
+            print(str(calibrator_scans[0].source_name) + '\tSNR: ' \
+                            + '{:.2f}.'.format(np.nanmedian(calibrator_scans[0].snr)))
             print('\nSN#1 created.\n')
+            print('Execution time: {:.2f} s. \n'.format(t7-t6))
 
-        print('Execution time: {:.2f} s. \n'.format(t7-t6))
-        try:
             scan_dict = \
-                {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), [sum(inner) / len(inner) for inner in scan.snr], scan.antennas) for scan in scan_list}
+                {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), np.nanmedian(scan.snr), scan.antennas) for scan in scan_list}
             calibscans_dict = \
-                {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), [sum(inner) / len(inner) for inner in scan.snr], scan.calib_antennas) for scan in calibrator_scans}
-        except TypeError: # Single IF
-            scan_dict = \
-                {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), scan.snr, scan.antennas) for scan in scan_list}
-            calibscans_dict = \
-                {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), scan.snr, scan.calib_antennas) for scan in calibrator_scans}
+                {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), np.nanmedian(scan.snr), scan.calib_antennas) for scan in calibrator_scans}
 
-        stats_df['SNR_scan_list'] = json.dumps(scan_dict)
-        stats_df['selected_scans'] = json.dumps(calibscans_dict)
-        if len(no_calib_antennas) > 0:
-            stats_df['antennas_no_calib'] = str(no_calib_antennas)
-        else:
-            stats_df['antennas_no_calib'] = False
-        stats_df['calibrator_search'] = 'AUTO'
-        stats_df['time_10'] = t7 - t6
-        
-    # If there is an input calibrator
-    if input_calibrator != None:
-        ## Look for calibrator ##
-        ## SNR fringe search ##
-        disp.write_box(log_list, 'Calibrator search')
-        disp.print_box('Calibrator search')
-        
-        #snr_fring(uvdata, refant)
-        cali.snr_fring(uvdata, refant, priority_refants)
-        
-        ## Get a list of scans ordered by SNR ##
-        
-        scan_list = cali.snr_scan_list_v2(uvdata)
-        
-        ## Get the scans for the input calibrator ## 
-        calibrator_scans = [x for x in scan_list if x.source_name == input_calibrator]
-        ## Order by SNR
-        calibrator_scans.sort(key=lambda x: np.nanmedian(x.snr),\
-                   reverse=True)
-        
-        calibrator_scans = [calibrator_scans[0]]
+            stats_df['SNR_scan_list'] = json.dumps(scan_dict)
+            stats_df['selected_scans'] = json.dumps(calibscans_dict)
+            if len(no_calib_antennas) > 0:
+                stats_df['antennas_no_calib'] = str(no_calib_antennas)
+            else:
+                stats_df['antennas_no_calib'] = False
+            stats_df['calibrator_search'] = 'MANUAL'
+            stats_df['time_10'] = t7 - t6
+
+        # Counting again the visibilities with the flags
+        vis_stats.count(uvdata, target_list, ['CL4_vis_FG3', 'CL4_FG3_ant_vis'],
+                        'CL4 visibilities of {} after flagging',
+                        cl_table = 4, flagver = 3, split = interactive)
+
+        engine.complete('calibrator', uvdata, stats_df, scan_list = scan_list,
+                        calibrator_scans = calibrator_scans,
+                        no_calib_antennas = no_calib_antennas)
+    else:
+        scan_list = jrnl.restore_scans(journal, 'scan_list')
+        calibrator_scans = jrnl.restore_scans(journal, 'calibrator_scans')
+        no_calib_antennas = journal['state']['no_calib_antennas']
         t7 = time.time()
 
-        for pipeline_log in log_list:
-            pipeline_log.write('\nThe chosen scan for calibration is:\n')
-            pipeline_log.write(str(calibrator_scans[0].source_name) + '\t\tSNR: ' \
-                                + '{:.2f}.'.format(np.nanmedian(calibrator_scans[0].snr)))
-            pipeline_log.write('\nSN#1 created.\n')
-            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t7-t6))
-
-        print('\nThe chosen scan for calibration is:\n')
-        print(str(calibrator_scans[0].source_name) + '\tSNR: ' \
-                        + '{:.2f}.'.format(np.nanmedian(calibrator_scans[0].snr)))
-        print('\nSN#1 created.\n')
-        print('Execution time: {:.2f} s. \n'.format(t7-t6))
-
-        scan_dict = \
-            {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), np.nanmedian(scan.snr), scan.antennas) for scan in scan_list}
-        calibscans_dict = \
-            {scan.time: (scan.source_name, inst.ddhhmmss(scan.time).tolist(), np.nanmedian(scan.snr), scan.calib_antennas) for scan in calibrator_scans}
-
-        stats_df['SNR_scan_list'] = json.dumps(scan_dict)
-        stats_df['selected_scans'] = json.dumps(calibscans_dict)
-        if len(no_calib_antennas) > 0:
-            stats_df['antennas_no_calib'] = str(no_calib_antennas)
-        else:
-            stats_df['antennas_no_calib'] = False
-        stats_df['calibrator_search'] = 'MANUAL'
-        stats_df['time_10'] = t7 - t6
-
-    # Counting again the visibilities with the flags
-    expo.data_split(uvdata, target_list, cl_table=4, flagver=3)
-    for i, target in enumerate(target_list):
-        cl4_fg3 = AIPSUVData(target, 'PLOT', uvdata.disk, 4)
-        vis_cl4_fg3, vis_ant_cl4_fg3 = expo.vis_count_v2(cl4_fg3)
-        stats_df.at[i, 'CL4_vis_FG3'] = int(vis_cl4_fg3)
-        stats_df.at[i, 'CL4_FG3_ant_vis'] = json.dumps(vis_ant_cl4_fg3)
-        print(f"CL4 visibilities of {target} after flagging: {vis_cl4_fg3}\n")
-        log_list[i].write(f"\nCL4 visibilities of {target} after flagging: {vis_cl4_fg3}\n")
-
-    ## Digital sampling correction ##
-    disp.write_box(log_list, 'Digital sampling corrections')
-    disp.print_box('Digital sampling corrections')
+    if engine.pending('accor', uvdata) == True:
+        ## Digital sampling correction ##
+        disp.write_box(log_list, 'Digital sampling corrections')
+        disp.print_box('Digital sampling corrections')
     
-    accr.sampling_correct(uvdata)
+        accr.sampling_correct(uvdata)
 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nDigital sampling corrections applied!\nSN#2 and CL#5'\
-                        + ' created.\n')
-    print('\nDigital sampling corrections applied!\nSN#2 and CL#5 created.\n')
+        for pipeline_log in log_list:
+            pipeline_log.write('\nDigital sampling corrections applied!\nSN#2 and CL#5'\
+                            + ' created.\n')
+        print('\nDigital sampling corrections applied!\nSN#2 and CL#5 created.\n')
 
-    # Counting visibilities
-    expo.data_split(uvdata, target_list, cl_table=5, flagver=3)
-    for i, target in enumerate(target_list):
-        cl5 = AIPSUVData(target, 'PLOT', uvdata.disk, 5)
-        vis_cl5, vis_ant_cl5 = expo.vis_count_v2(cl5)
-        stats_df.at[i, 'CL5_vis'] = int(vis_cl5)
-        stats_df.at[i, 'CL5_ant_vis'] = json.dumps(vis_ant_cl5)
-        print(f"CL5 visibilities of {target}: {vis_cl5}\n")
-        log_list[i].write(f"\nCL5 visibilities of {target}: {vis_cl5}\n")
+        # Counting visibilities
+        vis_stats.count(uvdata, target_list, ['CL5_vis', 'CL5_ant_vis'],
+                        'CL5 visibilities of {}',
+                        cl_table = 5, flagver = 3, split = interactive)
 
-    t8 = time.time()
+        t8 = time.time()
 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t8-t7))
-    print('Execution time: {:.2f} s. \n'.format(t8-t7))
+        for pipeline_log in log_list:
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t8-t7))
+        print('Execution time: {:.2f} s. \n'.format(t8-t7))
 
-    stats_df['time_11'] = t8 - t7
+        stats_df['time_11'] = t8 - t7
 
-    ## Instrumental phase correction ##
-    disp.write_box(log_list, 'Instrumental phase corrections')
-    disp.print_box('Instrumental phase corrections')
+        engine.complete('accor', uvdata, stats_df)
+    else:
+        t8 = time.time()
+
+    if engine.pending('instrumental', uvdata) == True:
+        ## Instrumental phase correction ##
+        disp.write_box(log_list, 'Instrumental phase corrections')
+        disp.print_box('Instrumental phase corrections')
     
-    inst.manual_phasecal_multi(uvdata, refant, priority_refants, calibrator_scans)
+        inst.manual_phasecal_multi(uvdata, refant, priority_refants, calibrator_scans)
     
-    for pipeline_log in log_list:
-        pipeline_log.write('\nInstrumental phase correction applied using'\
-                        + ' the calibrator(s).\nSN#3 and CL#6 created.\n')
-    print('\nInstrumental phase correction applied using the calibrator(s).'\
-          + '\nSN#3 and CL#6 created.\n')
+        for pipeline_log in log_list:
+            pipeline_log.write('\nInstrumental phase correction applied using'\
+                            + ' the calibrator(s).\nSN#3 and CL#6 created.\n')
+        print('\nInstrumental phase correction applied using the calibrator(s).'\
+              + '\nSN#3 and CL#6 created.\n')
     
-    # Counting visibilities
-    expo.data_split(uvdata, target_list, cl_table=6, flagver=3)
-    for i, target in enumerate(target_list):
-        cl6 = AIPSUVData(target, 'PLOT', uvdata.disk, 6)
-        vis_cl6, vis_ant_cl6 = expo.vis_count_v2(cl6)
-        stats_df.at[i, 'CL6_vis'] = int(vis_cl6)
-        stats_df.at[i, 'CL6_ant_vis'] = json.dumps(vis_ant_cl6)
-        print(f"CL6 visibilities of {target}: {vis_cl6}\n")
-        log_list[i].write(f"\nCL6 visibilities of {target}: {vis_cl6}\n")
-
-    t9 = time.time()
+        # Counting visibilities
+        vis_stats.count(uvdata, target_list, ['CL6_vis', 'CL6_ant_vis'],
+                        'CL6 visibilities of {}',
+                        cl_table = 6, flagver = 3, split = interactive)
+
+        t9 = time.time()
     
-    for pipeline_log in log_list:
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t9-t8))
-    print('Execution time: {:.2f} s. \n'.format(t9-t8))
+        for pipeline_log in log_list:
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t9-t8))
+        print('Execution time: {:.2f} s. \n'.format(t9-t8))
 
 
-    stats_df['time_12'] = t9 - t8
+        stats_df['time_12'] = t9 - t8
 
-    ## Bandpass correction ##
-    disp.write_box(log_list, 'Bandpass correction')
-    disp.print_box('Bandpass correction')
+        engine.complete('instrumental', uvdata, stats_df)
+    else:
+        t9 = time.time()
+
+    if engine.pending('bandpass', uvdata) == True:
+        ## Bandpass correction ##
+        disp.write_box(log_list, 'Bandpass correction')
+        disp.print_box('Bandpass correction')
     
-    bpas.bp_correction(uvdata, refant, calibrator_scans)
+        bpas.bp_correction(uvdata, refant, calibrator_scans)
 
-    t10 = time.time()
+        t10 = time.time()
 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nBandpass correction applied!\nBP#1 created.\n')
-    print('\nBandpass correction applied!\nBP#1 created.\n')
+        for pipeline_log in log_list:
+            pipeline_log.write('\nBandpass correction applied!\nBP#1 created.\n')
+        print('\nBandpass correction applied!\nBP#1 created.\n')
 
-    # Counting visibilities
-    expo.data_split(uvdata, target_list, cl_table=6, flagver=3, bpass = True, \
-                    keep = True)
-    for i, target in enumerate(target_list):
-        cl6_bp1 = AIPSUVData(target, 'PLOTBP', uvdata.disk, 6)
-        vis_cl6_bp1, vis_ant_cl6_bp1 = expo.vis_count_v2(cl6_bp1)
-        stats_df.at[i, 'CL6_BP1_vis'] = int(vis_cl6_bp1)
-        stats_df.at[i, 'CL6_BP1_ant_vis'] = json.dumps(vis_ant_cl6_bp1)
-        print(f"CL6 + BP1 visibilities of {target}: {vis_cl6_bp1}\n")
-        log_list[i].write(f"\nCL6 + BP1 visibilities of {target}: {vis_cl6_bp1}\n")
+        # Counting visibilities
+        vis_stats.count(uvdata, target_list, ['CL6_BP1_vis', 'CL6_BP1_ant_vis'],
+                        'CL6 + BP1 visibilities of {}',
+                        cl_table = 6, flagver = 3, bpass = True, split = False,
+                        keep = True)
 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t10-t9))
-    print('Execution time: {:.2f} s. \n'.format(t10-t9))
+        for pipeline_log in log_list:
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t10-t9))
+        print('Execution time: {:.2f} s. \n'.format(t10-t9))
 
-    stats_df['time_13'] = t10 - t9
+        stats_df['time_13'] = t10 - t9
 
+        engine.complete('bandpass', uvdata, stats_df)
+    else:
+        t10 = time.time()
 
-    ## Correcting autocorrelations ##
-    disp.write_box(log_list, 'Correcting autocorrelations')
-    disp.print_box('Correcting autocorrelations')
 
-    accr.autocorr_correct(uvdata)
+    if engine.pending('autocorr', uvdata) == True:
+        ## Correcting autocorrelations ##
+        disp.write_box(log_list, 'Correcting autocorrelations')
+        disp.print_box('Correcting autocorrelations')
 
+        accr.autocorr_correct(uvdata)
 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nAutocorrelations have been normalized!\nSN#4 and CL#7'\
-                        + ' created.\n')
-    print('\nAutocorrelations have been normalized!\nSN#4 and CL#7 created.\n')
 
-    # Counting visibilities
-    expo.data_split(uvdata, target_list, cl_table=7, flagver=3, bpass = True)
-    for i, target in enumerate(target_list):
-        cl7_bp1 = AIPSUVData(target, 'PLOTBP', uvdata.disk, 7)
-        vis_cl7_bp1, vis_ant_cl7_bp1 = expo.vis_count_v2(cl7_bp1)
-        stats_df.at[i, 'CL7_BP1_vis'] = int(vis_cl7_bp1)
-        stats_df.at[i, 'CL7_BP1_ant_vis'] = json.dumps(vis_ant_cl7_bp1)
-        print(f"CL7 + BP1 visibilities of {target}: {vis_cl7_bp1}\n")
-        log_list[i].write(f"\nCL7 + BP1 visibilities of {target}: {vis_cl7_bp1}\n")
-
-    t11 = time.time()
-    for pipeline_log in log_list:
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t11-t10))
-    print('Execution time: {:.2f} s. \n'.format(t11-t10))
+        for pipeline_log in log_list:
+            pipeline_log.write('\nAutocorrelations have been normalized!\nSN#4 and CL#7'\
+                            + ' created.\n')
+        print('\nAutocorrelations have been normalized!\nSN#4 and CL#7 created.\n')
 
-    stats_df['time_14'] = t11 - t10
+        # Counting visibilities
+        vis_stats.count(uvdata, target_list, ['CL7_BP1_vis', 'CL7_BP1_ant_vis'],
+                        'CL7 + BP1 visibilities of {}',
+                        cl_table = 7, flagver = 3, bpass = True, split = interactive)
+
+        t11 = time.time()
+        for pipeline_log in log_list:
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t11-t10))
+        print('Execution time: {:.2f} s. \n'.format(t11-t10))
 
+        stats_df['time_14'] = t11 - t10
 
-    ## Amplitude calibration ##
-    disp.write_box(log_list, 'Amplitude calibration')
-    disp.print_box('Amplitude calibration')
+        engine.complete('autocorr', uvdata, stats_df)
+    else:
+        t11 = time.time()
+
+
+    if engine.pending('ampcal', uvdata) == True:
+        ## Amplitude calibration ##
+        disp.write_box(log_list, 'Amplitude calibration')
+        disp.print_box('Amplitude calibration')
     
-    ampc.amp_cal(uvdata)
+        ampc.amp_cal(uvdata)
 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nAmplitude calibration applied!\nSN#5 and CL#8'\
-                        + ' created.\n')
-    print('\nAmplitude calibration applied!\nSN#5 and CL#8 created.\n')
+        for pipeline_log in log_list:
+            pipeline_log.write('\nAmplitude calibration applied!\nSN#5 and CL#8'\
+                            + ' created.\n')
+        print('\nAmplitude calibration applied!\nSN#5 and CL#8 created.\n')
 
-    # Counting visibilities
-    expo.data_split(uvdata, target_list, cl_table=8, flagver=3, bpass = True)
-    for i, target in enumerate(target_list):
-        cl8_bp1 = AIPSUVData(target, 'PLOTBP', uvdata.disk, 8)
-        vis_cl8_bp1, vis_ant_cl8_bp1 = expo.vis_count_v2(cl8_bp1)
-        stats_df.at[i, 'CL8_BP1_vis'] = int(vis_cl8_bp1)
-        stats_df.at[i, 'CL8_BP1_ant_vis'] = json.dumps(vis_ant_cl8_bp1)
-        print(f"CL8 + BP1 visibilities of {target}: {vis_cl8_bp1}\n")
-        log_list[i].write(f"\nCL8 + BP1 visibilities of {target}: {vis_cl8_bp1}\n")
+        # Counting visibilities
+        vis_stats.count(uvdata, target_list, ['CL8_BP1_vis', 'CL8_BP1_ant_vis'],
+                        'CL8 + BP1 visibilities of {}',
+                        cl_table = 8, flagver = 3, bpass = True, split = interactive)
 
-    t12 = time.time()
+        t12 = time.time()
 
-    for pipeline_log in log_list:
-        pipeline_log.write('\nExecution time: {:.2f} s.\n'.format(t12-t11))
-    print('Execution time: {:.2f} s.\n'.format(t12-t11))
+        for pipeline_log in log_list:
+            pipeline_log.write('\nExecution time: {:.2f} s.\n'.format(t12-t11))
+        print('Execution time: {:.2f} s.\n'.format(t12-t11))
+
+        stats_df['time_15'] = t12 - t11
 
-    stats_df['time_15'] = t12 - t11
+        engine.complete('ampcal', uvdata, stats_df)
+    else:
+        t12 = time.time()
     
     ## Get optimal solution interval for each target
     disp.write_box(log_list, 'Target fringe fit')
@@ -1319,447 +1485,477 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
     if phase_ref == None:
         phase_ref = [None] * len(target_list)
     
-    solint_list = []
-    for i, target in enumerate(target_list):
-        if phase_ref[i] == None:
-            target_scans = [x for x in scan_list if x.source_name == target]
+    if engine.pending('solint', uvdata) == True:
+        solint_list = []
+        for i, target in enumerate(target_list):
+            if phase_ref[i] == None:
+                target_scans = [x for x in scan_list if x.source_name == target]
 
-            if default_solint == None:
+                if default_solint == None:
 
-                solint, solint_dict = opti.optimize_solint_mm(uvdata, target, \
-                                                        target_scans, refant, 
-                                                        min_solint = min_solint,
-                                                        max_solint = max_solint)
+                    solint, solint_dict = opti.optimize_solint_mm(uvdata, target, \
+                                                            target_scans, refant, 
+                                                            min_solint = min_solint,
+                                                            max_solint = max_solint)
                 
-                solint_list.append(solint) 
+                    solint_list.append(solint) 
+
+                    if solint_list[i] != 1:
+                        log_list[i].write('\nThe optimal solution interval for the target is '\
+                                    + str(solint_list[i]) + ' minutes. \n')
+                        print('\nThe optimal solution interval for ' + target + ' is ' \
+                            + str(solint_list[i]) + ' minutes. \n')
+                    else:
+                        log_list[i].write('\nThe optimal solution interval for the target is '\
+                                    + str(solint_list[i]) + ' minute. \n')
+                        print('\nThe optimal solution interval for ' + target + ' is ' \
+                            + str(solint_list[i]) + ' minute. \n')    
 
-                if solint_list[i] != 1:
-                    log_list[i].write('\nThe optimal solution interval for the target is '\
-                                + str(solint_list[i]) + ' minutes. \n')
-                    print('\nThe optimal solution interval for ' + target + ' is ' \
-                        + str(solint_list[i]) + ' minutes. \n')
                 else:
-                    log_list[i].write('\nThe optimal solution interval for the target is '\
-                                + str(solint_list[i]) + ' minute. \n')
-                    print('\nThe optimal solution interval for ' + target + ' is ' \
-                        + str(solint_list[i]) + ' minute. \n')    
+                    solint = default_solint
+                    solint_list.append(solint) 
+                    solint_dict = {default_solint: 'MANUAL'}
+                    log_list[i].write('\nThe optimal solution interval has been manually selected as '\
+                                + str(solint_list[i]) + ' minutes. \n')
+                    print('\nThe optimal solution interval has been manually selected as ' \
+                        + str(solint_list[i]) + ' minute. \n')     
 
+                stats_df.at[i, 'solint'] = solint_list[i]
+                stats_df.at[i, 'solint_dict'] = json.dumps(solint_dict)        
             else:
-                solint = default_solint
-                solint_list.append(solint) 
-                solint_dict = {default_solint: 'MANUAL'}
-                log_list[i].write('\nThe optimal solution interval has been manually selected as '\
-                            + str(solint_list[i]) + ' minutes. \n')
-                print('\nThe optimal solution interval has been manually selected as ' \
-                    + str(solint_list[i]) + ' minute. \n')     
-
-            stats_df.at[i, 'solint'] = solint_list[i]
-            stats_df.at[i, 'solint_dict'] = json.dumps(solint_dict)        
-        else:
-            phase_ref_scans = [x for x in scan_list if x.source_name == phase_ref[i]]
+                phase_ref_scans = [x for x in scan_list if x.source_name == phase_ref[i]]
 
-            if default_solint == None:
+                if default_solint == None:
 
-                solint, solint_dict = opti.optimize_solint_mm(uvdata, phase_ref[i], \
-                                                        phase_ref_scans, refant, 
-                                                        min_solint = min_solint,
-                                                        max_solint = max_solint)
+                    solint, solint_dict = opti.optimize_solint_mm(uvdata, phase_ref[i], \
+                                                            phase_ref_scans, refant, 
+                                                            min_solint = min_solint,
+                                                            max_solint = max_solint)
                 
-                solint_list.append(solint)
-
-                if solint_list[i] != 1:
-                    log_list[i].write('\nThe optimal solution interval for the phase ' \
-                                    + 'calibrator ' + phase_ref[i] + ' is ' + str(solint_list[i]) + ' minutes. \n')
-                    print('\nThe optimal solution interval for the phase calibrator ' + phase_ref[i] + ' is ' \
-                        + str(solint_list[i]) + ' minutes. \n')
-                else:
-                    log_list[i].write('\nThe optimal solution interval for the phase ' \
-                                    + 'calibrator ' + phase_ref[i] + ' is ' + str(solint_list[i]) + ' minute. \n')
-                    print('\nThe optimal solution interval for the phase calibrator ' + phase_ref[i] + ' is ' \
-                        + str(solint_list[i]) + ' minute. \n') 
+                    solint_list.append(solint)
 
-            else:
-                solint = default_solint
-                solint_list.append(solint) 
-                solint_dict = {default_solint: 'MANUAL'}
-                log_list[i].write('\nThe optimal solution interval has been manually selected as '\
+                    if solint_list[i] != 1:
+                        log_list[i].write('\nThe optimal solution interval for the phase ' \
+                                        + 'calibrator ' + phase_ref[i] + ' is ' + str(solint_list[i]) + ' minutes. \n')
+                        print('\nThe optimal solution interval for the phase calibrator ' + phase_ref[i] + ' is ' \
                             + str(solint_list[i]) + ' minutes. \n')
-                print('\nThe optimal solution interval has been manually selected as ' \
-                    + str(solint_list[i]) + ' minute. \n')  
+                    else:
+                        log_list[i].write('\nThe optimal solution interval for the phase ' \
+                                        + 'calibrator ' + phase_ref[i] + ' is ' + str(solint_list[i]) + ' minute. \n')
+                        print('\nThe optimal solution interval for the phase calibrator ' + phase_ref[i] + ' is ' \
+                            + str(solint_list[i]) + ' minute. \n') 
 
-            stats_df.at[i, 'solint'] = solint_list[i]
-            stats_df.at[i, 'solint_dict'] = json.dumps(solint_dict)   
+                else:
+                    solint = default_solint
+                    solint_list.append(solint) 
+                    solint_dict = {default_solint: 'MANUAL'}
+                    log_list[i].write('\nThe optimal solution interval has been manually selected as '\
+                                + str(solint_list[i]) + ' minutes. \n')
+                    print('\nThe optimal solution interval has been manually selected as ' \
+                        + str(solint_list[i]) + ' minute. \n')  
+
+                stats_df.at[i, 'solint'] = solint_list[i]
+                stats_df.at[i, 'solint_dict'] = json.dumps(solint_dict)   
                           
-    t13 = time.time()
+        t13 = time.time()
     
-    for pipeline_log in log_list:    
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t13-t12)) 
-    print('Execution time: {:.2f} s. \n'.format(t13-t12))
+        for pipeline_log in log_list:    
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t13-t12)) 
+        print('Execution time: {:.2f} s. \n'.format(t13-t12))
 
-    stats_df['time_16'] = t13-t12
+        stats_df['time_16'] = t13-t12
+
+        engine.complete('solint', uvdata, stats_df, solint_list = solint_list)
+    else:
+        solint_list = journal['state']['solint_list']
+        t13 = time.time()
 
     ## Fringe fit of the target ##
 
-    ignore_list = []
+    if engine.pending('fringe', uvdata) == True:
+        ignore_list = []
     
-    # Separate in no phaseref and phaseref targets
+        # Separate in no phaseref and phaseref targets
     
-    ff_target_list = []
-    for i, target in enumerate(target_list):
-        t = help.FFTarget()
-        t.name = target
-        t.phaseref = phase_ref[i]
-        t.solint = solint_list[i]
-        t.log = log_list[i]
-        ff_target_list.append(t)
+        ff_target_list = []
+        for i, target in enumerate(target_list):
+            t = help.FFTarget()
+            t.name = target
+            t.phaseref = phase_ref[i]
+            t.solint = solint_list[i]
+            t.log = log_list[i]
+            ff_target_list.append(t)
     
-    no_pr_target_list = [t for t in ff_target_list if t.phaseref == None]
-    pr_target_list = [t for t in ff_target_list if t.phaseref != None]
+        no_pr_target_list = [t for t in ff_target_list if t.phaseref == None]
+        pr_target_list = [t for t in ff_target_list if t.phaseref != None]
    
-    ## NO PHASEREF FRINGE FIT ##
-    for i, target in enumerate(no_pr_target_list): 
+        ## NO PHASEREF FRINGE FIT ##
+        for i, target in enumerate(no_pr_target_list): 
 
-        r =  stats_df.index[stats_df['target'] == target.name][0]
+            r =  stats_df.index[stats_df['target'] == target.name][0]
 
-        ratio = 0
-        ratio_single = 0
-        stats_df.at[r, 'single_ff'] = False
-        stats_df.at[r,'phaseref_ff'] = False  
+            ratio = 0
+            ratio_single = 0
+            if_ratios = False
+            if_ratios_s = False
+            stats_df.at[r, 'single_ff'] = False
+            stats_df.at[r,'phaseref_ff'] = False  
           
-        try:
-            tfring_params = frng.target_fring_fit(uvdata, refant, priority_refants,
-                                                  target.name, version = 6+i, 
-                                                  snr_cutoff = fringefit_snr,
-                                                  solint=float(target.solint))
+            try:
+                tfring_params = frng.target_fring_fit(uvdata, refant, priority_refants,
+                                                      target.name, version = 6+i, 
+                                                      snr_cutoff = fringefit_snr,
+                                                      solint=float(target.solint))
         
-            target.log.write('\nFringe search performed on ' + target.name + '. Windows '\
-                              + 'for the search were ' + tfring_params[1] \
-                              + ' ns and ' + tfring_params[2] + ' mHz.\n')
+                target.log.write('\nFringe search performed on ' + target.name + '. Windows '\
+                                  + 'for the search were ' + tfring_params[1] \
+                                  + ' ns and ' + tfring_params[2] + ' mHz.\n')
             
-            print('\nFringe search performed on ' + target.name + '. Windows for ' \
-                + 'the search were ' + tfring_params[1] + ' ns and ' \
-                + tfring_params[2] + ' mHz.\n')
+                print('\nFringe search performed on ' + target.name + '. Windows for ' \
+                    + 'the search were ' + tfring_params[1] + ' ns and ' \
+                    + tfring_params[2] + ' mHz.\n')
             
-            ## Get the ratio of bad to good solutions ##
+                ## Get the ratio of bad to good solutions ##
     
-            badsols, totalsols, ratios_dict = frng.assess_fringe_fit(uvdata, target.log, version = 6+i) 
-            ratio = 1 - badsols/totalsols
+                badsols, totalsols, ratios_dict, if_ratios = frng.assess_fringe_fit(uvdata, target.log, version = 6+i) 
+                ratio = 1 - badsols/totalsols
             
-        except RuntimeError:
+            except RuntimeError:
 
-            print("Fringe fit has failed.\n")
+                print("Fringe fit has failed.\n")
 
-            target.log.write("Fringe fit has failed.\n")
-            ratio = 0    
+                target.log.write("Fringe fit has failed.\n")
+                ratio = 0    
                 
-        # If the ratio is < 0.99 (arbitrary) repeat the fringe fit but averaging IFs
+            # If the ratio is < 0.99 (arbitrary) repeat the fringe fit but averaging IFs
 
-        if ratio < 0.99:
+            if ratio < 0.99:
 
-            print('Ratio of good/total solutions is : {:.2f}.\n'.format(ratio))
-            print('Repeating the fringe fit solving for all IFs together:\n')
+                print('Ratio of good/total solutions is : {:.2f}.\n'.format(ratio))
+                print('Repeating the fringe fit solving for all IFs together:\n')
 
-            target.log.write('Ratio of good/total solutions ' \
-                            + 'is : {:.2f}.\n'.format(ratio))
-            target.log.write('Repeating the fringe fit solving for all IFs ' \
-                            + 'together:\n')
+                target.log.write('Ratio of good/total solutions ' \
+                                + 'is : {:.2f}.\n'.format(ratio))
+                target.log.write('Repeating the fringe fit solving for all IFs ' \
+                                + 'together:\n')
 
-            try:
-                tfring_params = frng.target_fring_fit(uvdata, refant, priority_refants, 
-                                                      target.name,
-                                                      version = 6+i+1, 
-                                                      snr_cutoff = fringefit_snr,
-                                                      solint=float(target.solint),
-                                                      solve_ifs=False)
-                
-                target.log.write('\nFringe search performed on ' + target.name \
-                + '. Windows for the search were ' + tfring_params[1] + ' ns and ' \
-                + tfring_params[2] + ' mHz.\n')
+                try:
+                    tfring_params = frng.target_fring_fit(uvdata, refant, priority_refants, 
+                                                          target.name,
+                                                          version = 6+i+1, 
+                                                          snr_cutoff = fringefit_snr,
+                                                          solint=float(target.solint),
+                                                          solve_ifs=False)
                 
-                print('\nFringe search performed on ' + target.name + '. Windows for ' \
-                    + 'the search were ' + tfring_params[1] + ' ns and ' \
+                    target.log.write('\nFringe search performed on ' + target.name \
+                    + '. Windows for the search were ' + tfring_params[1] + ' ns and ' \
                     + tfring_params[2] + ' mHz.\n')
+                
+                    print('\nFringe search performed on ' + target.name + '. Windows for ' \
+                        + 'the search were ' + tfring_params[1] + ' ns and ' \
+                        + tfring_params[2] + ' mHz.\n')
                     
-                ## Get the new ratio of bad to good solutions ##
+                    ## Get the new ratio of bad to good solutions ##
             
-                badsols_s, totalsols_s, ratios_dict_s = frng.assess_fringe_fit(uvdata, target.log, \
-                                                            version = 6+i+1) 
+                    badsols_s, totalsols_s, ratios_dict_s, if_ratios_s = frng.assess_fringe_fit(uvdata, target.log, \
+                                                                version = 6+i+1) 
                 
-                ratio_single = 1 - badsols_s/totalsols_s
+                    ratio_single = 1 - badsols_s/totalsols_s
                 
-            except RuntimeError:
-                print('\nThe new fringe fit has failed, the previous one will ' \
-                     + 'be kept.\n')
+                except RuntimeError:
+                    print('\nThe new fringe fit has failed, the previous one will ' \
+                         + 'be kept.\n')
 
-                target.log.write('\nThe new fringe fit has failed, the previous ' \
-                                 + 'one will be kept.\n')
-                ratio_single = 0    
+                    target.log.write('\nThe new fringe fit has failed, the previous ' \
+                                     + 'one will be kept.\n')
+                    ratio_single = 0    
     
-            # If both ratios are 0, end the pipeline
-            if (ratio + ratio_single) == 0:
+                # If both ratios are 0, end the pipeline
+                if (ratio + ratio_single) == 0:
 
-                print('\nThe pipeline was not able to find any good solutions.\n')
+                    print('\nThe pipeline was not able to find any good solutions.\n')
 
-                target.log.write('\nThe pipeline was not able to find any good ' \
-                                + 'solutions.\n')
+                    target.log.write('\nThe pipeline was not able to find any good ' \
+                                    + 'solutions.\n')
 
-                ## Remove target from the workflow
-                ignore_list.append(target.name)
+                    ## Remove target from the workflow
+                    ignore_list.append(target.name)
 
             
-            # If the new ratio is smaller or equal than the previous, 
-            # then keep the previous
-
-            elif ratio_single <= ratio:
-                print("New ratio of good/total solutions "\
-                    + "is : {:.2f}.\n".format(ratio_single))
-                print("The multi-IF fringe fit will be applied.\n")
-
-                target.log.write("New ratio of good/total solutions "\
-                    + "is : {:.2f}.\n".format(ratio_single))
-                target.log.write("The multi-IF fringe fit will be applied.\n ")
-                # Remove the single-IF fringe fit SN table
-                uvdata.zap_table('SN', 6+i+1)
-
-
-            # If new ratio is better than the previous, then replace the SN table and 
-            # apply the solutions
-            elif ratio_single > ratio:
-                print("New ratio of good/total solutions "\
-                    + "is : {:.2f}.\n".format(ratio_single))
-                print("The averaged IF fringe fit will be applied.\n ")
-
-                target.log.write("New ratio of good/total solutions "\
-                    + "is : {:.2f}.\n".format(ratio_single))
-                target.log.write("The averaged IF fringe fit will be applied.\n ")
-                uvdata.zap_table('SN', 6+i)
-                tysm.tacop(uvdata, 'SN', 6+i+1, 6+i)
-                uvdata.zap_table('SN', 6+i+1)
-                stats_df.at[r, 'single_ff'] = True   
+                # If the new ratio is smaller or equal than the previous, 
+                # then keep the previous
+
+                elif ratio_single <= ratio:
+                    print("New ratio of good/total solutions "\
+                        + "is : {:.2f}.\n".format(ratio_single))
+                    print("The multi-IF fringe fit will be applied.\n")
+
+                    target.log.write("New ratio of good/total solutions "\
+                        + "is : {:.2f}.\n".format(ratio_single))
+                    target.log.write("The multi-IF fringe fit will be applied.\n ")
+                    # Remove the single-IF fringe fit SN table
+                    uvdata.zap_table('SN', 6+i+1)
+
+
+                # If new ratio is better than the previous, then replace the SN table and 
+                # apply the solutions
+                elif ratio_single > ratio:
+                    print("New ratio of good/total solutions "\
+                        + "is : {:.2f}.\n".format(ratio_single))
+                    print("The averaged IF fringe fit will be applied.\n ")
+
+                    target.log.write("New ratio of good/total solutions "\
+                        + "is : {:.2f}.\n".format(ratio_single))
+                    target.log.write("The averaged IF fringe fit will be applied.\n ")
+                    uvdata.zap_table('SN', 6+i)
+                    tysm.tacop(uvdata, 'SN', 6+i+1, 6+i)
+                    uvdata.zap_table('SN', 6+i+1)
+                    stats_df.at[r, 'single_ff'] = True   
             
-        if (ratio + ratio_single) == 0:
-            stats_df.at[r, 'good_sols'] = False
-            stats_df.at[r, 'total_sols'] = False
-            stats_df.at[r, 'ratios_dict'] = False
-            stats_df.at[r, 'good_sols_single'] = False
-            stats_df.at[r, 'total_sols_single'] = False
-            stats_df.at[r, 'ratios_dict_single'] = False
-
-        elif ratio == 0 and ratio_single != 0:
-            stats_df.at[r, 'good_sols'] = False
-            stats_df.at[r, 'total_sols'] = False
-            stats_df.at[r, 'ratios_dict'] = False
-            stats_df.at[r, 'good_sols_single'] = int(totalsols_s - badsols_s)
-            stats_df.at[r, 'total_sols_single'] = int(totalsols_s)
-            stats_df.at[r, 'ratios_dict_single'] = json.dumps(ratios_dict_s)
+            if (ratio + ratio_single) == 0:
+                stats_df.at[r, 'good_sols'] = False
+                stats_df.at[r, 'total_sols'] = False
+                stats_df.at[r, 'ratios_dict'] = False
+                stats_df.at[r, 'good_sols_single'] = False
+                stats_df.at[r, 'total_sols_single'] = False
+                stats_df.at[r, 'ratios_dict_single'] = False
+
+            elif ratio == 0 and ratio_single != 0:
+                stats_df.at[r, 'good_sols'] = False
+                stats_df.at[r, 'total_sols'] = False
+                stats_df.at[r, 'ratios_dict'] = False
+                stats_df.at[r, 'good_sols_single'] = int(totalsols_s - badsols_s)
+                stats_df.at[r, 'total_sols_single'] = int(totalsols_s)
+                stats_df.at[r, 'ratios_dict_single'] = json.dumps(ratios_dict_s)
         
-        elif ratio < 0.99 and ratio_single != 0: 
-            stats_df.at[r, 'good_sols'] = int(totalsols - badsols)
-            stats_df.at[r, 'total_sols'] = int(totalsols)
-            stats_df.at[r, 'ratios_dict'] = json.dumps(ratios_dict)
-            stats_df.at[r, 'good_sols_single'] = int(totalsols_s - badsols_s)
-            stats_df.at[r, 'total_sols_single'] = int(totalsols_s)
-            stats_df.at[r, 'ratios_dict_single'] = json.dumps(ratios_dict_s)
-
-        elif ratio < 0.99 and ratio_single == 0: 
-            stats_df.at[r, 'good_sols'] = int(totalsols - badsols)
-            stats_df.at[r, 'total_sols'] = int(totalsols)
-            stats_df.at[r, 'ratios_dict'] = json.dumps(ratios_dict)
-            stats_df.at[r, 'good_sols_single'] = False
-            stats_df.at[r, 'total_sols_single'] = False
-            stats_df.at[r, 'ratios_dict_single'] = False
-
-        elif ratio >= 0.99: 
-            stats_df.at[r, 'good_sols'] = int(totalsols - badsols)
-            stats_df.at[r, 'total_sols'] = int(totalsols)
-            stats_df.at[r, 'ratios_dict'] = json.dumps(ratios_dict)
-            stats_df.at[r, 'good_sols_single'] = False
-            stats_df.at[r, 'total_sols_single'] = False
-            stats_df.at[r, 'ratios_dict_single'] = False
-
-    ## PHASEREF FRINGE FIT ##
-    pr_sn = uvdata.table_highver('SN') + 1
-
-    for i, target in enumerate(pr_target_list): 
-
-        r =  stats_df.index[stats_df['target'] == target.name][0]
-
-        ratio = 0
-        ratio_single = 0
-        stats_df.at[r, 'single_ff'] = False
-        stats_df.at[r,'phaseref_ff'] = False  
+            elif ratio < 0.99 and ratio_single != 0: 
+                stats_df.at[r, 'good_sols'] = int(totalsols - badsols)
+                stats_df.at[r, 'total_sols'] = int(totalsols)
+                stats_df.at[r, 'ratios_dict'] = json.dumps(ratios_dict)
+                stats_df.at[r, 'good_sols_single'] = int(totalsols_s - badsols_s)
+                stats_df.at[r, 'total_sols_single'] = int(totalsols_s)
+                stats_df.at[r, 'ratios_dict_single'] = json.dumps(ratios_dict_s)
+
+            elif ratio < 0.99 and ratio_single == 0: 
+                stats_df.at[r, 'good_sols'] = int(totalsols - badsols)
+                stats_df.at[r, 'total_sols'] = int(totalsols)
+                stats_df.at[r, 'ratios_dict'] = json.dumps(ratios_dict)
+                stats_df.at[r, 'good_sols_single'] = False
+                stats_df.at[r, 'total_sols_single'] = False
+                stats_df.at[r, 'ratios_dict_single'] = False
+
+            elif ratio >= 0.99: 
+                stats_df.at[r, 'good_sols'] = int(totalsols - badsols)
+                stats_df.at[r, 'total_sols'] = int(totalsols)
+                stats_df.at[r, 'ratios_dict'] = json.dumps(ratios_dict)
+                stats_df.at[r, 'good_sols_single'] = False
+                stats_df.at[r, 'total_sols_single'] = False
+                stats_df.at[r, 'ratios_dict_single'] = False
+
+            # Good/attempted solutions per IF, stored with the antenna ratios
+            stats_df.at[r, 'if_ratios'] = json.dumps(if_ratios) \
+                if (ratio != 0 and if_ratios != False) else False
+            stats_df.at[r, 'if_ratios_single'] = json.dumps(if_ratios_s) \
+                if (ratio_single != 0 and if_ratios_s != False) else False
+
+        ## PHASEREF FRINGE FIT ##
+        pr_sn = uvdata.table_highver('SN') + 1
+
+        for i, target in enumerate(pr_target_list): 
+
+            r =  stats_df.index[stats_df['target'] == target.name][0]
+
+            ratio = 0
+            ratio_single = 0
+            if_ratios = False
+            if_ratios_s = False
+            stats_df.at[r, 'single_ff'] = False
+            stats_df.at[r,'phaseref_ff'] = False  
           
-        try:
-            tfring_params = frng.target_fring_fit(uvdata, refant, priority_refants, 
-                                                  target.phaseref, version = pr_sn+i,
-                                                  snr_cutoff = fringefit_snr,
-                                                  solint=float(target.solint))
+            try:
+                tfring_params = frng.target_fring_fit(uvdata, refant, priority_refants, 
+                                                      target.phaseref, version = pr_sn+i,
+                                                      snr_cutoff = fringefit_snr,
+                                                      solint=float(target.solint))
         
-            target.log.write('\nFringe search performed on the phase calibrator: ' \
-                              + target.phaseref + '. Windows '\
-                              + 'for the search were ' + tfring_params[1] \
-                              + ' ns and ' + tfring_params[2] + ' mHz.\n')
+                target.log.write('\nFringe search performed on the phase calibrator: ' \
+                                  + target.phaseref + '. Windows '\
+                                  + 'for the search were ' + tfring_params[1] \
+                                  + ' ns and ' + tfring_params[2] + ' mHz.\n')
             
-            print('\nFringe search performed on the phase calibrator: ' \
-                  + target.phaseref + '. Windows for ' \
-                  + 'the search were ' + tfring_params[1] + ' ns and ' \
-                  + tfring_params[2] + ' mHz.\n')
+                print('\nFringe search performed on the phase calibrator: ' \
+                      + target.phaseref + '. Windows for ' \
+                      + 'the search were ' + tfring_params[1] + ' ns and ' \
+                      + tfring_params[2] + ' mHz.\n')
             
-            ## Get the ratio of bad to good solutions ##
+                ## Get the ratio of bad to good solutions ##
     
-            badsols, totalsols, ratios_dict = frng.assess_fringe_fit(uvdata, target.log, version = pr_sn+i) 
-            ratio = 1 - badsols/totalsols
+                badsols, totalsols, ratios_dict, if_ratios = frng.assess_fringe_fit(uvdata, target.log, version = pr_sn+i) 
+                ratio = 1 - badsols/totalsols
             
-        except RuntimeError:
+            except RuntimeError:
 
-            print("Fringe fit has failed.\n")
+                print("Fringe fit has failed.\n")
 
-            target.log.write("Fringe fit has failed.\n")
-            ratio = 0    
+                target.log.write("Fringe fit has failed.\n")
+                ratio = 0    
             
-        # If the ratio is > 0.99, apply the solutions to a CL table
+            # If the ratio is > 0.99, apply the solutions to a CL table
 
-        #if ratio >= 0.99:
-        #    continue
+            #if ratio >= 0.99:
+            #    continue
     
-        # If the ratio is < 0.99 (arbitrary) repeat the fringe fit but averaging IFs
+            # If the ratio is < 0.99 (arbitrary) repeat the fringe fit but averaging IFs
 
-        if ratio < 0.99:
+            if ratio < 0.99:
 
-            print('Ratio of good/total solutions is : {:.2f}.\n'.format(ratio))
-            print('Repeating the fringe fit solving for all IFs together:\n')
+                print('Ratio of good/total solutions is : {:.2f}.\n'.format(ratio))
+                print('Repeating the fringe fit solving for all IFs together:\n')
 
-            target.log.write('Ratio of good/total solutions ' \
-                            + 'is : {:.2f}.\n'.format(ratio))
-            target.log.write('Repeating the fringe fit solving for all IFs ' \
-                            + 'together:\n')
+                target.log.write('Ratio of good/total solutions ' \
+                                + 'is : {:.2f}.\n'.format(ratio))
+                target.log.write('Repeating the fringe fit solving for all IFs ' \
+                                + 'together:\n')
 
-            try:
-                tfring_params = frng.target_fring_fit(uvdata, refant, priority_refants, 
-                                                      target.phaseref, 
-                                                      version = pr_sn+i+1, 
-                                                      snr_cutoff = fringefit_snr,
-                                                      solint=float(target.solint),
-                                                      solve_ifs=False)
+                try:
+                    tfring_params = frng.target_fring_fit(uvdata, refant, priority_refants, 
+                                                          target.phaseref, 
+                                                          version = pr_sn+i+1, 
+                                                          snr_cutoff = fringefit_snr,
+                                                          solint=float(target.solint),
+                                                          solve_ifs=False)
                 
-                target.log.write('\nFringe search performed on the phase calibrator: ' \
-                                 + target.phaseref + '. Windows for the search were ' \
-                                 + tfring_params[1] + ' ns and ' \
-                                 + tfring_params[2] + ' mHz.\n')
+                    target.log.write('\nFringe search performed on the phase calibrator: ' \
+                                     + target.phaseref + '. Windows for the search were ' \
+                                     + tfring_params[1] + ' ns and ' \
+                                     + tfring_params[2] + ' mHz.\n')
                 
-                print('\nFringe search performed on the phase claibrator: ' + target.phaseref + '. Windows for ' \
-                    + 'the search were ' + tfring_params[1] + ' ns and ' \
-                    + tfring_params[2] + ' mHz.\n')
+                    print('\nFringe search performed on the phase claibrator: ' + target.phaseref + '. Windows for ' \
+                        + 'the search were ' + tfring_params[1] + ' ns and ' \
+                        + tfring_params[2] + ' mHz.\n')
                     
-                ## Get the new ratio of bad to good solutions ##
+                    ## Get the new ratio of bad to good solutions ##
             
-                badsols_s, totalsols_s, ratios_dict_s = frng.assess_fringe_fit(uvdata, target.log, \
-                                                            version = pr_sn+i+1) 
+                    badsols_s, totalsols_s, ratios_dict_s, if_ratios_s = frng.assess_fringe_fit(uvdata, target.log, \
+                                                                version = pr_sn+i+1) 
                 
-                ratio_single = 1 - badsols_s/totalsols_s
+                    ratio_single = 1 - badsols_s/totalsols_s
                 
-            except RuntimeError:
-                print('\nThe new fringe fit has failed, the previous one will ' \
-                     + 'be kept.\n')
+                except RuntimeError:
+                    print('\nThe new fringe fit has failed, the previous one will ' \
+                         + 'be kept.\n')
 
-                target.log.write('\nThe new fringe fit has failed, the previous ' \
-                                 + 'one will be kept.\n')
-                ratio_single = 0    
+                    target.log.write('\nThe new fringe fit has failed, the previous ' \
+                                     + 'one will be kept.\n')
+                    ratio_single = 0    
     
-            # If both ratios are 0, end the pipeline
-            if (ratio + ratio_single) == 0:
+                # If both ratios are 0, end the pipeline
+                if (ratio + ratio_single) == 0:
 
-                print('\nThe pipeline was not able to find any good solutions.\n')
+                    print('\nThe pipeline was not able to find any good solutions.\n')
 
-                target.log.write('\nThe pipeline was not able to find any good ' \
-                                + 'solutions.\n')
+                    target.log.write('\nThe pipeline was not able to find any good ' \
+                                    + 'solutions.\n')
 
-                ## Remove target from the workflow
-                ignore_list.append(target.name)
+                    ## Remove target from the workflow
+                    ignore_list.append(target.name)
 
             
-            # If the new ratio is smaller or equal than the previous, 
-            # then keep the previous
-
-            elif ratio_single <= ratio:
-                print("New ratio of good/total solutions "\
-                    + "is : {:.2f}.\n".format(ratio_single))
-                print("The multi-IF fringe fit will be applied.\n")
-
-                target.log.write("New ratio of good/total solutions "\
-                    + "is : {:.2f}.\n".format(ratio_single))
-                target.log.write("The multi-IF fringe fit will be applied.\n ")
-                # Remove the single-IF fringe fit SN table
-                uvdata.zap_table('SN', pr_sn+i+1)
+                # If the new ratio is smaller or equal than the previous, 
+                # then keep the previous
+
+                elif ratio_single <= ratio:
+                    print("New ratio of good/total solutions "\
+                        + "is : {:.2f}.\n".format(ratio_single))
+                    print("The multi-IF fringe fit will be applied.\n")
+
+                    target.log.write("New ratio of good/total solutions "\
+                        + "is : {:.2f}.\n".format(ratio_single))
+                    target.log.write("The multi-IF fringe fit will be applied.\n ")
+                    # Remove the single-IF fringe fit SN table
+                    uvdata.zap_table('SN', pr_sn+i+1)
                 
 
 
-            # If new ratio is better than the previous, then replace the SN table and 
-            # apply the solutions
-            elif ratio_single > ratio:
-                print("New ratio of good/total solutions "\
-                    + "is : {:.2f}.\n".format(ratio_single))
-                print("The averaged IF fringe fit will be applied.\n ")
+                # If new ratio is better than the previous, then replace the SN table and 
+                # apply the solutions
+                elif ratio_single > ratio:
+                    print("New ratio of good/total solutions "\
+                        + "is : {:.2f}.\n".format(ratio_single))
+                    print("The averaged IF fringe fit will be applied.\n ")
 
-                target.log.write("New ratio of good/total solutions "\
-                    + "is : {:.2f}.\n".format(ratio_single))
-                target.log.write("The averaged IF fringe fit will be applied.\n ")
-                uvdata.zap_table('SN', pr_sn+i)
-                tysm.tacop(uvdata, 'SN', pr_sn+i+1, pr_sn+i)
-                uvdata.zap_table('SN', pr_sn+i+1)
-                stats_df.at[r, 'single_ff'] = True   
+                    target.log.write("New ratio of good/total solutions "\
+                        + "is : {:.2f}.\n".format(ratio_single))
+                    target.log.write("The averaged IF fringe fit will be applied.\n ")
+                    uvdata.zap_table('SN', pr_sn+i)
+                    tysm.tacop(uvdata, 'SN', pr_sn+i+1, pr_sn+i)
+                    uvdata.zap_table('SN', pr_sn+i+1)
+                    stats_df.at[r, 'single_ff'] = True   
 
-        r =  stats_df.index[stats_df['target'] == target.name][0]
+            r =  stats_df.index[stats_df['target'] == target.name][0]
             
-        if (ratio + ratio_single) == 0:
-            stats_df.at[r, 'good_sols'] = False
-            stats_df.at[r, 'total_sols'] = False
-            stats_df.at[r, 'ratios_dict'] = False
-            stats_df.at[r, 'good_sols_single'] = False
-            stats_df.at[r, 'total_sols_single'] = False
-            stats_df.at[r, 'ratios_dict_single'] = False
+            if (ratio + ratio_single) == 0:
+                stats_df.at[r, 'good_sols'] = False
+                stats_df.at[r, 'total_sols'] = False
+                stats_df.at[r, 'ratios_dict'] = False
+                stats_df.at[r, 'good_sols_single'] = False
+                stats_df.at[r, 'total_sols_single'] = False
+                stats_df.at[r, 'ratios_dict_single'] = False
         
-        elif ratio < 0.99: 
-            stats_df.at[r, 'good_sols'] = int(totalsols - badsols)
-            stats_df.at[r, 'total_sols'] = int(totalsols)
-            stats_df.at[r, 'ratios_dict'] = json.dumps(ratios_dict)
-            stats_df.at[r, 'good_sols_single'] = int(totalsols_s - badsols_s)
-            stats_df.at[r, 'total_sols_single'] = int(totalsols_s)
-            stats_df.at[r, 'ratios_dict_single'] = json.dumps(ratios_dict_s)
-
-        elif ratio >= 0.99: 
-            stats_df.at[r, 'good_sols'] = int(totalsols - badsols)
-            stats_df.at[r, 'total_sols'] = int(totalsols)
-            stats_df.at[r, 'ratios_dict'] = json.dumps(ratios_dict)
-            stats_df.at[r, 'good_sols_single'] = False
-            stats_df.at[r, 'total_sols_single'] = False
-            stats_df.at[r, 'ratios_dict_single'] = False
-
-    # Apply all SN tables into CL9    
-    no_pr_target_scans = [x for x in scan_list if x.source_name in [t.name for t in no_pr_target_list]]
-    if len(no_pr_target_list) > 0:
-        frng.fringe_clcal(uvdata, refant, no_pr_target_list, no_pr_target_scans, max_ver = pr_sn - 1)
-    else:
-        # Create a CL9 if it has not been created before
-        help.tacop(uvdata, 'CL', 8, 9)
-    frng.fringe_phaseref_clcal(uvdata, refant, pr_target_list, version = pr_sn)
+            elif ratio < 0.99: 
+                stats_df.at[r, 'good_sols'] = int(totalsols - badsols)
+                stats_df.at[r, 'total_sols'] = int(totalsols)
+                stats_df.at[r, 'ratios_dict'] = json.dumps(ratios_dict)
+                stats_df.at[r, 'good_sols_single'] = int(totalsols_s - badsols_s)
+                stats_df.at[r, 'total_sols_single'] = int(totalsols_s)
+                stats_df.at[r, 'ratios_dict_single'] = json.dumps(ratios_dict_s)
+
+            elif ratio >= 0.99: 
+                stats_df.at[r, 'good_sols'] = int(totalsols - badsols)
+                stats_df.at[r, 'total_sols'] = int(totalsols)
+                stats_df.at[r, 'ratios_dict'] = json.dumps(ratios_dict)
+                stats_df.at[r, 'good_sols_single'] = False
+                stats_df.at[r, 'total_sols_single'] = False
+                stats_df.at[r, 'ratios_dict_single'] = False
+
+            # Good/attempted solutions per IF, stored with the antenna ratios
+            stats_df.at[r, 'if_ratios'] = json.dumps(if_ratios) \
+                if (ratio != 0 and if_ratios != False) else False
+            stats_df.at[r, 'if_ratios_single'] = json.dumps(if_ratios_s) \
+                if (ratio_single != 0 and if_ratios_s != False) else False
+
+        # Apply all SN tables into CL9    
+        no_pr_target_scans = [x for x in scan_list if x.source_name in [t.name for t in no_pr_target_list]]
+        if len(no_pr_target_list) > 0:
+            frng.fringe_clcal(uvdata, refant, no_pr_target_list, no_pr_target_scans, max_ver = pr_sn - 1)
+        else:
+            # Create a CL9 if it has not been created before
+            help.tacop(uvdata, 'CL', 8, 9)
+        frng.fringe_phaseref_clcal(uvdata, refant, pr_target_list, version = pr_sn)
 
 
-    t14 = time.time()
-    for i, pipeline_log in enumerate(log_list):        
-        pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t14-t13))  
-    print('Execution time: {:.2f} s. \n'.format(t14-t13))
+        t14 = time.time()
+        for i, pipeline_log in enumerate(log_list):        
+            pipeline_log.write('\nExecution time: {:.2f} s. \n'.format(t14-t13))  
+        print('Execution time: {:.2f} s. \n'.format(t14-t13))
 
-    stats_df['time_17'] = t14 - t13
+        stats_df['time_17'] = t14 - t13
+
+        engine.complete('fringe', uvdata, stats_df, ignore_list = ignore_list)
+    else:
+        ignore_list = journal['state']['ignore_list']
+        t14 = time.time()
 
     ##  Export data ##
+    # Export and plots always run, the engine only keeps track of them
+    engine.pending('export', uvdata)
     t_export = time.time()
     disp.write_box(log_list, 'Exporting visibility data')
     disp.print_box('Exporting visibility data')
 
     no_baseline = expo.data_export(outpath_list, uvdata, target_list, \
                                    filename_list, ignore_list, channel_out,\
-                                   flag_frac = flag_edge)
+                                   flag_frac = flag_edge, workspace = workspace)
     
 
     for i, target in enumerate(target_list): 
@@ -1783,7 +1979,8 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
                               + 'there are not enough solutions to form a baseline.\n')
                      
 
-    expo.table_export(outpath_list, uvdata, target_list, filename_list)
+    expo.table_export(outpath_list, uvdata, target_list, filename_list, 
+                      workspace = workspace)
     for i, target in enumerate(target_list): 
         log_list[i].write('\n' + target + ' calibration tables exported to '
                           + outpath_list[i] + '/TABLES/' \
@@ -1792,28 +1989,28 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
                           + outpath_list[i] + '/TABLES/' \
                           + filename_list[i] + '.caltab.uvfits\n')
         
-    # Counting visibilities
-    expo.data_split(uvdata, [t for t in target_list if t not in ignore_list and t not in no_baseline], \
-                    cl_table=9, flagver=3, bpass = True)
-    
+    # Counting visibilities, the splitted entries are always needed for the radplots
     for i, target in enumerate(target_list):
         r =  stats_df.index[stats_df['target'] == target][0]
-        if target not in ignore_list and target not in no_baseline:
-            cl9_bp1 = AIPSUVData(target, 'PLOTBP', uvdata.disk, 9)
-            vis_cl9_bp1, vis_ant_cl9_bp1 = expo.vis_count_v2(cl9_bp1)
-            stats_df.at[r, 'CL9_BP1_vis'] = int(vis_cl9_bp1)
-            stats_df.at[i, 'CL9_BP1_ant_vis'] = json.dumps(vis_ant_cl9_bp1)
-            print(f"CL9 + BP1 visibilities of {target}: {vis_cl9_bp1}\n")
-            log_list[i].write(f"\nCL9 + BP1 visibilities of {target}: {vis_cl9_bp1}\n")
-        else:
+        if target in ignore_list or target in no_baseline:
             stats_df.at[r, 'CL9_BP1_vis'] = 0
-            antenna_names = [x.anname.strip() for x in uvdata.table('AN', 1)]
+            antenna_names = [x.anname.strip() for x in tcache.table(uvdata, 'AN', 1)]
             vis_ant_cl9_bp1 = dict(zip(antenna_names, [0]*len(antenna_names)))
             stats_df.at[i, 'CL9_BP1_ant_vis'] = json.dumps(vis_ant_cl9_bp1)
+
+    vis_stats.count(uvdata, [t for t in target_list \
+                             if t not in ignore_list and t not in no_baseline],
+                    ['CL9_BP1_vis', 'CL9_BP1_ant_vis'], 'CL9 + BP1 visibilities of {}',
+                    cl_table = 9, flagver = 3, bpass = True, split = True)
+
+    # Deferred counts of all calibration steps, in a single pass over the data
+    vis_stats.flush(uvdata)
         
     stats_df['time_18'] = time.time() - t_export
+    engine.complete('export', uvdata, stats_df)
 
     ## PLOTS ##
+    engine.pending('plots', uvdata)
 
     ######################## PLOTS FOR THE GUI ########################
     t_interactive = time.time()
@@ -1821,12 +2018,13 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
     if interactive ==  True:
         disp.print_box("Generating interactive plots")
         disp.write_box(log_list, "Generating interactive plots")
-        plot.generate_pickle_plots(uvdata, target_list, outpath_list)
+        plot.generate_pickle_plots(uvdata, target_list, outpath_list, 
+                                   workspace = workspace)
 
         for i, path in enumerate(outpath_list):
             target_name = path.split('/')[-1]
             plot_size = sum(
-                f.stat().st_size for f in Path(tmp_dir).rglob('*')
+                f.stat().st_size for f in Path(workspace.plot_dir).rglob('*')
                 if f.is_file() and target_name in f.name)
             
             stats_df.at[i, 'int_plot_size_mb'] = plot_size / 1024**2
@@ -1856,7 +2054,8 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
             try:
                 plot.possm_plotter(outpath_list[i], uvdata, target, 
                                             gainuse = 1, bpver = 0, \
-                                            flagver=1, flag_edge=False)
+                                            flagver=1, flag_edge=False, 
+                                            workspace = workspace)
                 log_list[i].write('\nUncalibrated visibilities plotted in '
                                 + outpath_list[i] + '/PLOTS/'  \
                                 + filename_list[i] + '_CL1_POSSM.ps\n')
@@ -1877,7 +2076,7 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
             try: 
                 plot.possm_plotter(outpath_list[i], uvdata, target, 
                                             gainuse = 9, bpver = 1, 
-                                            flag_edge=False)
+                                            flag_edge=False, workspace = workspace)
                 log_list[i].write('Calibrated visibilities plotted in '
                                 + outpath_list[i] + '/PLOTS/' \
                                 + filename_list[i] + '_CL' + str(9) + '_POSSM.ps\n')
@@ -1895,7 +2094,7 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
             continue
         if target not in no_baseline:
             try:
-                plot.uvplt_plotter(outpath_list[i], uvdata, target)
+                plot.uvplt_plotter(outpath_list[i], uvdata, target, workspace = workspace)
                 log_list[i].write('UV coverage plotted in '
                                 + outpath_list[i] + '/PLOTS/' \
                                 + filename_list[i] + '_UVPLT.ps\n')
@@ -1913,7 +2112,7 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
             continue
         if target not in no_baseline:
             try:
-                plot.vplot_plotter(outpath_list[i], uvdata, target, 9)   
+                plot.vplot_plotter(outpath_list[i], uvdata, target, 9, workspace = workspace)   
                 log_list[i].write('Visibilities as a function of time plotted in '
                                 + outpath_list[i] + '/PLOTS/' \
                                 + filename_list[i]  + '_VPLOT.ps\n')
@@ -1927,14 +2126,17 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
                 
     ## Plot visibilities as a function of uv distance of target ##
     if interactive == False:
-        #plot.generate_pickle_radplot(uvdata, [t for t in  target_list \
-        #        if t not in ignore_list and t not in no_baseline], outpath_list)
-        plot.generate_pickle_radplot(uvdata, target_list, outpath_list)
+        # Only targets with CL9 have splitted entries
+        radplot_index = [i for i, t in enumerate(target_list) 
+                         if t not in ignore_list and t not in no_baseline]
+        plot.generate_pickle_radplot(uvdata, [target_list[i] for i in radplot_index], 
+                                     [outpath_list[i] for i in radplot_index], 
+                                     workspace = workspace)
 
     for i, target in enumerate(target_list):
         if target not in ignore_list and target not in no_baseline:
             target_name = outpath_list[i].split('/')[-1]
-            fig = pickle.load(open(f'{tmp_dir}/{target_name}.radplot.pickle', 'rb'))
+            fig = pickle.load(open(f'{workspace.plot_dir}/{target_name}.radplot.pickle', 'rb'))
             # Keep the color scheme in black and white, for consistency with other plots
             for ax in fig.get_axes():
                 for line in ax.get_lines():
@@ -1991,6 +2193,8 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
     print('Execution time: {:.2f} s.\n'.format(t15-t14))
 
     stats_df['time_20'] = t15 - t_plots
+    engine.complete('plots', uvdata, stats_df)
+    engine.shutdown()
 
     ## Total execution time ##
     tf = time.time()
@@ -2059,6 +2263,89 @@ def calibrate(filepath_list, filename_list, outpath_list, log_list, target_list,
     ######################## PRINT STATS ######################## 
      
 
+class BandJob(NamedTuple):
+    """Calibration of one frequency band, queued by :func:`pipeline`."""
+    band: str
+    log_list: list
+    calibrate_args: list
+
+def calibrate_band(job, userno):
+    """Calibrate one frequency band in its own process.
+
+    The band uses its own AIPS user number, so that the catalogue entries created 
+    during the calibration (e.g. the PLOT and DUMMY entries) never clash with the ones 
+    of other bands, and its own nested scratch workspace.
+
+    :param job: band to calibrate
+    :type job: :class:`BandJob`
+    :param userno: AIPS user number for this band
+    :type userno: int
+    """
+    AIPS.userno = userno
+    workspace = job.calibrate_args[-1].subspace()
+    try:
+        calibrate(*job.calibrate_args[:-1], workspace)
+    finally:
+        # Forked processes exit without flushing, make sure the logs are complete
+        for pipeline_log in job.log_list:
+            if pipeline_log.closed == False:
+                pipeline_log.flush()
+        if AIPS.log != None:
+            AIPS.log.flush()
+    workspace.clean()
+
+def run_bands(band_jobs, parallel_bands, workspace):
+    """Calibrate the different frequency bands of a dataset.
+
+    If parallel_bands is True, each band is calibrated at the same time in a separate
+    process, using the AIPS user number of the run plus the index of the band.
+    Otherwise, the bands are calibrated one after the other. In both cases, an error
+    is raised if the calibration of any band fails.
+
+    :param band_jobs: bands to calibrate
+    :type band_jobs: list of :class:`BandJob`
+    :param parallel_bands: calibrate the bands concurrently
+    :type parallel_bands: bool
+    :param workspace: scratch workspace of the run
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`
+    """
+    if parallel_bands == False or len(band_jobs) < 2:
+        for job in band_jobs:
+            calibrate(*job.calibrate_args)
+        return
+
+    print(f'\nCalibrating {len(band_jobs)} frequency bands in parallel.\n')
+    # Fork, so that the open log files are inherited by the child processes. Flush 
+    # them first, otherwise the buffered lines would be written twice
+    for job in band_jobs:
+        for pipeline_log in job.log_list:
+            pipeline_log.flush()
+    ctx = multiprocessing.get_context('fork')
+    processes = []
+    for k, job in enumerate(band_jobs):
+        userno = AIPS.userno + k
+        print(f'Band {job.band} will be calibrated with AIPS user number {userno}.\n')
+        proc = ctx.Process(target = calibrate_band, args = (job, userno), 
+                           name = f'VIPCALs-{job.band}')
+        proc.start()
+        processes.append(proc)
+
+    failed_bands = []
+    for job, proc in zip(band_jobs, processes):
+        proc.join()
+        if proc.exitcode != 0:
+            print(f'\nThe calibration of band {job.band} failed '
+                  + f'(exit code {proc.exitcode}).\n')
+            failed_bands.append(job.band)
+        # The logs were written by the child process, close the copies of this one
+        for pipeline_log in job.log_list:
+            pipeline_log.close()
+
+    # Fail as the sequential calibration would
+    if len(failed_bands) > 0:
+        raise RuntimeError('The calibration of the bands ' + ', '.join(failed_bands) 
+                           + ' failed.')
+
 def pipeline(input_dict):
     """Read the inputs, split multiple frequencies and calibrate the dataset
 
@@ -2105,10 +2392,28 @@ def pipeline(input_dict):
     flag_edge = input_dict['flag_edge']
     # Plotting options
     interactive = input_dict['interactive']
+    # Parallel options
+    parallel_bands = input_dict['parallel_bands']
+    # Scratch directory
+    scratch_dir = input_dict['scratch_dir']
+    # Resume options
+    resume = input_dict['resume']
+    # Statistics options
+    deferred_stats = input_dict['deferred_stats']
+    inplace_stats = input_dict['inplace_stats']
+
+    # When resuming, keep the outputs and logs of the previous run
+    if resume == True:
+        log_mode = 'a+'
+    else:
+        log_mode = 'w+'
 
 
-    ## Clean tmp directory ##
-    os.system(f'rm {tmp_dir}/*')
+    ## Create the scratch workspace of this run ##
+    workspace = help.Workspace(scratch_dir, interactive)
+    # Remove interactive plots of previous runs, the GUI reads them from tmp_dir
+    if interactive == True:
+        os.system(f'rm -f {tmp_dir}/*.pickle {tmp_dir}/*.npz')
 
     ## If calibrate all is selected => load all is also selected
     if calib_all == True:
@@ -2121,6 +2426,7 @@ def pipeline(input_dict):
 
     # If there are multiple IDs:
     if multifreq_id[0] == True:
+        band_jobs = []
         for id in multifreq_id[1]:
 
             t_0 = time.time()
@@ -2181,8 +2487,8 @@ def pipeline(input_dict):
                     klass_1 = str(group[0])[:1] + 'G'
 
                 # Define AIPS name
-                with fits.open(filepath_list_ID[0]) as hdul:
-                    aips_name = hdul['UV_DATA'].header['OBSCODE'] # + '_' + klass_1
+                obscode = meta.read_metadata(filepath_list_ID[0]).obscode
+                aips_name = obscode # + '_' + klass_1
 
                 ## Check if the AIPS catalogue name is too long, and rename ##
                 # 12 is the maximum length for a file name in AIPS
@@ -2194,7 +2500,7 @@ def pipeline(input_dict):
                     aips_name_short = name[:size_name] + '_' + suffix
 
                 # Check if project directory already exists, if not, create one
-                project_dir = output_directory + '/' + hdul['UV_DATA'].header['OBSCODE']
+                project_dir = output_directory + '/' + obscode
                 if os.path.exists(project_dir) == False:
                     os.system('mkdir ' + project_dir)
 
@@ -2210,7 +2516,7 @@ def pipeline(input_dict):
                 stats_df['loaded_sources'] =  json.dumps(dict(zip(sources, [x.band_flux for x in full_source_list if x.name in sources])))            
                 stats_df['n_of_freqs'] = len(freq_groups)
 
-                # Create subdirectories for the targets and DELETE EXISTING ONES
+                # Create subdirectories for the targets and DELETE EXISTING ONES (unless resuming)
                 # Also, create the pipeline log file of each target
                 filename_list = target_list.copy()
                 log_list = target_list.copy()
@@ -2218,28 +2524,32 @@ def pipeline(input_dict):
                 for i, name in enumerate(filename_list):
                     filename_list[i] = load.set_name(filepath_list_ID[0], name, klass_1)
                     outpath_list[i] = project_dir + '/' + filename_list[i]
-                    if os.path.exists(project_dir + '/' + filename_list[i]) == True:
+                    if os.path.exists(project_dir + '/' + filename_list[i]) == True and resume == False:
                         os.system('rm -rf ' + project_dir + '/' + filename_list[i])
-                    os.system('mkdir ' + project_dir + '/' + filename_list[i])
-                    os.system('mkdir ' + project_dir + '/' + filename_list[i] \
+                    os.system('mkdir -p ' + project_dir + '/' + filename_list[i])
+                    os.system('mkdir -p ' + project_dir + '/' + filename_list[i] \
                             + '/PLOTS')
-                    os.system('mkdir ' + project_dir + '/' + filename_list[i] \
+                    os.system('mkdir -p ' + project_dir + '/' + filename_list[i] \
                             + '/TABLES')
                     log_list[i] = open(project_dir + '/' + filename_list[i] + '/' \
-                                    + filename_list[i] + '_VIPCALslog.txt', 'w+')
+                                    + filename_list[i] + '_VIPCALslog.txt', log_mode)
                     log_list[i].write(ascii_logo + '\n')
 
                 stats_df['t_0'] = time.time() - t_0
 
-                ## START THE PIPELINE ##    
-                calibrate(filepath_list_ID, filename_list, outpath_list, log_list, target_list, 
-                  sources, load_all_id, full_source_list, disk_number, aips_name_short, klass_1,
-                  multifreq_id[0], group[0]/1e6, bif, eif, def_refant, def_refant_list, search_central,
-                  max_scan_refant_search, time_aver, freq_aver, fringefit_snr,
-                  def_solint, min_solint, max_solint, phase_ref,
-                  inp_cal, subarray, shifts, load_antab, channel_out, flag_edge, interactive, 
-                  stats_df)     
+                ## Queue the calibration of this band ##    
+                band_jobs.append(BandJob(klass_1, log_list, [filepath_list_ID, filename_list, outpath_list, log_list, target_list, 
+                          sources, load_all_id, full_source_list, disk_number, aips_name_short, klass_1,
+                          multifreq_id[0], group[0]/1e6, bif, eif, def_refant, def_refant_list, search_central,
+                          max_scan_refant_search, time_aver, freq_aver, fringefit_snr,
+                          def_solint, min_solint, max_solint, phase_ref,
+                          inp_cal, subarray, shifts, load_antab, channel_out, flag_edge, interactive, 
+                          resume, deferred_stats, inplace_stats, stats_df, workspace]))     
+
+        ## START THE PIPELINE ##
+        run_bands(band_jobs, parallel_bands, workspace)
 
+        workspace.clean()
         return() # STOP the pipeline. This needs to be tweaked.
 
 
@@ -2248,7 +2558,8 @@ def pipeline(input_dict):
 
     # If there are multiple IFs:   
     if multifreq_if[0] == True:
-        
+        band_jobs = []
+
         klass_1 = multifreq_if[5] + 'G'
         klass_2 = multifreq_if[6] + 'G'
 
@@ -2280,8 +2591,8 @@ def pipeline(input_dict):
                     sources = [x.name for x in full_source_list]
 
         # Define AIPS name
-        hdul = fits.open(filepath_list[0])
-        aips_name = hdul['UV_DATA'].header['OBSCODE'] # + '_' + klass_1
+        obscode = meta.read_metadata(filepath_list[0]).obscode
+        aips_name = obscode # + '_' + klass_1
 
         ## Check if the AIPS catalogue name is too long, and rename ##
         aips_name_short = aips_name
@@ -2292,7 +2603,7 @@ def pipeline(input_dict):
             aips_name_short = name[:size_name] + '_' + suffix
 
         # Check if project directory already exists, if not, create one
-        project_dir = output_directory + '/' + hdul['UV_DATA'].header['OBSCODE']
+        project_dir = output_directory + '/' + obscode
         if os.path.exists(project_dir) == False:
             os.system('mkdir ' + project_dir)
 
@@ -2307,7 +2618,7 @@ def pipeline(input_dict):
         stats_df['loaded_sources'] =  json.dumps(dict(zip(sources, [x.band_flux for x in full_source_list if x.name in sources])))
         stats_df['n_of_freqs'] = 2
 
-        # Create subdirectories for the targets and DELETE EXISTING ONES
+        # Create subdirectories for the targets and DELETE EXISTING ONES (unless resuming)
         # Also, create the pipeline log file of each target
         filename_list = target_list.copy()
         log_list = target_list.copy()
@@ -2315,27 +2626,27 @@ def pipeline(input_dict):
         for i, name in enumerate(filename_list):
             filename_list[i] = load.set_name(filepath_list[0], name, klass_1)
             outpath_list[i] = project_dir + '/' + filename_list[i]
-            if os.path.exists(project_dir + '/' + filename_list[i]) == True:
+            if os.path.exists(project_dir + '/' + filename_list[i]) == True and resume == False:
                 os.system('rm -rf ' + project_dir + '/' + filename_list[i])
-            os.system('mkdir ' + project_dir + '/' + filename_list[i])
-            os.system('mkdir ' + project_dir + '/' + filename_list[i] \
+            os.system('mkdir -p ' + project_dir + '/' + filename_list[i])
+            os.system('mkdir -p ' + project_dir + '/' + filename_list[i] \
                         + '/PLOTS')
-            os.system('mkdir ' + project_dir + '/' + filename_list[i] \
+            os.system('mkdir -p ' + project_dir + '/' + filename_list[i] \
                         + '/TABLES')
 
             log_list[i] = open(project_dir + '/' + filename_list[i] + '/' \
-                               + filename_list[i] + '_VIPCALslog.txt', 'w+')
+                               + filename_list[i] + '_VIPCALslog.txt', log_mode)
             log_list[i].write(ascii_logo + '\n')
 
         stats_df['t_0'] = time.time() - t_0        
-        ## START THE PIPELINE ##
-        calibrate(filepath_list, filename_list, outpath_list, log_list, target_list, 
-                  sources, load_all, full_source_list, disk_number, aips_name_short, klass_1,
-                  multifreq_id[0], 0, multifreq_if[1], multifreq_if[2], def_refant, def_refant_list, search_central,
-                  max_scan_refant_search, time_aver, freq_aver, fringefit_snr,
-                  def_solint, min_solint, max_solint, phase_ref,
-                  inp_cal, subarray, shifts, load_antab, channel_out, flag_edge, interactive, 
-                  stats_df)   
+        ## Queue the calibration of this band ##
+        band_jobs.append(BandJob(klass_1, log_list, [filepath_list, filename_list, outpath_list, log_list, target_list, 
+                          sources, load_all, full_source_list, disk_number, aips_name_short, klass_1,
+                          multifreq_id[0], 0, multifreq_if[1], multifreq_if[2], def_refant, def_refant_list, search_central,
+                          max_scan_refant_search, time_aver, freq_aver, fringefit_snr,
+                          def_solint, min_solint, max_solint, phase_ref,
+                          inp_cal, subarray, shifts, load_antab, channel_out, flag_edge, interactive, 
+                          resume, deferred_stats, inplace_stats, stats_df, workspace]))   
         
         
         
@@ -2367,8 +2678,8 @@ def pipeline(input_dict):
                     sources = [x.name for x in full_source_list]
 
         # Define AIPS name
-        hdul = fits.open(filepath_list[0])
-        aips_name = hdul['UV_DATA'].header['OBSCODE'] # + '_' + klass_2
+        obscode = meta.read_metadata(filepath_list[0]).obscode
+        aips_name = obscode # + '_' + klass_2
         
         ## Check if the AIPS catalogue name is too long, and rename ##
         aips_name_short = aips_name
@@ -2379,7 +2690,7 @@ def pipeline(input_dict):
             aips_name_short = name[:size_name] + '_' + suffix
 
         # Check if project directory already exists, if not, create one
-        project_dir = output_directory + '/' + hdul['UV_DATA'].header['OBSCODE']
+        project_dir = output_directory + '/' + obscode
         if os.path.exists(project_dir) == False:
             os.system('mkdir ' + project_dir)
 
@@ -2394,7 +2705,7 @@ def pipeline(input_dict):
         stats_df['loaded_sources'] =  json.dumps(dict(zip(sources, [x.band_flux for x in full_source_list if x.name in sources])))
         stats_df['n_of_freqs'] = 2
 
-        # Create subdirectories for the targets and DELETE EXISTING ONES
+        # Create subdirectories for the targets and DELETE EXISTING ONES (unless resuming)
         # Also, create the pipeline log file of each target
         filename_list = target_list.copy()
         log_list = target_list.copy()
@@ -2402,29 +2713,33 @@ def pipeline(input_dict):
         for i, name in enumerate(filename_list):
             filename_list[i] = load.set_name(filepath_list[0], name, klass_2)
             outpath_list[i] = project_dir + '/' + filename_list[i]
-            if os.path.exists(project_dir + '/' + filename_list[i]) == True:
+            if os.path.exists(project_dir + '/' + filename_list[i]) == True and resume == False:
                 os.system('rm -rf ' + project_dir + '/' + filename_list[i])
-            os.system('mkdir ' + project_dir + '/' + filename_list[i])
-            os.system('mkdir ' + project_dir + '/' + filename_list[i] \
+            os.system('mkdir -p ' + project_dir + '/' + filename_list[i])
+            os.system('mkdir -p ' + project_dir + '/' + filename_list[i] \
                         + '/PLOTS')
-            os.system('mkdir ' + project_dir + '/' + filename_list[i] \
+            os.system('mkdir -p ' + project_dir + '/' + filename_list[i] \
                         + '/TABLES')
 
             log_list[i] = open(project_dir + '/' + filename_list[i] + '/' \
-                               + filename_list[i] + '_VIPCALslog.txt', 'w+')
+                               + filename_list[i] + '_VIPCALslog.txt', log_mode)
             log_list[i].write(ascii_logo + '\n')
 
         stats_df['t_0'] = time.time() - t_0           
-        ## START THE PIPELINE ##  
-        calibrate(filepath_list, filename_list, outpath_list, log_list, target_list, 
-                sources, load_all, full_source_list, disk_number, aips_name_short, klass_2,
-                multifreq_id[0], 0, multifreq_if[3], multifreq_if[4], def_refant, def_refant_list, search_central,
-                max_scan_refant_search, time_aver, freq_aver, fringefit_snr,
-                def_solint, min_solint, max_solint, phase_ref,
-                inp_cal, subarray, shifts, load_antab, channel_out, flag_edge, interactive, 
-                stats_df) 
+        ## Queue the calibration of this band ##  
+        band_jobs.append(BandJob(klass_2, log_list, [filepath_list, filename_list, outpath_list, log_list, target_list, 
+                        sources, load_all, full_source_list, disk_number, aips_name_short, klass_2,
+                        multifreq_id[0], 0, multifreq_if[3], multifreq_if[4], def_refant, def_refant_list, search_central,
+                        max_scan_refant_search, time_aver, freq_aver, fringefit_snr,
+                        def_solint, min_solint, max_solint, phase_ref,
+                        inp_cal, subarray, shifts, load_antab, channel_out, flag_edge, interactive, 
+                        resume, deferred_stats, inplace_stats, stats_df, workspace])) 
+
+        ## START THE PIPELINE ##
+        run_bands(band_jobs, parallel_bands, workspace)
 
         # End the pipeline
+        workspace.clean()
         return()
 
      # If there is only one frequency:  
@@ -2458,8 +2773,8 @@ def pipeline(input_dict):
                     sources = [x.name for x in full_source_list]
 
         # Define AIPS name
-        hdul = fits.open(filepath_list[0])
-        aips_name = hdul['UV_DATA'].header['OBSCODE']
+        obscode = meta.read_metadata(filepath_list[0]).obscode
+        aips_name = obscode
         
         ## Check if the AIPS catalogue name is too long, and rename ##
         aips_name_short = aips_name
@@ -2470,7 +2785,7 @@ def pipeline(input_dict):
             aips_name_short = name[:size_name] + '_' + suffix
 
         # Check if project directory already exists, if not, create one
-        project_dir = output_directory + '/' + hdul['UV_DATA'].header['OBSCODE']
+        project_dir = output_directory + '/' + obscode
         if os.path.exists(project_dir) == False:
             os.system('mkdir ' + project_dir)
 
@@ -2485,7 +2800,7 @@ def pipeline(input_dict):
         stats_df['loaded_sources'] =  json.dumps(dict(zip(sources, [x.band_flux for x in full_source_list if x.name in sources])))
         stats_df['n_of_freqs'] = 1
 
-        # Create subdirectories for the targets and DELETE EXISTING ONES
+        # Create subdirectories for the targets and DELETE EXISTING ONES (unless resuming)
         # Also, create the pipeline log file of each target
         filename_list = target_list.copy()
         log_list = target_list.copy()
@@ -2494,16 +2809,16 @@ def pipeline(input_dict):
             filename_list[i] = load.set_name(filepath_list[0], name, klass_1)
             outpath_list[i] = project_dir + '/' + filename_list[i]
             
-            if os.path.exists(project_dir + '/' + filename_list[i]) == True:
+            if os.path.exists(project_dir + '/' + filename_list[i]) == True and resume == False:
                 os.system('rm -rf ' + project_dir + '/' + filename_list[i])
-            os.system('mkdir ' + project_dir + '/' + filename_list[i])
-            os.system('mkdir ' + project_dir + '/' + filename_list[i] \
+            os.system('mkdir -p ' + project_dir + '/' + filename_list[i])
+            os.system('mkdir -p ' + project_dir + '/' + filename_list[i] \
                         + '/PLOTS')
-            os.system('mkdir ' + project_dir + '/' + filename_list[i] \
+            os.system('mkdir -p ' + project_dir + '/' + filename_list[i] \
                         + '/TABLES')
 
             log_list[i] = open(project_dir + '/' + filename_list[i] + '/' \
-                               + filename_list[i] + '_VIPCALslog.txt', 'w+')
+                               + filename_list[i] + '_VIPCALslog.txt', log_mode)
             log_list[i].write(ascii_logo + '\n')
 
         stats_df['t_0'] = time.time() - t_0            
@@ -2514,4 +2829,7 @@ def pipeline(input_dict):
                   max_scan_refant_search, time_aver, freq_aver, fringefit_snr,
                   def_solint, min_solint, max_solint, phase_ref,
                   inp_cal, subarray, shifts, load_antab, channel_out, flag_edge, interactive, 
-                  stats_df)   
\ No newline at end of file
+                  resume, deferred_stats, inplace_stats, stats_df, workspace)   
+
+        # End the pipeline
+        workspace.clean()
\ No newline at end of file
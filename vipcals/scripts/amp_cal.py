@@ -1,5 +1,7 @@
 import numpy as np
 
+from vipcals.scripts import table_cache as tcache
+
 from AIPSTask import AIPSTask, AIPSList
 
 AIPSTask.msgkill = -8
@@ -28,7 +30,7 @@ def amp_cal(data, solint = -3, average = False, ref_if = 0):
     :type ref_if: int, optional
     """    
     # Check which antennas have GC, only calibrate those
-    gc_antennas = [y['antenna_no'] for y in data.table('GC',1)]
+    gc_antennas = [y['antenna_no'] for y in tcache.table(data, 'GC',1)]
     antenna_list = list(set(gc_antennas))
 
     apcal = AIPSTask('apcal')
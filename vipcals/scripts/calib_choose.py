@@ -1,5 +1,8 @@
+import warnings
 import numpy as np
 
+from typing import NamedTuple
+
 from AIPSTask import AIPSTask, AIPSList
 
 AIPSTask.msgkill = -8
@@ -7,6 +10,7 @@ AIPSTask.msgkill = -8
 from vipcals.scripts.helper import NoScansError
 from vipcals.scripts.helper import Scan
 from vipcals.scripts.helper import tacop
+from vipcals.scripts import table_cache as tcache
     
 def snr_fring(data, refant, priority_refants, delay_w = 1000, rate_w = 200):
     """Short fringe fit (only FFT) to select a bright calibrator.
@@ -33,7 +37,7 @@ def snr_fring(data, refant, priority_refants, delay_w = 1000, rate_w = 200):
         defaults to 200
     :type rate_w: int, optional  
     """    
-    nx_table = data.table('NX', 1)
+    nx_table = tcache.table(data, 'NX', 1)
     longest_scan = np.ceil(max([x.time_interval for x in nx_table]) * 24 * 60)
 
     snr_fring = AIPSTask('fring')
@@ -63,6 +67,73 @@ def snr_fring(data, refant, priority_refants, delay_w = 1000, rate_w = 200):
     snr_fring.go()
     
 
+class SNRMatrix(NamedTuple):
+    """SNR of every scan of the calibrator search.
+
+    Scans are kept in the order in which they appear in the SN table. Entries without 
+    a solution and entries of the reference antenna of each solution are NaN. If an 
+    antenna has several rows in the same scan (e.g. from different subarrays), the 
+    matrix keeps the highest SNR of each IF, and the SNR of each row is also kept.
+    """
+    times: np.ndarray
+    time_intervals: np.ndarray
+    source_ids: np.ndarray
+    antennas: np.ndarray
+    snr: np.ndarray         # [scan, antenna, IF]
+    present: np.ndarray     # [scan, antenna], whether the antenna has a solution
+    single_if: bool
+    row_scans: np.ndarray   # [row], scan of each row of the SN table
+    row_antennas: np.ndarray    # [row], antenna index of each row
+    row_snr: np.ndarray     # [row, IF]
+
+def snr_matrix(data, version = 1):
+    """Read the SNR values of a solution table into a scan x antenna x IF matrix.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param version: SN table version containing the SNR values; defaults to 1
+    :type version: int, optional
+    :return: SNR matrix
+    :rtype: :class:`~vipcals.scripts.calib_choose.SNRMatrix`
+    """
+    snr_table = tcache.table(data, 'SN', version)
+    n_rows = len(snr_table)
+    if n_rows == 0:
+        raise NoScansError
+
+    # Scans in order of appearance
+    time_col = snr_table['time']
+    unique_times, first, inverse = np.unique(time_col, return_index = True, 
+                                             return_inverse = True)
+    order = np.argsort(first, kind = 'stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    scan_idx = rank[inverse]
+
+    antennas, ant_idx = np.unique(snr_table['antenna_no'], return_inverse = True)
+
+    # Single IF datasets have one value per row
+    single_if = snr_table['weight_1'].ndim == 1
+    weights = snr_table['weight_1'].reshape(n_rows, -1) / 2
+    refants = snr_table['refant_1'].reshape(n_rows, -1)[:, 0]
+    weights[snr_table['antenna_no'] == refants] = np.nan
+
+    # Repeated (scan, antenna) rows keep the highest value, NaN only if all are NaN
+    snr = np.full((len(order), len(antennas), weights.shape[1]), np.nan)
+    np.fmax.at(snr, (scan_idx, ant_idx), weights)
+    present = np.zeros((len(order), len(antennas)), dtype = bool)
+    present[scan_idx, ant_idx] = True
+
+    # Source of the last entry of each scan
+    source_ids = np.zeros(len(order), dtype = int)
+    source_ids[scan_idx] = snr_table['source_id']
+
+    return(SNRMatrix(times = time_col[first[order]], 
+                     time_intervals = snr_table['time_interval'][first[order]],
+                     source_ids = source_ids, antennas = antennas, snr = snr, 
+                     present = present, single_if = single_if, row_scans = scan_idx,
+                     row_antennas = ant_idx, row_snr = weights))
+
 def snr_scan_list_v2(data, version = 1):
     """Create a list of scans ordered by SNR.
 
@@ -77,53 +148,41 @@ def snr_scan_list_v2(data, version = 1):
     :return: list of scans ordered by median SNR
     :rtype: list of :class:`~vipcals.scripts.helper.Scan` objects
     """    
-    snr_table = data.table('SN', version)
+    matrix = snr_matrix(data, version)
+    source_names = dict([(src.id__no, src.source.strip()) 
+                         for src in tcache.table(data, 'SU', 1)])
+
+    # Rows of each scan in order of appearance. Every row is kept, also when an 
+    # antenna appears more than once in the same scan
+    row_order = np.argsort(matrix.row_scans, kind = 'stable')
+    bounds = np.cumsum(np.bincount(matrix.row_scans, minlength = len(matrix.times)))
+    scan_rows = np.split(row_order, bounds[:-1])
+
+    # Order them by their median SNR over all rows
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Scans without valid SNR
+        median_snr = np.array([np.nanmedian(matrix.row_snr[rows]) 
+                               for rows in scan_rows])
+    order = np.argsort(-median_snr, kind = 'stable')
+
     scan_list = []
-    time_list = []
-    for entry in snr_table:
-        # Create a new Scan() for each new timestamp
-        if entry['time'] not in time_list:
-            a = Scan()
-            a.time = entry['time']
-            a.time_interval = entry['time_interval']
-            scan_list.append(a)
-            time_list.append(a.time)
-            
-        element = next(scan for scan in scan_list \
-                       if scan.time == entry['time'])
-        element.source_id = entry['source_id']
-        element.antennas.append(entry['antenna_no'])
-
-        # Append the SNR value of each antenna (except the reference antenna)
-        if type(entry['weight_1']) == list:
-            if entry.antenna_no != entry.refant_1[0]:
-                element.snr.append([x/2 for x in entry['weight_1']])
-            else:
-                element.snr.append([np.nan])
-        else: # Single IF datasets
-            if entry.antenna_no != entry.refant_1:
-                element.snr.append(entry['weight_1']/2)
+    for n in order:
+        a = Scan()
+        a.time = float(matrix.times[n])
+        a.time_interval = float(matrix.time_intervals[n])
+        a.source_id = int(matrix.source_ids[n])
+        a.source_name = source_names.get(a.source_id)
+        # SNR value of each row (NaN for the reference antenna)
+        for row in scan_rows[n]:
+            a.antennas.append(int(matrix.antennas[matrix.row_antennas[row]]))
+            values = matrix.row_snr[row]
+            if matrix.single_if == True:
+                a.snr.append(float(values[0]))
+            elif np.all(np.isnan(values)):
+                a.snr.append([np.nan])
             else:
-                element.snr.append(np.nan)
-
-    # Order them by their median SNR
-    if type(entry['weight_1']) == list:
-        scan_list.sort(key=lambda x: np.nanmedian([a for b in x.snr for a in b]),\
-                    reverse=True)
-    else: # Single IF datasets
-        scan_list.sort(key=lambda x: np.nanmedian(x.snr),\
-                    reverse=True)
-    
-    # If there are no scans, tell the main worflow to print an error message
-    # and stop the pipeline
-    if len(scan_list) == 0:
-        raise NoScansError
-    
-    # Assign source names to the Scan objects
-    for scans in scan_list:
-        for src in data.table('SU', 1):
-            if scans.source_id == src.id__no:
-                scans.source_name = src.source.strip()
+                a.snr.append(values.tolist())
+        scan_list.append(a)
 
     return(scan_list)
 
@@ -152,22 +211,37 @@ def get_calib_scans(data, ordered_scan_list, refant):
         if refant in s.antennas and s.time_interval > 0.0:
             scan_list.append(s)
 
-    best_scans = {}
+    # Mean SNR over IFs of each row of the SN table, NaN for the reference antenna. 
+    # Rows are taken scan by scan, in the order of the scan list
+    matrix = snr_matrix(data)
+    row_order = np.argsort(matrix.row_scans, kind = 'stable')
+    bounds = np.cumsum(np.bincount(matrix.row_scans, minlength = len(matrix.times)))
+    scan_rows = np.split(row_order, bounds[:-1])
+    scan_row = dict([(t, n) for n, t in enumerate(matrix.times.tolist())])
+    rows = np.concatenate([scan_rows[scan_row[s.time]] for s in scan_list] 
+                          + [np.zeros(0, dtype = int)])
+    row_scan = np.concatenate([np.full(len(scan_rows[scan_row[s.time]]), n) 
+                               for n, s in enumerate(scan_list)] 
+                              + [np.zeros(0, dtype = int)])
+    row_ant = matrix.antennas[matrix.row_antennas[rows]]
+    row_mean = matrix.row_snr[rows].mean(axis = 1)
 
+    # Antennas in order of appearance
+    antennas = []
     for s in scan_list:
-        try: 
-            _ = len(s.snr[0])>1
-            for ant, snr in zip(s.antennas, [sum(inner) / len(inner) for inner in s.snr]):  
-                if ant == refant:
-                    continue     
-                if ant not in best_scans or snr > best_scans[ant][1]:
-                    best_scans[ant] = (s, snr)
-        except TypeError: # Single IF
-            for ant, snr in zip(s.antennas, s.snr):  
-                if ant == refant:
-                    continue     
-                if ant not in best_scans or snr > best_scans[ant][1]:
-                    best_scans[ant] = (s, snr)
+        antennas += [ant for ant in s.antennas if ant != refant and ant not in antennas]
+
+    # The first row of each antenna sets its SNR, which is only replaced by a higher 
+    # one. An antenna whose first row is NaN keeps NaN
+    best_scans = {}
+    for ant in antennas:
+        ant_rows = np.flatnonzero(row_ant == ant)
+        values = row_mean[ant_rows]
+        if np.isnan(values[0]):
+            best_scans[ant] = (scan_list[row_scan[ant_rows[0]]], np.nan)
+        else:
+            n = np.nanargmax(values)
+            best_scans[ant] = (scan_list[row_scan[ant_rows[n]]], float(values[n]))
 
     # Remove antennas that did not reach 5 of SNR
     no_calib_antennas = [ant for ant in best_scans if best_scans[ant][1] < 5 
@@ -1,5 +1,7 @@
 import os
 
+from vipcals.scripts import product_cache as pcache
+
 from AIPSTask import AIPSTask, AIPSList
 
 AIPSTask.msgkill = -8
@@ -10,7 +12,30 @@ tmp_dir = os.path.expanduser("~/.vipcals/tmp")
 if os.path.isdir("/home/vipcals"):
     tmp_dir = "/home/vipcals/.vipcals/tmp"
 
-def eop_correct(data):
+def download_eop(workspace = None):
+    """Download the Earth orientation parameters file.
+
+    The file is kept in the product cache and checked again for updates once a day.
+
+    This function does not access the AIPS catalogue, so it can run in the background 
+    while other calibration steps are executed.
+
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
+    :return: path of the downloaded file
+    :rtype: str
+    """
+    tmp = tmp_dir if workspace == None else workspace.path
+
+    # The file is updated daily
+    pcache.fetch('ftp://gdc.cddis.eosdis.nasa.gov/vlbi/gsfc/ancillary/' \
+                 + 'solve_apriori/usno_finals.erp', tmp + '/usno_finals_bis.erp', 
+                 max_age = pcache.DAILY, options = pcache.CDDIS_OPTIONS)
+
+    return(f'{tmp}/usno_finals_bis.erp')
+
+def eop_correct(data, workspace = None, download = True):
     """Earth orientation parameters correction.
     
     Correction of UT1-UTC and Earth's pole position. Downloads a file and 
@@ -19,14 +44,17 @@ def eop_correct(data):
 
     :param data: visibility data
     :type data: AIPSUVData
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
+    :param download: download the file, set to False if it was already retrieved 
+        by :func:`~vipcals.scripts.eop_corr.download_eop`; defaults to True
+    :type download: bool, optional
     """    
-    here = os.path.dirname(__file__)
-    tmp = tmp_dir
+    tmp = tmp_dir if workspace == None else workspace.path
 
-    curl_command = 'curl -su anonymous:daip@nrao.edu --ftp-ssl ' \
-    + 'ftp://gdc.cddis.eosdis.nasa.gov/vlbi/gsfc/ancillary/' \
-    + 'solve_apriori/usno_finals.erp > ' + tmp + '/usno_finals_bis.erp'
-    os.system(curl_command)
+    if download == True:
+        download_eop(workspace = workspace)
     
     clcor = AIPSTask('clcor')
     clcor.inname = data.name
@@ -39,4 +67,4 @@ def eop_correct(data):
     clcor.gainver = 2
     clcor.gainuse = 3
 
-    clcor.go()
\ No newline at end of file
+    clcor.go()
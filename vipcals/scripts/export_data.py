@@ -1,8 +1,11 @@
 import os
 import functools
+from typing import NamedTuple
 print = functools.partial(print, flush=True)
 import numpy as np
 
+from vipcals.scripts import table_cache as tcache
+
 from AIPSData import AIPSUVData
 from AIPSTask import AIPSTask, AIPSList
 AIPSTask.msgkill = -8
@@ -16,7 +19,8 @@ if os.path.isdir("/home/vipcals"):
     tmp_dir = "/home/vipcals/.vipcals/tmp"
 
 def data_export(path_list, data, target_list, filename_list, \
-                ignore_list, channel_out, flag_edge = True, flag_frac = 0.1):
+                ignore_list, channel_out, flag_edge = True, flag_frac = 0.1, \
+                workspace = None):
     """Split multi-source uv data to single source and export it to uvfits format.
 
     Uses the SPLIT task in AIPS to apply the calibration tables to each source and 
@@ -50,9 +54,13 @@ def data_export(path_list, data, target_list, filename_list, \
     :param flag_frac: number of edge channels to flag, either a percentage (if < 1) \
                       or an integer number of channels (if >= 1); defaults to 0.1
     :type flag_frac: float, optional
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     :return: list of sources where no baselines could be formed, if any
     :rtype: list of str
     """
+    tmp = tmp_dir if workspace == None else workspace.path
     no_baseline = []
     if flag_frac == 0:
         flag_edge = False
@@ -94,11 +102,11 @@ def data_export(path_list, data, target_list, filename_list, \
 
         else:
             try:
-                no_channels = int(data.table('FQ',1)[0]['total_bandwidth'][0] / \
-                            data.table('FQ',1)[0]['ch_width'][0])
+                no_channels = int(tcache.table(data, 'FQ',1)[0]['total_bandwidth'][0] / \
+                            tcache.table(data, 'FQ',1)[0]['ch_width'][0])
             except TypeError:   # Single IF datasets
-                no_channels = int(data.table('FQ',1)[0]['total_bandwidth'] / \
-                            data.table('FQ',1)[0]['ch_width'])
+                no_channels = int(tcache.table(data, 'FQ',1)[0]['total_bandwidth'] / \
+                            tcache.table(data, 'FQ',1)[0]['ch_width'])
                 
             if flag_edge == True and flag_frac < 1:
                 flag_chann = round(flag_frac * no_channels)
@@ -137,17 +145,17 @@ def data_export(path_list, data, target_list, filename_list, \
             if len(path_list[i] + '/' + filename_list[i] + '.uvfits') < 100:
                 fittp.dataout = path_list[i] + '/' + filename_list[i] + '.uvfits'
             else:
-                fittp.dataout = tmp_dir + '/aux.export.uvfits'
+                fittp.dataout = tmp + '/aux.export.uvfits'
             fittp.go()
 
             # If created, move the auxiliary file to the correct path
             if len(path_list[i] + '/' + filename_list[i] + '.uvfits') >= 100:
-                os.system('mv ' + tmp_dir + '/aux.export.uvfits ' \
+                os.system('mv ' + tmp + '/aux.export.uvfits ' \
                         + path_list[i] + '/' + filename_list[i] + '.uvfits')
 
     return(no_baseline)
 
-def table_export(path_list, data, target_list, filename_list):
+def table_export(path_list, data, target_list, filename_list, workspace = None):
     """Copy calibration tables to a dummy AIPS entry and export them.
 
     :param path_list: list of filepaths for each source
@@ -158,7 +166,11 @@ def table_export(path_list, data, target_list, filename_list):
     :type target_list: list of str
     :param filename_list: list containing the subdirectories of each target
     :type filename_list: list of str
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """    
+    tmp = tmp_dir if workspace == None else workspace.path
 
     tasav = AIPSTask('tasav')
     tasav.inname = data.name
@@ -183,13 +195,13 @@ def table_export(path_list, data, target_list, filename_list):
                             + '.caltab.uvfits'
         # If the name is too long, save the tables on aux.caltab.fits   
         else:
-            fittp.dataout = tmp_dir + '/aux.caltab.uvfits'
+            fittp.dataout = tmp + '/aux.caltab.uvfits'
       
         fittp.go()
 
         # If created, move aux.caltab.fits to the correct path
         if len(path_list[i] + '/TABLES/' + filename_list[i] + '.caltab.uvfits') >= 100:
-            os.system('mv ' + tmp_dir + '/aux.caltab.uvfits ' \
+            os.system('mv ' + tmp + '/aux.caltab.uvfits ' \
                       + path_list[i] + '/TABLES/' + filename_list[i] + '.caltab.uvfits')
 
     # Remove the DUMMY AIPS entry
@@ -256,25 +268,182 @@ def data_split(data, target_list, cl_table = 1, bpass = False, flagver = 0, \
 
         data_split.go()
 
-def vis_count(data):
-    """Fast count of unflagged visibilities using NumPy vectorization.
+# Memory used to buffer the visibility weights of a chunk of records
+CHUNK_BYTES = 64 * 1024**2
+
+class VisCounter():
+    """Accumulate the number of unflagged visibilities of a dataset.
+
+    Records are added in chunks, and the counts per antenna, IF, polarization and scan 
+    are computed with NumPy for the whole chunk at once.
+    """
+    def __init__(self, antenna_codes, n_if, n_pol, scans = None):
+        """
+        Initialize the counter with the antenna numbers of the AN table, the shape of 
+        the data and optionally the (start, end) times of the scans.
+        """
+        self.antenna_codes = list(antenna_codes)
+        self.total = 0
+        self.antennas = np.zeros(max(self.antenna_codes + [0]) + 1, dtype = np.int64)
+        self.ifs = np.zeros(n_if, dtype = np.int64)
+        self.pols = np.zeros(n_pol, dtype = np.int64)
+        if scans == None:
+            scans = []
+        self.scan_start = np.array([x[0] for x in scans], dtype = float)
+        self.scan_end = np.array([x[1] for x in scans], dtype = float)
+        self.scans = np.zeros(len(scans), dtype = np.int64)
+
+    def add(self, baselines, times, good):
+        """
+        Add a chunk of records, given their baselines [N, 2], times [N] and unflagged 
+        visibilities [N, IF, chan, pol].
+        """
+        per_if_pol = np.count_nonzero(good, axis = 2)   # shape: [N, IF, pol]
+        per_record = per_if_pol.sum(axis = (1, 2))
+        self.total += int(per_record.sum())
+        self.ifs += per_if_pol.sum(axis = (0, 2))
+        self.pols += per_if_pol.sum(axis = (0, 1))
+
+        # Both antennas of the baseline get the visibilities of the record
+        ants = baselines.ravel()
+        known = ants < len(self.antennas)
+        self.antennas += np.bincount(ants[known], 
+                                     weights = np.repeat(per_record, 2)[known],
+                                     minlength = len(self.antennas)).astype(np.int64)
+
+        if len(self.scans) > 0:
+            n = np.searchsorted(self.scan_start, times, side = 'right') - 1
+            in_scan = (n >= 0) & (times <= self.scan_end[np.maximum(n, 0)])
+            np.add.at(self.scans, n[in_scan], per_record[in_scan])
+
+    def breakdown(self, key_map):
+        """
+        Return the counts, with antenna numbers translated into names.
+        """
+        return {'total': int(self.total),
+                'antennas': {key_map[k]: int(self.antennas[k]) for k in self.antenna_codes
+                             if k in key_map},
+                'ifs': self.ifs.tolist(),
+                'pols': self.pols.tolist(),
+                'scans': self.scans.tolist()}
+
+class VisChunk(NamedTuple):
+    """Chunk of records read by :func:`~vipcals.scripts.export_data.read_chunks`."""
+    sources: np.ndarray     # [N]
+    baselines: np.ndarray   # [N, 2]
+    times: np.ndarray       # [N]
+    subarrays: np.ndarray   # [N]
+    freq_ids: np.ndarray    # [N]
+    good: np.ndarray        # [N, IF, chan, pol], visibilities with non-zero weight
+
+def read_chunks(w_data, select = None, stop = None):
+    """Read the visibilities of a dataset in chunks of records.
+
+    Wizardry only gives access to the data one record at a time, so each record is 
+    still read and copied into the chunk in Python. Only the operations on the chunks 
+    are vectorized.
+
+    :param w_data: visibility data
+    :type w_data: Wizardry.AIPSData.AIPSUVData object
+    :param select: function called with each record, returning False to skip it; 
+        defaults to None (read all records)
+    :type select: function, optional
+    :param stop: time in days where the reading stops, the data have to be in time 
+        order; defaults to None (read all records)
+    :type stop: float, optional
+    :return: chunks of records
+    :rtype: generator of :class:`VisChunk`
+    """
+    buffer = None
+    n = 0
+    for record in w_data:
+        if stop != None and record.time >= stop:
+            break
+        if select != None and select(record) == False:
+            continue
+        good = record.visibility[..., 2] != 0
+
+        if buffer == None:
+            chunk_size = max(1, CHUNK_BYTES // good.size)
+            # Data without SUBARRAY or FREQSEL random parameters have a single one
+            has_subarray = hasattr(record, 'subarray')
+            has_freqsel = hasattr(record, 'freqsel')
+            buffer = VisChunk(np.zeros(chunk_size, dtype = int), 
+                              np.zeros((chunk_size, 2), dtype = int),
+                              np.zeros(chunk_size), np.ones(chunk_size, dtype = int), 
+                              np.ones(chunk_size, dtype = int),
+                              np.zeros((chunk_size,) + good.shape, dtype = bool))
+        buffer.sources[n] = record.source
+        buffer.baselines[n] = record.baseline
+        buffer.times[n] = record.time
+        if has_subarray == True:
+            buffer.subarrays[n] = record.subarray
+        if has_freqsel == True:
+            buffer.freq_ids[n] = record.freqsel
+        buffer.good[n] = good
+        n += 1
+
+        if n == chunk_size:
+            yield VisChunk(*[x[:n] for x in buffer])
+            n = 0
+
+    if n > 0:
+        yield VisChunk(*[x[:n] for x in buffer])
+
+def scan_times(data):
+    """Start and end times of the scans in the NX table.
 
     :param data: visibility data
     :type data: AIPSUVData
-    :return: Total number of unflagged visibilities
-    :rtype: int
+    :return: (start, end) time of each scan in days, or an empty list if there is no 
+        NX table
+    :rtype: list of tuple
     """
-    n_vis = 0
+    if [1, 'AIPS NX'] not in [[x[0], x[1]] for x in data.tables]:
+        return []
+    return [(x['time'] - x['time_interval']/2, x['time'] + x['time_interval']/2) 
+            for x in tcache.table(data, 'NX', 1)]
+
+def vis_breakdown(data, scans = None):
+    """Count unflagged visibilities per antenna, IF, polarization and scan.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param scans: (start, end) time of each scan; defaults to the scans in the NX 
+        table of the data
+    :type scans: list of tuple, optional
+    :return: total number of unflagged visibilities ('total') and per antenna name 
+        ('antennas'), IF ('ifs'), polarization ('pols') and scan ('scans')
+    :rtype: dict
+    """
+    antenna_codes = tcache.table(data, 'AN', 1)['nosta'].tolist()
+    antenna_names = [x.strip() for x in tcache.table(data, 'AN', 1)['anname']]
+    key_map = dict(zip(antenna_codes, antenna_names))
+    if scans == None:
+        scans = scan_times(data)
 
     w_data = wizard.AIPSUVData(data.name, data.klass, data.disk, data.seq)
+    counter = None
+    for chunk in read_chunks(w_data):
+        if counter == None:
+            counter = VisCounter(antenna_codes, chunk.good.shape[1], 
+                                 chunk.good.shape[3], scans)
+        counter.add(chunk.baselines, chunk.times, chunk.good)
 
-    for record in w_data:
-        vis = record.visibility  # shape: [IF, chan, pol, N]
-        # Extract weight axis (index 2 of the last dim)
-        weights = vis[..., 2]  # shape: [IF, chan, pol]
-        n_vis += np.count_nonzero(weights)
+    if counter == None:  # No visibilities
+        return {'total': 0, 'antennas': {key_map[k]: 0 for k in antenna_codes},
+                'ifs': [], 'pols': [], 'scans': [0] * len(scans)}
+    return counter.breakdown(key_map)
 
-    return int(n_vis)
+def vis_count(data):
+    """Fast count of unflagged visibilities using NumPy vectorization.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :return: Total number of unflagged visibilities
+    :rtype: int
+    """
+    return vis_breakdown(data, scans = [])['total']
 
 def vis_count_v2(data):
     """Fast count of unflagged visibilities using NumPy vectorization.
@@ -286,28 +455,711 @@ def vis_count_v2(data):
     :return: Total and per antenna number of unflagged visibilities
     :rtype: int, dict
     """
-    n_vis = 0
-    antenna_codes = [x.nosta for x in data.table('AN', 1)]
-    antenna_names = [x.anname.strip() for x in data.table('AN', 1)]
+    counts = vis_breakdown(data, scans = [])
+    return counts['total'], counts['antennas']
+
+# Value of blanked (flagged) solutions in AIPS tables
+FBLANK = 3140.892822265625
+
+# Feeds (first antenna, second antenna) of each Stokes code, 0 => R/X, 1 => L/Y
+STOKES_FEEDS = {-1: (0, 0), -2: (1, 1), -3: (0, 1), -4: (1, 0),
+                -5: (0, 0), -6: (1, 1), -7: (0, 1), -8: (1, 0)}
+
+def source_ids(data, target_list):
+    """Get the source IDs of a list of sources from the SU table.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param target_list: source names
+    :type target_list: list of str
+    :return: source ID => source name
+    :rtype: dict
+    """
+    ids = {}
+    for srcs in tcache.table(data, 'SU', 1):
+        clean_name = srcs['source'].strip(' ')
+        if clean_name in target_list:
+            ids[srcs['id__no']] = clean_name
+    return(ids)
+
+def stokes_codes(data):
+    """Stokes code of each polarization product of the data.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :return: Stokes code of each polarization product, e.g. -1 => RR, -2 => LL
+    :rtype: list of int
+    """
+    stokes_indx = data.header['ctype'].index('STOKES')
+    n_pol = data.header['naxis'][stokes_indx]
+    first = int(round(data.header['crval'][stokes_indx]))
+    step = int(round(data.header['cdelt'][stokes_indx]))
+    return([first + k * step for k in range(n_pol)])
+
+def stokes_feeds(data):
+    """Feeds of each polarization product of the data.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :return: feed of the first and second antenna for each polarization product
+    :rtype: list of tuple
+    """
+    return([STOKES_FEEDS.get(code, (0, 0)) for code in stokes_codes(data)])
+
+def pflags_mask(pflags, codes):
+    """Polarization products flagged by the PFLAGS of a FG table row.
+
+    PFLAGS are always given in RR, LL, RL, LR (or XX, YY, XY, YX) order, independently 
+    of the polarization products of the data. Stokes parameters (I, Q, U, V) are 
+    flagged if any of the PFLAGS is set.
+
+    :param pflags: PFLAGS of the row
+    :type pflags: numpy.ndarray
+    :param codes: Stokes code of each polarization product of the data
+    :type codes: list of int
+    :return: flagged polarization products
+    :rtype: numpy.ndarray
+    """
+    pflags = np.atleast_1d(pflags) != 0
+    mask = []
+    for code in codes:
+        if code < 0 and (-code - 1) % 4 < len(pflags):
+            mask.append(pflags[(-code - 1) % 4])
+        else:
+            mask.append(pflags.any())
+    return(np.array(mask, dtype = bool))
+
+class FlagTable(NamedTuple):
+    """Flags of a FG table, read by :func:`~vipcals.scripts.export_data.read_flags`."""
+    flags: list            # Sorted by start time
+    starts: np.ndarray     # Start time of each flag
+    ends: np.ndarray       # End time of each flag
+
+def read_flags(data, flagver, ids):
+    """Read the flags of a FG table that affect a list of sources.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param flagver: flag table version, 0 => max
+    :type flagver: int
+    :param ids: source IDs
+    :type ids: list of int
+    :return: flags sorted by start time; each flag is a tuple with the source ID 
+        (0 => all), time range, antennas (0 => all), subarray (0 => all), frequency ID 
+        (0 => all), IF and channel selection, and the flagged polarization products of 
+        the data
+    :rtype: :class:`FlagTable`
+    """
+    if flagver == 0:
+        flagver = data.table_highver('FG')
+    codes = stokes_codes(data)
+    flags = []
+    if [flagver, 'AIPS FG'] in [[x[0], x[1]] for x in data.tables]:
+        for row in tcache.table(data, 'FG', flagver):
+            if row['source'] != 0 and row['source'] not in ids:
+                continue
+            ants = np.atleast_1d(row['ants'])
+            ifs = np.atleast_1d(row['ifs'])
+            chans = np.atleast_1d(row['chans'])
+            # 0 => from the first / up to the last
+            if_sel = slice(max(ifs[0] - 1, 0), ifs[1] if ifs[1] > 0 else None)
+            chan_sel = slice(max(chans[0] - 1, 0), chans[1] if chans[1] > 0 else None)
+            pol_sel = pflags_mask(row['pflags'], codes)
+            flags.append((row['source'], row['time_range'][0], row['time_range'][1], 
+                          ants[0], ants[1], max(row['subarray'], 0), 
+                          max(row['freq_id'], 0), if_sel, chan_sel, pol_sel))
+
+    flags.sort(key = lambda x: x[1])
+    return(FlagTable(flags, np.array([x[1] for x in flags], dtype = float), 
+                     np.array([x[2] for x in flags], dtype = float)))
+
+def apply_flags(flag_table, chunk, good):
+    """Remove the flagged visibilities of a chunk of records.
+
+    Only the flags whose time range overlaps with the chunk are checked, and each of 
+    them is applied to all the records of the chunk at once.
+
+    :param flag_table: flags from :func:`~vipcals.scripts.export_data.read_flags`
+    :type flag_table: :class:`FlagTable`
+    :param chunk: chunk of records
+    :type chunk: :class:`VisChunk`
+    :param good: unflagged visibilities [N, IF, chan, pol], modified in place
+    :type good: numpy.ndarray
+    """
+    if len(flag_table.flags) == 0 or len(chunk.times) == 0:
+        return
+    t_min = chunk.times.min()
+    t_max = chunk.times.max()
+    last = np.searchsorted(flag_table.starts, t_max, side = 'right')
+    ant1 = chunk.baselines[:, 0]
+    ant2 = chunk.baselines[:, 1]
+    for k in np.flatnonzero(flag_table.ends[:last] >= t_min):
+        f_source, t_start, t_end, f_ant1, f_ant2, f_subarray, f_freq_id, if_sel, \
+            chan_sel, pol_sel = flag_table.flags[k]
+        rows = (chunk.times >= t_start) & (chunk.times <= t_end)
+        if f_source != 0:
+            rows &= chunk.sources == f_source
+        if f_subarray != 0:
+            rows &= chunk.subarrays == f_subarray
+        if f_freq_id != 0:
+            rows &= chunk.freq_ids == f_freq_id
+        if f_ant1 != 0 and f_ant2 != 0:
+            rows &= ((ant1 == f_ant1) & (ant2 == f_ant2)) \
+                    | ((ant1 == f_ant2) & (ant2 == f_ant1))
+        elif f_ant1 != 0 or f_ant2 != 0:
+            f_ant = max(f_ant1, f_ant2)
+            rows &= (ant1 == f_ant) | (ant2 == f_ant)
+        rows = np.flatnonzero(rows)
+        if len(rows) > 0:
+            good[rows, if_sel, chan_sel] &= ~pol_sel
+
+def read_solutions(data, table, version, ids):
+    """Read which solutions of a CL or BP table are valid.
+
+    A solution is not valid if its weight is zero or if it is blanked.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param table: table extension, 'CL' or 'BP'
+    :type table: str
+    :param version: table version
+    :type version: int
+    :param ids: source IDs
+    :type ids: list of int
+    :return: (source ID, antenna, subarray, frequency ID) => (times, valid solutions), 
+        sorted in time. Valid solutions have shape [time, IF, feed] for CL and 
+        [time, IF, channel, feed] for BP. Solutions valid for all sources, subarrays or 
+        frequency IDs have 0 in that position of the key
+    :rtype: dict
+    """
+    if table == 'CL':
+        ant_col, real_cols = 'antenna_no', ['real1', 'real2']
+    else:
+        ant_col, real_cols = 'antenna', ['real_1', 'real_2']
+
+    solutions = {}
+    for row in tcache.table(data, table, version):
+        if row['source_id'] != 0 and row['source_id'] not in ids:
+            continue
+        valid = []
+        for feed in [1, 2]:
+            try:
+                weight = np.atleast_1d(row[f'weight_{feed}'])
+                real = np.atleast_1d(row[real_cols[feed - 1]])
+            except KeyError:  # Single polarization, same solution for both feeds
+                weight = np.atleast_1d(row['weight_1'])
+                real = np.atleast_1d(row[real_cols[0]])
+            if table == 'BP':
+                real = real.reshape(len(weight), -1)
+                valid.append((weight[:, None] != 0) & (real != FBLANK))
+            else:
+                valid.append((weight != 0) & (real != FBLANK))
+        key = (row['source_id'], row[ant_col], max(row['subarray'], 0), 
+               max(row['freq_id'], 0))
+        solutions.setdefault(key, ([], []))
+        solutions[key][0].append(row['time'])
+        solutions[key][1].append(np.stack(valid, axis = -1))
+
+    for key in solutions:
+        order = np.argsort(solutions[key][0])
+        solutions[key] = (np.array(solutions[key][0])[order], 
+                          np.array(solutions[key][1])[order])
+    return(solutions)
+
+def interpolated_solutions(solutions, chunk, antennas):
+    """Validity of the solutions of an antenna at the time of each record.
+
+    Solutions are interpolated between the samples before and after each record, so 
+    they are only valid if both samples are valid. Records before the first sample or 
+    after the last one take the closest sample. Each record takes the solutions of its 
+    source, subarray and frequency ID, or the ones valid for all of them.
+
+    :param solutions: solutions from :func:`~vipcals.scripts.export_data.read_solutions`
+    :type solutions: dict
+    :param chunk: chunk of records
+    :type chunk: :class:`VisChunk`
+    :param antennas: antenna of each record [N]
+    :type antennas: numpy.ndarray
+    :return: valid solutions of each record, records of antennas without solutions 
+        are not valid; or None if none of the records has solutions
+    :rtype: numpy.ndarray
+    """
+    interpolated = None
+    records = zip(chunk.sources.tolist(), antennas.tolist(), chunk.subarrays.tolist(), 
+                  chunk.freq_ids.tolist())
+    for source, antenna, subarray, freq_id in set(records):
+        keys = [(s, antenna, a, f) for s in [source, 0] for a in [subarray, 0] 
+                for f in [freq_id, 0]]
+        keys = [key for key in keys if key in solutions]
+        if len(keys) == 0:
+            continue
+        sol_times, valid = solutions[keys[0]]
+        rows = np.flatnonzero((chunk.sources == source) & (antennas == antenna) 
+                              & (chunk.subarrays == subarray) 
+                              & (chunk.freq_ids == freq_id))
+        before = np.searchsorted(sol_times, chunk.times[rows], side = 'right') - 1
+        after = np.searchsorted(sol_times, chunk.times[rows], side = 'left')
+        before = np.clip(before, 0, len(sol_times) - 1)
+        after = np.clip(after, 0, len(sol_times) - 1)
+        if interpolated is None:
+            interpolated = np.zeros((len(chunk.times),) + valid.shape[1:], dtype = bool)
+        interpolated[rows] = valid[before] & valid[after]
+    return(interpolated)
+
+def valid_visibilities(setup, chunk, feed_1, feed_2):
+    """Unflagged visibilities of a chunk of records after applying a calibration setup.
+
+    :param setup: source IDs, flags, CL and BP solutions of the setup, as read in 
+        :func:`~vipcals.scripts.export_data.vis_count_multi`
+    :type setup: tuple
+    :param chunk: chunk of records
+    :type chunk: :class:`VisChunk`
+    :param feed_1: feed of the first antenna of each polarization product
+    :type feed_1: list of int
+    :param feed_2: feed of the second antenna of each polarization product
+    :type feed_2: list of int
+    :return: unflagged visibilities [N, IF, chan, pol]; records of other sources or 
+        without solutions have none
+    :rtype: numpy.ndarray
+    """
+    ids, flag_table, cl_solutions, bp_solutions = setup
+    selected = np.isin(chunk.sources, list(ids))
+    good = chunk.good & selected[:, None, None, None]
+
+    # Flags
+    apply_flags(flag_table, chunk, good)
+
+    # Calibration, valid solutions have shape [N, IF, feed]
+    cl_1 = interpolated_solutions(cl_solutions, chunk, chunk.baselines[:, 0])
+    cl_2 = interpolated_solutions(cl_solutions, chunk, chunk.baselines[:, 1])
+    if cl_1 is None or cl_2 is None:
+        good[:] = False
+        return good
+    good &= (cl_1[:, :, feed_1] & cl_2[:, :, feed_2])[:, :, None, :]
+
+    # Bandpass, valid solutions have shape [N, IF, chan, feed]
+    if bp_solutions != None:
+        bp_1 = interpolated_solutions(bp_solutions, chunk, chunk.baselines[:, 0])
+        bp_2 = interpolated_solutions(bp_solutions, chunk, chunk.baselines[:, 1])
+        if bp_1 is None or bp_2 is None:
+            good[:] = False
+            return good
+        good &= bp_1[..., feed_1] & bp_2[..., feed_2]
+
+    return good
+
+def vis_count_multi(data, requests):
+    """Count unflagged visibilities of several calibration setups in a single pass.
+
+    Each request is counted as in :func:`~vipcals.scripts.export_data.vis_count_inplace`, 
+    but the multi-source dataset is read only once for all of them. Tables shared by 
+    several requests are also read only once.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param requests: calibration setups to count, each one with the sources 
+        ('targets'), the CL table ('cl_table'), the flag table ('flagver', 0 => max), 
+        whether to apply the bandpass ('bpass') and the BP table ('bpver', 0 => max)
+    :type requests: list of dict
+    :return: for each request, source name => total and per antenna number of 
+        unflagged visibilities
+    :rtype: list of dict
+    """
+    feeds = stokes_feeds(data)
+    feed_1 = [x[0] for x in feeds]
+    feed_2 = [x[1] for x in feeds]
+
+    all_ids = {}
+    for request in requests:
+        all_ids.update(source_ids(data, request['targets']))
+
+    # Flags and solutions of every source, shared between requests
+    flag_tables = {}
+    sol_tables = {}
+    setups = []
+    for request in requests:
+        ids = source_ids(data, request['targets'])
+        flagver = request.get('flagver', 0)
+        if flagver not in flag_tables:
+            flag_tables[flagver] = read_flags(data, flagver, list(all_ids))
+        tables = [('CL', request.get('cl_table', 1))]
+        if request.get('bpass', False) == True:
+            bpver = request.get('bpver', 0)
+            tables.append(('BP', bpver if bpver > 0 else data.table_highver('BP')))
+        for key in tables:
+            if key not in sol_tables:
+                sol_tables[key] = read_solutions(data, key[0], key[1], list(all_ids))
+        bp_solutions = sol_tables[tables[1]] if len(tables) > 1 else None
+        setups.append((ids, flag_tables[flagver], sol_tables[tables[0]], bp_solutions))
+
+    antenna_codes = tcache.table(data, 'AN', 1)['nosta'].tolist()
+    antenna_names = [x.strip() for x in tcache.table(data, 'AN', 1)['anname']]
     key_map = dict(zip(antenna_codes, antenna_names))
-    ant_counts = {ant: 0 for ant in antenna_codes}
+
+    def select(record):
+        ant1, ant2 = record.baseline
+        return record.source in all_ids and ant1 != ant2
 
     w_data = wizard.AIPSUVData(data.name, data.klass, data.disk, data.seq)
+    counters = {}
+    for chunk in read_chunks(w_data, select):
+        for n, setup in enumerate(setups):
+            good = valid_visibilities(setup, chunk, feed_1, feed_2)
+            for sid in np.unique(chunk.sources):
+                if sid not in setup[0]:
+                    continue
+                rows = chunk.sources == sid
+                if (n, sid) not in counters:
+                    counters[(n, sid)] = VisCounter(antenna_codes, good.shape[1], 
+                                                    good.shape[3])
+                counters[(n, sid)].add(chunk.baselines[rows], chunk.times[rows], 
+                                       good[rows])
 
-    for record in w_data:
-        vis = record.visibility  # shape: [IF, chan, pol, N]
-        weights = vis[..., 2]    # shape: [IF, chan, pol]
-        n_good = np.count_nonzero(weights)
-        n_vis += n_good
-        for ant in record.baseline:
-            if ant in ant_counts:  # just in case
-                ant_counts[ant] += n_good
-
-    ant_counts_translated = {key_map[k]: v for k,v in ant_counts.items() if k in key_map}
-    
-    return int(n_vis), ant_counts_translated
+    counts_list = []
+    for n, setup in enumerate(setups):
+        counts = {}
+        for sid in setup[0]:
+            if (n, sid) in counters:
+                breakdown = counters[(n, sid)].breakdown(key_map)
+            else:
+                breakdown = {'total': 0, 
+                             'antennas': {key_map[k]: 0 for k in antenna_codes}}
+            counts[setup[0][sid]] = (breakdown['total'], breakdown['antennas'])
+        counts_list.append(counts)
+    return(counts_list)
+
+def vis_count_inplace(data, target_list, cl_table = 1, bpass = False, flagver = 0):
+    """Count unflagged visibilities without splitting the data.
+
+    Estimates the number of visibilities that SPLIT would keep, reading the 
+    multi-source dataset only once for all sources. Cross-correlations of the selected 
+    sources are counted if they have a non-zero weight, are not flagged in the FG 
+    table, and the solutions of the CL table (and the BP table) before and after them 
+    are valid for both antennas. The counts are not guaranteed to be identical to the 
+    ones of :func:`~vipcals.scripts.export_data.vis_count_v2` on the entries created 
+    by :func:`~vipcals.scripts.export_data.data_split`.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param target_list: list of sources to count
+    :type target_list: list of str  
+    :param cl_table: CL table number to apply; defaults to 1
+    :type cl_table: int, optional
+    :param bpass: apply the bandpass table; defaults to False
+    :type bpass: bool, optional
+    :param flagver: flag table version to apply, 0 => max; defaults to 0
+    :type flagver: int, optional
+    :return: source name => total and per antenna number of unflagged visibilities
+    :rtype: dict
+    """
+    request = {'targets': target_list, 'cl_table': cl_table, 'flagver': flagver, 
+               'bpass': bpass}
+    return(vis_count_multi(data, [request])[0])
+
+def flag_key(flag):
+    """Hashable version of a flag read by :func:`~vipcals.scripts.export_data.read_flags`.
+
+    :param flag: flag
+    :type flag: tuple
+    :return: flag with the selections written as tuples
+    :rtype: tuple
+    """
+    f_source, t_start, t_end, f_ant1, f_ant2, f_subarray, f_freq_id, if_sel, \
+        chan_sel, pol_sel = flag
+    return((f_source, t_start, t_end, f_ant1, f_ant2, f_subarray, f_freq_id, 
+            if_sel.start, if_sel.stop, chan_sel.start, chan_sel.stop, 
+            tuple(pol_sel.tolist())))
+
+def flag_changes(old_flags, new_flags):
+    """Flags that are only in one of two flag tables.
+
+    :param old_flags: flags from :func:`~vipcals.scripts.export_data.read_flags`
+    :type old_flags: :class:`FlagTable`
+    :param new_flags: flags from :func:`~vipcals.scripts.export_data.read_flags`
+    :type new_flags: :class:`FlagTable`
+    :return: antenna (0 => all), start and end time of each different flag
+    :rtype: list of tuple
+    """
+    flag_sets = []
+    for flag_table in [old_flags, new_flags]:
+        flag_sets.append(dict([(flag_key(x), x) for x in flag_table.flags]))
+
+    changes = []
+    for key in set(flag_sets[0]) ^ set(flag_sets[1]):
+        f_source, t_start, t_end, f_ant1, f_ant2 = key[:5]
+        if f_ant1 == 0 and f_ant2 != 0:
+            f_ant1, f_ant2 = f_ant2, 0
+        changes.append((f_ant1, t_start, t_end))
+        if f_ant1 != 0 and f_ant2 != 0 and f_ant2 != f_ant1:
+            changes.append((f_ant2, t_start, t_end))
+    return(changes)
+
+def solution_changes(old_solutions, new_solutions):
+    """Solutions whose validity differs between two CL or BP tables.
+
+    :param old_solutions: solutions from 
+        :func:`~vipcals.scripts.export_data.read_solutions`
+    :type old_solutions: dict
+    :param new_solutions: solutions from 
+        :func:`~vipcals.scripts.export_data.read_solutions`
+    :type new_solutions: dict
+    :return: antenna, start and end time of the visibilities that can be affected by 
+        each different solution
+    :rtype: list of tuple
+    """
+    changes = []
+    for key in set(old_solutions) | set(new_solutions):
+        antenna = key[1]
+        if key not in old_solutions or key not in new_solutions:
+            changes.append((antenna, -np.inf, np.inf))
+            continue
+        t_old, v_old = old_solutions[key]
+        t_new, v_new = new_solutions[key]
+        if len(t_old) != len(t_new) or v_old.shape != v_new.shape \
+           or np.any(t_old != t_new):
+            changes.append((antenna, -np.inf, np.inf))
+            continue
+        # A solution is only interpolated between its neighbours
+        different = (v_old != v_new).reshape(len(t_old), -1).any(axis = 1)
+        for n in np.flatnonzero(different):
+            t_start = t_old[n-1] if n > 0 else -np.inf
+            t_end = t_old[n+1] if n + 1 < len(t_old) else np.inf
+            changes.append((antenna, t_start, t_end))
+    return(changes)
+
+class VisCube():
+    """Unflagged visibilities per source, scan and baseline, updated incrementally.
+
+    The first count reads the whole dataset. Later counts with other FG, CL or BP 
+    tables compare them with the tables of the previous count, and only the scans and 
+    antennas affected by the differences are counted again. The results are the same 
+    as with :func:`~vipcals.scripts.export_data.vis_count_inplace`. Since Wizardry can 
+    only read the records in order, the data are still read from the first record up 
+    to the last affected scan, so a change that spans the whole observation (e.g. a 
+    flag on one antenna) costs a full pass.
+
+    Each scan covers the time from its start to the start of the next scan, so that 
+    visibilities outside the scans of the NX table are also counted.
+    """
+    def __init__(self, data, target_list):
+        """
+        Initialize an empty cube for the science targets of a dataset.
+        """
+        self.entry = (data.name, data.klass, data.disk, data.seq)
+        self.ids = source_ids(data, target_list)
+        self.scan_start = np.sort([x[0] for x in scan_times(data)])
+        self.n_cells = max(len(self.scan_start), 1)
+        self.antenna_codes = tcache.table(data, 'AN', 1)['nosta'].tolist()
+        antenna_names = [x.strip() for x in tcache.table(data, 'AN', 1)['anname']]
+        self.key_map = dict(zip(self.antenna_codes, antenna_names))
+        self.n_ant = max(self.antenna_codes + [0]) + 1
+        self.cube = dict([(sid, np.zeros((self.n_cells, self.n_ant, self.n_ant), 
+                                         dtype = np.int64)) for sid in self.ids])
+        # Tables of the current counts
+        self.flags = None
+        self.cl_solutions = None
+        self.bp_solutions = None
+
+    def matches(self, data):
+        """
+        Check if the cube belongs to a catalogue entry.
+        """
+        return self.entry == (data.name, data.klass, data.disk, data.seq)
+
+    def cell_index(self, times):
+        """
+        Scan of each time.
+        """
+        n = np.searchsorted(self.scan_start, times, side = 'right') - 1
+        return np.clip(n, 0, self.n_cells - 1)
+
+    def changed_cells(self, flags, cl_solutions, bp_solutions):
+        """
+        Scans and antennas whose counts change with the new tables.
+        """
+        dirty = np.zeros((self.n_cells, self.n_ant), dtype = bool)
+        if self.flags == None or (self.bp_solutions == None) != (bp_solutions == None):
+            dirty[:] = True
+            return dirty
+
+        changes = flag_changes(self.flags, flags) \
+                  + solution_changes(self.cl_solutions, cl_solutions)
+        if bp_solutions != None:
+            changes += solution_changes(self.bp_solutions, bp_solutions)
+
+        for antenna, t_start, t_end in changes:
+            if antenna >= self.n_ant:
+                continue
+            first, last = self.cell_index([t_start, t_end])
+            if antenna == 0:
+                dirty[first:last+1, :] = True
+            else:
+                dirty[first:last+1, antenna] = True
+        return dirty
+
+    def count(self, data, cl_table = 1, bpass = False, flagver = 0, target_list = None):
+        """Count unflagged visibilities applying a set of calibration tables.
+
+        :param data: visibility data, the same entry used to create the cube
+        :type data: AIPSUVData
+        :param cl_table: CL table number to apply; defaults to 1
+        :type cl_table: int, optional
+        :param bpass: apply the bandpass table; defaults to False
+        :type bpass: bool, optional
+        :param flagver: flag table version to apply, 0 => max; defaults to 0
+        :type flagver: int, optional
+        :param target_list: sources to return; defaults to all sources of the cube
+        :type target_list: list of str, optional
+        :return: source name => total and per antenna number of unflagged visibilities
+        :rtype: dict
+        """
+        feeds = stokes_feeds(data)
+        feed_1 = [x[0] for x in feeds]
+        feed_2 = [x[1] for x in feeds]
+        flags = read_flags(data, flagver, list(self.ids))
+        cl_solutions = read_solutions(data, 'CL', cl_table, list(self.ids))
+        bp_solutions = None
+        if bpass == True:
+            bp_solutions = read_solutions(data, 'BP', data.table_highver('BP'), 
+                                          list(self.ids))
+
+        dirty = self.changed_cells(flags, cl_solutions, bp_solutions)
+        self.flags, self.cl_solutions, self.bp_solutions = \
+            flags, cl_solutions, bp_solutions
+
+        if dirty.any():
+            # Baselines with at least one affected antenna are counted again
+            dirty_bl = dirty[:, :, None] | dirty[:, None, :]
+            for sid in self.cube:
+                self.cube[sid][dirty_bl] = 0
+
+            # Data are in time order, there is nothing to count after the last scan 
+            # affected
+            last = np.flatnonzero(dirty.any(axis = 1))[-1]
+            stop = self.scan_start[last + 1] if last + 1 < len(self.scan_start) else None
+
+            setup = (self.ids, flags, cl_solutions, bp_solutions)
+
+            def select(record):
+                ant1, ant2 = record.baseline
+                if record.source not in self.ids or ant1 == ant2 \
+                   or ant1 >= self.n_ant or ant2 >= self.n_ant:
+                    return False
+                cell = self.cell_index(record.time)
+                return dirty[cell, ant1] == True or dirty[cell, ant2] == True
+
+            w_data = wizard.AIPSUVData(data.name, data.klass, data.disk, data.seq)
+            for chunk in read_chunks(w_data, select, stop):
+                good = valid_visibilities(setup, chunk, feed_1, feed_2)
+                per_record = np.count_nonzero(good, axis = (1, 2, 3))
+                cells = self.cell_index(chunk.times)
+                for sid in np.unique(chunk.sources):
+                    rows = chunk.sources == sid
+                    np.add.at(self.cube[sid], (cells[rows], chunk.baselines[rows, 0], 
+                                               chunk.baselines[rows, 1]), 
+                              per_record[rows])
+
+        counts = {}
+        for sid in self.ids:
+            if target_list != None and self.ids[sid] not in target_list:
+                continue
+            per_baseline = self.cube[sid].sum(axis = 0)
+            per_antenna = per_baseline.sum(axis = 0) + per_baseline.sum(axis = 1)
+            counts[self.ids[sid]] = (int(per_baseline.sum()), 
+                                     dict([(self.key_map[k], int(per_antenna[k])) 
+                                           for k in self.antenna_codes]))
+        return(counts)
+
+def count_visibilities(data, target_list, cl_table = 1, bpass = False, flagver = 0, \
+                       keep = False):
+    """Count the unflagged visibilities of each source after applying calibration.
+
+    The sources are splitted with :func:`~vipcals.scripts.export_data.data_split` and 
+    the visibilities of each splitted entry are counted with 
+    :func:`~vipcals.scripts.export_data.vis_count_v2`. The splitted entries are kept, 
+    so that they can be used for the interactive plots.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param target_list: list of sources to count
+    :type target_list: list of str  
+    :param cl_table: CL table number to apply; defaults to 1
+    :type cl_table: int, optional
+    :param bpass: apply the bandpass table; defaults to False
+    :type bpass: bool, optional
+    :param flagver: flag table version to apply, 0 => max; defaults to 0
+    :type flagver: int, optional
+    :param keep: delete previous entries for the same table; defaults to 0
+    :type keep: bool, optional
+    :return: source name => total and per antenna number of unflagged visibilities
+    :rtype: dict
+    """
+    data_split(data, target_list, cl_table, bpass, flagver, keep)
+    counts = {}
+    for target in target_list:
+        if bpass == True:
+            splitted = AIPSUVData(target, 'PLOTBP', data.disk, cl_table)
+        else:
+            splitted = AIPSUVData(target, 'PLOT', data.disk, cl_table)
+        counts[target] = vis_count_v2(splitted)
+    return(counts)
 
 
+def baseline_time_ranges(data, table_number, source_name):
+    """Time ranges where the unflagged solutions of a source can form baselines.
+
+    The solutions of the CL table are grouped by time, keeping for each polarization 
+    and IF a bitmask of the antennas with non-zero weight. A baseline can be formed at 
+    a time if any of the bitmasks has two or more antennas.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param table_number: number of CL table where to perform the check
+    :type table_number: int
+    :param source_name: name of the source to be checked
+    :type source_name: str
+    :return: start and end time in days of each range of consecutive solution times 
+        that can form baselines
+    :rtype: list of tuple
+    """
+    source_id = None
+    for srcs in tcache.table(data, 'SU', 1):
+        clean_name = srcs['source'].strip(' ')
+        if clean_name == source_name:
+            source_id = srcs['id__no']
+            break
+
+    # time => {(polarization, IF): bitmask of antennas}
+    masks = {}
+    for element in tcache.table(data, 'CL', table_number):
+        if element['source_id'] != source_id:
+            continue
+        time_masks = masks.setdefault(element['time'], {})
+        for pol in ['weight_1', 'weight_2']:
+            try:
+                weights = np.atleast_1d(element[pol])
+            except KeyError:  # Single polarization
+                continue
+            for k in np.flatnonzero(weights):
+                time_masks[(pol, k)] = time_masks.get((pol, k), 0) \
+                                       | (1 << int(element['antenna_no']))
+
+    # A bitmask with two or more antennas is not a power of two
+    time_ranges = []
+    start = None
+    times = sorted(masks)
+    for n, time in enumerate(times):
+        if any(m & (m - 1) != 0 for m in masks[time].values()):
+            if start == None:
+                start = time
+            continue
+        if start != None:
+            time_ranges.append((start, times[n-1]))
+            start = None
+    if start != None:
+        time_ranges.append((start, times[-1]))
+    return(time_ranges)
+
 def are_there_baselines(data, table_number, source_name):
     """Check if there are enough unflagged visibilities to form at least a baseline.
 
@@ -325,39 +1177,4 @@ def are_there_baselines(data, table_number, source_name):
     :return: whether there are available baselines or not
     :rtype: bool
     """    
-    for srcs in data.table('SU', 1):
-        clean_name = srcs['source'].strip(' ')
-        if clean_name == source_name:
-            source_id = srcs['id__no']
-            break
-    table = data.table('CL', table_number)
-    good_entries_RR = []
-    good_entries_LL = []
-    for element in table:
-        if element['source_id'] == source_id:
-            if any(x!=0 for x in element['weight_1']):
-                good_entries_RR.append(element)
-            try:
-                if any(x!=0 for x in element['weight_2']):
-                    good_entries_LL.append(element) 
-            except KeyError:
-                pass
-    if len(good_entries_RR) == 0 and len(good_entries_LL) == 0:
-        return(False) 
-    # Check RR    
-    for i, entry in enumerate(good_entries_RR):
-        for j, entry_n in enumerate(good_entries_RR[i:]):
-            if entry['time'] == entry_n['time']:
-                if entry['antenna_no'] != entry_n['antenna_no']:
-                    for k, wei in enumerate(entry['weight_1']):
-                        if wei != 0 and entry_n['weight_1'][k] != 0:
-                            return(True) 
-    # Check LL    
-    for i, entry in enumerate(good_entries_LL):
-        for j, entry_n in enumerate(good_entries_LL[i:]):
-            if entry['time'] == entry_n['time']:
-                if entry['antenna_no'] != entry_n['antenna_no']:
-                    for k, wei in enumerate(entry['weight_2']):
-                        if wei != 0 and entry_n['weight_2'][k] != 0:
-                            return(True)
-    return(False)
\ No newline at end of file
+    return(len(baseline_time_ranges(data, table_number, source_name)) > 0)
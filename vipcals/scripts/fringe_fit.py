@@ -1,7 +1,9 @@
+import numpy as np
 import functools
 print = functools.partial(print, flush=True)
 
 from vipcals.scripts.helper import tacop
+from vipcals.scripts import table_cache as tcache
 
 from AIPSTask import AIPSTask, AIPSList
 AIPSTask.msgkill = -8
@@ -163,12 +165,49 @@ def fringe_phaseref_clcal(data, refant, target_list, version):
         tacop(data, 'CL', 10, 9)
         data.zap_table('CL', 10)
  
+def fringe_solutions(data, version = 6):
+    """Count the solutions of a fringe fit in a cube.
+
+    Each solution is classified by looking at its weight in the SN table, which is 0 if
+    the solution failed. Rows with the same time and antenna (e.g. from different 
+    subarrays or frequency IDs) are all counted.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param version: SN version to read, defaults to 6
+    :type version: int, optional
+    :return: solution times, antenna numbers, and good and attempted solutions 
+        [time, antenna, IF, pol]
+    :rtype: numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray
+    """
+    sn_table = tcache.table(data, 'SN', version)
+    n_rows = len(sn_table)
+    if n_rows == 0:
+        empty = np.zeros((0, 0, 1, 1), dtype = int)
+        return(np.zeros(0), np.zeros(0, dtype = int), empty, empty)
+
+    # Single IF datasets have one value per row
+    weights = [sn_table['weight_1'].reshape(n_rows, -1)]
+    try:
+        weights.append(sn_table['weight_2'].reshape(n_rows, -1))
+    except KeyError: # Single polarization
+        pass
+    weights = np.stack(weights, axis = -1)
+
+    times, time_idx = np.unique(sn_table['time'], return_inverse = True)
+    antennas, ant_idx = np.unique(sn_table['antenna_no'], return_inverse = True)
+    good = np.zeros((len(times), len(antennas)) + weights.shape[1:], dtype = int)
+    attempted = np.zeros_like(good)
+    np.add.at(good, (time_idx, ant_idx), weights != 0)
+    np.add.at(attempted, (time_idx, ant_idx), 1)
+    return(times, antennas, good, attempted)
+
 def assess_fringe_fit(data, log, version = 6):
     """Retrieve the number of failed solutions after fringe fit
 
-    Explore a solution table produced by FRING and print how many solutions failed. This 
-    is done by looking at the weights of every entry in the SN table. Since each SN table 
-    contains solutions only for one source, this information is also printed in the 
+    Explore a solution table produced by FRING and print how many solutions failed. This
+    is done by looking at the weights of every entry in the SN table. Since each SN table
+    contains solutions only for one source, this information is also printed in the
     corresponding log of each source.
 
     :param data: visibility data
@@ -177,95 +216,40 @@ def assess_fringe_fit(data, log, version = 6):
     :type log: file
     :param version: SN version to evaluate, defaults to 6
     :type version: int, optional
-    :return: total good solutions, total attempted solutions, 
-        dictionary with good/attempted values per antenna
-    :rtype: int, int, dict
-    """    
-    an_table = data.table('AN', 1)
-    sn_table = data.table('SN', version)
-    
-    antenna_dict = {}
-    for ant in an_table:
-        antenna_dict[ant['nosta']] = ant['anname'].strip()
-        
-    antennas = []
-    for s in sn_table:
-        antennas.append(s['antenna_no'])
-    antennas = list(set(antennas))
-    
-    fring_dict = {}
-    ratios_dict = {}
-    for a in antennas:
-        fring_dict[a] = []
-        ratios_dict[a] = [0,0]
+    :return: total failed solutions, total attempted solutions,
+        dictionary with good/attempted values per antenna, good/attempted values per IF
+    :rtype: int, int, dict, list
+    """
+    an_names = tcache.antenna_names(data)
+    times, antennas, good, attempted = fringe_solutions(data, version)
 
-            
-    # Single polarization:
-    try:
-        _ = sn_table[0]['weight_2']
-    except KeyError:      
-    
-        for s in sn_table:
-            if type(s['weight_1']) == float: # single IF
-                fring_dict[s['antenna_no']].append(s['weight_1'])
-            else:
-                for i in range(len(s['weight_1'])):
-                    fring_dict[s['antenna_no']].append(s['weight_1'][i])
-    
-        total_length = sum((len(v) for v in fring_dict.values()))
-        global_counter = 0
-        for a in fring_dict:
-            counter = 0
-            for val in fring_dict[a]:
-                if val == 0:
-                    counter += 1
-                    global_counter += 1
-            print('    ' + str(a) + '-' + antenna_dict[a] + ' failed in ' + str(counter) + \
-                  ' out of ' + str(len(fring_dict[a])) + ' solutions.\n')
-            log.write('    ' + str(a) + '-' + antenna_dict[a] + ' failed in ' \
-                      + str(counter) + ' out of ' + str(len(fring_dict[a])) \
-                      + ' solutions.\n')
-            
-            ratios_dict[a][0] = len(fring_dict[a]) - counter
-            ratios_dict[a][1] = len(fring_dict[a])
-               
-        print('Fringe fit failed in ' + str(global_counter) + ' out of '\
-              + str(total_length) + ' solutions.\n')
-        log.write('Fringe fit failed in ' + str(global_counter) + ' out of '\
-              + str(total_length) + ' solutions.\n')   
-        
-        return global_counter, total_length, ratios_dict
-        
-    # Dual polarization
-    for s in sn_table:
-        try:
-            for i in range(len(s['weight_1'])):
-                fring_dict[s['antenna_no']].append(s['weight_1'][i])
-                fring_dict[s['antenna_no']].append(s['weight_2'][i])
-        except TypeError: # Single IF datasets
-            fring_dict[s['antenna_no']].append(s['weight_1'])
-            fring_dict[s['antenna_no']].append(s['weight_2'])
-    
-    total_length = sum((len(v) for v in fring_dict.values()))
-    global_counter = 0
-    for a in fring_dict:
-        counter = 0
-        for val in fring_dict[a]:
-            if val == 0:
-                counter += 1
-                global_counter += 1
-        print('    ' + str(a) + '-' + antenna_dict[a] + ' failed in ' + str(counter) + \
-                ' out of ' + str(len(fring_dict[a])) + ' solutions.\n')
-        log.write('    ' + str(a) + '-' + antenna_dict[a] + ' failed in ' \
-                    + str(counter) + ' out of ' + str(len(fring_dict[a])) \
-                    + ' solutions.\n')
-        
-        ratios_dict[a][0] = len(fring_dict[a]) - counter
-        ratios_dict[a][1] = len(fring_dict[a])
-               
+    # Sum over time, IF and polarization
+    ant_attempted = attempted.sum(axis = (0, 2, 3))
+    ant_good = good.sum(axis = (0, 2, 3))
+
+    ratios_dict = {}
+    for n, a in enumerate(antennas.tolist()):
+        total = int(ant_attempted[n])
+        counter = total - int(ant_good[n])
+        print('    ' + str(a) + '-' + an_names[a].strip() + ' failed in ' + str(counter) \
+              + ' out of ' + str(total) + ' solutions.\n')
+        log.write('    ' + str(a) + '-' + an_names[a].strip() + ' failed in ' \
+                  + str(counter) + ' out of ' + str(total) + ' solutions.\n')
+        ratios_dict[a] = [total - counter, total]
+
+    # Sum over time, antenna and polarization
+    if_ratios = [[int(g), int(t)] for g, t in zip(good.sum(axis = (0, 1, 3)),
+                                                  attempted.sum(axis = (0, 1, 3)))]
+
+    total_length = int(attempted.sum())
+    global_counter = total_length - int(good.sum())
     print('Fringe fit failed in ' + str(global_counter) + ' out of '\
           + str(total_length) + ' solutions.\n')
     log.write('Fringe fit failed in ' + str(global_counter) + ' out of '\
-              + str(total_length) + ' solutions.\n') 
-    
-    return global_counter, total_length, ratios_dict
\ No newline at end of file
+              + str(total_length) + ' solutions.\n')
+    if len(if_ratios) > 1:
+        if_text = ', '.join([f'IF{n+1}: {t-g}/{t}' for n, (g, t) in enumerate(if_ratios)])
+        print('Failed solutions per IF: ' + if_text + '.\n')
+        log.write('Failed solutions per IF: ' + if_text + '.\n')
+
+    return global_counter, total_length, ratios_dict, if_ratios
\ No newline at end of file
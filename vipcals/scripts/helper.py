@@ -1,8 +1,19 @@
+import os
+import shutil
+import tempfile
 import numpy as np
 
 from AIPS import AIPS
 from AIPSTask import AIPSTask
 
+import Wizardry.AIPSData as wizard
+
+tmp_dir = os.path.expanduser("~/.vipcals/tmp")
+
+# Check if /home/vipcals exists
+if os.path.isdir("/home/vipcals"):
+    tmp_dir = "/home/vipcals/.vipcals/tmp"
+
 ################################################
 ####                Exceptions               ####
 ################################################
@@ -198,6 +209,46 @@ class MultiFile:
         return f"MultiFile({[file.name for file in self.files]}, \
             mode={self.files[0].mode})"
 
+class Workspace():
+    """Scratch directory of a single pipeline run.
+
+    Every run creates its own unique directory inside ``root``, where all auxiliary 
+    files (symbolic links, downloaded calibration tables, ionospheric maps, EOP files, 
+    etc.) are written. This way, multiple pipelines can run at the same time on the 
+    same machine without overwriting each other's files. Interactive plots are written 
+    in the default temporary directory, which is the one read by the GUI.
+    """
+    def __init__(self, root = None, interactive = False):
+        """
+        Create the unique scratch directory of the run.
+        """
+        if root == None:
+            root = tmp_dir
+        os.makedirs(root, exist_ok = True)
+        os.makedirs(tmp_dir, exist_ok = True)
+        self.root = root
+        self.interactive = interactive
+        self.path = tempfile.mkdtemp(prefix = 'run_', dir = root)
+        if interactive == True:
+            self.plot_dir = tmp_dir
+        else:
+            self.plot_dir = self.path
+
+    def subspace(self):
+        """
+        Create a nested workspace, e.g. for a calibration running in another process.
+        """
+        return Workspace(self.path, self.interactive)
+
+    def clean(self):
+        """
+        Remove the scratch directory and everything inside it.
+        """
+        shutil.rmtree(self.path, ignore_errors = True)
+
+    def __repr__(self):
+        return f"Workspace({self.path})"
+
 ################################################
 ####                Functions               ####
 ################################################
@@ -216,19 +267,21 @@ def ddhhmmss(time):
     minutes, seconds = divmod(remainder, 60)
     return np.array([days,hours,minutes,seconds])
 
-def open_log(path_list, filename_list):
+def open_log(path_list, filename_list, mode = 'w'):
     """Create a log.txt to store AIPS outputs.
 
     :param path_list: list of filepaths for each source
     :type path_list: list of str
     :param filename_list: list of file names
     :type filename_list: list of str
+    :param mode: file mode, 'a' appends to the log of a previous run; defaults to 'w'
+    :type mode: str, optional
     """
     log_paths = []
     for i, path in enumerate(path_list):
         log_paths.append(path + '/' + filename_list[i] + '_AIPSlog.txt')
 
-    AIPS.log = MultiFile(*log_paths, mode = 'w')
+    AIPS.log = MultiFile(*log_paths, mode = mode)
 
 def tacop(data, ext, invers, outvers):
     """Copy one calibration table to another.
@@ -259,4 +312,48 @@ def tacop(data, ext, invers, outvers):
     tacop.invers = invers
     tacop.outvers = outvers
     
-    tacop.go()
\ No newline at end of file
+    tacop.go()
+
+
+def keep_antennas(data, ext, version, antennas):
+    """Remove the rows of a calibration table that belong to other antennas.
+
+    The rows to keep are written in a single pass into a new version of the table, 
+    which then replaces the original one. Deleting the rows one by one would need an 
+    AIPS task per row.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param ext: table extension, e.g. 'SN'
+    :type ext: str
+    :param version: table version
+    :type version: int
+    :param antennas: antenna numbers whose rows are kept
+    :type antennas: list of int
+    :return: number of rows removed
+    :rtype: int
+    """
+    wuvdata = wizard.AIPSUVData(data.name, data.klass, data.disk, data.seq)
+    old_table = wuvdata.table(ext, version)
+    new_version = wuvdata.table_highver(ext) + 1
+    new_table = wuvdata.attach_table(ext, new_version, 
+                                     no_if = old_table.keywords['NO_IF'], 
+                                     no_pol = old_table.keywords['NO_POL'])
+    for key in old_table.keywords:
+        if key not in ['NO_IF', 'NO_POL']:
+            new_table.keywords[key] = old_table.keywords[key]
+
+    removed = 0
+    for row in old_table:
+        if row.antenna_no in antennas:
+            new_table.append(row)
+        else:
+            removed += 1
+    old_table.close()
+    new_table.close()
+
+    # The original table is only replaced once the new one has been written
+    data.zap_table(ext, version)
+    tacop(data, ext, new_version, version)
+    data.zap_table(ext, new_version)
+    return(removed)
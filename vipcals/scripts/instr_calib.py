@@ -1,4 +1,5 @@
-from vipcals.scripts.helper import ddhhmmss, tacop
+from vipcals.scripts.helper import ddhhmmss, tacop, keep_antennas
+from vipcals.scripts import table_cache as tcache
 
 import numpy as np
 
@@ -124,7 +125,7 @@ def manual_phasecal_multi(data, refant, priority_refants, calib_scans):
 
         except RuntimeError:
             # Check if the fringe fit failed completely
-            sn_table = data.table('SN', 3 + n)
+            sn_table = tcache.table(data, 'SN', 3 + n)
 
             if np.sum([x['weight_1'] for x in sn_table]) == 0:
 
@@ -163,34 +164,8 @@ def manual_phasecal_multi(data, refant, priority_refants, calib_scans):
                 phasecal_fring.go()
 
 
-                # Flag results from antennas not corresponding to this scan
-
-                sn_table = data.table('SN', 3 + n)
-                del_rows = [r for r,s in enumerate(sn_table) 
-                            if s.antenna_no not in scan.calib_antennas + [refant]]
-
-                for row in del_rows:
-
-                    tabed = AIPSTask('TABED')
-                    tabed.inname = data.name
-                    tabed.inclass = data.klass
-                    tabed.indisk = data.disk
-                    tabed.inseq = data.seq
-                    tabed.inext = 'SN'
-                    tabed.invers = 3+n
-                    
-                    tabed.outname = data.name
-                    tabed.outclass = data.klass
-                    tabed.outdisk = data.disk
-                    tabed.outseq = data.seq
-                    tabed.outvers = 3+n
-                    
-                    tabed.optype = 'DELE'
-                    
-                    tabed.bcount = row  # 1st row to modify
-                    tabed.ecount = row  # Last row to modify
-                                
-                    tabed.go()
+                # Remove results from antennas not corresponding to this scan
+                keep_antennas(data, 'SN', 3 + n, scan.calib_antennas + [refant])
 
             else:
                 raise RuntimeError("The instrumental calibration fringe fit has failed.")
@@ -222,7 +197,7 @@ def manual_phasecal_multi(data, refant, priority_refants, calib_scans):
 
     # If any of the antennas is flagged in the final SN table, don't touch it
     bad_antennas = []
-    for s in data.table('SN', 0):
+    for s in tcache.table(data, 'SN', 0):
         if type(s['weight_1']) == float and s['weight_1'] == 0: # single IF
             bad_antennas.append(-s['antenna_no'])
         elif type(s['weight_1']) == list and sum(s['weight_1']) == 0:
@@ -3,6 +3,9 @@ import numpy as np
 
 from datetime import datetime
 
+from vipcals.scripts import table_cache as tcache
+from vipcals.scripts import product_cache as pcache
+
 from AIPSTask import AIPSTask
 
 AIPSTask.msgkill = -8
@@ -13,7 +16,7 @@ tmp_dir = os.path.expanduser("~/.vipcals/tmp")
 if os.path.isdir("/home/vipcals"):
     tmp_dir = "/home/vipcals/.vipcals/tmp"
 
-def ionos_correct(data):
+def ionos_correct(data, workspace = None, files = None):
     """Ionospheric delay calibration.
 
     Calls :func:`~vipcals.scripts.ionos_corr.new_tecor` or \
@@ -24,9 +27,30 @@ def ionos_correct(data):
     
     :param data: visibility data
     :type data: AIPSUVData
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
+    :param files: list of files already retrieved by 
+        :func:`~vipcals.scripts.ionos_corr.download_ionex`; defaults to None
+    :type files: list of str, optional
     :return: list of retrieved files
     :rtype: list of str
     """
+    if is_new_format(data) == True:
+        files = new_tecor(data, workspace = workspace, files = files)
+    else:
+        files = old_tecor(data, workspace = workspace, files = files)
+
+    return(files)
+
+def is_new_format(data):
+    """Check if the IONEX files of the observation follow the new format.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :return: True if the observation is more recent than 26/11/2022
+    :rtype: bool
+    """
     # GPS Week 2238  -> 26/11/2022
     
     date_lim = datetime(2022,11,26)
@@ -35,34 +59,25 @@ def ionos_correct(data):
     DD = int(data.header.date_obs[8:])
 
     date_obs = datetime(YYYY, MM, DD)
-    if date_obs > date_lim:
-        files = new_tecor(data)
-    else:
-        files = old_tecor(data)
+    return date_obs > date_lim
 
-    return(files)
+def ionex_list(data, new_format = None):
+    """List the IONEX files that cover the observation.
 
-def old_tecor(data):
-    """Ionospheric delay calibration using TECOR.
-
-    Derives corrections for ionospheric Faraday rotation and \
-    dispersive delay from maps of total electron content in IONEX \
-    format. 
-
-    Reads the date from the header and the different observed days \
-    from each scan, then downloads the corresponding file(s) using the old format \
-    (older than 26/11/2022) and applies the TECOR task in AIPS. The downloaded files 
-    are of the CODG type (Center for Orbit Determination in Europe).
-
-    Creates CL#2
+    Reads the date from the header and the different observed days from the CL#1 
+    table, and builds the download address of the CODG file of each day. 
 
     :param data: visibility data
     :type data: AIPSUVData
-    :return: list of retrieved files
-    :rtype: list of str
+    :param new_format: use the new format (more recent than 26/11/2022); defaults to 
+        None, which chooses the format from the observation date
+    :type new_format: bool, optional
+    :return: list of [download address, file name] of each day, and name of the 
+        file of the first day
+    :rtype: tuple of (list of list of str, str)
     """
-    here = os.path.dirname(__file__)
-    tmp = tmp_dir
+    if new_format == None:
+        new_format = is_new_format(data)
 
     YYYY = int(data.header.date_obs[:4])
     MM = int(data.header.date_obs[5:7])
@@ -71,7 +86,7 @@ def old_tecor(data):
     date_obs = datetime(YYYY, MM, DD)
     DDD = date_obs.timetuple().tm_yday
 
-    cl1_table = data.table('CL',1)
+    cl1_table = tcache.table(data, 'CL',1)
 
     days = [*range(int(np.floor(cl1_table[-1]['time']))+1)]
 
@@ -80,7 +95,7 @@ def old_tecor(data):
     if date_obs < datetime(2002,11,4):
         days = [(min(days)-1)] + days + [(max(days)+1)]
 
-    files = []
+    file_list = []
 
     for elements in days:
         YY = data.header.date_obs[2:4]
@@ -101,42 +116,88 @@ def old_tecor(data):
                 new_DDD = '00' + new_DDD
             new_YYYY = YYYY + 1
             new_YY = str(new_YYYY)[2:4]
-        
-        if os.path.exists(tmp + '/codg' + new_DDD +'0.'+ new_YY +'i') == False:
-            curl_command = (
-    f"curl -sf --retry 5 --retry-delay 10 -u 'anonymous:daip@nrao.edu' --ftp-ssl "
-    f"ftp://gdc.cddis.eosdis.nasa.gov/gps/products/ionex/{str(new_YYYY)}/{new_DDD}/"
-    f"codg{new_DDD}0.{new_YY}i.Z > {tmp}/codg{new_DDD}0.{new_YY}i.Z")
 
-            os.system(curl_command)
+        if new_format == True:
+            url = f"ftp://gdc.cddis.eosdis.nasa.gov/gps/products/ionex/{new_YYYY}/" \
+                + f"{new_DDD}/COD0OPSFIN_{new_YYYY}{new_DDD}0000_01D_01H_GIM.INX.gz"
+        else:
+            url = f"ftp://gdc.cddis.eosdis.nasa.gov/gps/products/ionex/{str(new_YYYY)}/" \
+                + f"{new_DDD}/codg{new_DDD}0.{new_YY}i.Z"
 
-            files.append(curl_command.split(' ')[9])
-            
-            zcat_command = f"""zcat {tmp}/codg{new_DDD}0.{new_YY}i.Z >> {tmp}/codg{new_DDD}0.{new_YY}i"""
-            os.system(zcat_command)
+        file_list.append([url, f'codg{new_DDD}0.{new_YY}i'])
     
     infile = str(DDD + days[0])
     if len(infile) == 2:
         infile = '0' + infile
     if len(infile) == 1:
         infile = '00' + infile
-    
+
+    return(file_list, f'codg{infile}0.{YY}i')
+
+def download_ionex(file_list, workspace = None):
+    """Download and uncompress IONEX files.
+
+    Files that already exist in the scratch directory or in the product cache are not 
+    downloaded again. This function does not access the AIPS catalogue, so it can run 
+    in the background while other calibration steps are executed.
+
+    :param file_list: list of [download address, file name], as given by 
+        :func:`~vipcals.scripts.ionos_corr.ionex_list`
+    :type file_list: list of list of str
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
+    :return: list of retrieved files
+    :rtype: list of str
+    """
+    tmp = tmp_dir if workspace == None else workspace.path
+
+    files = []
+
+    for url, name in file_list:
+        if os.path.exists(tmp + '/' + name) == False:
+            ext = url.split('.')[-1]
+            # Final products never change, they are kept in the cache
+            pcache.fetch(url, f'{tmp}/{name}.{ext}', options = pcache.CDDIS_OPTIONS)
+
+            files.append(url)
+            
+            zcat_command = f'zcat {tmp}/{name}.{ext} >> {tmp}/{name}'
+            os.system(zcat_command)
+
+    return(files)
+
+def run_tecor(data, infile, nfiles, workspace = None):
+    """Apply the TECOR task in AIPS using IONEX files in the scratch directory.
+
+    Creates CL#2
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param infile: name of the IONEX file of the first day
+    :type infile: str
+    :param nfiles: number of IONEX files
+    :type nfiles: int
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
+    """
+    tmp = tmp_dir if workspace == None else workspace.path
+
     tecor = AIPSTask('tecor')
     tecor.inname = data.name
     tecor.inclass = data.klass 
     tecor.indisk = data.disk
     tecor.inseq = data.seq
-    tecor.infile = f'{tmp}/codg{infile}0.{YY}i'
-    tecor.nfiles = len(days)
+    tecor.infile = f'{tmp}/{infile}'
+    tecor.nfiles = nfiles
     tecor.aparm[1] = 1   # Correct for dispersive delays
     tecor.gainver = 1
     tecor.gainuse = 2
 
     tecor.go()
 
-    return(files)
-
-def new_tecor(data):
+def old_tecor(data, workspace = None, files = None):
     """Ionospheric delay calibration using TECOR.
 
     Derives corrections for ionospheric Faraday rotation and \
@@ -144,84 +205,62 @@ def new_tecor(data):
     format. 
 
     Reads the date from the header and the different observed days \
-    from each scan, then downloads the corresponding file(s) using the new format \
-    (recent than 26/11/2023) and applies the TECOR task in AIPS. The downloaded files 
+    from each scan, then downloads the corresponding file(s) using the old format \
+    (older than 26/11/2022) and applies the TECOR task in AIPS. The downloaded files 
     are of the CODG type (Center for Orbit Determination in Europe).
 
     Creates CL#2
 
     :param data: visibility data
     :type data: AIPSUVData
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
+    :param files: list of files already retrieved; defaults to None
+    :type files: list of str, optional
     :return: list of retrieved files
     :rtype: list of str
     """
-    here = os.path.dirname(__file__)
-    tmp = tmp_dir
+    file_list, infile = ionex_list(data, new_format = False)
 
-    YYYY = int(data.header.date_obs[:4])
-    MM = int(data.header.date_obs[5:7])
-    DD = int(data.header.date_obs[8:])
+    retrieved_files = download_ionex(file_list, workspace = workspace)
+    if files != None:
+        retrieved_files = files + retrieved_files
 
-    date_obs = datetime(YYYY, MM, DD)
-    DDD = date_obs.timetuple().tm_yday
+    run_tecor(data, infile, len(file_list), workspace = workspace)
 
-    cl1_table = data.table('CL',1)
+    return(retrieved_files)
 
-    days = [*range(int(np.floor(cl1_table[-1]['time']))+1)]
+def new_tecor(data, workspace = None, files = None):
+    """Ionospheric delay calibration using TECOR.
 
-    files = []
+    Derives corrections for ionospheric Faraday rotation and \
+    dispersive delay from maps of total electron content in IONEX \
+    format. 
 
-    for elements in days:
-        YY = data.header.date_obs[2:4]
-        if DDD + elements <= 365:
-            new_DDD = str(DDD + elements)
-            if len(new_DDD) == 2:
-                new_DDD = '0' + new_DDD
-            if len(new_DDD) == 1:
-                new_DDD = '00' + new_DDD
-            new_YYYY = YYYY
-            new_YY = YY
+    Reads the date from the header and the different observed days \
+    from each scan, then downloads the corresponding file(s) using the new format \
+    (recent than 26/11/2023) and applies the TECOR task in AIPS. The downloaded files 
+    are of the CODG type (Center for Orbit Determination in Europe).
 
-        if DDD + elements > 365:
-            new_DDD = str(DDD + elements - 365)
-            if len(new_DDD) == 2:
-                new_DDD = '0' + new_DDD
-            if len(new_DDD) == 1:
-                new_DDD = '00' + new_DDD
-            new_YYYY = YYYY + 1
-            new_YY = str(new_YYYY)[2:4]
-        
-        if os.path.exists(tmp + '/codg' + new_DDD +'0.'+ new_YY +'i') == False:
-            curl_command = (
-    f"curl -sf --retry 5 --retry-delay 10 -u 'anonymous:daip@nrao.edu' --ftp-ssl "
-    f"ftp://gdc.cddis.eosdis.nasa.gov/gps/products/ionex/{new_YYYY}/{new_DDD}/"
-    f"COD0OPSFIN_{new_YYYY}{new_DDD}0000_01D_01H_GIM.INX.gz "
-    f"> {tmp}/codg{new_DDD}0.{new_YY}i.gz")
+    Creates CL#2
 
-            os.system(curl_command)
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
+    :param files: list of files already retrieved; defaults to None
+    :type files: list of str, optional
+    :return: list of retrieved files
+    :rtype: list of str
+    """
+    file_list, infile = ionex_list(data, new_format = True)
 
-            files.append(curl_command.split(' ')[9])
-            
-            zcat_command = f'zcat {tmp}/codg{new_DDD}0.{new_YY}i.gz >> {tmp}/codg{new_DDD}0.{new_YY}i'
-            os.system(zcat_command)
-    
-    infile = str(DDD + days[0])
-    if len(infile) == 2:
-        infile = '0' + infile
-    if len(infile) == 1:
-        infile = '00' + infile
- 
-    tecor = AIPSTask('tecor')
-    tecor.inname = data.name
-    tecor.inclass = data.klass 
-    tecor.indisk = data.disk
-    tecor.inseq = data.seq
-    tecor.infile = f'{tmp}/codg{infile}0.{YY}i'
-    tecor.nfiles = len(days)
-    tecor.aparm[1] = 1   # Correct for dispersive delays
-    tecor.gainver = 1
-    tecor.gainuse = 2
+    retrieved_files = download_ionex(file_list, workspace = workspace)
+    if files != None:
+        retrieved_files = files + retrieved_files
 
-    tecor.go()
+    run_tecor(data, infile, len(file_list), workspace = workspace)
 
-    return(files)
\ No newline at end of file
+    return(retrieved_files)
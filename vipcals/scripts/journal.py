@@ -0,0 +1,174 @@
+import os
+import json
+import pandas as pd
+from io import StringIO
+
+from AIPSData import AIPSUVData
+
+from vipcals.scripts.helper import Scan
+
+# Table extensions created by the calibration stages
+CAL_TABLES = ['AIPS CL', 'AIPS SN', 'AIPS FG', 'AIPS BP', 'AIPS TY']
+
+def journal_path(outpath, filename):
+    """Path of the stage journal of a target.
+
+    :param outpath: output directory of the target
+    :type outpath: str
+    :param filename: name of the target subdirectory
+    :type filename: str
+    :return: path of the journal file
+    :rtype: str
+    """
+    return outpath + '/' + filename + '.journal.json'
+
+def to_json(obj):
+    """Convert numpy types into objects that can be written into a JSON file.
+
+    :param obj: object to convert
+    :type obj: object
+    :return: JSON serializable object
+    :rtype: object
+    """
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
+def new_journal(outpath_list, filename_list, target_list):
+    """Create an empty stage journal.
+
+    :param outpath_list: list containing the output file paths for each target
+    :type outpath_list: list of str
+    :param filename_list: list containing the names of the subdirectories of each target
+    :type filename_list: list of str
+    :param target_list: science target names
+    :type target_list: list of str
+    :return: stage journal
+    :rtype: dict
+    """
+    journal = {}
+    journal['paths'] = [journal_path(x, filename_list[i]) \
+                        for i, x in enumerate(outpath_list)]
+    journal['targets'] = list(target_list)
+    journal['stage'] = None
+    journal['uvdata'] = None
+    journal['tables'] = []
+    journal['state'] = {}
+    journal['stats'] = None
+    return journal
+
+def read_journal(outpath_list, filename_list, target_list):
+    """Read the stage journal written by a previous run.
+
+    :param outpath_list: list containing the output file paths for each target
+    :type outpath_list: list of str
+    :param filename_list: list containing the names of the subdirectories of each target
+    :type filename_list: list of str
+    :param target_list: science target names
+    :type target_list: list of str
+    :return: stage journal, or None if there is no journal or it belongs to another
+        set of targets
+    :rtype: dict
+    """
+    path = journal_path(outpath_list[0], filename_list[0])
+    if os.path.exists(path) == False:
+        return None
+    try:
+        with open(path, 'r') as f:
+            journal = json.load(f)
+    except ValueError:
+        return None
+
+    if journal['targets'] != list(target_list) or journal['stage'] == None:
+        return None
+
+    journal['paths'] = [journal_path(x, filename_list[i]) \
+                        for i, x in enumerate(outpath_list)]
+    return journal
+
+def record_stage(journal, stage, uvdata, stats_df, **state):
+    """Mark a stage as completed and write the journal in the target folders.
+
+    The AIPS catalogue entry, the existing tables, the statistics and any
+    variable given as keyword argument are stored. Scans are stored as dictionaries.
+
+    :param journal: stage journal
+    :type journal: dict
+    :param stage: name of the completed stage
+    :type stage: str
+    :param uvdata: visibility data
+    :type uvdata: AIPSUVData
+    :param stats_df: Pandas DataFrame where to keep track of the different statistics
+    :type stats_df: pandas.DataFrame object
+    """
+    for key in state:
+        if type(state[key]) == list and len(state[key]) > 0 \
+            and type(state[key][0]) == Scan:
+            state[key] = [vars(x) for x in state[key]]
+
+    journal['stage'] = stage
+    journal['uvdata'] = [uvdata.name, uvdata.klass, uvdata.disk, uvdata.seq]
+    journal['tables'] = [[x[0], x[1]] for x in uvdata.tables]
+    journal['state'].update(state)
+    journal['stats'] = stats_df.to_json(orient = 'split', default_handler = str)
+
+    for path in journal['paths']:
+        # Write in a temporary file first, a crash never leaves a broken journal
+        with open(path + '.tmp', 'w') as f:
+            json.dump(journal, f, default = to_json)
+        os.replace(path + '.tmp', path)
+
+def check_entry(journal):
+    """Check the AIPS catalogue entry of a journal and roll back unfinished stages.
+
+    The entry has to exist and contain all the tables written in the journal.
+    Calibration tables created after the last completed stage are deleted.
+
+    :param journal: stage journal
+    :type journal: dict
+    :return: visibility data, or None if the entry does not match the journal
+    :rtype: AIPSUVData
+    """
+    name, klass, disk, seq = journal['uvdata']
+    uvdata = AIPSUVData(name, klass, disk, seq)
+    if uvdata.exists() == False:
+        return None
+
+    tables = [[x[0], x[1]] for x in uvdata.tables]
+    for tab in journal['tables']:
+        if tab not in tables:
+            return None
+
+    for tab in tables:
+        if tab not in journal['tables'] and tab[1] in CAL_TABLES:
+            uvdata.zap_table(tab[1].split(' ')[-1], tab[0])
+
+    return uvdata
+
+def restore_stats(journal):
+    """Recover the statistics DataFrame of the last completed stage.
+
+    :param journal: stage journal
+    :type journal: dict
+    :return: Pandas DataFrame with the statistics
+    :rtype: pandas.DataFrame object
+    """
+    return pd.read_json(StringIO(journal['stats']), orient = 'split', dtype = False,
+                        convert_dates = False)
+
+def restore_scans(journal, key):
+    """Recover a list of scans stored in the journal.
+
+    :param journal: stage journal
+    :type journal: dict
+    :param key: name of the stored variable
+    :type key: str
+    :return: list of scans
+    :rtype: list of :class:`~vipcals.scripts.helper.Scan` objects
+    """
+    scan_list = []
+    for entry in journal['state'][key]:
+        scan = Scan()
+        scan.__dict__.update(entry)
+        scan_list.append(scan)
+    return scan_list
@@ -14,6 +14,8 @@ from astropy.coordinates import search_around_sky
 from astropy import units as u
 
 from vipcals.scripts.helper import Source
+from vipcals.scripts.metadata import read_metadata
+from vipcals.scripts import table_cache as tcache
 
 from AIPSData import AIPSUVData
 from AIPSTask import AIPSTask, AIPSList
@@ -40,17 +42,16 @@ def set_name(path, source, klass):
     :return: name to be used in the outputs
     :rtype: str
     """    
-    hdul = fits.open(path)
-    obs = hdul['UV_DATA'].header['OBSCODE'].strip()
-    if '/' in hdul['UV_DATA'].header['DATE-OBS']:
-        date = hdul['UV_DATA'].header['DATE-OBS'].split('/')
+    metadata = read_metadata(path)
+    obs = metadata.obscode.strip()
+    if '/' in metadata.date_obs:
+        date = metadata.date_obs.split('/')
         if int(date[2]) > 90:
             date_obs = '19' + date[2] + '-' + date[1] + '-' + date[0]
         else:
             date_obs = '20' + date[2] + '-' + date[1] + '-' + date[0]
-    if '-' in hdul['UV_DATA'].header['DATE-OBS']:
-        date_obs = hdul['UV_DATA'].header['DATE-OBS']
-    hdul.close()
+    if '-' in metadata.date_obs:
+        date_obs = metadata.date_obs
 
     name = source + '_' + obs + '_' + klass + '_' + date_obs
     return(name)
@@ -67,8 +68,8 @@ def get_source_list(file_path_list, freq = 0):
     """    
     full_source_list = []
     for file_path in file_path_list:
-        hdul = fits.open(file_path)
-        for elements in Table(hdul['SOURCE'].data):
+        metadata = read_metadata(file_path)
+        for elements in Table(metadata.sources):
             a = Source()
             a.name = elements['SOURCE'].strip()
             try:
@@ -86,7 +87,7 @@ def get_source_list(file_path_list, freq = 0):
                 a.restfreq = freq
             # If not, grab it from the header
             else:
-                a.restfreq = hdul['FREQUENCY'].header['REF_FREQ']
+                a.restfreq = metadata.ref_freq
  
             a.set_band()      
 
@@ -95,7 +96,6 @@ def get_source_list(file_path_list, freq = 0):
                 full_source_list.append(a)
                 
             a = None  
-        hdul.close()      
         
     # Make sure that source names are ASCII characters
     for s in full_source_list:
@@ -116,7 +116,7 @@ def redo_source_list(uvdata):
     :return: list of sources contained in the observations
     :rtype: list of :class:`~vipcals.scripts.helper.Source` objects
     """    
-    su_table = uvdata.table('SU', 1)
+    su_table = tcache.table(uvdata, 'SU', 1)
     full_source_list = []
     for source in su_table:
         b = Source()
@@ -132,6 +132,32 @@ def redo_source_list(uvdata):
 
     return full_source_list
 
+@functools.lru_cache(maxsize = None)
+def read_calibrator_catalogue():
+    """Read the VLBA calibrator catalogue.
+
+    The catalogue is read only once per process and kept in memory, e.g. by the 
+    pipeline daemon, which calibrates several datasets without restarting.
+
+    :return: catalogue of calibrators and their coordinates
+    :rtype: tuple of (pandas.DataFrame, astropy.coordinates.SkyCoord)
+    """
+    col_names = ['NameJ2000', 'NameB1950', 'NameICRF3', 'NameOther','RA',\
+                 'DEC', 'RAE', 'DECE', 'S_short', 'S_long', 'C_short',\
+                 'C_long', 'X_short', 'X_long', 'U_short', 'U_long',\
+                 'K_short', 'K_long', 'Ka', 'Ref']
+
+    catalogue_path = \
+        pkg_resources.resource_filename(__name__,\
+                                         '../catalogues/vlbaCalib_allfreq_full.txt')
+
+    calib_list = pd.read_fwf(catalogue_path, skiprows = 16,\
+                             names = col_names)
+
+    calib_coords = SkyCoord(calib_list['RA'].to_list(), calib_list['DEC'].to_list())
+
+    return(calib_list, calib_coords)
+
 def find_calibrators(full_source_list, choose = 'BYCOORD'):
     """Choose possible calibrators from a source list.
 
@@ -152,23 +178,12 @@ def find_calibrators(full_source_list, choose = 'BYCOORD'):
     :return: names of possible calibrators available in the file
     :rtype: list of str
     """
-    col_names = ['NameJ2000', 'NameB1950', 'NameICRF3', 'NameOther','RA',\
-                 'DEC', 'RAE', 'DECE', 'S_short', 'S_long', 'C_short',\
-                 'C_long', 'X_short', 'X_long', 'U_short', 'U_long',\
-                 'K_short', 'K_long', 'Ka', 'Ref']
-
-    catalogue_path = \
-        pkg_resources.resource_filename(__name__,\
-                                         '../catalogues/vlbaCalib_allfreq_full.txt')
-    
-    calib_list = pd.read_fwf(catalogue_path, skiprows = 16,\
-                             names = col_names)
+    calib_list, calib_coords = read_calibrator_catalogue()
 
     # Crossmatch using coordinates (fast, needs astropy)
     if choose == "BYCOORD":
         source_coords = SkyCoord([x.ra for x in full_source_list], \
                              [y.dec for y in full_source_list], unit = 'deg')
-        calib_coords = SkyCoord(calib_list['RA'].to_list(), calib_list['DEC'].to_list())
         idx1, idx2 ,_ ,_ = search_around_sky(source_coords, calib_coords, 1 * u.arcsec)
         for i, idx in enumerate(idx1):
             try:
@@ -220,20 +235,19 @@ def is_it_multifreq_id(file_path_list):
     file_dict = {}
     id_list = []
     for file in file_path_list:
-        with fits.open(file) as hdul:
-            if len(hdul['FREQUENCY'].data['FREQID']) > 1:
-                multifreq = True
-            file_dict[file] = []
-            for i in range(len(hdul['FREQUENCY'].data['FREQID'])):
-                id = hdul['FREQUENCY'].data['FREQID']
-                freq = np.floor(hdul['SOURCE'].data['RESTFREQ'][0] \
-                                + hdul['FREQUENCY'].data['BANDFREQ'][i])
-                if type(freq) == np.float64: # Single IF
-                    file_dict[file].append((freq))
-                    id_list.append((freq))
-                else:
-                    file_dict[file].append((tuple(freq)))
-                    id_list.append((tuple(freq)))
+        metadata = read_metadata(file)
+        if len(metadata.frequency['FREQID']) > 1:
+            multifreq = True
+        file_dict[file] = []
+        for i in range(len(metadata.frequency['FREQID'])):
+            freq = np.floor(metadata.sources['RESTFREQ'][0] \
+                            + metadata.frequency['BANDFREQ'][i])
+            if type(freq) == np.float64: # Single IF
+                file_dict[file].append((freq))
+                id_list.append((freq))
+            else:
+                file_dict[file].append((tuple(freq)))
+                id_list.append((tuple(freq)))
                     
     id_list = list(set(id_list))
 
@@ -273,6 +287,88 @@ def group_ids(id):
         result.append((group_min, overall_min, [min(group), max(group)]))
     return result
     
+def count_bands(file_path_list):
+    """Count the frequency bands that the pipeline calibrates separately.
+
+    These are the groups of :func:`group_ids` of every frequency ID, or the two bands 
+    of :func:`is_it_multifreq_if`. Frequency IDs that are later skipped because the 
+    targets are missing are also counted.
+
+    :param file_path_list: list of paths of the uvfits/idifts files
+    :type file_path_list: list of str
+    :return: number of frequency bands
+    :rtype: int
+    """
+    multifreq_id = is_it_multifreq_id(file_path_list)
+    if multifreq_id[0] == True:
+        return(sum([len(group_ids(id)) for id in multifreq_id[1]]))
+    if is_it_multifreq_if(file_path_list[0])[0] == True:
+        return(2)
+    return(1)
+
+@functools.lru_cache(maxsize = 16)
+def _sources_per_id(file_path, mtime, size, source_ids, chunk_rows):
+    """Presence map of a file, cached by path, modification time and size."""
+    freq_ids = [int(x) for x in np.atleast_1d(read_metadata(file_path).frequency['FREQID'])]
+    wanted = np.array(source_ids, dtype = int)
+    presence = dict([(fid, set()) for fid in freq_ids])
+
+    # Only the headers are read here, the visibilities are mapped below
+    with fits.open(file_path, memmap = True, lazy_load_hdus = True) as hdul:
+        index = hdul.index_of('UV_DATA')
+        hdu = hdul[index]
+        offset = hdul.fileinfo(index)['datLoc']
+        n_rows = hdu.header['NAXIS2']
+        row_size = hdu.header['NAXIS1']
+        row_dtype = hdu.columns.dtype.newbyteorder('>')  # FITS is big-endian
+        source_col = 'SOURCE' if 'SOURCE' in hdu.columns.names else 'SOURCE_ID'
+
+        if row_dtype.itemsize == row_size:
+            uv_rows = np.memmap(file_path, dtype = row_dtype, mode = 'r', 
+                                offset = offset, shape = (n_rows,))
+        else:
+            # Unexpected layout, let astropy map the columns
+            uv_rows = hdu.data
+
+        for start in range(0, n_rows, chunk_rows):
+            chunk = uv_rows[start:start + chunk_rows]
+            source_chunk = np.asarray(chunk[source_col])
+            freq_chunk = np.asarray(chunk['FREQID'])
+            keep = np.isin(source_chunk, wanted)
+            if np.any(keep) == True:
+                pairs = np.unique(np.stack([freq_chunk[keep], source_chunk[keep]]), axis = 1)
+                for fid, sid in pairs.T:
+                    presence.setdefault(int(fid), set()).add(int(sid))
+
+            # Stop as soon as all sources have been found in all IDs
+            if all(len(presence[fid]) == len(wanted) for fid in freq_ids):
+                break
+
+        del uv_rows
+
+    return(dict([(fid, frozenset(presence[fid])) for fid in presence]))
+
+def sources_per_id(file_path, source_ids, chunk_rows = 1000000):
+    """Check which sources were observed in each frequency ID.
+
+    The SOURCE and FREQID columns of the UV_DATA table are read in chunks from a 
+    memory-mapped file, so the visibilities are never loaded in memory. The scan stops 
+    as soon as all sources have been found in all frequency IDs.
+
+    :param file_path: path of the idifits file
+    :type file_path: str
+    :param source_ids: source IDs to look for
+    :type source_ids: list of int
+    :param chunk_rows: number of rows read at the same time; defaults to 1000000
+    :type chunk_rows: int, optional
+    :return: source IDs observed in each frequency ID
+    :rtype: dict of frozenset
+    """
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    return(_sources_per_id(file_path, stat.st_mtime_ns, stat.st_size, 
+                           tuple(sorted(int(x) for x in source_ids)), chunk_rows))
+
 def are_sources_in_id(file_path_list, loaded_id, sources):
     """Check if some sources were not observed in a certain frequency ID
 
@@ -287,32 +383,31 @@ def are_sources_in_id(file_path_list, loaded_id, sources):
     :rtype: list of str
     """   
     missingso = [] 
-    with fits.open(file_path_list[0]) as hdul:
-        # Get sources_id
-        if type(hdul['SOURCE'].data['SOURCE'][0]) == str: 
-            sources_id = [x['ID_NO.'] for x in hdul['SOURCE'].data 
-                        if x['SOURCE'].split('\x00', 1)[0].strip() in sources]
-        else:
-            sources_id = [x['ID_NO.'] for x in hdul['SOURCE'].data 
-                      if x['SOURCE'].decode('latin-1', errors='ignore').split('\x00', 1)[0].strip() in sources]
-        
-        for i in range(len(hdul['FREQUENCY'].data['FREQID'])):
-            fid = hdul['FREQUENCY'].data['FREQID'][i]
-            freq = np.floor(hdul['SOURCE'].data['RESTFREQ'][0] \
-                            + hdul['FREQUENCY'].data['BANDFREQ'][i])
-
-            if np.all(freq == np.array(loaded_id)):
-                for sid in sources_id:
-                    uv_data = hdul['UV_DATA'].data
-                    exists = np.any((uv_data['SOURCE'] == sid) & (uv_data['FREQID'] == fid)) 
-                    if exists == False:
-                        if type(hdul['SOURCE'].data['SOURCE'][0]) == str: 
-                            missingso = [x['SOURCE'].split('\x00', 1)[0].strip() for x in hdul['SOURCE'].data 
-                                        if x['ID_NO.'] == sid]
-                        else:
-                            missingso = [x['SOURCE'].decode('latin-1', errors='ignore').split('\x00', 1)[0].strip() for x in hdul['SOURCE'].data 
-                                        if x['ID_NO.'] == sid]                            
-                        break
+    metadata = read_metadata(file_path_list[0])
+
+    # Get sources_id
+    if type(metadata.sources['SOURCE'][0]) == str: 
+        source_names = [x.split('\x00', 1)[0].strip() for x in metadata.sources['SOURCE']]
+    else:
+        source_names = [x.decode('latin-1', errors='ignore').split('\x00', 1)[0].strip() 
+                        for x in metadata.sources['SOURCE']]
+    source_numbers = list(metadata.sources['ID_NO.'])
+    sources_id = [source_numbers[n] for n, x in enumerate(source_names) if x in sources]
+
+    # All IDs are checked in a single pass over the file
+    presence = sources_per_id(file_path_list[0], sources_id)
+
+    for i in range(len(metadata.frequency['FREQID'])):
+        fid = metadata.frequency['FREQID'][i]
+        freq = np.floor(metadata.sources['RESTFREQ'][0] \
+                        + metadata.frequency['BANDFREQ'][i])
+
+        if np.all(freq == np.array(loaded_id)):
+            for sid in sources_id:
+                if int(sid) not in presence[int(fid)]:
+                    missingso = [source_names[n] for n, x in enumerate(source_numbers) 
+                                 if x == sid]
+                    break
 
     return(missingso)
 
@@ -333,9 +428,8 @@ def is_it_multifreq_if(file_path):
     :rtype: boolean, int, int, int, int, str, str, float, float
     """    
     multifreq = False
-    hdul = fits.open(file_path)
-    if_freq = hdul['FREQUENCY'].header['REF_FREQ'] \
-              + hdul['FREQUENCY'].data['BANDFREQ']
+    metadata = read_metadata(file_path)
+    if_freq = metadata.ref_freq + metadata.frequency['BANDFREQ']
 
     if isinstance(if_freq[0], np.float64) == True:
         # Data is single IF
@@ -363,8 +457,6 @@ def is_it_multifreq_if(file_path):
     else:
         klass_2 = str(freq_2)[0]
 
-    hdul.close()
-
     return(multifreq, 1, IF, IF+1, len(if_freq[0]), klass_1,\
            klass_2, freq_1, freq_2)
         
@@ -513,7 +605,7 @@ def merge_red_tables(data, timetol = 0.1):
 
         tamrg.go()
 
-def print_listr(data, path_list, filename_list):
+def print_listr(data, path_list, filename_list, workspace = None):
     """Print scan information in an external file.
 
     Runs the FITLD task in AIPS and prints the output in _scansum.txt
@@ -524,7 +616,11 @@ def print_listr(data, path_list, filename_list):
     :type path_list: list of str
     :param filename_list: list of folder names for the different science targets
     :type filename_list: list of str
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """    
+    tmp = tmp_dir if workspace == None else workspace.path
     listr = AIPSTask('listr')
     listr.inname = data.name
     listr.inclass = data.klass
@@ -540,13 +636,13 @@ def print_listr(data, path_list, filename_list):
         if len(path_list[i] + '/' + name + '_scansum.txt') < 100:
             listr.outprint = path_list[i] + '/' + name + '_scansum.txt'
         else:
-            listr.outprint = tmp_dir + '/aux.scansum.txt'
+            listr.outprint = tmp + '/aux.scansum.txt'
 
         listr.go()
         
         # If created, move aux.caltab.fits to the correct path
         if len(path_list[i] + '/' + name + '_scansum.txt') >= 100:
-            os.system('mv ' + tmp_dir + '/aux.scansum.txt ' \
+            os.system('mv ' + tmp + '/aux.scansum.txt ' \
                       + path_list[i] + '/' + name + '_scansum.txt')    
 
 
@@ -6,29 +6,39 @@ import functools
 print = functools.partial(print, flush=True)
 
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from string import ascii_lowercase as alc 
 from astropy.io import fits
 from astropy.table import Table
 
 from vipcals.scripts.helper import NoTablesError
 from vipcals.scripts.helper import GC_entry
+from vipcals.scripts import table_cache as tcache
+from vipcals.scripts import product_cache as pcache
 
 from AIPSTask import AIPSTask, AIPSList
 AIPSTask.msgkill = -8
 
+import Wizardry.AIPSData as wizard
+
 tmp_dir = os.path.expanduser("~/.vipcals/tmp")
 
 # Check if /home/vipcals exists
 if os.path.isdir("/home/vipcals"):
     tmp_dir = "/home/vipcals/.vipcals/tmp"
 
-def load_evn_tables(data):
+def load_evn_tables(data, workspace = None):
     """Retrieve and load TY and GC tables from the EVN Archive
 
     :param data: vibility data
     :type data: AIPSUVData
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """
-    tmp = tmp_dir
+    tmp = tmp_dir if workspace == None else workspace.path
 
     # Remove any pre-existing tables
     if ([1, 'AIPS TY'] in data.tables):
@@ -39,8 +49,8 @@ def load_evn_tables(data):
     obs = data.header.observer
     date = data.header.date_obs.replace('-', '')
     evn_url = f"https://archive.jive.nl/exp/{obs}_{date[2:]}/pipe/{obs.lower()}.antab.gz"
-    os.system('curl -sf --retry 5 --retry-delay 10 ' + evn_url \
-                    + ' > ' + tmp + '/tables.evn.gz')  
+    # The tables can be corrected by the EVN support, check them again once a day
+    pcache.fetch(evn_url, tmp + '/tables.evn.gz', max_age = pcache.DAILY)
     os.system('zcat ' + tmp + '/tables.evn.gz > ' + tmp + '/tables.evn')
 
     # Run ANTAB
@@ -55,38 +65,20 @@ def load_evn_tables(data):
 
     return(evn_url) 
 
-def load_ty_tables(data, bif, eif):
-    """Retrieve and load TY tables from an external server.
+# Archive of the vlba.cal files
+VOBS_URL = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/'
 
-    Download TY data from an external repository, edit them in a suitable format, and 
-    then load them into AIPS using the ANTAB task.
-     
-    The function can retrieve vlba.cal files produced by two different softwares: TSM 
-    before October 2015, and RDBETSM after. The files are retrieved from 
-    `http://www.vlba.nrao.edu/astro/VOBS/astronomy/ <VOBS>`_. The function uses 
-    brute-force to look for any possible name of vlba.cal files from the same 
-    project as the one in the data header. Then, the retrieved files are formatted 
-    automatically and saved into /TABLES/tsys.vlba on the output directory. The required 
-    IFs have to be given as an input, as usually they will come all together in the same 
-    calibration file. For the files in TSM format, the function  
-    :func:`~vipcals.scripts.load_tables.ty_tsm_vlog` uses the VLOG task in AIPS to split 
-    the TY tables from the rest of the calibration tables. 
+# Seconds during which the result of a search in the archive is reused
+VLBA_CAL_TTL = pcache.DAILY
 
-    .. _VOBS: http://www.vlba.nrao.edu/astro/VOBS/astronomy/
+def vobs_directory(data):
+    """Month directory and project code of a dataset in the VOBS archive.
 
     :param data: visibility data
     :type data: AIPSUVData
-    :param bif: first frequency IF to consider 
-    :type bif: int
-    :param eif: last frequency IF to consider
-    :type eif: int
-    :return: urls from which the calibration tables have been retrieved
-    :rtype: list of str
-    """    
-    here = os.path.dirname(__file__)
-    tmp = tmp_dir
-
-    # Obtain cal.vlba file
+    :return: month directory (e.g. 'jan15'), project code
+    :rtype: str, str
+    """
     YY = int(data.header.date_obs[2:4])
     MM = int(data.header.date_obs[5:7])
     month_dict = {1: 'jan', 2: 'feb', 3: 'mar', 4: 'apr', 5: 'may', \
@@ -103,330 +95,374 @@ def load_ty_tables(data, bif, eif):
         project = 'br5'
     if project == 'bc016' and mmm == 'jun':
         project = 'bc16'
-    
-    normal = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-             + mmm + yy + '/' + project  #### + '[a-z]cal.vlba'
-    
-    normal_new = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-             + mmm + yy + '/' + project + '/' + project + 'cal.vlba'
-    compressed_new = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-             + mmm + yy + '/' + project + '/' + project + 'cal.vlba.Z'
-    compressed_gz_new = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-             + mmm + yy + '/' + project + '/' + project + 'cal.vlba.gz'
-
-    # If the file is splitted in different letters, we will keep them here
+
+    return(mmm + yy, project)
+
+def vlba_cal_candidates(data):
+    """Possible urls of the vlba.cal files of a dataset.
+
+    The vlba.cal files are stored in the VOBS archive under different names, depending 
+    on the date of the observation. Old projects can also be split in different files, 
+    one per letter of the project code.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :return: groups of candidate urls in order of preference, each one given as a list 
+        of (url, letter) and whether all the files found in the group are retrieved or 
+        only the first one
+    :rtype: list of tuple
+    """
+    month, project = vobs_directory(data)
+
+    normal = VOBS_URL + month + '/' + project
+    groups = []
+    # New format
+    groups.append(([(normal + '/' + project + 'cal.vlba' + ext, '') \
+                    for ext in ['', '.Z', '.gz']], False))
+    # Old format, no letter
+    groups.append(([(normal + 'cal.vlba' + ext, '') for ext in ['', '.Z', '.gz']], False))
+    # Old format, one file per letter
+    for ext in ['', '.Z', '.gz']:
+        groups.append(([(normal + s + 'cal.vlba' + ext, s) \
+                        for s in alc + '123456789'], True))
+        groups.append(([(normal + s + '/' + project + s + 'cal.vlba' + ext, s) \
+                        for s in alc + '123456789'], True))
+    return(groups)
+
+def vlba_session(workers = 32):
+    """HTTP session to the VOBS archive.
+
+    Connections are pooled and shared by all the requests of the session. Failed 
+    requests are retried, same as ``curl --retry 5``.
+
+    :param workers: maximum number of simultaneous connections; defaults to 32
+    :type workers: int, optional
+    :return: session
+    :rtype: requests.Session
+    """
+    session = requests.Session()
+    retries = Retry(total = 5, backoff_factor = 1, 
+                    status_forcelist = [429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = workers, 
+                          max_retries = retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return(session)
+
+def probe_urls(session, urls, workers = 32):
+    """Check which urls exist in a server.
+
+    All urls are checked at the same time with HEAD requests, so that the files are 
+    not downloaded. Only successful answers (e.g. not 403, 404 or 410) count as 
+    existing.
+
+    :param session: HTTP session
+    :type session: requests.Session
+    :param urls: urls to check
+    :type urls: list of str
+    :param workers: number of simultaneous requests; defaults to 32
+    :type workers: int, optional
+    :return: urls that exist, in the same order as the input, and whether the server 
+        answered for every url
+    :rtype: list of str, bool
+    """
+    def exists(url):
+        try:
+            r = session.head(url, allow_redirects = True, timeout = 30)
+            if r.status_code == 405: # HEAD not allowed by the server
+                with session.get(url, stream = True, timeout = 30) as r:
+                    pass
+        except requests.RequestException:
+            return None
+        return r.ok
+
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        found = list(pool.map(exists, urls))
+    return([url for url, f in zip(urls, found) if f == True], None not in found)
+
+def download_url(session, url, path):
+    """Stream a file into disk.
+
+    :param session: HTTP session
+    :type session: requests.Session
+    :param url: url of the file
+    :type url: str
+    :param path: path where the file is written
+    :type path: str
+    :return: whether the file was downloaded
+    :rtype: bool
+    """
+    try:
+        with session.get(url, stream = True, timeout = 60) as r:
+            r.raise_for_status()
+            with open(path, 'wb') as f:
+                for chunk in r.iter_content(chunk_size = 1 << 20):
+                    f.write(chunk)
+    except (requests.RequestException, OSError):
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+    return True
+
+def fetch_vlba_cal(data, tmp, ttl = None):
+    """Download the vlba.cal files of a dataset from the VOBS archive.
+
+    The groups of candidate urls from 
+    :func:`~vipcals.scripts.load_tables.vlba_cal_candidates` are probed in order of 
+    preference, all the urls of a group at once, and the search stops at the first 
+    group whose files can be retrieved. Each file is downloaded once. Files are 
+    written into tables.vlba, or tables<letter>.vlba if the project is split in 
+    several files.
+
+    The urls found for each project and month are kept in the product cache, also if 
+    none was found, so that later runs do not search the archive again.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param tmp: directory where the files are written
+    :type tmp: str
+    :param ttl: seconds during which a previous search is reused; defaults to 
+        VLBA_CAL_TTL (one day)
+    :type ttl: float, optional
+    :return: letters of the files retrieved, urls from which they were retrieved
+    :rtype: list of str, list of str
+    """
+    if ttl == None:
+        ttl = VLBA_CAL_TTL
+    groups = vlba_cal_candidates(data)
+    key = 'vlba.cal:' + '/'.join(vobs_directory(data))
     letters = []
-    
-    # Here we store the urls from which the tables are retrieved
     retrieved_urls = []
-    
-    # try the new format
-    
-    for url in [normal_new, compressed_new, compressed_gz_new]:
-        r = requests.get(url)
-        if r.status_code != 404:
-            good_url = url
-            if '.Z' in url:
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba.Z')
-                os.system('zcat ' + tmp + '/tables.vlba.Z > ' + tmp + '/tables.vlba')
-            elif '.gz' in url:
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba.gz')
-                os.system('zcat ' + tmp + '/tables.vlba.gz > ' + tmp + '/tables.vlba')
-            else:
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba')  
-            retrieved_urls.append(good_url)
-            break
-    
-    # try the old format... letter by letter
-    
-    if not glob.glob(tmp + '/tables*.vlba'):
-        for i in range(1):
-            # no letter
-            url = normal + 'cal.vlba'
-            r = requests.get(url)
-            if r.status_code != 404:
-                good_url = url
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba')  
-                retrieved_urls.append(good_url)
-                break
-            url = normal + 'cal.vlba.Z'
-            r = requests.get(url)
-            if r.status_code != 404:
-                good_url = url
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba.Z')  
-                os.system('zcat ' + tmp + '/tables.vlba.Z > ' + tmp + '/tables.vlba')
-                retrieved_urls.append(good_url)
-                break
-            url = normal + 'cal.vlba.gz'
-            r = requests.get(url)
-            if r.status_code != 404:
-                good_url = url
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba.gz')  
-                os.system('zcat ' + tmp + '/tables.vlba.gz > ' + tmp + '/tables.vlba')
-                retrieved_urls.append(good_url)
-                break
 
-            # Try all letters
-            for s in alc + '123456789':
-                url = normal + s +'cal.vlba'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables' + s + '.vlba') 
-                    letters.append(s)
-                    retrieved_urls.append(good_url)
-            
-            # Break the loop if it already found some tables
-            if len(letters) != 0:
-                break
-                  
-            # try all letters
-            for s in alc + '123456789':
-                url = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-                + mmm + yy + '/' + project + s + '/' + project + s + 'cal.vlba'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables' + s + '.vlba') 
-                    letters.append(s)
-                    retrieved_urls.append(good_url)
-            
-            # Break the loop if it already found some tables
-            if len(letters) != 0:
-                break
-            
-            for s in alc + '123456789':
-                url = normal + s +'cal.vlba.Z'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables.vlba.Z')  
-                    os.system('zcat ' + tmp + '/tables.vlba.Z > ' + tmp + '/tables' + s +'.vlba')
-                    letters.append(s)
-                    retrieved_urls.append(good_url)
-                    
-            # Break the loop if it already found some tables
-            if len(letters) != 0:
-                break
-            
-            for s in alc + '123456789':
-                url = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-                + mmm + yy + '/' + project + s + '/' + project + s + 'cal.vlba.Z'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables.vlba.Z')  
-                    os.system('zcat ' + tmp + '/tables.vlba.Z > ' + tmp + '/tables' + s +'.vlba')
+    cached_urls = pcache.read_discovery(key, ttl)
+    # Nothing was found by a recent search
+    if cached_urls == []:
+        return(letters, retrieved_urls)
+    cached = cached_urls != None
+
+    found = []
+    complete = True
+    with vlba_session() as session:
+        for group, retrieve_all in groups:
+            if cached == True:
+                hits = [(url, s) for url, s in group if url in cached_urls]
+            else:
+                group_found, group_complete = probe_urls(session, 
+                                                         [url for url, _ in group])
+                complete = complete and group_complete
+                found += group_found
+                hits = [(url, s) for url, s in group if url in group_found]
+            if retrieve_all == False:
+                hits = hits[:1]
+            for url, s in hits:
+                path = tmp + '/tables' + s + '.vlba'
+                ext = os.path.splitext(url)[1] if url.endswith(('.Z', '.gz')) else ''
+                # vlba.cal files never change, they are kept in the cache
+                if pcache.fetch(url, path + ext, download = lambda u, f, since: \
+                                download_url(session, u, f)) == False:
+                    continue
+                if ext != '':
+                    os.system('zcat ' + path + ext + ' > ' + path)
+                if s != '':
                     letters.append(s)
-                    retrieved_urls.append(good_url)
-                    
-            # Break the loop if it already found some tables
-            if len(letters) != 0:
+                retrieved_urls.append(url)
+            # Stop at the first group with tables
+            if len(retrieved_urls) > 0:
                 break
-            
-            for s in alc + '123456789':
-                url = normal + s +'cal.vlba.gz'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables.vlba.gz')  
-                    os.system('zcat ' + tmp + '/tables.vlba.gz > ' + tmp + '/tables' + s +'.vlba')
-                    letters.append(s)
-                    retrieved_urls.append(good_url)
 
-            # Break the loop if it already found some tables
-            if len(letters) != 0:
-                break
+    # Do not keep the result if the server could not be reached for a preferred url
+    if cached == False and complete == True:
+        pcache.write_discovery(key, found)
 
-            for s in alc + '123456789':
-                url = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-                    + mmm + yy + '/' + project + s + '/' + project + s + 'cal.vlba.gz'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables.vlba.gz')  
-                    os.system('zcat ' + tmp + '/tables.vlba.gz > ' + tmp + '/tables' + s +'.vlba')
-                    letters.append(s)
-                    retrieved_urls.append(good_url)
-         
-    # If the task did not succeed, raise an error and end the pipeline
-    if not glob.glob(tmp + '/tables*.vlba'):
-        raise NoTablesError("No vlba.cal tables were found online.")
+    # The files found by the previous search could not be retrieved, search again
+    if cached == True and len(retrieved_urls) == 0:
+        pcache.write_discovery(key, None)
+        return(fetch_vlba_cal(data, tmp, ttl))
 
-    # Extract TSYS information from tables.vlba into tsys.vlba
+    return(letters, retrieved_urls)
 
-    # If there are no letters:
-    if len(letters) == 0:
+class CalVlbaBundle():
+    """vlba.cal files of a dataset, retrieved and parsed only once.
+
+    The files are downloaded by :func:`~vipcals.scripts.load_tables.fetch_vlba_cal` and 
+    their content is kept in memory, split into the Tsys, flag and other sections, so 
+    that the TY and FG tables are loaded from the same retrieval. Files in the TSM 
+    format are split with VLOG when the bundle is created.
+    """
+    def __init__(self, data, workspace = None, ttl = None):
+        """
+        Download and parse the vlba.cal files of a dataset, reusing previous searches 
+        of the archive done less than ttl seconds ago (default: VLBA_CAL_TTL).
+        """
+        tmp = tmp_dir if workspace == None else workspace.path
+        self.letters, self.urls = fetch_vlba_cal(data, tmp, ttl)
+        # If nothing was retrieved, raise an error and end the pipeline
+        if len(self.urls) == 0:
+            raise NoTablesError("No vlba.cal tables were found online.")
+
+        # Sections of the files in the TSM format, split by VLOG
+        self.tsm_tsys = ''
+        self.tsm_flags = ''
+        # Sections of the files produced by rdbetsm (from October 2015)
+        self.rdbetsm = []
+
+        n_ant = len(tcache.table(data, 'AN', 1))
+        for s in (self.letters if len(self.letters) > 0 else ['']):
+            path = tmp + '/tables' + s + '.vlba'
+            with open(path, 'r') as f:
+                cal_list = f.read().split('\n')
 
-        input_file = open(f"{tmp}/tables.vlba", "r") 
-        cal_table = input_file.read() 
-        cal_list = cal_table.split("\n")
-        
-        # If produced by TSM:
-        if 'Produced by: TSM' in cal_list[0]:
-        
-            ty_tsm_vlog(data, bif, eif, [f"{tmp}/tables.vlba"])
-                    
-        # If produced by rdbetsm (from October 2015):
-        if 'Produced by: rdbetsm ' in cal_list[0]:
-            
-            n_ant = len(data.table('AN', 1))
-            for n, lines in enumerate(cal_list):
-                if 'Tsys information' in lines:
-                    start = n
-                    break
-                
-            counter = 0
-            for n, lines in enumerate(cal_list[start:]):
-                if '! Produced by: ' in lines:
-                    counter += 1
-                if counter == n_ant:    
-                    end = start+n-1
-                    break
-                end = start + n
-            # Clean those * comments
-            clean_list = cal_list[start:end]
-            clean_list = [ elem for elem in clean_list if '*' not in elem]
-            
-            # If multi-if dataset:
-            if bif == 0 and eif != 0:
-                final_list = clean_list
-                
-            if bif == 0 and eif == 0:
-                final_list = clean_list
-            
-            if bif == 1 and eif != 0:
-                final_list = []
-                for item in clean_list:
-                    if len(item.split()) > 0:
-                        if item.split()[0] in ['!', 'TSYS','/']:
-                            final_list.append(item)
-                            continue
-                        aux = item.split()
-                        del aux[2+eif:]
-                        aux2 = ' '.join(aux)
-                        final_list.append(aux2)
-            if bif != 1 and eif != 0:
-                final_list = []
-                for item in clean_list:
-                    if len(item.split()) > 0:
-                        if item.split()[0] in ['!', 'TSYS','/']:
-                            final_list.append(item)
-                            continue
-                        aux = item.split()
-                        del aux[2:bif+1]
-                        aux2 = ' '.join(aux)
-                        final_list.append(aux2)
-                
-            
-            with open(f'{tmp}/tsys.vlba', 'w') as fp:
-                for item in final_list:
-                    
-                    # Im not sure of this part here... it was needed from 
-                    # some old dataset but I dont know the implications
-                    # Replace * with 0.0, is it safe?? 
-                    if '*' in item:
-                        item = item.replace('*', '0.0')
-        
-                    # write each item on a new line
-                    fp.write("%s\n" % item)
-                    
-        if 'Produced by:' not in cal_list[0]:
-            print('\n\n ERROR WHILE READING THE CAL.VLBA FILE,' \
-                  + ' UNRECOGNIZED FORMAT \n')           
-
-              
-    # If there are letters:
-    else:
-        for s in letters:
-            input_file = open(tmp + "/tables" + s + ".vlba", "r") 
-            cal_table = input_file.read() 
-            cal_list = cal_table.split("\n")
-            
-            # If produced by TSM:
             if 'Produced by: TSM' in cal_list[0]:
-                ty_tsm_vlog(data, bif, eif, glob.glob(f'{tmp}/tables*.vlba'))
-                break
-                        
-            # If produced by rdbetsm (from October 2015):
+                tsys_text, flag_text = tsm_vlog(data, path)
+                self.tsm_tsys += tsys_text
+                self.tsm_flags += flag_text
+
             if 'Produced by: rdbetsm ' in cal_list[0]:
-                
-                n_ant = len(data.table('AN', 1))
-                for n, lines in enumerate(cal_list):
-                    if 'Tsys information' in lines:
-                        start = n
-                        break
-                    
-                counter = 0
-                for n, lines in enumerate(cal_list[start:]):
-                    if '! Produced by: ' in lines:
-                        counter += 1
-                    if counter == n_ant:    
-                        end = start+n-1
-                        break
-                    end = start + n
-                # Clean those * comments
-                clean_list = cal_list[start:end]
-                clean_list = [ elem for elem in clean_list if '*' not in elem]
-                
-                
-                if bif == 0 and eif != 0:
-                    final_list = clean_list
-                    
-                if bif == 0 and eif == 0:
-                    final_list = clean_list
-                
-                if bif == 1 and eif != 0:
-                    final_list = []
-                    for item in clean_list:
-                        if len(item.split()) > 0:
-                            if item.split()[0] in ['!', 'TSYS','/']:
-                                final_list.append(item)
-                                continue
-                            aux = item.split()
-                            del aux[2+eif:]
-                            aux2 = ' '.join(aux)
-                            final_list.append(aux2)
-                if bif != 1 and eif != 0:
-                    final_list = []
-                    for item in clean_list:
-                        if len(item.split()) > 0:
-                            if item.split()[0] in ['!', 'TSYS','/']:
-                                final_list.append(item)
-                                continue
-                            aux = item.split()
-                            del aux[2:bif+1]
-                            aux2 = ' '.join(aux)
-                            final_list.append(aux2)
-                    
-                
-                with open(f'{tmp}/tsys.vlba', 'a') as fp:
-                    for item in final_list:
-                        
-                        # Im not sure of this part here... it was needed from 
-                        # some old dataset but I dont know the implications
-                        # Replace * with 0.0, is it safe?? 
-                        if '*' in item:
-                            item = item.replace('*', '0.0')
-            
-                        # write each item on a new line
-                        fp.write("%s\n" % item)
-                        
+                self.rdbetsm.append(self.split_sections(cal_list, n_ant))
+
             if 'Produced by:' not in cal_list[0]:
                 print('\n\n ERROR WHILE READING THE CAL.VLBA FILE,' \
                       + ' UNRECOGNIZED FORMAT \n')
+
+    @staticmethod
+    def split_sections(cal_list, n_ant):
+        """Split the lines of a file produced by rdbetsm into sections.
+
+        The Tsys section starts at 'Tsys information' and covers the blocks of every 
+        antenna. The flag section starts at 'Edit data' and ends at the next block.
+
+        :param cal_list: lines of the file
+        :type cal_list: list of str
+        :param n_ant: number of antennas in the AN table
+        :type n_ant: int
+        :return: lines of the 'tsys', 'flags' and 'other' sections, and the line range 
+            of each section in the file ('ranges')
+        :rtype: dict
+        """
+        ranges = {}
+        tsys_start = None
+        flag_start = None
+        counter = 0
+        for n, line in enumerate(cal_list):
+            if tsys_start == None and 'Tsys information' in line:
+                tsys_start = n
+            if flag_start == None and 'Edit data' in line:
+                flag_start = n
+            if tsys_start != None and 'tsys' not in ranges:
+                if '! Produced by: ' in line:
+                    counter += 1
+                if counter == n_ant:
+                    ranges['tsys'] = (tsys_start, n - 1)
+            if flag_start != None and 'flags' not in ranges and '! Produced by: ' in line:
+                ranges['flags'] = (flag_start, n)
+        if tsys_start != None:
+            ranges.setdefault('tsys', (tsys_start, len(cal_list) - 1))
+        if flag_start != None:
+            ranges.setdefault('flags', (flag_start, len(cal_list) - 1))
+
+        sections = {'ranges': ranges, 'tsys': [], 'flags': []}
+        covered = set()
+        for key, (start, end) in ranges.items():
+            sections[key] = cal_list[start:end]
+            covered.update(range(start, end))
+        sections['other'] = [l for n, l in enumerate(cal_list) if n not in covered]
+        return(sections)
+
+def load_ty_tables(data, bif, eif, workspace = None, bundle = None):
+    """Retrieve and load TY tables from an external server.
+
+    Download TY data from an external repository, edit them in a suitable format, and 
+    then load them into AIPS using the ANTAB task.
+     
+    The function can retrieve vlba.cal files produced by two different softwares: TSM 
+    before October 2015, and RDBETSM after. The files are retrieved from 
+    `http://www.vlba.nrao.edu/astro/VOBS/astronomy/ <VOBS>`_ by 
+    :class:`~vipcals.scripts.load_tables.CalVlbaBundle`, which looks for any possible 
+    name of vlba.cal files from the same project as the one in the data header. Then, 
+    the Tsys section of the retrieved files is formatted automatically and saved into 
+    /TABLES/tsys.vlba on the output directory. The required IFs have to be given as an 
+    input, as usually they will come all together in the same calibration file. For the 
+    files in TSM format, the function :func:`~vipcals.scripts.load_tables.ty_tsm_vlog` 
+    formats the TY tables split by the VLOG task in AIPS. 
+
+    .. _VOBS: http://www.vlba.nrao.edu/astro/VOBS/astronomy/
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param bif: first frequency IF to consider 
+    :type bif: int
+    :param eif: last frequency IF to consider
+    :type eif: int
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
+    :param bundle: vlba.cal files already retrieved; if None, they are retrieved
+    :type bundle: :class:`~vipcals.scripts.load_tables.CalVlbaBundle`, optional
+    :return: urls from which the calibration tables have been retrieved
+    :rtype: list of str
+    """    
+    here = os.path.dirname(__file__)
+    tmp = tmp_dir if workspace == None else workspace.path
+
+    # Obtain the vlba.cal files
+    if bundle == None:
+        bundle = CalVlbaBundle(data, workspace = workspace)
+    retrieved_urls = bundle.urls
+
+    # Extract TSYS information from the vlba.cal files into tsys.vlba
+    open(f'{tmp}/tsys.vlba', 'w').close()
+
+    # If produced by TSM:
+    if len(bundle.tsm_tsys) > 0:
+        ty_tsm_vlog(data, bif, eif, bundle.tsm_tsys, workspace = workspace)
+
+    # If produced by rdbetsm (from October 2015):
+    for sections in bundle.rdbetsm:
+        # Clean those * comments
+        clean_list = sections['tsys']
+        clean_list = [ elem for elem in clean_list if '*' not in elem]
+
+        # If multi-if dataset:
+        if bif == 0 and eif != 0:
+            final_list = clean_list
+            
+        if bif == 0 and eif == 0:
+            final_list = clean_list
+        
+        if bif == 1 and eif != 0:
+            final_list = []
+            for item in clean_list:
+                if len(item.split()) > 0:
+                    if item.split()[0] in ['!', 'TSYS','/']:
+                        final_list.append(item)
+                        continue
+                    aux = item.split()
+                    del aux[2+eif:]
+                    aux2 = ' '.join(aux)
+                    final_list.append(aux2)
+        if bif != 1 and eif != 0:
+            final_list = []
+            for item in clean_list:
+                if len(item.split()) > 0:
+                    if item.split()[0] in ['!', 'TSYS','/']:
+                        final_list.append(item)
+                        continue
+                    aux = item.split()
+                    del aux[2:bif+1]
+                    aux2 = ' '.join(aux)
+                    final_list.append(aux2)
+
+        with open(f'{tmp}/tsys.vlba', 'a') as fp:
+            for item in final_list:
+                
+                # Im not sure of this part here... it was needed from 
+                # some old dataset but I dont know the implications
+                # Replace * with 0.0, is it safe?? 
+                if '*' in item:
+                    item = item.replace('*', '0.0')
+    
+                # write each item on a new line
+                fp.write("%s\n" % item)
             
     # Run ANTAB
     antab = AIPSTask('antab')
@@ -453,7 +489,7 @@ def load_ty_tables(data, bif, eif):
 
     return(retrieved_urls)    
     
-def load_fg_tables(data):
+def load_fg_tables(data, workspace = None, bundle = None):
     """Retrieve and load FG tables from an external server.
 
     Download FG data from an external repository, edit them in a suitable format, and 
@@ -461,281 +497,59 @@ def load_fg_tables(data):
      
     The function can retrieve vlba.cal files produced by two different softwares: TSM 
     before October 2015, and RDBETSM after. The files are retrieved from 
-    `http://www.vlba.nrao.edu/astro/VOBS/astronomy/ <VOBS>`_. The function uses 
-    brute-force to look for any possible name of vlba.cal files from the same 
-    project as the one in the data header. Then, the retrieved files are formatted 
-    automatically and saved into /TABLES/flags.vlba on the output directory. For the 
-    files in TSM format, the function :func:`~vipcals.scripts.load_tables.fg_tsm_vlog` 
-    uses the VLOG task in AIPS to split the TY tables from the rest of the calibration 
-    tables. 
+    `http://www.vlba.nrao.edu/astro/VOBS/astronomy/ <VOBS>`_ by 
+    :class:`~vipcals.scripts.load_tables.CalVlbaBundle`, which looks for any possible 
+    name of vlba.cal files from the same project as the one in the data header. Then, 
+    the flag section of the retrieved files is formatted automatically and saved into 
+    /TABLES/flags.vlba on the output directory. For the files in TSM format, the 
+    function :func:`~vipcals.scripts.load_tables.fg_tsm_vlog` writes the FG tables split 
+    by the VLOG task in AIPS. 
 
     .. _VOBS: http://www.vlba.nrao.edu/astro/VOBS/astronomy/    
 
     :param data: visibility data
     :type data: AIPSUVData
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
+    :param bundle: vlba.cal files already retrieved; if None, they are retrieved
+    :type bundle: :class:`~vipcals.scripts.load_tables.CalVlbaBundle`, optional
     :return: urls from which the calibration tables have been retrieved
     :rtype: list of str
     """    
     here = os.path.dirname(__file__)
-    tmp = tmp_dir
+    tmp = tmp_dir if workspace == None else workspace.path
 
-    # Obtain cal.vlba file
-    YY = int(data.header.date_obs[2:4])
-    MM = int(data.header.date_obs[5:7])
-    month_dict = {1: 'jan', 2: 'feb', 3: 'mar', 4: 'apr', 5: 'may', \
-                  6: 'jun', 7: 'jul', 8: 'aug', 9: 'sep', 10: 'oct', \
-                  11: 'nov', 12: 'dec'}
-    mmm = month_dict[MM]
-    yy = str(YY)
-    project = data.header.observer.lower()
+    # Obtain the vlba.cal files
+    if bundle == None:
+        bundle = CalVlbaBundle(data, workspace = workspace)
+    retrieved_urls = bundle.urls
 
-    # Weird exceptions:
-    if project == 'bt022' and mmm == 'jul':
-        project = 'bt22'
-    if project == 'br005' and mmm == 'jul':
-        project = 'br5'
-    if project == 'bc016' and mmm == 'jun':
-        project = 'bc16'
-    
-    normal = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-             + mmm + yy + '/' + project  #### + '[a-z]cal.vlba'
-    
-    normal_new = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-             + mmm + yy + '/' + project + '/' + project + 'cal.vlba'
-    compressed_new = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-             + mmm + yy + '/' + project + '/' + project + 'cal.vlba.Z'
-    compressed_gz_new = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-             + mmm + yy + '/' + project + '/' + project + 'cal.vlba.gz'
-
-    # If the file is splitted in different letters, we will keep them here
-    letters = []
+    # Extract FG information from the vlba.cal files into flags.vlba
+    open(f'{tmp}/flags.vlba', 'w').close()
 
-    # Here we store the urls from which the tables are retrieved
-    retrieved_urls = []
+    # If produced by TSM:
+    if len(bundle.tsm_flags) > 0:
+        fg_tsm_vlog(data, bundle.tsm_flags, workspace = workspace)
 
-    # try the new format
-    
-    for url in [normal_new, compressed_new, compressed_gz_new]:
-        r = requests.get(url)
-        if r.status_code != 404:
-            good_url = url
-            if '.Z' in url:
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba.Z')
-                os.system('zcat ' + tmp + '/tables.vlba.Z > ' + tmp + '/tables.vlba')
-            elif '.gz' in url:
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba.gz')
-                os.system('zcat ' + tmp + '/tables.vlba.gz > ' + tmp + '/tables.vlba')
-            else:
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba')             
-            retrieved_urls.append(good_url)
-            break
-
-
-    # try the old format... letter by letter    
-    if not glob.glob(tmp + '/tables*.vlba'):
-        for i in range(1):
-            # no letter
-            url = normal + 'cal.vlba'
-            r = requests.get(url)
-            if r.status_code != 404:
-                good_url = url
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba')  
-                retrieved_urls.append(good_url)
-                break
-            url = normal + 'cal.vlba.Z'
-            r = requests.get(url)
-            if r.status_code != 404:
-                good_url = url
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba.Z')  
-                os.system('zcat ' + tmp + '/tables.vlba.Z > ' + tmp + '/tables.vlba')
-                retrieved_urls.append(good_url)
-                break
-            url = normal + 'cal.vlba.gz'
-            r = requests.get(url)
-            if r.status_code != 404:
-                good_url = url
-                os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                          + ' > ' + tmp + '/tables.vlba.gz')  
-                os.system('zcat ' + tmp + '/tables.vlba.gz > ' + tmp + '/tables.vlba')
-                retrieved_urls.append(good_url)
-                break
+    # If produced by rdbetsm (from October 2015):
+    for sections in bundle.rdbetsm:
+        if 'flags' not in sections['ranges']:
+            continue
+        start, end = sections['ranges']['flags']
 
-            # Try all letters
-            for s in alc:
-                url = normal + s +'cal.vlba'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables' + s + '.vlba') 
-                    letters.append(s)
-                    retrieved_urls.append(good_url)
-            
-            # Break the loop if it already found some tables
-            if len(letters) != 0:
-                break
-                  
-            # try all letters
-            for s in alc + '123456789':
-                url = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-                + mmm + yy + '/' + project + s + '/' + project + s + 'cal.vlba'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables' + s + '.vlba') 
-                    letters.append(s)
-                    retrieved_urls.append(good_url)
-            
-            # Break the loop if it already found some tables
-            if len(letters) != 0:
-                break
-            
-            for s in alc + '123456789':
-                url = normal + s +'cal.vlba.Z'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables.vlba.Z')  
-                    os.system('zcat ' + tmp + '/tables.vlba.Z > ' + tmp + '/tables' + s +'.vlba')
-                    letters.append(s)
-                    retrieved_urls.append(good_url)
-                    
-            # Break the loop if it already found some tables
-            if len(letters) != 0:
-                break
-            
-            for s in alc + '123456789':
-                url = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-                + mmm + yy + '/' + project + s + '/' + project + s + 'cal.vlba.Z'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables.vlba.Z')  
-                    os.system('zcat ' + tmp + '/tables.vlba.Z > ' + tmp + '/tables' + s +'.vlba')
-                    letters.append(s)
-                    retrieved_urls.append(good_url)
-                    
-            # Break the loop if it already found some tables
-            if len(letters) != 0:
-                break
-            
-            for s in alc + '123456789':
-                url = normal + s +'cal.vlba.gz'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables.vlba.gz')  
-                    os.system('zcat ' + tmp + '/tables.vlba.gz > ' + tmp + '/tables' + s +'.vlba')
-                    letters.append(s)
-                    retrieved_urls.append(good_url)
-
-            # Break the loop if it already found some tables
-            if len(letters) != 0:
-                break
-
-            for s in alc + '123456789':
-                url = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/' \
-                    + mmm + yy + '/' + project + s + '/' + project + s + 'cal.vlba.gz'
-                r = requests.get(url)
-                if r.status_code != 404:
-                    good_url = url
-                    os.system('curl -sf --retry 5 --retry-delay 10 ' + url \
-                              + ' > ' + tmp + '/tables.vlba.gz')  
-                    os.system('zcat ' + tmp + '/tables.vlba.gz > ' + tmp + '/tables' + s +'.vlba')
-                    letters.append(s)
-                    retrieved_urls.append(good_url)
-        
-    # If the task did not succeed, raise an error and end the pipeline
-    if not glob.glob(tmp + '/tables*.vlba'):
-        raise NoTablesError("No vlba.cal tables were found online.")
-            
-    # Extract FG information from tables.vlba into flags.vlba
-    
-    # If there are no letters:
-    if len(letters) == 0:
-        
-        input_file = open(f"{tmp}/tables.vlba", "r") 
-        cal_table = input_file.read() 
-        cal_list = cal_table.split("\n")
-        
-        # If produced by TSM:
-        if 'Produced by: TSM' in cal_list[0]:
-            fg_tsm_vlog(data, [f"{tmp}/tables.vlba"])
-                    
-        # If produced by rdbetsm (from October 2015):
-        if 'Produced by: rdbetsm ' in cal_list[0]:
-            for n, lines in enumerate(cal_list):
-                if 'Edit data' in lines:
-                    start = n
-                    break
-    
-            for n, lines in enumerate(cal_list[start:]):
-                if '! Produced by: ' in lines:   
-                    end = start+n
-                    break
-                end = start + n
-                
-            # Clean those * comments
-            clean_list = cal_list[start:end]
-            clean_list = [ elem for elem in clean_list if '*' not in elem]
-            
-            with open(f'{tmp}/flags.vlba', 'w') as fp:
-                for item in clean_list[start:end]:
-                    # write each item on a new line
-                    fp.write("%s\n" % item)
-                    
-        if 'Produced by:' not in cal_list[0]:
-            print('\n\n ERROR WHILE READING THE CAL.VLBA FILE,' \
-                  + ' UNRECOGNIZED FORMAT \n')
-                
-        
-    # If there are letters:
-    else:
-        for s in letters:
-            input_file = open(f"{tmp}/tables{s}.vlba", "r") 
-            cal_table = input_file.read() 
-            cal_list = cal_table.split("\n")
-         
-            # If produced by TSM:
-            if 'Produced by: TSM' in cal_list[0]:
-                fg_tsm_vlog(data, glob.glob(f'{tmp}/tables*.vlba'))
-                     
-            # If produced by rdbetsm (from October 2015):
-            if 'Produced by: rdbetsm ' in cal_list[0]:
-                for n, lines in enumerate(cal_list):
-                    if 'Edit data' in lines:
-                        start = n
-                        break
+        # Clean those * comments
+        clean_list = sections['flags']
+        clean_list = [ elem for elem in clean_list if '*' not in elem]
      
-                for n, lines in enumerate(cal_list[start:]):
-                    if '! Produced by: ' in lines:   
-                        end = start+n
-                        break
-                    end = start + n
-                 
-                # Clean those * comments
-                clean_list = cal_list[start:end]
-                clean_list = [ elem for elem in clean_list if '*' not in elem]
-             
-                with open(f'{tmp}/flags.vlba', 'a') as fp:
-                    for item in clean_list[start:end]:
-                        # write each item on a new line
-                        fp.write("%s\n" % item)
-                     
-            if 'Produced by:' not in cal_list[0]:
-                print('\n\n ERROR WHILE READING THE CAL.VLBA FILE,' \
-                      + ' UNRECOGNIZED FORMAT \n')
+        # The section is sliced again with the line numbers of the whole file, as the 
+        # pipeline has always done. Writing the whole section would apply flags that 
+        # are not applied now, which has to be reviewed on its own
+        with open(f'{tmp}/flags.vlba', 'a') as fp:
+            for item in clean_list[start:end]:
+                # write each item on a new line
+                fp.write("%s\n" % item)
 
-         
     # Run UVFLG
     uvflg = AIPSTask('uvflg')
     uvflg.inname = data.name
@@ -748,7 +562,7 @@ def load_fg_tables(data):
 
     return(retrieved_urls)
 
-def load_gc_tables(data, ant_list = ['all']):
+def load_gc_tables(data, ant_list = ['all'], workspace = None):
     """Retrieve and load GC tables from an external file.
 
     Look for relevant gain curves from an external file, edit them in a suitable format, 
@@ -761,9 +575,12 @@ def load_gc_tables(data, ant_list = ['all']):
     :type data: AIPSUVData
     :param log: pipeline log
     :type log: file
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """
     here = os.path.dirname(__file__)
-    tmp = tmp_dir
+    tmp = tmp_dir if workspace == None else workspace.path
 
     # Read data
     good_url = 'http://www.vlba.nrao.edu/astro/VOBS/astronomy/vlba_gains.key'
@@ -889,6 +706,130 @@ def load_external_antab(data, filepath):
     
     antab.go()
 
+def read_fits_antennas(filepath):
+    """Read the antenna names and polarization types of a uvfits/idifits file.
+
+    Non-ASCII characters (e.g. padding) are removed.
+
+    :param filepath: path to the original uvfits/idifits file
+    :type filepath: str
+    :return: antenna names, and polarization types of the first and second feed
+    :rtype: list of str, list of str, list of str
+    """
+    with fits.open(filepath) as hdul:
+        an_data = Table(hdul['ANTENNA'].data)
+        names = [re.sub(r'[^\x20-\x7E]', '', x).strip() for x in an_data['ANNAME']]
+        poltya = [re.sub(r'[^\x20-\x7E]', '', x).strip() for x in an_data['POLTYA']]
+        poltyb = [re.sub(r'[^\x20-\x7E]', '', x).strip() for x in an_data['POLTYB']]
+    return(names, poltya, poltyb)
+
+def tabed_replace(data, column, row, value):
+    """Replace a string in one row of the AN table with the TABED task.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param column: column number
+    :type column: int
+    :param row: row number, starting at 1
+    :type row: int
+    :param value: new value
+    :type value: str
+    """
+    tabed = AIPSTask('TABED')
+    tabed.inname = data.name
+    tabed.inclass = data.klass
+    tabed.indisk = data.disk
+    tabed.inseq = data.seq
+    tabed.inext = 'AN'
+    tabed.invers = 1
+    
+    tabed.outname = data.name
+    tabed.outclass = data.klass
+    tabed.outdisk = data.disk
+    tabed.outseq = data.seq
+    tabed.outvers = 1
+    
+    tabed.optype = 'REPL'
+    tabed.aparm[1] = column  # Column number
+    tabed.aparm[2] = 0  # 1st character to modify (0 => 1)
+    tabed.aparm[3] = 0  # Last character to modify (0 => last)
+    tabed.aparm[4] = 3  # String
+    
+    tabed.bcount = row  # 1st row to modify
+    tabed.ecount = row  # Last row to modify
+    
+    tabed.keystrng = AIPSList(value)
+    
+    tabed.go()
+
+def edit_an_table(data, columns):
+    """Rewrite string columns of every row of the AN table at once.
+
+    The table is opened once with Wizardry and all rows are written in the same pass.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param columns: column name => new value of each row
+    :type columns: dict
+    """
+    wuvdata = wizard.AIPSUVData(data.name, data.klass, data.disk, data.seq)
+    an_table = wuvdata.table('AN', 1)
+    try:
+        for n, row in enumerate(an_table):
+            for key in columns:
+                setattr(row, key, columns[key][n])
+            row.update()
+    finally:
+        an_table.close()
+        tcache.invalidate(data.name, data.klass, 'AN')
+
+def wrong_an_rows(data, columns):
+    """Check the values of the AN table after editing it.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param columns: column name => expected value of each row
+    :type columns: dict
+    :return: rows (starting at 0) with values different from the expected ones; all 
+        rows if the table cannot be read
+    :rtype: list of int
+    """
+    n_rows = len(list(columns.values())[0])
+    try:
+        data.antennas
+        an_table = tcache.table(data, 'AN', 1)
+        wrong = set()
+        for key in columns:
+            for n, value in enumerate(an_table[key]):
+                if value.strip() != columns[key][n]:
+                    wrong.add(n)
+        return sorted(wrong)
+    except SystemError:
+        return list(range(n_rows))
+
+def repair_an_table(data, filepath):
+    """Remove non-ASCII characters from antenna names and polarization types.
+
+    Recovers the antenna names and polarization types from the uvifts/idifits files 
+    and writes them in all rows of the AN table at once. The result is checked once, 
+    rows that could not be written are edited with the TABED task.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param filepath: path to the original uvfits/idifits file
+    :type filepath: str
+    """
+    names, poltya, poltyb = read_fits_antennas(filepath)
+    columns = {'anname': names, 'poltya': poltya, 'poltyb': poltyb}
+    try:
+        edit_an_table(data, columns)
+    except (SystemError, RuntimeError, UnicodeError):
+        pass  # The table could not be read in Python
+
+    for n in wrong_an_rows(data, columns):
+        tabed_replace(data, 1, n+1, names[n])
+        tabed_replace(data, 9, n+1, poltya[n] + poltyb[n])
+
 def remove_ascii_antname(data, filepath):
     """Remove non-ASCII characters from antenna names.
 
@@ -900,43 +841,10 @@ def remove_ascii_antname(data, filepath):
     :param filepath: path to the original uvfits/idifits file
     :type filepath: str
     """    
-    # Recover antenna names from fits file
-    backup_names = []
-    hdul = fits.open(filepath)
-    non_ascii_antennas = list(Table(hdul['ANTENNA'].data)['ANNAME'])
-    for ant in non_ascii_antennas:
-        ant = re.sub(r'[^\x20-\x7E]', '', ant).strip()
-        backup_names.append(ant)
-    hdul.close()
-        
-    for i in range(len(data.table('AN',1))):
+    names, poltya, poltyb = read_fits_antennas(filepath)
+    for i in range(len(names)):
         # Replace antenna names row by row
-        tabed_antname = AIPSTask('TABED')
-        tabed_antname.inname = data.name
-        tabed_antname.inclass = data.klass
-        tabed_antname.indisk = data.disk
-        tabed_antname.inseq = data.seq
-        tabed_antname.inext = 'AN'
-        tabed_antname.invers = 1
-        
-        tabed_antname.outname = data.name
-        tabed_antname.outclass = data.klass
-        tabed_antname.outdisk = data.disk
-        tabed_antname.outseq = data.seq
-        tabed_antname.outvers = 1
-        
-        tabed_antname.optype = 'REPL'
-        tabed_antname.aparm[1] = 1  # Column number (Sure is always this?)
-        tabed_antname.aparm[2] = 0  # 1st character to modify (0 => 1)
-        tabed_antname.aparm[3] = 0  # Last character to modify (0 => last)
-        tabed_antname.aparm[4] = 3  # String
-        
-        tabed_antname.bcount = i+1  # 1st row to modify
-        tabed_antname.ecount = i+1  # Last row to modify
-        
-        tabed_antname.keystrng = AIPSList(backup_names[i]) # Antenna name
-        
-        tabed_antname.go()
+        tabed_replace(data, 1, i+1, names[i])
     
 def remove_ascii_poltype(data, filepath):
     """Remove non-ASCII characters from polarization types.
@@ -949,52 +857,47 @@ def remove_ascii_poltype(data, filepath):
     :param filepath: path to the original uvfits/idifits file
     :type filepath: str
     """
-    # Recover polarization labels from fits file
-    backup_names = []
-    hdul = fits.open(filepath)
-    poltya = list(Table(hdul['ANTENNA'].data)['POLTYA'])
-    poltyb = list(Table(hdul['ANTENNA'].data)['POLTYB'])
-    for n, ant in enumerate(poltya):
-        pol = re.sub(r'[^\x20-\x7E]', '', poltya[n]).strip() \
-            + re.sub(r'[^\x20-\x7E]', '', poltyb[n]).strip()
-        backup_names.append(pol)
-    hdul.close()
-
-    for i in range(len(data.table('AN',1))):
+    names, poltya, poltyb = read_fits_antennas(filepath)
+    for i in range(len(names)):
         # Replace polarization type row by row
-        tabed_poltype = AIPSTask('TABED')
-        tabed_poltype.inname = data.name
-        tabed_poltype.inclass = data.klass
-        tabed_poltype.indisk = data.disk
-        tabed_poltype.inseq = data.seq
-        tabed_poltype.inext = 'AN'
-        tabed_poltype.invers = 1
-        
-        tabed_poltype.outname = data.name
-        tabed_poltype.outclass = data.klass
-        tabed_poltype.outdisk = data.disk
-        tabed_poltype.outseq = data.seq
-        tabed_poltype.outvers = 1
-        
-        tabed_poltype.optype = 'REPL'
-        tabed_poltype.aparm[1] = 9  # Column number (Sure it's always this?)
-        tabed_poltype.aparm[2] = 0  # 1st character to modify (0 => 1)
-        tabed_poltype.aparm[3] = 0  # Last character to modify (0 => last)
-        tabed_poltype.aparm[4] = 3  # String
-        
-        tabed_poltype.bcount = i+1  # 1st row to modify
-        tabed_poltype.ecount = i+1  # Last row to modify
-        
-        tabed_poltype.keystrng = AIPSList(backup_names[i])  # Replace value
+        tabed_replace(data, 9, i+1, poltya[i] + poltyb[i])
+
+def tsm_vlog(data, path):
+    """Split a TSM produced cal.vlba file.
+
+    Uses the VLOG task in AIPS to separate the system temperature and flag information 
+    of a cal.vlba file in the TSM format.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param path: path where the calibration table has been downloaded
+    :type path: str
+    :return: system temperature information, flag information
+    :rtype: str, str
+    """
+    vlog = AIPSTask('VLOG')
+    vlog.inname = data.name
+    vlog.inclass = data.klass
+    vlog.inseq = data.seq
+    vlog.indisk = data.disk
+
+    vlog.calin = path
+    vlog.outfile = path[:-5]
 
-        tabed_poltype.go()
+    vlog.go()
 
-def ty_tsm_vlog(data, bif, eif, table_paths):
-    """Split tsys tables from a TSM produced cal.vlba file.
+    with open(path[:-5] + '.TSYS', 'r') as f:
+        tsys_text = f.read()
+    with open(path[:-5] + '.FLAG', 'r') as f:
+        flag_text = f.read()
+    return(tsys_text, flag_text)
 
-    Uses the VLOG task in AIPS to separate the system temperature information from one 
-    or multiple cal.vlba files in the TSM format. The output is written onto 
-    ./vipcals/tmp/tsys.vlba
+def ty_tsm_vlog(data, bif, eif, tsys_text, workspace = None):
+    """Format the tsys tables of TSM produced cal.vlba files.
+
+    Selects the required IFs from the system temperature information split by 
+    :func:`~vipcals.scripts.load_tables.tsm_vlog` from one or multiple cal.vlba files in 
+    the TSM format. The output is written onto ./vipcals/tmp/tsys.vlba
 
     :param data: visibility data
     :type data: AIPSUVData
@@ -1002,29 +905,15 @@ def ty_tsm_vlog(data, bif, eif, table_paths):
     :type bif: int
     :param eif: last frequency IF to consider
     :type eif: int
-    :param table_paths: list of paths where the calibration tables have been downloaded
-    :type table_pahts: list of str
+    :param tsys_text: system temperature information of the calibration tables
+    :type tsys_text: str
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """ 
     here = os.path.dirname(__file__)
-    tmp = tmp_dir
-    for path in table_paths:
-        vlog = AIPSTask('VLOG')
-        vlog.inname = data.name
-        vlog.inclass = data.klass
-        vlog.inseq = data.seq
-        vlog.indisk = data.disk
-
-        vlog.calin = path
-        vlog.outfile = path[:-5]
-
-        vlog.go()
-
-    for path in table_paths:
-        with open(f'{tmp}/tsys.vlba', 'a') as f:
-            f.write(open(path[:-5]+'.TSYS', 'r').read())
-
-    tsys_file = open(f"{tmp}/tsys.vlba", "r")
-    tsys_list = tsys_file.read().split('\n')
+    tmp = tmp_dir if workspace == None else workspace.path
+    tsys_list = tsys_text.split('\n')
 
     # Adjust for multiple polarizations:
     if len(data.polarizations) == 2:
@@ -1083,31 +972,21 @@ def ty_tsm_vlog(data, bif, eif, table_paths):
             # write each item on a new line
             fp.write("%s\n" % item)
 
-def fg_tsm_vlog(data, table_paths):
-    """Split flag tables from a TSM produced cal.vlba file.
+def fg_tsm_vlog(data, flag_text, workspace = None):
+    """Write the flag tables of TSM produced cal.vlba files.
 
-    Uses the VLOG task in AIPS to separate the flag information from one or multiple 
-    cal.vlba files in the TSM format. The output is written onto /.vipcals/tmp/flags.vlba
+    Writes the flag information split by :func:`~vipcals.scripts.load_tables.tsm_vlog` 
+    from one or multiple cal.vlba files in the TSM format onto /.vipcals/tmp/flags.vlba
 
     :param data: visibility data
     :type data: AIPSUVData
-    :param table_paths: list of paths where the calibration tables have been downloaded
-    :type table_pahts: list of str
+    :param flag_text: flag information of the calibration tables
+    :type flag_text: str
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """    
     here = os.path.dirname(__file__)
-    tmp = tmp_dir
-    for path in table_paths:
-        vlog = AIPSTask('VLOG')
-        vlog.inname = data.name
-        vlog.inclass = data.klass
-        vlog.inseq = data.seq
-        vlog.indisk = data.disk
-
-        vlog.calin = path
-        vlog.outfile = path[:-5]
-
-        vlog.go()
-
-    for path in table_paths:
-        with open(f'{tmp}/flags.vlba', 'a') as f:
-            f.write(open(path[:-5]+'.FLAG', 'r').read())
\ No newline at end of file
+    tmp = tmp_dir if workspace == None else workspace.path
+    with open(f'{tmp}/flags.vlba', 'a') as f:
+        f.write(flag_text)
\ No newline at end of file
@@ -0,0 +1,229 @@
+import os
+import io
+import json
+import sqlite3
+import functools
+import contextlib
+
+from typing import NamedTuple
+
+from astropy.io import fits
+
+index_path = os.path.expanduser("~/.vipcals/metadata.db")
+
+# Check if /home/vipcals exists
+if os.path.isdir("/home/vipcals"):
+    index_path = "/home/vipcals/.vipcals/metadata.db"
+
+# Increase when the stored metadata change, older indexes are rebuilt
+INDEX_VERSION = 1
+
+class FitsMetadata(NamedTuple):
+    """Metadata of a uvfits/idifits file.
+
+    Contains the headers and small tables needed to validate the inputs and to set up
+    the calibration. The tables are read-only copies detached from the file, since the
+    same object is shared by every function reading the file.
+    """
+    path: str
+    obscode: str
+    date_obs: str
+    correlator: str
+    no_chan: int
+    no_band: int
+    no_stkd: int
+    ref_pixl: float
+    ref_freq: float
+    sources: fits.FITS_rec
+    frequency: fits.FITS_rec
+    antennas: tuple
+
+def table_to_bytes(data):
+    """Write a FITS table into bytes that can be stored in the index.
+
+    :param data: table
+    :type data: astropy.io.fits.FITS_rec
+    :return: table written as a FITS file
+    :rtype: bytes
+    """
+    buffer = io.BytesIO()
+    fits.HDUList([fits.PrimaryHDU(), fits.BinTableHDU(data)]).writeto(buffer)
+    return(buffer.getvalue())
+
+def bytes_to_table(blob):
+    """Recover a FITS table stored in the index.
+
+    :param blob: table written by :func:`~vipcals.scripts.metadata.table_to_bytes`
+    :type blob: bytes
+    :return: table
+    :rtype: astropy.io.fits.FITS_rec
+    """
+    with fits.open(io.BytesIO(blob)) as hdul:
+        return(hdul[1].data.copy())
+
+def read_only(metadata):
+    """Make the tables of the metadata read-only.
+
+    :param metadata: metadata of a file
+    :type metadata: :class:`~vipcals.scripts.metadata.FitsMetadata`
+    :return: metadata with read-only copies of the tables
+    :rtype: :class:`~vipcals.scripts.metadata.FitsMetadata`
+    """
+    tables = {}
+    for name in ['sources', 'frequency']:
+        table = getattr(metadata, name).copy()
+        table.setflags(write = False)
+        tables[name] = table
+    return(metadata._replace(**tables))
+
+def open_index(path = index_path):
+    """Open the metadata index, creating it if needed.
+
+    The index is a SQLite database with one row per file, keyed by path. It can be
+    shared by several pipelines running at the same time.
+
+    :param path: path of the index; defaults to ~/.vipcals/metadata.db
+    :type path: str, optional
+    :return: connection to the index
+    :rtype: sqlite3.Connection
+    """
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    con = sqlite3.connect(path, timeout = 30)
+    if con.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION:
+        con.execute('DROP TABLE IF EXISTS files')
+        con.execute('CREATE TABLE files (path TEXT PRIMARY KEY, size INTEGER, ' \
+                    + 'mtime INTEGER, obscode TEXT, date_obs TEXT, correlator TEXT, ' \
+                    + 'no_chan INTEGER, no_band INTEGER, no_stkd INTEGER, ' \
+                    + 'ref_pixl REAL, ref_freq REAL, sources BLOB, frequency BLOB, ' \
+                    + 'antennas TEXT)')
+        con.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+        con.commit()
+    return(con)
+
+def read_index(con, path, mtime, size):
+    """Look for a file in the index.
+
+    :param con: connection to the index
+    :type con: sqlite3.Connection
+    :param path: absolute path of the file
+    :type path: str
+    :param mtime: modification time of the file in ns
+    :type mtime: int
+    :param size: size of the file in bytes
+    :type size: int
+    :return: metadata of the file, or None if it is not indexed or it has changed
+    :rtype: :class:`~vipcals.scripts.metadata.FitsMetadata`
+    """
+    row = con.execute('SELECT obscode, date_obs, correlator, no_chan, no_band, ' \
+                      + 'no_stkd, ref_pixl, ref_freq, sources, frequency, antennas ' \
+                      + 'FROM files WHERE path = ? AND mtime = ? AND size = ?',
+                      (path, mtime, size)).fetchone()
+    if row == None:
+        return(None)
+
+    return(FitsMetadata(path, *row[:8], bytes_to_table(row[8]),
+                        bytes_to_table(row[9]), tuple(json.loads(row[10]))))
+
+def write_index(con, metadata, mtime, size):
+    """Store the metadata of a file in the index.
+
+    :param con: connection to the index
+    :type con: sqlite3.Connection
+    :param metadata: metadata of the file
+    :type metadata: :class:`~vipcals.scripts.metadata.FitsMetadata`
+    :param mtime: modification time of the file in ns
+    :type mtime: int
+    :param size: size of the file in bytes
+    :type size: int
+    """
+    con.execute('INSERT OR REPLACE INTO files VALUES ' \
+                + '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (metadata.path, size, mtime, metadata.obscode, metadata.date_obs,
+                 metadata.correlator, int(metadata.no_chan), int(metadata.no_band),
+                 int(metadata.no_stkd), float(metadata.ref_pixl),
+                 float(metadata.ref_freq), table_to_bytes(metadata.sources),
+                 table_to_bytes(metadata.frequency), json.dumps(metadata.antennas)))
+    con.commit()
+
+def read_file(path):
+    """Read the metadata directly from a file.
+
+    :param path: absolute path of the uvfits/idifits file
+    :type path: str
+    :return: metadata of the file
+    :rtype: :class:`~vipcals.scripts.metadata.FitsMetadata`
+    """
+    # Only the headers and the requested tables are read, the visibilities are not
+    with fits.open(path, memmap = True, lazy_load_hdus = True) as hdul:
+        try:
+            correlator = hdul[0].header['CORRELAT'].strip()
+        except KeyError:
+            correlator = None
+
+        metadata = FitsMetadata(
+            path = path,
+            obscode = hdul['UV_DATA'].header['OBSCODE'],
+            date_obs = hdul['UV_DATA'].header['DATE-OBS'],
+            correlator = correlator,
+            no_chan = hdul['FREQUENCY'].header['NO_CHAN'],
+            no_band = hdul['FREQUENCY'].header['NO_BAND'],
+            no_stkd = hdul['FREQUENCY'].header['NO_STKD'],
+            ref_pixl = hdul['FREQUENCY'].header['REF_PIXL'],
+            ref_freq = hdul['FREQUENCY'].header['REF_FREQ'],
+            sources = hdul['SOURCE'].data.copy(),
+            frequency = hdul['FREQUENCY'].data.copy(),
+            antennas = tuple(hdul['ANTENNA'].data['ANNAME'])
+        )
+
+    return(metadata)
+
+@functools.lru_cache(maxsize = 64)
+def _scan_file(path, mtime, size):
+    """Read the metadata of a file, cached by path, modification time and size."""
+    # The index is only an accelerator, the file is read if it cannot be used
+    try:
+        con = open_index()
+    except (sqlite3.Error, OSError):
+        return(read_only(read_file(path)))
+
+    with contextlib.closing(con):
+        try:
+            metadata = read_index(con, path, mtime, size)
+        except (sqlite3.Error, OSError, ValueError):
+            metadata = None
+
+        if metadata == None:
+            metadata = read_file(path)
+            try:
+                write_index(con, metadata, mtime, size)
+            except (sqlite3.Error, TypeError, ValueError):
+                pass
+
+    # The same object is returned to every caller
+    return(read_only(metadata))
+
+def read_metadata(path):
+    """Read the metadata of a uvfits/idifits file.
+
+    Each file is opened only once per process; later calls return the same read-only
+    object unless the file has been modified. The metadata are also kept in an index on disk,
+    so files that were already read by a previous run are not opened again.
+
+    :param path: path of the uvfits/idifits file
+    :type path: str
+    :return: metadata of the file
+    :rtype: :class:`~vipcals.scripts.metadata.FitsMetadata`
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return(_scan_file(path, stat.st_mtime_ns, stat.st_size))
+
+def scan_files(path_list):
+    """Read the metadata of a list of uvfits/idifits files.
+
+    :param path_list: paths of the uvfits/idifits files
+    :type path_list: list of str
+    :return: metadata of each file
+    :rtype: list of :class:`~vipcals.scripts.metadata.FitsMetadata`
+    """
+    return([read_metadata(path) for path in path_list])
@@ -4,6 +4,7 @@ import warnings
 import numpy as np
 
 from vipcals.scripts.helper import ddhhmmss
+from vipcals.scripts import table_cache as tcache
 
 from AIPSTask import AIPSTask, AIPSList
 
@@ -147,7 +148,7 @@ def optimize_solint_mm(data, target, target_scans, refant, min_solint = 1.0,
             snr_fring_optimiz(data, refant, float(solint), timerang, \
                               AIPSList(target), 6)
                 
-            snr_table = data.table('SN', 6)
+            snr_table = tcache.table(data, 'SN', 6)
             # Save the SNR of the scan
             
             for antennas in snr_table:
@@ -238,7 +239,7 @@ def optimize_solint_cm(data, target, target_scans, refant, min_solint = 1.0):
             snr_fring_optimiz(data, refant, int(solint), timerang, \
                               AIPSList(target), 6)
                 
-            snr_table = data.table('SN', 6)
+            snr_table = tcache.table(data, 'SN', 6)
             # Save the SNR of the scan
             
             for antennas in snr_table:
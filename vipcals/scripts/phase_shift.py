@@ -2,6 +2,8 @@ import numpy as np
 
 from astropy.coordinates import SkyCoord
 
+from vipcals.scripts import table_cache as tcache
+
 from AIPSTask import AIPSTask, AIPSList
 
 AIPSTask.msgkill = -8
@@ -16,7 +18,7 @@ def get_coord(data, target):
     :return: coordinates
     :rtype: SkyCoord object
     """    
-    su_table = data.table('SU', 1)
+    su_table = tcache.table(data, 'SU', 1)
     
     for entry in su_table:
         if target == entry['source'].replace(' ',''):
@@ -42,7 +44,7 @@ def uv_shift(data, target, new_coord):
     :return: old coordinates, new coordinates
     :rtype: SkyCoord objects
     """    
-    su_table = data.table('SU', 1)
+    su_table = tcache.table(data, 'SU', 1)
     
     for entry in su_table:
         if target == entry['source'].replace(' ',''):
@@ -15,6 +15,8 @@ from AIPSData import AIPSCat
 
 import Wizardry.AIPSData as wizard
 
+from vipcals.scripts import table_cache as tcache
+
 from AIPSTask import AIPSTask, AIPSList
 AIPSTask.msgkill = -8
 
@@ -86,7 +88,7 @@ def plot_vis_per_antenna(stats_df, target_list, filename_list, outpath_list):
 
 def possm_plotter(filepath, data, target, \
                   gainuse, bpver = 0, flagver = 0, \
-                  flag_edge = False, flag_frac = 0.1):
+                  flag_edge = False, flag_frac = 0.1, workspace = None):
     """Plot visibilities as a function of frequency to a PostScript file.
 
     Uses the POSSM task in AIPS to plot amplitudes and phases as a function of frequency.
@@ -111,9 +113,12 @@ def possm_plotter(filepath, data, target, \
     :param flag_frac: number of edge channels to flag, either a fraction (if < 1) \
                       or an integer number of channels (if >= 1); defaults to 0.1
     :type flag_frac: float, optional
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """    
     here = os.path.dirname(__file__)
-    tmp = tmp_dir
+    tmp = tmp_dir if workspace == None else workspace.path
     
     filename = filepath.split('/')[-1]
     
@@ -135,11 +140,11 @@ def possm_plotter(filepath, data, target, \
         possm.bpver = bpver
 
     try:
-        no_channels = int(data.table('FQ',1)[0]['total_bandwidth'][0] / \
-                      data.table('FQ',1)[0]['ch_width'][0])
+        no_channels = int(tcache.table(data, 'FQ',1)[0]['total_bandwidth'][0] / \
+                      tcache.table(data, 'FQ',1)[0]['ch_width'][0])
     except TypeError:   # Single IF datasets
-        no_channels = int(data.table('FQ',1)[0]['total_bandwidth'] / \
-                      data.table('FQ',1)[0]['ch_width'])
+        no_channels = int(tcache.table(data, 'FQ',1)[0]['total_bandwidth'] / \
+                      tcache.table(data, 'FQ',1)[0]['ch_width'])
         
     if flag_edge == True and flag_frac < 1:
         flag_chann = int(flag_frac * no_channels)
@@ -197,7 +202,7 @@ def possm_plotter(filepath, data, target, \
     data.zap_table('PL', -1)
 
 
-def uvplt_plotter(filepath, data, target, solint = 0.09):
+def uvplt_plotter(filepath, data, target, solint = 0.09, workspace = None):
     """Plot UV coverage for a source to a PostScript file.
 
     Uses the UVPLT task in AIPS to plot the UV coverage of a source. By default it plots 
@@ -212,7 +217,11 @@ def uvplt_plotter(filepath, data, target, solint = 0.09):
     :type target: str
     :param solint: time averaging interval in minutes; defaults to 0.09 (~5 seconds)
     :type solint: float, optional
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """    
+    tmp = tmp_dir if workspace == None else workspace.path
     filename = filepath.split('/')[-1]
 
     uvplt = AIPSTask('uvplt')
@@ -257,13 +266,13 @@ def uvplt_plotter(filepath, data, target, solint = 0.09):
     if len(filepath + '/PLOTS/' + filename + '_UVPLT.ps') < 110:
         lwpla.outfile = filepath + '/PLOTS/' + filename + '_UVPLT.ps'
     else:
-        lwpla.outfile = tmp_dir + '/aux.uvplt.ps'
+        lwpla.outfile = tmp + '/aux.uvplt.ps'
     
     lwpla.go()
 
     # If the filepath name was too long, move the auxiliary file to the correct place
     if len(filepath + '/PLOTS/' + filename + '_UVPLT.ps') >= 110:
-        os.system('mv ' + tmp_dir + '/aux.uvplt.ps '\
+        os.system('mv ' + tmp + '/aux.uvplt.ps '\
                   + filepath + '/PLOTS/' + filename + '_UVPLT.ps')
 
     
@@ -272,7 +281,7 @@ def uvplt_plotter(filepath, data, target, solint = 0.09):
 
 
 def vplot_plotter(filepath, data, target, gainuse, bpver = 0, avgif = 1, avgchan = 1, \
-                  solint = 0.09):
+                  solint = 0.09, workspace = None):
     """Plot visibilities as a function of time to a PostScript file.
 
     Uses the VPLOT task in AIPS to plot amplitudes and phases of a source as a function 
@@ -297,7 +306,11 @@ def vplot_plotter(filepath, data, target, gainuse, bpver = 0, avgif = 1, avgchan
     :type avgchan: int, optional
     :param solint: time averaging interval in minutes; defaults to 0.09
     :type solint: float, optional
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """    
+    tmp = tmp_dir if workspace == None else workspace.path
     filename = filepath.split('/')[-1]
 
     vplot = AIPSTask('vplot')
@@ -349,19 +362,19 @@ def vplot_plotter(filepath, data, target, gainuse, bpver = 0, avgif = 1, avgchan
     if len(filepath + '/PLOTS/' + filename + '_VPLOT.ps') < 110:
         lwpla.outfile = filepath + '/PLOTS/' + filename + '_VPLOT.ps'
     else:
-        lwpla.outfile = tmp_dir + '/aux.vplot.ps'
+        lwpla.outfile = tmp + '/aux.vplot.ps'
     
     lwpla.go()
 
     # If the filepath name was too long, move the auxiliary file to the correct place
     if len(filepath + '/PLOTS/' + filename + '_VPLOT.ps') >= 110:
-        os.system('mv ' + tmp_dir + '/aux.vplot.ps '\
+        os.system('mv ' + tmp + '/aux.vplot.ps '\
                   + filepath + '/PLOTS/' + filename + '_VPLOT.ps')
     
     # Clean all plots
     data.zap_table('PL', -1)
 
-def tsys_plotter(filepath, data, tyver = 1):
+def tsys_plotter(filepath, data, tyver = 1, workspace = None):
     """Plot system temperatures as a function of time to a PostScript file.
 
     Uses the SNPLT task in AIPS to plot system temperatures of the antennas as a function 
@@ -374,7 +387,11 @@ def tsys_plotter(filepath, data, tyver = 1):
     :type data: AIPSUVData
     :param tyver: TY table version to print; defaults to 1
     :type tyver: int, optional
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """    
+    tmp = tmp_dir if workspace == None else workspace.path
     filename = filepath.split('/')[-1]
 
     snplt = AIPSTask('snplt')
@@ -418,19 +435,19 @@ def tsys_plotter(filepath, data, tyver = 1):
     if len(filepath + '/PLOTS/' + filename + '_TSYS_TY' + str(tyver) + '.ps') < 110:
         lwpla.outfile = filepath + '/PLOTS/' + filename + '_TSYS_TY' + str(tyver) + '.ps'
     else:
-        lwpla.outfile = tmp_dir + f'/aux.tsys{tyver}.ps'
+        lwpla.outfile = tmp + f'/aux.tsys{tyver}.ps'
     
     lwpla.go()
 
     # If the filepath name was too long, move the auxiliary file to the correct place
     if len(filepath + '/PLOTS/' + filename + '_TSYS_TY' + str(tyver) + '.ps') >= 110:
-        os.system('mv ' + tmp_dir + f'/aux.tsys{tyver}.ps '\
+        os.system('mv ' + tmp + f'/aux.tsys{tyver}.ps '\
                   + filepath + '/PLOTS/' + filename + '_TSYS_TY' + str(tyver) + '.ps')
     
     # Clean all plots
     data.zap_table('PL', -1)
 
-def generate_pickle_plots(data, target_list, path_list):
+def generate_pickle_plots(data, target_list, path_list, workspace = None):
     """Generate multiple plots and serialize them in a compressed format.
 
     The function applies all the different calibration tables to the data and 
@@ -450,13 +467,16 @@ def generate_pickle_plots(data, target_list, path_list):
     :type target_list: list of str  
     :param path_list: list of paths of the visibilities
     :type path_list: list of str
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """
-    an_table = data.table('AN', 1)
+    an_table = tcache.table(data, 'AN', 1)
     disk = data.disk
     catalog = AIPSCat(disk)[disk]
 
     here = os.path.dirname(__file__)
-    tmp = tmp_dir
+    tmp = tmp_dir if workspace == None else workspace.plot_dir
     # Apply all calibrations tables to each target
     
     for i, target in enumerate(target_list):
@@ -482,7 +502,7 @@ def generate_pickle_plots(data, target_list, path_list):
         pickle_uvplt(wuvdata, tmp, name)
 
 
-def generate_pickle_radplot(data, target_list, path_list):
+def generate_pickle_radplot(data, target_list, path_list, workspace = None):
     """Generate radplots and serialize them in pickle format.
 
     Exactly the same as :func:`~vipcals.scripts.plotter.generate_pickle_plots` but only 
@@ -496,9 +516,12 @@ def generate_pickle_radplot(data, target_list, path_list):
     :type target_list: list of str  
     :param path_list: list of paths of the visibilities
     :type path_list: list of str
+    :param workspace: scratch workspace of the run; defaults to the common 
+        temporary directory
+    :type workspace: :class:`~vipcals.scripts.helper.Workspace`, optional
     """
     here = os.path.dirname(__file__)
-    tmp = tmp_dir
+    tmp = tmp_dir if workspace == None else workspace.plot_dir
     # Apply all calibrations tables to each target
     disk = data.disk
     catalog = AIPSCat(disk)[disk]
@@ -529,7 +552,7 @@ def pickle_uvplt(wuvdata, path, name):
         
     u = []
     v = []
-    fq_table = wuvdata.table('FQ', 0)
+    fq_table = tcache.table(wuvdata, 'FQ', 0)
     if_freq = fq_table[0]['if_freq']
     central_freq =  wuvdata.header['crval'][2]
     for vis in wuvdata:
@@ -579,7 +602,7 @@ def pickle_radplot(wuvdata, path, name):
     """    
 
     central_freq = wuvdata.header['crval'][2]
-    if_freq = wuvdata.table('FQ', 0)[0]['if_freq']
+    if_freq = tcache.table(wuvdata, 'FQ', 0)[0]['if_freq']
     reals_list = []
     imags_list = []
     amps = []
@@ -699,7 +722,7 @@ def pickle_possm(wuvdata, path, name, an_table, bp = False):
     POSSM = {}
     scans = []
 
-    for s in wuvdata.table('NX', 1):
+    for s in tcache.table(wuvdata, 'NX', 1):
         scans.append((s['time'] - s['time_interval'], s['time'] + s['time_interval']))
     for v in wuvdata:
         try:
@@ -738,9 +761,9 @@ def pickle_possm(wuvdata, path, name, an_table, bp = False):
     POSSM['scans'] = scans
     POSSM['ant_dict'] = {x.nosta: x.anname.strip() for x in an_table}
     POSSM['pols'] = list(wuvdata.polarizations)
-    POSSM['if_freq'] = wuvdata.table('FQ', 0)[0]['if_freq']
-    POSSM['total_bandwidth'] = wuvdata.table('FQ', 0)[0]['total_bandwidth']
-    POSSM['ch_width'] = wuvdata.table('FQ', 0)[0]['ch_width']
+    POSSM['if_freq'] = tcache.table(wuvdata, 'FQ', 0)[0]['if_freq']
+    POSSM['total_bandwidth'] = tcache.table(wuvdata, 'FQ', 0)[0]['total_bandwidth']
+    POSSM['ch_width'] = tcache.table(wuvdata, 'FQ', 0)[0]['ch_width']
     POSSM['central_freq'] = wuvdata.header['crval'][2]
 
     if bp == False:
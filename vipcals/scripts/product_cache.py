@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import sqlite3
+import hashlib
+import threading
+import contextlib
+import subprocess
+
+cache_path = os.path.expanduser("~/.vipcals/cache")
+
+# Check if /home/vipcals exists
+if os.path.isdir("/home/vipcals"):
+    cache_path = "/home/vipcals/.vipcals/cache"
+
+# Increase when the layout of the cache changes, older indexes are rebuilt
+INDEX_VERSION = 1
+
+# Freshness of the products in seconds
+FOREVER = None    # Final products that never change
+DAILY = 24 * 3600
+
+# Anonymous login of the CDDIS archive
+CDDIS_OPTIONS = ['-u', 'anonymous:daip@nrao.edu', '--ftp-ssl']
+
+def open_index(path = cache_path):
+    """Open the index of the product cache, creating it if needed.
+
+    The index is a SQLite database with one row per url, pointing to the file in the
+    cache named by the SHA-256 of its content, and one row per search of remote 
+    products. It is shared by every pipeline running at the same time.
+
+    :param path: directory of the cache; defaults to ~/.vipcals/cache
+    :type path: str, optional
+    :return: connection to the index
+    :rtype: sqlite3.Connection
+    """
+    os.makedirs(path, exist_ok = True)
+    con = sqlite3.connect(os.path.join(path, 'index.db'), timeout = 30)
+    if con.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION:
+        con.execute('DROP TABLE IF EXISTS products')
+        con.execute('CREATE TABLE products (url TEXT PRIMARY KEY, digest TEXT, ' \
+                    + 'fetched REAL)')
+        con.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+        con.commit()
+    con.execute('CREATE TABLE IF NOT EXISTS discoveries (key TEXT PRIMARY KEY, ' \
+                + 'urls TEXT, checked REAL)')
+    return(con)
+
+@contextlib.contextmanager
+def url_lock(url, path = cache_path):
+    """Lock a url for every process using the cache.
+
+    Runs retrieving the same product wait for each other, so it is downloaded only
+    once.
+
+    :param url: url of the product
+    :type url: str
+    :param path: directory of the cache; defaults to ~/.vipcals/cache
+    :type path: str, optional
+    """
+    os.makedirs(os.path.join(path, 'locks'), exist_ok = True)
+    name = hashlib.sha256(url.encode()).hexdigest()
+    with open(os.path.join(path, 'locks', name + '.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def object_path(digest, path = cache_path):
+    """Path of a file in the cache.
+
+    :param digest: SHA-256 of the content of the file
+    :type digest: str
+    :param path: directory of the cache; defaults to ~/.vipcals/cache
+    :type path: str, optional
+    :return: path of the file
+    :rtype: str
+    """
+    return(os.path.join(path, 'objects', digest[:2], digest[2:]))
+
+def store_object(filepath, path = cache_path):
+    """Move a file into the cache.
+
+    :param filepath: path of the file, in the same file system as the cache
+    :type filepath: str
+    :param path: directory of the cache; defaults to ~/.vipcals/cache
+    :type path: str, optional
+    :return: SHA-256 of the content of the file
+    :rtype: str
+    """
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    dest = object_path(digest, path)
+    os.makedirs(os.path.dirname(dest), exist_ok = True)
+    os.replace(filepath, dest)
+    return(digest)
+
+def curl_download(url, filepath, since = None, options = None):
+    """Download a file with curl.
+
+    :param url: url of the file
+    :type url: str
+    :param filepath: path where the file is written
+    :type filepath: str
+    :param since: path of a local copy; if given, the file is only downloaded if it
+        was modified after the local copy (If-Modified-Since); defaults to None
+    :type since: str, optional
+    :param options: additional options of curl, e.g. the login; defaults to None
+    :type options: list of str, optional
+    :return: whether curl succeeded; if the file was not modified, nothing is written
+    :rtype: bool
+    """
+    command = ['curl', '-sfR', '--retry', '5', '--retry-delay', '10']
+    command += options if options != None else []
+    if since != None:
+        command += ['-z', since]
+    command += ['-o', filepath, url]
+    return(subprocess.run(command).returncode == 0)
+
+def fetch(url, filepath, max_age = FOREVER, options = None, download = None,
+          path = cache_path):
+    """Retrieve a remote product through the local cache.
+
+    The product is only downloaded if it is not in the cache or if its copy is older
+    than ``max_age``. Expired copies are refreshed with a conditional request, and
+    are still used if the server cannot be reached. If the cache cannot be used, the
+    product is downloaded directly.
+
+    :param url: url of the product
+    :type url: str
+    :param filepath: path where the product is copied
+    :type filepath: str
+    :param max_age: seconds after which the cached copy is checked again; defaults to
+        FOREVER, for products that never change
+    :type max_age: float, optional
+    :param options: additional options of curl, e.g. the login; defaults to None
+    :type options: list of str, optional
+    :param download: function used to download the product instead of curl, called
+        as download(url, filepath, since) and returning whether it succeeded; defaults
+        to None
+    :type download: function, optional
+    :param path: directory of the cache; defaults to ~/.vipcals/cache
+    :type path: str, optional
+    :return: whether the product was retrieved
+    :rtype: bool
+    """
+    if download == None:
+        download = lambda u, f, since: curl_download(u, f, since, options)
+
+    # The cache is only an accelerator, the product is downloaded if it cannot be used
+    try:
+        con = open_index(path)
+    except (sqlite3.Error, OSError):
+        return(download(url, filepath, None))
+
+    with contextlib.closing(con), url_lock(url, path):
+        row = con.execute('SELECT digest, fetched FROM products WHERE url = ?',
+                          (url,)).fetchone()
+        digest = None
+        if row != None and os.path.exists(object_path(row[0], path)):
+            digest = row[0]
+
+        if digest == None or (max_age != None and time.time() - row[1] > max_age):
+            incoming = os.path.join(path,
+                                    f'incoming-{os.getpid()}-{threading.get_ident()}')
+            since = object_path(digest, path) if digest != None else None
+            if download(url, incoming, since) == True:
+                if os.path.exists(incoming) \
+                   and (digest == None or os.path.getsize(incoming) > 0):
+                    digest = store_object(incoming, path)
+                # Otherwise, it was not modified since the cached copy
+                if digest != None:
+                    con.execute('INSERT OR REPLACE INTO products VALUES (?, ?, ?)',
+                                (url, digest, time.time()))
+                    con.commit()
+            if os.path.exists(incoming):
+                os.remove(incoming)
+
+    if digest == None:
+        return(False)
+    shutil.copyfile(object_path(digest, path), filepath)
+    return(True)
+
+def read_discovery(key, ttl = DAILY, path = cache_path):
+    """Look for the result of a previous search of remote products.
+
+    :param key: identifier of the search
+    :type key: str
+    :param ttl: seconds during which the result is valid, None => always; defaults to 
+        DAILY
+    :type ttl: float, optional
+    :param path: directory of the cache; defaults to ~/.vipcals/cache
+    :type path: str, optional
+    :return: urls found by the search, empty if nothing was found; or None if the 
+        search is not cached or has expired
+    :rtype: list of str
+    """
+    try:
+        with contextlib.closing(open_index(path)) as con:
+            row = con.execute('SELECT urls, checked FROM discoveries WHERE key = ?',
+                              (key,)).fetchone()
+    except (sqlite3.Error, OSError):
+        return(None)
+    if row == None or (ttl != None and time.time() - row[1] > ttl):
+        return(None)
+    return(json.loads(row[0]))
+
+def write_discovery(key, urls, path = cache_path):
+    """Store the result of a search of remote products.
+
+    :param key: identifier of the search
+    :type key: str
+    :param urls: urls found by the search, empty if nothing was found; None removes 
+        the result
+    :type urls: list of str
+    :param path: directory of the cache; defaults to ~/.vipcals/cache
+    :type path: str, optional
+    """
+    try:
+        with contextlib.closing(open_index(path)) as con:
+            if urls == None:
+                con.execute('DELETE FROM discoveries WHERE key = ?', (key,))
+            else:
+                con.execute('INSERT OR REPLACE INTO discoveries VALUES (?, ?, ?)',
+                            (key, json.dumps(urls), time.time()))
+            con.commit()
+    except (sqlite3.Error, OSError):
+        pass
@@ -10,6 +10,7 @@ from collections import defaultdict
 
 from vipcals.scripts.helper import Antenna, Scan
 from vipcals.scripts.helper import ddhhmmss, tacop
+from vipcals.scripts import table_cache as tcache
 
 import Wizardry.AIPSData as wizard
 
@@ -44,8 +45,8 @@ def refant_choose_snr(data, sources, target_list, full_source_list, \
     :rtype: int, dict
     """     
     # Load tables
-    nx_table = data.table('NX', 1)
-    an_table = data.table('AN', 1)
+    nx_table = tcache.table(data, 'NX', 1)
+    an_table = tcache.table(data, 'AN', 1)
     
     # Collect info from antennas participating in the observation
     antennas_dict = {}
@@ -59,8 +60,8 @@ def refant_choose_snr(data, sources, target_list, full_source_list, \
         antennas_dict[a.id] = a
 
     # Remove antennas with no TY or GC information
-    gc_antennas = [y['antenna_no'] for y in data.table('GC',1)]
-    ty_antennas = [t['antenna_no'] for t in data.table('TY',2)]
+    gc_antennas = [y['antenna_no'] for y in tcache.table(data, 'GC',1)]
+    ty_antennas = [t['antenna_no'] for t in tcache.table(data, 'TY',2)]
     ty_antennas = list(set(ty_antennas))
 
     bad_antennas = [z for z in list(antennas_dict.keys()) if z \
@@ -106,7 +107,7 @@ def refant_choose_snr(data, sources, target_list, full_source_list, \
 
     # Give scans a source_name
     for sc in scan_list:
-        for so in data.table('SU', 1):
+        for so in tcache.table(data, 'SU', 1):
             if sc.source_id == so.id__no:
                 sc.source_name = so.source.strip()
 
@@ -224,7 +225,7 @@ def refant_choose_snr(data, sources, target_list, full_source_list, \
             refant_fring(data, ant, selected_scans)
             #refant_kring(data, ant, selected_scans, inttime)
             # Check the last SN table and store the median SNR (computed over IFs)
-            last_table = data.table('SN', 0)
+            last_table = tcache.table(data, 'SN', 0)
             for entry in last_table:
                 snr_dict[ant][entry['antenna_no']].append(np.nanmedian(entry['weight_1']))
             # Remove table
@@ -345,7 +346,7 @@ def get_flagged_antennas(data):
     """Return a set of antennas flagged due to 'NO TSYS/GC'."""
     if [1, 'AIPS FG'] not in data.tables:
         return set()
-    fg_table = data.table('FG', 0)
+    fg_table = tcache.table(data, 'FG', 0)
     return {
         row['ants'][0] for row in fg_table
         if row['reason'].strip() == 'NO TSYS/GC'
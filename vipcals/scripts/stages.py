@@ -0,0 +1,136 @@
+import json
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from vipcals.scripts import journal as jrnl
+
+class Stage():
+    """Calibration stage, with the AIPS tables it reads and writes."""
+    def __init__(self, name, inputs = [], outputs = [], checkpoint = True):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.checkpoint = checkpoint
+
+# Stages of the calibration, in order of execution. Tables are written as in the logs.
+STAGES = [Stage('load', outputs = ['CL#1', 'NX#1']),
+          Stage('tsys', inputs = ['CL#1', 'TY#1'], outputs = ['TY#2', 'FG#2']),
+          Stage('refant', inputs = ['FG#2']),
+          Stage('ionos', inputs = ['CL#1'], outputs = ['CL#2']),
+          Stage('eop', inputs = ['CL#2'], outputs = ['CL#3']),
+          Stage('pang', inputs = ['CL#3'], outputs = ['CL#4']),
+          Stage('calibrator', inputs = ['CL#4', 'FG#2'], outputs = ['SN#1']),
+          Stage('accor', inputs = ['CL#4'], outputs = ['SN#2', 'CL#5']),
+          Stage('instrumental', inputs = ['CL#5'], outputs = ['SN#3', 'CL#6']),
+          Stage('bandpass', inputs = ['CL#6'], outputs = ['BP#1']),
+          Stage('autocorr', inputs = ['CL#6', 'BP#1'], outputs = ['SN#4', 'CL#7']),
+          Stage('ampcal', inputs = ['CL#7'], outputs = ['SN#5', 'CL#8']),
+          Stage('solint', inputs = ['CL#8']),
+          Stage('fringe', inputs = ['CL#8'], outputs = ['CL#9']),
+          Stage('export', inputs = ['CL#9', 'BP#1'], checkpoint = False),
+          Stage('plots', inputs = ['CL#9', 'BP#1'], checkpoint = False)]
+
+def missing_tables(uvdata, tables):
+    """Check which tables are not present in the dataset.
+
+    :param uvdata: visibility data
+    :type uvdata: AIPSUVData
+    :param tables: tables written as extension#version, e.g. CL#1
+    :type tables: list of str
+    :return: tables not present in the dataset
+    :rtype: list of str
+    """
+    present = [x[1].split(' ')[-1] + '#' + str(x[0]) for x in uvdata.tables]
+    return [x for x in tables if x not in present]
+
+class StageEngine():
+    """Run the stages of the calibration.
+
+    Every stage goes through the same hooks. Stages completed in a previous run are
+    skipped using the stage journal, the input tables of a stage are checked before it
+    starts and its output tables after it ends, the execution time of each stage is
+    recorded and the journal is updated. Work that does not access the AIPS catalogue
+    (e.g. downloads of remote files) can be submitted to run in the background.
+    """
+    def __init__(self, journal, log_list, max_workers = 4):
+        """
+        Initialize the engine with the stage journal of the calibration.
+        """
+        self.journal = journal
+        self.log_list = log_list
+        self.stages = dict([(x.name, x) for x in STAGES])
+        self.order = [x.name for x in STAGES]
+        self.t_start = {}
+        self.pool = ThreadPoolExecutor(max_workers = max_workers)
+        self.tasks = {}
+
+    def is_done(self, name):
+        """
+        Check if a stage was completed in this or a previous run.
+        """
+        if self.stages[name].checkpoint == False or self.journal['stage'] == None:
+            return False
+        return self.order.index(name) <= self.order.index(self.journal['stage'])
+
+    def pending(self, name, uvdata = None):
+        """
+        Return True if the stage has to run, and start it.
+        """
+        if self.is_done(name) == True:
+            return False
+
+        if uvdata != None:
+            missing = missing_tables(uvdata, self.stages[name].inputs)
+            if len(missing) > 0:
+                self.warn(f'\nWARNING: {missing} not found before the {name} stage.\n')
+
+        self.t_start[name] = time.time()
+        return True
+
+    def complete(self, name, uvdata, stats_df, **state):
+        """
+        Finish a stage, record its execution time and update the journal.
+        """
+        if 'stage_times' in stats_df.columns:
+            stage_times = json.loads(stats_df['stage_times'].iloc[0])
+        else:
+            stage_times = {}
+        stage_times[name] = time.time() - self.t_start[name]
+        stats_df['stage_times'] = json.dumps(stage_times)
+
+        missing = missing_tables(uvdata, self.stages[name].outputs)
+        if len(missing) > 0:
+            self.warn(f'\nWARNING: {missing} not found after the {name} stage.\n')
+
+        if self.stages[name].checkpoint == True:
+            jrnl.record_stage(self.journal, name, uvdata, stats_df, **state)
+
+    def submit(self, key, function, *args, **kwargs):
+        """
+        Run a function in the background, its result is retrieved with the same key.
+        """
+        self.tasks[key] = self.pool.submit(function, *args, **kwargs)
+
+    def result(self, key):
+        """
+        Wait for a background function and return its result, or None if it was never
+        submitted.
+        """
+        if key not in self.tasks:
+            return None
+        return self.tasks.pop(key).result()
+
+    def shutdown(self):
+        """
+        Wait for all background functions to finish.
+        """
+        self.pool.shutdown(wait = True)
+
+    def warn(self, message):
+        """
+        Write a message in the logs and print it.
+        """
+        for pipeline_log in self.log_list:
+            pipeline_log.write(message)
+        print(message)
@@ -0,0 +1,208 @@
+import functools
+import contextlib
+import numpy as np
+
+from AIPS import AIPS
+from AIPSData import AIPSUVData
+from AIPSTask import AIPSTask
+
+# (user number, name, class, disk, sequence, extension, version) => Table
+cached_tables = {}
+
+# Number of open tracking contexts, tables are only cached inside them
+tracking_depth = 0
+
+# Tasks that do not modify their input catalogue entry
+READ_ONLY_TASKS = ['LISTR', 'POSSM', 'SNPLT', 'LWPLA', 'VPLOT', 'UVPLT', 'FITTP',
+                   'SPLIT', 'TASAV', 'AVSPC', 'UVAVG', 'VLOG', 'PRTAN', 'DTSUM']
+
+# Table extensions written in the input catalogue entry by each task. Entries of
+# other tasks are invalidated completely.
+TASK_WRITES = {'CLCAL': ['CL'], 'CLCOR': ['CL'], 'TECOR': ['CL'], 'INDXR': ['NX', 'CL'],
+               'FRING': ['SN'], 'KRING': ['SN'], 'ACCOR': ['SN'], 'ACSCL': ['SN'],
+               'APCAL': ['SN'], 'PCCOR': ['SN'], 'BPASS': ['BP'], 'UVFLG': ['FG'],
+               'TYSMO': ['TY'], 'ANTAB': ['TY', 'GC']}
+
+class Table():
+    """Rows of an AIPS table, read only once.
+
+    Rows are accessed as in the tables of ParselTongue, by index or iterating over the
+    table. Indexing the table with a column name returns the whole column as a NumPy
+    array, built the first time it is requested. Rows and columns are shared by every
+    function reading the table and must not be modified.
+    """
+    def __init__(self, rows):
+        """
+        Initialize the table with its rows.
+        """
+        self.rows = rows
+        self.columns = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, key):
+        if type(key) == str:
+            return self.column(key)
+        return self.rows[key]
+
+    def column(self, key):
+        """
+        Column of the table as a NumPy array, with one row per entry.
+        """
+        if key not in self.columns:
+            self.columns[key] = np.array([x[key] for x in self.rows])
+        return self.columns[key]
+
+def table(data, ext, version = 1):
+    """Read an AIPS table, or return it from the cache if it was already read.
+
+    Tables are only cached inside :func:`tracking`, where the cache is invalidated 
+    automatically when a task writes in the catalogue entry and when a table is 
+    deleted. Tables written with Wizardry have to be invalidated with 
+    :func:`invalidate`. Outside of it, the table is always read again.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param ext: table extension, e.g. 'AN'
+    :type ext: str
+    :param version: table version, 0 => highest; defaults to 1
+    :type version: int, optional
+    :return: table
+    :rtype: :class:`~vipcals.scripts.table_cache.Table`
+    """
+    if version <= 0:
+        version = data.table_highver(ext)
+    key = (AIPS.userno, data.name, data.klass, data.disk, data.seq, ext, version)
+    if key in cached_tables:
+        return cached_tables[key]
+
+    # Always read with the non-Wizardry interface, whose rows are kept in memory
+    uvdata = AIPSUVData(data.name, data.klass, data.disk, data.seq)
+    aips_table = Table([x for x in uvdata.table(ext, version)])
+    if tracking_depth > 0:
+        cached_tables[key] = aips_table
+    return aips_table
+
+def antenna_names(data):
+    """Antenna names of the AN table.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :return: antenna number => antenna name, as written in the AN table
+    :rtype: dict
+    """
+    an_table = table(data, 'AN', 1)
+    return dict(zip(an_table['nosta'].tolist(), an_table['anname'].tolist()))
+
+def invalidate(name, klass, ext = None, version = None):
+    """Remove the tables of a catalogue entry from the cache.
+
+    :param name: name of the catalogue entry
+    :type name: str
+    :param klass: class of the catalogue entry
+    :type klass: str
+    :param ext: table extension; defaults to all extensions
+    :type ext: str, optional
+    :param version: table version; defaults to all versions
+    :type version: int, optional
+    """
+    for key in list(cached_tables):
+        if key[1] != name or key[2] != klass:
+            continue
+        if ext != None and key[5] != ext:
+            continue
+        if version != None and key[6] != version:
+            continue
+        del cached_tables[key]
+
+def task_entries(task):
+    """Catalogue entries that a task can modify.
+
+    :param task: AIPS task that has run
+    :type task: AIPSTask
+    :return: name, class and table extensions modified (None => all) of each entry
+    :rtype: list of tuple
+    """
+    task_name = str(getattr(task, '_name', '')).upper()
+    inname = getattr(task, 'inname', None)
+    inclass = getattr(task, 'inclass', None)
+
+    entries = []
+    if inname != None and task_name not in READ_ONLY_TASKS:
+        entries.append((inname, inclass, TASK_WRITES.get(task_name)))
+    # An empty output name means the input entry
+    for prefix in ['in2', 'out']:
+        name = getattr(task, prefix + 'name', None)
+        klass = getattr(task, prefix + 'class', None)
+        if name == None and klass == None:
+            continue
+        entries.append((name or inname, klass or inclass, None))
+    return entries
+
+# Original methods of ParselTongue that write tables
+task_go = AIPSTask.go
+uvdata_zap = AIPSUVData.zap
+uvdata_zap_table = AIPSUVData.zap_table
+
+def go(self, *args, **kwargs):
+    try:
+        return task_go(self, *args, **kwargs)
+    finally:
+        for name, klass, ext_list in task_entries(self):
+            if ext_list == None:
+                invalidate(name, klass)
+            else:
+                for ext in ext_list:
+                    invalidate(name, klass, ext)
+
+def zap(self, *args, **kwargs):
+    invalidate(self.name, self.klass)
+    return uvdata_zap(self, *args, **kwargs)
+
+def zap_table(self, type, version):
+    ext = type.split(' ')[-1].upper()
+    invalidate(self.name, self.klass, ext, version if version > 0 else None)
+    return uvdata_zap_table(self, type, version)
+
+@contextlib.contextmanager
+def tracking():
+    """Cache the tables read inside the context.
+
+    The methods of ParselTongue that write tables are hooked while the context is 
+    open, so that the cache never returns outdated tables, and restored when it is 
+    closed. The cache is emptied when the outermost context is closed. Contexts can 
+    be nested.
+    """
+    global tracking_depth
+    if tracking_depth == 0:
+        AIPSTask.go = go
+        AIPSUVData.zap = zap
+        AIPSUVData.zap_table = zap_table
+    tracking_depth += 1
+    try:
+        yield
+    finally:
+        tracking_depth -= 1
+        if tracking_depth == 0:
+            AIPSTask.go = task_go
+            AIPSUVData.zap = uvdata_zap
+            AIPSUVData.zap_table = uvdata_zap_table
+            cached_tables.clear()
+
+def tracked(function):
+    """Decorator running a function inside :func:`tracking`.
+
+    :param function: function that reads and writes AIPS tables
+    :type function: function
+    :return: decorated function
+    :rtype: function
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with tracking():
+            return function(*args, **kwargs)
+    return wrapper
@@ -1,4 +1,7 @@
+import numpy as np
+
 from vipcals.scripts.helper import tacop
+from vipcals.scripts import table_cache as tcache
 
 from AIPSTask import AIPSTask, AIPSList
 
@@ -52,15 +55,15 @@ def ty_smooth(data, tmin = 0, tmax = 1500, time_interv = 15, max_dev = 250):
     # Flag antennas with no Tsys or GC information
 
     all_antennas = []
-    for a in data.table('AN',1):
+    for a in tcache.table(data, 'AN',1):
          all_antennas.append(a['nosta'])
 
     antennas_w_tsys = []
-    for t in data.table('TY', 2):
+    for t in tcache.table(data, 'TY', 2):
         antennas_w_tsys.append(t['antenna_no'])
     antennas_w_tsys = list(set(antennas_w_tsys))
 
-    antennas_w_gc = [y['antenna_no'] for y in data.table('GC',1)]
+    antennas_w_gc = [y['antenna_no'] for y in tcache.table(data, 'GC',1)]
 
     bad_antennas = [z for z in all_antennas if z  not in antennas_w_tsys or \
                     z not in antennas_w_gc]
@@ -87,6 +90,29 @@ def ty_smooth(data, tmin = 0, tmax = 1500, time_interv = 15, max_dev = 250):
 
     return(antennas_no_tsys, antennas_no_gc)
     
+def ty_points(data, version):
+    """Read which TSys datapoints of a TY table are valid.
+
+    A datapoint is valid if its TSys is different from the antenna temperature of the 
+    first IF, which is the value written for flagged points.
+
+    :param data: visibility data
+    :type data: AIPSUVData
+    :param version: TY table version
+    :type version: int
+    :return: antenna number and source ID of each row, and valid datapoints [row, IF]
+    :rtype: numpy.ndarray, numpy.ndarray, numpy.ndarray
+    """
+    ty_table = tcache.table(data, 'TY', version)
+    if len(ty_table) == 0:
+        return(np.zeros(0, dtype = int), np.zeros(0, dtype = int), 
+               np.zeros((0, 1), dtype = bool))
+    # Single IF datasets have one value per row
+    tsys = ty_table['tsys_1'].reshape(len(ty_table), -1)
+    tant = ty_table['tant_1'].reshape(len(ty_table), -1)
+    valid = tsys != tant[:, :1]
+    return(ty_table['antenna_no'].astype(int), ty_table['source_id'].astype(int), valid)
+
 def ty_assess(data):
     """Evaluate how many TSys datapoints have been flagged in TY#2.
 
@@ -95,50 +121,44 @@ def ty_assess(data):
     :param data: visibility data
     :type data: AIPSUVData
     :return: number of points in TY#1, number of flagged points in TY#2, dictionary with 
-        these values per antenna, antennas fully flagged
-    :rtype: float, float, dict, list of str
+        these values per antenna, antennas fully flagged, and fraction of flagged points 
+        per IF ('ifs') and per source name ('sources')
+    :rtype: float, float, dict, list of str, dict
     """    
-    ty1 = data.table('TY', 1)
-    ty2 = data.table('TY', 2)
-    ant_ids = [x.nosta for x in data.table('AN', 1)]
-    ant_dict = {}
-    for id in ant_ids:
-        ant_dict[id] = [0,0]
-    
+    ants_1, sources_1, valid_1 = ty_points(data, 1)
+    ants_2, sources_2, valid_2 = ty_points(data, 2)
+    ant_ids = tcache.table(data, 'AN', 1)['nosta'].tolist()
+    n_ant = max(ant_ids + ants_1.tolist() + ants_2.tolist() + [0]) + 1
+
     # Count valid tsys measurements
-    total_points_1 = 0
-    for tsys in ty1:
-        try: 
-            for tsys_if in tsys['tsys_1']:
-                if tsys_if != tsys['tant_1'][0]:
-                    total_points_1 += 1
-                    ant_dict[tsys['antenna_no']][1] += 1
-        except TypeError: # Single IF datasets
-            if tsys['tsys_1'] != tsys['tant_1']:
-                    total_points_1 +=1
-                    ant_dict[tsys['antenna_no']][1] += 1
-                    
-    total_points_2 = 0
-    for tsys in ty2:
-        try: 
-            for tsys_if in tsys['tsys_1']:
-                if tsys_if != tsys['tant_1'][0]:
-                    total_points_2 += 1
-                    ant_dict[tsys['antenna_no']][0] += 1
-        except TypeError: # Single IF datasets
-            if tsys['tsys_1'] != tsys['tant_1']:
-                    total_points_2 +=1
-                    ant_dict[tsys['antenna_no']][0] += 1
-                    
-    original_points = total_points_1
-    flagged_points = total_points_1 - total_points_2
+    ant_points_1 = np.bincount(ants_1, weights = valid_1.sum(axis = 1), minlength = n_ant)
+    ant_points_2 = np.bincount(ants_2, weights = valid_2.sum(axis = 1), minlength = n_ant)
+    original_points = int(valid_1.sum())
+    flagged_points = original_points - int(valid_2.sum())
 
     tsys_dict= {}
     smoothed_antennas = []
     smoothed_antennas_names = []
-    for key in ant_dict:
-        name = [str(x.nosta) + '-' + x.anname.strip() for x in data.table('AN', 1) if x.nosta == key][0]
-        tsys_dict[key] = (name, ant_dict[key][0], ant_dict[key][1])
+    an_names = tcache.antenna_names(data)
+    for key in ant_ids:
+        name = str(key) + '-' + an_names[key].strip()
+        tsys_dict[key] = (name, int(ant_points_2[key]), int(ant_points_1[key]))
+
+    # Flagged fraction per IF and per source
+    if_points_1 = valid_1.sum(axis = 0)
+    if_points_2 = valid_2.sum(axis = 0) if valid_2.shape[1] == valid_1.shape[1] \
+                  else np.zeros_like(if_points_1)
+    n_src = max(sources_1.tolist() + sources_2.tolist() + [0]) + 1
+    src_points_1 = np.bincount(sources_1, weights = valid_1.sum(axis = 1), minlength = n_src)
+    src_points_2 = np.bincount(sources_2, weights = valid_2.sum(axis = 1), minlength = n_src)
+    source_names = dict([(x['id__no'], x['source'].strip()) 
+                         for x in tcache.table(data, 'SU', 1)])
+    flag_fractions = {'ifs': [], 'sources': {}}
+    for n, points in enumerate(if_points_1):
+        flag_fractions['ifs'].append(float(1 - if_points_2[n]/points) if points > 0 else 0.)
+    for sid in np.flatnonzero(src_points_1):
+        name = source_names.get(sid, str(sid))
+        flag_fractions['sources'][name] = float(1 - src_points_2[sid]/src_points_1[sid])
 
     for key in tsys_dict:
         if tsys_dict[key][1]==0 and tsys_dict[key][2] != 0:
@@ -159,4 +179,5 @@ def ty_assess(data):
 
         uvflg.go()
     
-    return(original_points, flagged_points, tsys_dict, smoothed_antennas_names)
\ No newline at end of file
+    return(original_points, flagged_points, tsys_dict, smoothed_antennas_names, 
+           flag_fractions)
\ No newline at end of file